@@ -9,16 +9,23 @@ from currTimeStep import ModelTime
 import sys
 import logging
 from reporting import Reporting
-from imagemean import downsample
+import imagemean
 from bmi import EBmi
 from bmi import BmiGridType
 import datetime
 import os
 
+import virtualOS as vos
+import variable_list as varDicts
+import stateCheckpoint
+
 logger = logging.getLogger(__name__)
 
 
 class BmiPCRGlobWB(EBmi):
+    # file name of the state checkpoint used by save_state and load_state
+    checkpoint_file_name = "pcrglobwb_states.npz"
+
     #we use the same epoch as pcrglobwb netcdf reporting
     def days_since_industry_epoch(self, modeltime):
         return (modeltime - datetime.date(1901, 1, 1)).days
@@ -46,12 +53,15 @@ class BmiPCRGlobWB(EBmi):
 
             # set start and end time based on configuration
             self.model_time = ModelTime()
+            self.model_time.setCalendar(self.configuration.get_calendar())
             self.model_time.getStartEndTimeSteps(self.configuration.globalOptions['startTime'],
                                              self.configuration.globalOptions['endTime'])
 
             self.model_time.update(0)
 
             self.shape = self.calculate_shape()
+            # - the shape of the model maps (the BMI grid of the ScaledBmiPCRGlobWB is coarser)
+            self.model_shape = BmiPCRGlobWB.calculate_shape(self)
 
             logger.info("Shape of maps is %s", str(self.shape))
 
@@ -78,6 +88,8 @@ class BmiPCRGlobWB(EBmi):
 
             self.reporting = Reporting(self.configuration, self.model, self.model_time)
 
+            self.initialize_variable_registry()
+
             logger.info("Shape of maps is %s", str(self.shape))
 
             logger.info("PCRGlobWB Initialized")
@@ -89,7 +101,104 @@ class BmiPCRGlobWB(EBmi):
 
 
 
+    def initialize_variable_registry(self):
+
+        # landmask cells (in the BMI grid orientation, i.e. starting with the bottom row), cached for all get_value calls
+        self.landmask_cells = np.flipud(vos.getCellMask(self.model.landmask))
+
+        # registry of the variables: name -> (object, attribute, settable)
+        # - the model states, named "<component>.<state>" or "landSurface.<coverType>.<state>", can be set
+        # - the output variables of the variable_list, taken from the reporting object (available after the first update), are read only
+        self.variable_registry = {}
+        self.variable_registry["top_layer_soil_saturation"] = (self.model.landSurface, 'satDegUpp000005', True)
+        for component, states in self.model.getState().items():
+            component_object = vars(self.model)[component]
+            for state, value in states.items():
+                if isinstance(value, dict):
+                    cover_type_object = component_object.landCoverObj[state]
+                    for cover_type_state, cover_type_value in value.items():
+                        self.register_state(component + "." + state + "." + cover_type_state, cover_type_object, cover_type_state, cover_type_value)
+                else:
+                    self.register_state(component + "." + state, component_object, state, value)
+        # - the lake and reservoir states of the routing are overwritten by the ones of the WaterBodies every time step; hence, the latter are used
+        for name, attribute in [("routing.waterBodyStorage"           , 'waterBodyStorage'), \
+                                ("routing.avgLakeReservoirOutflowLong", 'avgOutflow'), \
+                                ("routing.avgLakeReservoirInflowShort", 'avgInflow')]:
+            if name in self.variable_registry: self.variable_registry[name] = (self.model.routing.WaterBodies, attribute, True)
+        for var in varDicts.netcdf_short_name.keys():
+            if var not in self.variable_registry: self.variable_registry[var] = (self.reporting, var, False)
+
+        # values (as numpy arrays) of the current time step; they are converted from pcraster maps only once per time step and variable
+        # - values set with set_value_at_indices are kept here and passed to the model (all at once) before the next update (see flush_values)
+        self.values = {}
+        self.values_to_flush = set()
+
+        logger.info("The BMI variable registry contains %i variables.", len(self.variable_registry))
+
+    def register_state(self, name, state_object, key, value):
+        # the attribute of a state; most of them have the same name as in getState, otherwise it is the attribute referring to the same object
+        attribute = key
+        if key not in vars(state_object):
+            attribute = None
+            for var in sorted(vars(state_object).keys()):
+                if vars(state_object)[var] is value:
+                    attribute = var
+                    break
+        if attribute is None:
+            logger.debug("The state %s is not found as an attribute and is not registered in the BMI.", name)
+            return
+        self.variable_registry[name] = (state_object, attribute, True)
+
+    def get_variable_entry(self, long_var_name):
+        if long_var_name not in self.variable_registry:
+            msg = "unknown var name " + long_var_name
+            logger.error(msg)
+            raise Exception(msg)
+        return self.variable_registry[long_var_name]
+
+    def get_values(self, long_var_name):
+        # the (cached) values of a variable at the BMI grid, with missing values outside the landmask
+        if long_var_name in self.values: return self.values[long_var_name]
+
+        variable_object, attribute, settable = self.get_variable_entry(long_var_name)
+        # - the reporting variables are read with Reporting.get_variable, as they are only calculated on a time step if they are needed for reporting
+        value = None
+        if variable_object is self.reporting:
+            if self.model_time.timeStepPCR > 0: value = self.reporting.get_variable(attribute)
+        elif attribute in vars(variable_object):
+            value = vars(variable_object)[attribute]
+        if value is not None:
+            values = np.flipud(pcr.pcr2numpy(pcr.scalar(value), np.nan)).astype(np.float64)
+            # - for the data assimilation, missing saturation values in the landmask are zero
+            if long_var_name == "top_layer_soil_saturation": values[np.isnan(values)] = 0.0
+            values[~self.landmask_cells] = np.nan
+        else:
+            logger.info("model has not run yet, returning empty state for %s", long_var_name)
+            values = np.zeros(self.model_shape)
+        self.values[long_var_name] = values
+        return values
+
+    def get_flat_indices(self, inds):
+        # indices as flat cell indices or as (row, column) pairs
+        inds = np.asarray(inds, dtype = np.int64)
+        if inds.ndim == 2: return np.ravel_multi_index((inds[:,0], inds[:,1]), self.shape)
+        return inds
+
+    def flush_values(self):
+        # passing the values set with set_value_at_indices to the model
+        for long_var_name in sorted(self.values_to_flush):
+            self.set_value(long_var_name, self.values[long_var_name])
+        self.values_to_flush = set()
+
+    def clear_values(self):
+        # the cached values are outdated after every update of the model states
+        self.values = {}
+        self.values_to_flush = set()
+
     def update(self):
+        self.flush_values()
+        self.clear_values()
+
         timestep = self.model_time.timeStepPCR
 
         self.model_time.update(timestep + 1)
@@ -118,15 +227,19 @@ class BmiPCRGlobWB(EBmi):
         return "pcrglobwb"
 
     def get_input_var_names(self):
-        return ["top_layer_soil_saturation"]
+        if self.model is None: return ["top_layer_soil_saturation"]
+        return sorted([var for var in self.variable_registry.keys() if self.variable_registry[var][2]])
 
     def get_output_var_names(self):
-        return ["top_layer_soil_saturation"]
+        if self.model is None: return ["top_layer_soil_saturation"]
+        return sorted(self.variable_registry.keys())
 
     def get_var_type(self, long_var_name):
         return 'float64'
 
     def get_var_units(self, long_var_name):
+        attribute = self.get_variable_entry(long_var_name)[1]
+        if long_var_name != "top_layer_soil_saturation" and attribute in varDicts.netcdf_unit: return varDicts.netcdf_unit[attribute]
         #TODO: this is not a proper unit
         return '1'
 
@@ -155,43 +268,13 @@ class BmiPCRGlobWB(EBmi):
         return "Days since 1901-01-01"
 
     def get_value(self, long_var_name):
-        logger.info("getting value for var %s", long_var_name)
-
-        if (long_var_name == "top_layer_soil_saturation"):
-
-            if self.model is not None and hasattr(self.model.landSurface, 'satDegUpp000005'):
-
-                #first make all NanS into 0.0 with cover, then cut out the model using the landmask.
-                # This should not actually make a difference.
-                remasked = pcr.ifthen(self.model.landmask, pcr.cover(self.model.landSurface.satDegUpp000005, 0.0))
-
-                pcr.report(self.model.landSurface.satDegUpp000005, "value.map")
-                pcr.report(remasked, "remasked.map")
-
-                value = pcr.pcr2numpy(remasked, np.NaN)
-
-            else:
-                logger.info("model has not run yet, returning empty state for top_layer_soil_saturation")
-                value = pcr.pcr2numpy(pcr.scalar(0.0), np.NaN)
+        logger.debug("getting value for var %s", long_var_name)
 
-            # print "getting var", value
-            # sys.stdout.flush()
-
-            doubles = value.astype(np.float64)
-
-            # print "getting var as doubles!!!!", doubles
-
-            result = np.flipud(doubles)
-
-            # print "getting var as doubles flipped!!!!", result
-            # sys.stdout.flush()
-
-            return result
-        else:
-            raise Exception("unknown var name" + long_var_name)
+        # a copy of the cached values (these may still be changed by set_value_at_indices)
+        return self.get_values(long_var_name).copy()
 
     def get_value_at_indices(self, long_var_name, inds):
-        raise NotImplementedError
+        return self.get_values(long_var_name).ravel()[self.get_flat_indices(inds)]
 
     #     def get_satDegUpp000005_from_observation(self):
     #
@@ -209,16 +292,8 @@ class BmiPCRGlobWB(EBmi):
         src[mask] = 1e20
         observed_satDegUpp000005 = pcr.numpy2pcr(pcr.Scalar, src, 1e20)
 
-        pcr.report(observed_satDegUpp000005, "observed.map")
-
         constrained_satDegUpp000005 = pcr.min(1.0, pcr.max(0.0, observed_satDegUpp000005))
 
-        pcr.report(constrained_satDegUpp000005, "constrained.map")
-
-        pcr.report(self.model.landSurface.satDegUpp000005, "origmap.map")
-        diffmap = constrained_satDegUpp000005 - self.model.landSurface.satDegUpp000005
-        pcr.report(diffmap, "diffmap.map")
-
         # ratio between observation and model
         ratio_between_observation_and_model = pcr.ifthenelse(self.model.landSurface.satDegUpp000005 > 0.0,
                                                              constrained_satDegUpp000005 / \
@@ -241,42 +316,45 @@ class BmiPCRGlobWB(EBmi):
 
     def set_value(self, long_var_name, src):
 
-        if self.model is None or not hasattr(self.model.landSurface, 'satDegUpp000005'):
+        variable_object, attribute, settable = self.get_variable_entry(long_var_name)
+        if not settable:
+            msg = "The variable " + long_var_name + " cannot be set."
+            logger.error(msg)
+            raise Exception(msg)
+
+        if self.model is None or attribute not in vars(variable_object):
             logger.info("cannot set value for %s, as model has not run yet.", long_var_name)
             return
 
-        logger.info("setting value for %s", long_var_name)
-
-        # logger.info("dumping state to %s", self.configuration.endStateDir)
-        # self.model.dumpStateDir(self.configuration.endStateDir + "/pre/")
-
-        # print "got value to set", src
+        logger.debug("setting value for %s", long_var_name)
 
-        # make sure the raster is the right side up
-        src = np.flipud(src)
-
-        # print "flipped", src
-
-        # cast to pcraster precision
-        src = src.astype(np.float32)
-
-        # print "as float 32", src
-
-        sys.stdout.flush()
-
-        logger.info("setting value shape %s", src.shape)
+        # make sure the raster is the right side up, and cast to pcraster precision
+        src = np.flipud(np.reshape(src, self.model_shape)).astype(np.float32)
 
         if (long_var_name == "top_layer_soil_saturation"):
             self.set_satDegUpp000005(src)
         else:
-            raise Exception("unknown var name" + long_var_name)
+            src[np.isnan(src)] = vos.MV
+            vars(variable_object)[attribute] = pcr.numpy2pcr(pcr.Scalar, src, vos.MV)
+            # - the water body table (numpy engine) keeps its own lake and reservoir states
+            if variable_object is self.model.routing.WaterBodies and variable_object.waterBodyTable is not None:
+                variable_object.loadWaterBodyTableStates()
 
-        # write state here to facilitate restarting tomorrow
-        # logger.info("dumping state to %s", self.configuration.endStateDir)
-        # self.model.dumpStateDir(self.configuration.endStateDir + "/post/")
+        # the cached values are outdated (note that other variables, e.g. the output variables, are only updated in the next update)
+        self.values.pop(long_var_name, None)
 
     def set_value_at_indices(self, long_var_name, inds, src):
-        raise NotImplementedError
+
+        variable_object, attribute, settable = self.get_variable_entry(long_var_name)
+        if not settable:
+            msg = "The variable " + long_var_name + " cannot be set."
+            logger.error(msg)
+            raise Exception(msg)
+
+        # the values are set in the cached values and passed to the model before the next update
+        values = self.get_values(long_var_name)
+        values.ravel()[self.get_flat_indices(inds)] = src
+        self.values_to_flush.add(long_var_name)
 
     def get_grid_type(self, long_var_name):
         return BmiGridType.UNIFORM
@@ -338,66 +416,103 @@ class BmiPCRGlobWB(EBmi):
         raise NotImplementedError
 
     def save_state(self, destination_directory):
+        self.flush_values()
         logger.info("saving state to %s", destination_directory)
-        self.model.dumpStateDir(destination_directory)
+        stateCheckpoint.writeStateCheckpoint(os.path.join(destination_directory, self.checkpoint_file_name), \
+                                             self.model.getState(), self.model.landmask, self.model_time)
 
     def load_state(self, source_directory):
-        raise NotImplementedError
+        logger.info("loading state from %s", source_directory)
+        state, metadata = stateCheckpoint.readStateCheckpoint(os.path.join(source_directory, self.checkpoint_file_name), self.model.landmask)
+        self.model.setState(state)
+
+        # continue from the model time of the states
+        if "date" in metadata:
+            date = datetime.datetime.strptime(metadata["date"], "%Y-%m-%d").date()
+            self.model_time.update(self.model_time.timeStepOfDate(date))
+
+        self.clear_values()
 
 
 
 class ScaledBmiPCRGlobWB(BmiPCRGlobWB):
     factor = 5
 
-    def set_value(self, long_var_name, scaled_new_value):
-        # small value for comparison
-        current_value = self.get_value(long_var_name)
-
-        print('current value after scaling', current_value)
+    # block reduction methods (see imagemean.block_reduce) of the aggregation to the coarse BMI grid; the default one is the NaN mean
+    aggregation_methods = {"mean"              : imagemean.MEAN,
+                           "sum"               : imagemean.SUM,
+                           "area_weighted_mean": imagemean.WEIGHTED_MEAN,
+                           "max"               : imagemean.MAX}
+    default_aggregation_method = "mean"
 
-        print('value given by user', scaled_new_value)
+    def initialize_variable_registry(self):
+        BmiPCRGlobWB.initialize_variable_registry(self)
 
-        diff = scaled_new_value - current_value
+        # cell areas (weights of the area_weighted_mean) and the aggregation method per variable
+        self.cell_area = np.ascontiguousarray(np.flipud(pcr.pcr2numpy(self.model.routing.cellArea, np.nan)), dtype = np.float64)
+        self.aggregation_method = {}
 
-        print("diff now", diff)
+        # aggregated values of the current time step
+        self.scaled_values = {}
 
-        # scale to model resolution
-        big_diff = np.repeat(np.repeat(diff, self.factor, axis=0), self.factor, axis=1)
+    def set_aggregation_method(self, long_var_name, method):
+        if method not in self.aggregation_methods:
+            msg = "Unknown aggregation method " + str(method) + ", use one of " + str(sorted(self.aggregation_methods.keys()))
+            logger.error(msg)
+            raise Exception(msg)
+        self.get_variable_entry(long_var_name)
+        self.aggregation_method[long_var_name] = method
+        self.scaled_values.pop(long_var_name, None)
 
-        big_current_value = BmiPCRGlobWB.get_value(self, long_var_name)
+    def get_aggregation_method(self, long_var_name):
+        return self.aggregation_method.get(long_var_name, self.default_aggregation_method)
 
-        new_value = big_current_value + big_diff
+    def clear_values(self):
+        BmiPCRGlobWB.clear_values(self)
+        self.scaled_values = {}
 
-        # new_value = np.repeat(np.repeat(src, self.factor, axis=0), self.factor, axis=1)
+    def get_scaled_values(self, long_var_name):
+        # the (cached) values of a variable at the coarse BMI grid
+        if long_var_name in self.scaled_values: return self.scaled_values[long_var_name]
 
-        BmiPCRGlobWB.set_value(self, long_var_name, new_value)
+        big_map = np.ascontiguousarray(self.get_values(long_var_name), dtype = np.float64)
+        result = np.empty(self.get_grid_shape(long_var_name))
+        imagemean.block_reduce(big_map, self.cell_area, result, self.factor, self.aggregation_methods[self.get_aggregation_method(long_var_name)])
 
-    def calculate_shape(self):
-        original = BmiPCRGlobWB.calculate_shape(self)
+        self.scaled_values[long_var_name] = result
+        return result
 
-        logger.info("original shape !!! =" + str(original))
+    def set_value(self, long_var_name, scaled_new_value):
+        scaled_new_value = np.reshape(np.asarray(scaled_new_value, dtype = np.float64), self.get_grid_shape(long_var_name))
 
-        return np.array([original[0] // self.factor, original[1] // self.factor])
+        # the difference to the current (aggregated) values is added to the cells at the model resolution
+        # - for the sum, it is divided over the cells of every block
+        diff = np.ascontiguousarray(scaled_new_value - self.get_scaled_values(long_var_name))
+        big_current_value = np.ascontiguousarray(self.get_values(long_var_name), dtype = np.float64)
+        new_value = np.empty(self.model_shape)
+        imagemean.prolongate_add(diff, big_current_value, new_value, self.factor, self.get_aggregation_method(long_var_name) == "sum")
 
-    def get_value(self, long_var_name):
-        big_map = BmiPCRGlobWB.get_value(self, long_var_name)
+        BmiPCRGlobWB.set_value(self, long_var_name, new_value)
+        self.scaled_values.pop(long_var_name, None)
 
-        print("getting value original shape " + str(big_map.shape))
-        print("original size " + str(big_map.size))
-        print("nans in original " + str(np.count_nonzero(np.isnan(big_map))))
+    def set_value_at_indices(self, long_var_name, inds, src):
+        new_value = self.get_scaled_values(long_var_name).copy()
+        new_value.ravel()[self.get_flat_indices(inds)] = src
+        self.set_value(long_var_name, new_value)
 
-        result = np.zeros(shape=self.get_grid_shape(long_var_name))
+    def calculate_shape(self):
+        original = BmiPCRGlobWB.calculate_shape(self)
 
-        downsample(big_map, result)
+        return (original[0] // self.factor, original[1] // self.factor)
 
-        print("getting value new shape " + str(result.shape))
-        print("result size " + str(result.size))
-        print("nans count in result " + str(np.count_nonzero(np.isnan(result))))
+    def get_value(self, long_var_name):
+        logger.debug("getting scaled value for var %s", long_var_name)
 
-        print("getting value", result)
-        sys.stdout.flush()
+        # a copy of the cached values
+        return self.get_scaled_values(long_var_name).copy()
 
-        return result
+    def get_value_at_indices(self, long_var_name, inds):
+        return self.get_scaled_values(long_var_name).ravel()[self.get_flat_indices(inds)]
 
     def get_grid_spacing(self, long_var_name):
         cellsize = pcr.clone().cellSize()
@@ -34,6 +34,8 @@ import shutil
 import glob
 import subprocess
 import platform
+import hashlib
+import pickle
 
 import logging
 logger = logging.getLogger(__name__)
@@ -48,7 +50,8 @@ class Configuration(object):
                        debug_mode = False, \
                        no_modification = True, \
                        system_arguments = None, \
-                       relative_ini_meteo_paths = False):
+                       relative_ini_meteo_paths = False, \
+                       parsed_configuration_file = None):
         object.__init__(self)
 
         if iniFileName is None:
@@ -67,7 +70,10 @@ class Configuration(object):
         self._cwd = os.getcwd()
         
         # read configuration from given file
-        self.parse_configuration_file(self.iniFileName)
+        # - or from the parsed configuration saved by another run (e.g. by the parallel runner for all clones), if it is from the same ini file content
+        self.parsed_configuration_file = None
+        if parsed_configuration_file is None or self.load_parsed_configuration(parsed_configuration_file) == False:
+            self.parse_configuration_file(self.iniFileName)
 
         # added this option to be able to run in a sandbox with meteo files and initial conditions
         self.using_relative_path_for_output_directory = False
@@ -96,6 +102,10 @@ class Configuration(object):
 
     def set_configuration(self, system_arguments = None):
 
+        # option to skip the backup of the python scripts given as the system argument -bs (e.g. "-bs False" for the clones of a parallel run)
+        if system_arguments is not None and "-bs" in system_arguments:
+            self.globalOptions['backupScripts'] = system_arguments[system_arguments.index("-bs") + 1]
+
         # set all paths, clean output when requested
         self.set_input_files()
         self.create_output_directories()
@@ -231,6 +241,9 @@ class Configuration(object):
         
         if system_arguments != None:
             logger.info('The system arguments given to execute this run: %s', system_arguments)
+        
+        if self.parsed_configuration_file is not None:
+            logger.info('The configuration is loaded from the parsed configuration %s (the ini file is not parsed again).', self.parsed_configuration_file)
        
     def backup_configuration(self):
         
@@ -256,6 +269,93 @@ class Configuration(object):
                 val = config.get(sec, opt)                     # value defined in every option 
                 self.__getattribute__(sec)[opt] = val          # example: self.globalOptions['logFileDir'] = val
         
+    def ini_file_hash(self):
+        # hash of the content of the ini file, used to check whether a parsed configuration belongs to it
+        with open(self.iniFileName, 'rb') as ini_file:
+            return hashlib.sha1(ini_file.read()).hexdigest()
+
+    def save_parsed_configuration(self, fileName):
+        """
+        Save the parsed sections (as given in the ini file, before any modification by set_configuration), 
+        so that other runs with the same ini file (e.g. the clones of a parallel run) do not have to parse it again
+        """
+        parsed_configuration = {'iniFileHash': self.ini_file_hash(), \
+                                'allSections': list(self.allSections), \
+                                'sections'   : dict((sec, dict(vars(self)[sec])) for sec in self.allSections)}
+        
+        # - written to a temporary file first, so that other runs never read an incomplete file
+        tmp_file_name = fileName + ".tmp"
+        with open(tmp_file_name, 'wb') as parsed_file:
+            pickle.dump(parsed_configuration, parsed_file, protocol = 2)
+        os.replace(tmp_file_name, fileName)
+        logger.debug('The parsed configuration is saved to %s', fileName)
+
+    def load_parsed_configuration(self, fileName):
+        """
+        Load the sections saved by save_parsed_configuration; returns False (nothing loaded) if the file is not available 
+        or if it does not belong to the current content of the ini file
+        """
+        if not os.path.isfile(fileName): return False
+        with open(fileName, 'rb') as parsed_file:
+            parsed_configuration = pickle.load(parsed_file)
+        if parsed_configuration['iniFileHash'] != self.ini_file_hash(): 
+            logger.warning("The parsed configuration %s does not belong to the ini file %s. The ini file is parsed.", fileName, self.iniFileName)
+            return False
+        
+        self.allSections = list(parsed_configuration['allSections'])
+        for sec in self.allSections:
+            vars(self)[sec] = dict(parsed_configuration['sections'][sec])
+        self.parsed_configuration_file = fileName
+        return True
+
+    def get_option(self, section, option, default = None):
+        """
+        Returns the value (string) of an option, or the default if the section or option is not defined or if its value is "None"
+        """
+        if section not in self.allSections: return default
+        value = vars(self)[section].get(option, "None")
+        if value == "None": return default
+        return value
+
+    def get_boolean_option(self, section, option, default = False):
+        """
+        Returns the value of a "True"/"False" option as a boolean (the default if it is not defined)
+        """
+        value = self.get_option(section, option)
+        if value is None: return default
+        if value not in ["True", "False"]:
+            msg = 'The option "' + option + '" in the "' + section + '" of the configuration file must be "True" or "False" (given: "' + value + '").'
+            logger.error(msg)
+            raise Exception(msg)
+        return value == "True"
+
+    def get_choice_option(self, section, option, choices, default):
+        """
+        Returns the value of an option that must be one of the choices (the default if it is not defined)
+        """
+        value = self.get_option(section, option, default)
+        if value not in choices:
+            msg = 'The option "' + option + '" in the "' + section + '" of the configuration file must be one of ' + str(choices) + ' (given: "' + str(value) + '").'
+            logger.error(msg)
+            raise Exception(msg)
+        return value
+
+    def get_calendar(self):
+        """
+        Returns the calendar of the simulation (the option "calendar" in the "globalOptions", default: "standard"); 
+        with "forcing", it is the calendar of the precipitation netcdf file
+        """
+        calendar = self.get_option('globalOptions', 'calendar', "standard")
+        if calendar == "forcing":
+            precipitation_file = vos.getFullPath(self.meteoOptions['precipitationNC'], self.globalOptions['inputDir'])
+            if "%" in precipitation_file:
+                msg = 'The calendar cannot be taken from the precipitation files defined per year or month. Please set the option "calendar" in the "globalOptions".'
+                logger.error(msg)
+                raise Exception(msg)
+            calendar = vos.getCalendarOfNetcdfFile(precipitation_file)
+            logger.info('The calendar of the forcing data is used: %s', calendar)
+        return calendar
+
     def set_input_files(self):
         # fullPath of CLONE:
         self.cloneMap = vos.getFullPath(self.globalOptions['cloneMap'], \
@@ -300,22 +400,25 @@ class Configuration(object):
         os.makedirs(self.outNCDir)
 
         # making backup for the python scripts used:
+        # - this can be skipped with the option backupScripts = False (e.g. for the clones of a parallel run, as the parallel runner has made the backup)
         self.scriptDir = vos.getFullPath("scripts/", \
                                          self.globalOptions['outputDir'])
-
-        if os.path.exists(self.scriptDir):
-            shutil.rmtree(self.scriptDir)
-        os.makedirs(self.scriptDir)
         
         # working/starting directory where all scripts are stored
         path_of_this_module = os.path.abspath(os.path.dirname(__file__))
         self.starting_directory = path_of_this_module
-                           
-        for filename in glob.glob(os.path.join(path_of_this_module, '*.py')):
-        # ~ for filename in glob.glob(os.path.join(path_of_this_module, '**/*.py'), recursive=True):
-            print(filename)
-            shutil.copy(filename, self.scriptDir)
-        # TODO: Fix this copying (it does not include subfolders)   
+
+        if self.get_boolean_option('globalOptions', 'backupScripts', True):
+
+            if os.path.exists(self.scriptDir):
+                shutil.rmtree(self.scriptDir)
+            os.makedirs(self.scriptDir)
+                               
+            for filename in glob.glob(os.path.join(path_of_this_module, '*.py')):
+            # ~ for filename in glob.glob(os.path.join(path_of_this_module, '**/*.py'), recursive=True):
+                print(filename)
+                shutil.copy(filename, self.scriptDir)
+            # TODO: Fix this copying (it does not include subfolders)   
         
         # making log directory:
         self.logFileDir = vos.getFullPath("log/", \
@@ -28,29 +28,77 @@ logger = logging.getLogger(__name__)
 import time
 import datetime
 
+import numpy as np
+
+# calendars of the simulation; the calendar should be the one of the (daily) forcing data (see Configuration.get_calendar)
+# - standard calendars (with leap days)
+standardCalendars = ["standard", "gregorian", "proleptic_gregorian"]
+# - calendars without leap days (every year has 365 days)
+noLeapCalendars = ["noleap", "365_day"]
+
+# first day of year (0 to 364) of every month in the calendars without leap days
+firstDayOfMonthNoLeap = np.cumsum([0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30])
+
+def calendarOrdinal(date, calendar = "standard"):
+    # number of days since 0001-01-01 in the calendar 
+    if calendar in noLeapCalendars:
+        if date.month == 2 and date.day == 29:
+            msg = "The date " + str(date) + " does not exist in the calendar " + str(calendar) + "."
+            logger.error(msg)
+            raise Exception(msg)
+        return (date.year - 1) * 365 + int(firstDayOfMonthNoLeap[date.month - 1]) + date.day - 1
+    return date.toordinal() - 1
+
+def calendarDates(ordinals, calendar = "standard"):
+    # years, months, days and days of year of the given ordinals (number of days since 0001-01-01 in the calendar), as numpy arrays
+    ordinals = np.asarray(ordinals, dtype = np.int64)
+    if calendar in noLeapCalendars:
+        years       = ordinals // 365 + 1
+        dayOfYear   = ordinals % 365
+        months      = np.searchsorted(firstDayOfMonthNoLeap, dayOfYear, side = 'right')
+        days        = dayOfYear - firstDayOfMonthNoLeap[months - 1] + 1
+        return years, months, days, dayOfYear + 1
+    # - numpy datetime64 (days since 1970-01-01) for the standard calendar
+    dates  = np.datetime64('0001-01-01', 'D') + ordinals
+    years  = dates.astype('datetime64[Y]').astype(np.int64) + 1970
+    months = dates.astype('datetime64[M]').astype(np.int64) % 12 + 1
+    days   = (dates - dates.astype('datetime64[M]')).astype(np.int64) + 1
+    doys   = (dates - dates.astype('datetime64[Y]')).astype(np.int64) + 1
+    return years, months, days, doys
+
+
 class ModelTime(object):
 
     def __init__(self):
         object.__init__(self)
         self._spinUpStatus = False
+        self._calendar = "standard"
+        self._calendarLength = -1
     
+    def setCalendar(self, calendar):
+        if calendar not in standardCalendars + noLeapCalendars:
+            msg = "The calendar " + str(calendar) + " is not supported; use one of " + str(standardCalendars + noLeapCalendars) + "."
+            logger.error(msg)
+            raise Exception(msg)
+        self._calendar = calendar
   
     #FIXME: use __init__
-    def getStartEndTimeSteps(self,strStartTime,strEndTime,showNumberOfTimeSteps=True):
+    def getStartEndTimeSteps(self,strStartTime,strEndTime,showNumberOfTimeSteps=True,calendar=None):
         # get startTime, endTime, nrOfTimeSteps 
+        if calendar is not None: self.setCalendar(calendar)
         sd = str(strStartTime).split('-')
         self._startTime = datetime.date(int(sd[0]), int(sd[1]), int(sd[2]))
         ed = str(strEndTime).split('-')
         self._endTime = datetime.date(int(ed[0]), int(ed[1]), int(ed[2]))
-        self._nrOfTimeSteps = 1 + (self.endTime - self.startTime).days
+        self._nrOfTimeSteps = self.numberOfDays(self.startTime, self.endTime)
         self._spinUpStatus = False
         if showNumberOfTimeSteps == True: logger.info("number of time steps: "+str(self._nrOfTimeSteps))
-        self._monthIdx = 0 # monthly indexes since the simulation starts
-        self._annuaIdx = 0 #  yearly indexes since the simulation starts
+        self.setCalendarArrays()
 
     #FIXME: use __init__
-    def getStartEndTimeStepsForSpinUp(self,strStartTime,noSpinUp,maxSpinUps):
+    def getStartEndTimeStepsForSpinUp(self,strStartTime,noSpinUp,maxSpinUps,calendar=None):
         # get startTime, endTime, nrOfTimeSteps for SpinUps
+        if calendar is not None: self.setCalendar(calendar)
         sd = str(strStartTime).split('-')
         self._startTime = datetime.date(int(sd[0]), int(sd[1]), int(sd[2]))
 
@@ -61,26 +109,67 @@ class ModelTime(object):
         # always use the last day of a year: 31 December of the starting year
         self._endTime = datetime.date(int(sd[0]), int(12), int(31))
         
-        self._nrOfTimeSteps = 1 + (self.endTime - self.startTime).days
+        self._nrOfTimeSteps = self.numberOfDays(self.startTime, self.endTime)
         self._spinUpStatus = True
         self._noSpinUp   = noSpinUp
         self._maxSpinUps = maxSpinUps
-        self._monthIdx = 0 # monthly indexes since the simulation starts
-        self._annuaIdx = 0 #  yearly indexes since the simulation starts
+        self.setCalendarArrays()
 
+    def numberOfDays(self, startDate, endDate):
+        # number of days (time steps) from startDate to endDate (both included) in the calendar
+        return 1 + calendarOrdinal(endDate, self._calendar) - calendarOrdinal(startDate, self._calendar)
+
+    def timeStepOfDate(self, date):
+        # time step (timeStepPCR) of the date
+        return self.numberOfDays(self.startTime, date)
+
+    def setCalendarArrays(self, length = None):
+        # all calendar values and flags of the simulation, for the time steps 0 (the day before the start) to length (default: nrOfTimeSteps)
+        # - the monthly and yearly indexes (monthIdx and annuaIdx) count the ends of months and years since the simulation starts
+        if length is None: length = self._nrOfTimeSteps
+        self._calendarLength = length
+        
+        # - values of the time steps 0 to length + 1 (the day after length is needed for the flags of the last time step)
+        ordinals = calendarOrdinal(self.startTime, self._calendar) - 1 + np.arange(length + 2)
+        years, months, days, doys = calendarDates(ordinals, self._calendar)
+        self._years  = years[:-1].tolist()
+        self._months = months[:-1].tolist()
+        self._days   = days[:-1].tolist()
+        self._doys   = doys[:-1].tolist()
+        
+        self._dates     = [datetime.date(y, m, d) for y, m, d in zip(self._years, self._months, self._days)]
+        self._datetimes = [datetime.datetime(y, m, d) for y, m, d in zip(self._years, self._months, self._days)]
+        self._fulldates = ['%04i-%02i-%02i' %(y, m, d) for y, m, d in zip(self._years, self._months, self._days)]
+        
+        # - flags (tomorrow is the first day of the month or of the year)
+        lastDayOfMonth = days[1:] == 1
+        lastDayOfYear  = doys[1:] == 1
+        self._isLastDayOfMonth = lastDayOfMonth.tolist()
+        self._isLastDayOfYear  = lastDayOfYear.tolist()
+        # - no ends of months or years are counted before the start (time step 0)
+        lastDayOfMonth[0] = False
+        lastDayOfYear[0]  = False
+        self._monthIdxs = np.cumsum(lastDayOfMonth).tolist()
+        self._annuaIdxs = np.cumsum(lastDayOfYear).tolist()
 
     def setStartTime(self, date):
         self._startTime = date
-        self._nrOfTimeSteps = 1 + (self.endTime - self.startTime).days
+        self._nrOfTimeSteps = self.numberOfDays(self.startTime, self.endTime)
+        self.setCalendarArrays()
 
     def setEndTime(self, date):
         self._endTime = date
-        self._nrOfTimeSteps = 1 + (self.endTime - self.startTime).days
+        self._nrOfTimeSteps = self.numberOfDays(self.startTime, self.endTime)
+        self.setCalendarArrays()
 
     @property
     def spinUpStatus(self):
         return self._spinUpStatus
 
+    @property
+    def calendar(self):
+        return self._calendar
+
     @property    
     def startTime(self):
         return self._startTime
@@ -93,21 +182,32 @@ class ModelTime(object):
     def currTime(self):
         return self._currTime
 
+    @property    
+    def currTimeFull(self):
+        # the current time as datetime (00:00:00), e.g. as the time stamp for reporting
+        return self._currTimeFull
+
     @property    
     def day(self):
-        return self._currTime.day
+        return self._day
 
     @property    
     def doy(self):
-        return self._currTime.timetuple().tm_yday
+        return self._doy
 
     @property    
     def month(self):
-        return self._currTime.month
+        return self._month
     
     @property    
     def year(self):
-        return self._currTime.year
+        return self._year
+
+    @property
+    def daysInYear(self):
+        # number of days of the current year in the calendar
+        if self._calendar in noLeapCalendars: return 365
+        return 366 if self._year % 4 == 0 and (self._year % 100 != 0 or self._year % 400 == 0) else 365
 
     @property    
     def timeStepPCR(self):
@@ -131,25 +231,26 @@ class ModelTime(object):
 
     def update(self,timeStepPCR):
         self._timeStepPCR = timeStepPCR
-        self._currTime = self._startTime + datetime.timedelta(days=1 * (timeStepPCR - 1))
         
-        #~ self._fulldate = str(self.currTime.strftime('%Y-%m-%d'))     # This does not work for the date before 1900
-        self._fulldate = '%04i-%02i-%02i' %(self._currTime.year, self._currTime.month, self._currTime.day)
-        #~ print(self._fulldate)
+        # the values of this time step are taken from the calendar arrays (extended if needed, e.g. for runs beyond the end time)
+        if timeStepPCR > self._calendarLength: self.setCalendarArrays(max(timeStepPCR, self._nrOfTimeSteps))
+        i = timeStepPCR
         
-        if self.spinUpStatus == True : 
-            logger.info("Spin-Up "+str(self._noSpinUp)+" of "+str(self._maxSpinUps))
-
+        self._currTime     = self._dates[i]
+        self._year         = self._years[i]
+        self._month        = self._months[i]
+        self._day          = self._days[i]
+        self._doy          = self._doys[i]
+        self._fulldate     = self._fulldates[i]
         # The following contains hours, minutes, seconds, etc. 
-        self._currTimeFull = datetime.datetime(self.year,self.month,self.day)
+        self._currTimeFull = self._datetimes[i]
         
-        # check if a certain day is the last day of the month
-        if self.isLastDayOfMonth():
-            self._monthIdx = self._monthIdx + 1
+        if self.spinUpStatus == True : 
+            logger.info("Spin-Up "+str(self._noSpinUp)+" of "+str(self._maxSpinUps))
 
-        # check if a certain day is the last day of the year
-        if self.isLastDayOfYear():
-            self._annuaIdx = self._annuaIdx + 1
+        # monthly and yearly indexes since the simulation starts
+        self._monthIdx = self._monthIdxs[i]
+        self._annuaIdx = self._annuaIdxs[i]
             
     def isFirstTimestep(self):
         return self.timeStepPCR == 1
@@ -161,23 +262,20 @@ class ModelTime(object):
         return self.doy== 1
     
     def isLastDayOfMonth(self):
-        tomorrow = self.currTime + datetime.timedelta(days=1)
-        
         #tomorrow is the first day of the month
-        return tomorrow.day == 1
+        return self._isLastDayOfMonth[self._timeStepPCR]
     
     def isLastDayOfYear(self):
-        tomorrow = self.currTime + datetime.timedelta(days=1)
-        
         #tomorrow is the first day of the year
-        return tomorrow.timetuple().tm_yday == 1
+        return self._isLastDayOfYear[self._timeStepPCR]
 
     def isLastTimeStep(self):
         return self._currTime == self._endTime
 
     def yesterday(self):
-        yesterday = self.currTime - datetime.timedelta(days=1)
-        return str(yesterday.strftime('%Y-%m-%d'))
+        if self._timeStepPCR > 0: return self._fulldates[self._timeStepPCR - 1]
+        years, months, days, doys = calendarDates([calendarOrdinal(self.startTime, self._calendar) - 2], self._calendar)
+        return '%04i-%02i-%02i' %(years[0], months[0], days[0])
 
     #FIXME: use isLastDayOfMonth
     @property
@@ -38,7 +38,6 @@ from pcrglobwb import PCRGlobWB
 import logging
 logger = logging.getLogger(__name__)
 
-import oldcalc_framework
 import disclaimer
 
 class DeterministicRunner(DynamicModel):
@@ -99,6 +98,7 @@ def main():
     
     # timeStep info: year, month, day, doy, hour, etc
     currTimeStep = ModelTime() 
+    currTimeStep.setCalendar(configuration.get_calendar())
     
     # object for spin_up
     spin_up = SpinUp(configuration)            
@@ -130,6 +130,10 @@ def main():
             has_converged = spin_up.checkConvergence(all_state_begin, all_state_end, spinUpRun, deterministic_runner.model.routing.cellArea)
             
             initial_state = deterministic_runner.model.getState()
+
+            # option to extrapolate slow storage states (accelerated spin-up)
+            if has_converged == False:
+                initial_state = spin_up.accelerateStates(initial_state, deterministic_runner.model.landSurface, deterministic_runner.model.routing.cellArea)
     
     # Running the deterministic_runner (excluding DA scheme)
     currTimeStep.getStartEndTimeSteps(configuration.globalOptions['startTime'],
@@ -144,10 +148,14 @@ def main():
     # for debugging to PCR-GLOBWB version one
     if configuration.debug_to_version_one:
     
+        # - only imported for this purpose
+        import oldcalc_framework
+
         logger.info('\n\n\n\n\n'+'Executing PCR-GLOBWB version 1.'+'\n\n\n\n\n')
 
         # reset modelTime object
         currTimeStep = None; currTimeStep = ModelTime() 
+        currTimeStep.setCalendar(configuration.get_calendar())
         currTimeStep.getStartEndTimeSteps(configuration.globalOptions['startTime'],
                                           configuration.globalOptions['endTime'])
         
@@ -478,10 +478,15 @@ def main():
     if len(sys.argv) > 2: 
         if sys.argv[2] == "parallel" or sys.argv[2] == "debug_parallel" or sys.argv[2] == "debug-parallel": this_run_is_part_of_a_set_of_parallel_run = True
 
+    # parsed configuration (of the same ini file) given by the parallel runner, used instead of parsing the ini file again
+    parsed_configuration_file = None
+    if "-pc" in sys.argv: parsed_configuration_file = sys.argv[sys.argv.index("-pc") + 1]
+
     # object to handle configuration/ini file
     configuration = Configuration(iniFileName = iniFileName, \
                                   debug_mode = debug_mode, \
-                                  no_modification = False)      
+                                  no_modification = False, \
+                                  parsed_configuration_file = parsed_configuration_file)      
 
     
     # for a parallel run (e.g. usually for 5min and 6min runs), we assign a specific directory based on the clone number/code:
@@ -507,6 +512,7 @@ def main():
 
     # timeStep info: year, month, day, doy, hour, etc
     currTimeStep = ModelTime() 
+    currTimeStep.setCalendar(configuration.get_calendar())
 
     # object for spin_up
     spin_up = SpinUp(configuration)            
@@ -578,6 +578,7 @@ def main():
 
     # timeStep info: year, month, day, doy, hour, etc
     currTimeStep = ModelTime() 
+    currTimeStep.setCalendar(configuration.get_calendar())
 
     # object for spin_up
     spin_up = SpinUp(configuration)            
@@ -609,6 +610,10 @@ def main():
             has_converged = spin_up.checkConvergence(all_state_begin, all_state_end, spinUpRun, deterministic_runner.model.routing.cellArea)
             
             initial_state = deterministic_runner.model.getState()
+
+            # option to extrapolate slow storage states (accelerated spin-up)
+            if has_converged == False:
+                initial_state = spin_up.accelerateStates(initial_state, deterministic_runner.model.landSurface, deterministic_runner.model.routing.cellArea)
             
         # TODO: for a parallel run call merging when the spinUp is done and isolate the states in a separate directory/folder
 
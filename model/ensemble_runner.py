@@ -0,0 +1,267 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# PCR-GLOBWB (PCRaster Global Water Balance) Global Hydrological Model
+#
+# Copyright (C) 2016, Edwin H. Sutanudjaja, Rens van Beek, Niko Wanders, Yoshihide Wada, 
+# Joyce H. C. Bosmans, Niels Drost, Ruud J. van der Ent, Inge E. M. de Graaf, Jannis M. Hoch, 
+# Kor de Jong, Derek Karssenberg, Patricia López López, Stefanie Peßenteiner, Oliver Schmitz, 
+# Menno W. Straatsma, Ekkamol Vannametee, Dominik Wisser, and Marc F. P. Bierkens
+# Faculty of Geosciences, Utrecht University, Utrecht, The Netherlands
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+# Ensemble runner: many PCR-GLOBWB members in one process
+# - the first member reads all input and static parameters; the other members are "member copies" of it
+#   (see ensembleMemberCopy) that share all its (read-only) pcraster maps and numpy arrays, so that only the states
+#   and fluxes are per member (pcraster maps are never modified in place, but always replaced by new maps)
+# - all members are updated in lockstep; the forcing is read only once per time step (by the first member)
+#   and given to all members, after which it can be perturbed per member
+# - the outputs (netcdf files, states and maps) of every member are written to the sub-directory member_<number>
+#   of the output directory
+
+import os
+import sys
+import copy
+
+from pcraster.framework import DynamicModel
+from pcraster.framework import DynamicFramework
+
+from configuration import Configuration
+from currTimeStep import ModelTime
+from reporting import Reporting
+from spinUp import SpinUp
+
+from pcrglobwb import PCRGlobWB
+
+import pcrglobwb
+import meteo
+import landSurface
+import landCover
+import groundwater
+import routing
+import waterBodies
+
+import virtualOS as vos
+
+import logging
+logger = logging.getLogger(__name__)
+
+import disclaimer
+
+from deterministic_runner import DeterministicRunner
+
+# classes of which every ensemble member has its own (shallow) copy; 
+# all other objects (e.g. pcraster maps, numpy arrays, the configuration and the model time) are shared by all members
+memberClasses = (pcrglobwb.PCRGlobWB, \
+                 meteo.Meteo, \
+                 landSurface.LandSurface, \
+                 landCover.LandCover, \
+                 groundwater.Groundwater, \
+                 routing.Routing, \
+                 waterBodies.WaterBodies)
+
+def ensembleMemberCopy(obj, memo = None):
+    """ Returns a copy of the model object obj, in which only the model objects (memberClasses), dictionaries and lists are copied. """
+
+    if memo is None: memo = {}
+    if id(obj) in memo: return memo[id(obj)]
+
+    if isinstance(obj, memberClasses):
+        result = copy.copy(obj)
+        memo[id(obj)] = result
+        result.__dict__ = ensembleMemberCopy(obj.__dict__, memo)
+    elif isinstance(obj, dict):
+        result = {}
+        memo[id(obj)] = result
+        for key, value in list(obj.items()): result[key] = ensembleMemberCopy(value, memo)
+    elif isinstance(obj, list):
+        result = []
+        memo[id(obj)] = result
+        for value in obj: result.append(ensembleMemberCopy(value, memo))
+    else:
+        # - shared by all members
+        result = obj
+    
+    return result
+
+
+class EnsembleRunner(DynamicModel):
+
+    def __init__(self, configuration, modelTime, initialState = None):
+        DynamicModel.__init__(self)
+
+        self.modelTime = modelTime        
+        
+        # ensemble options
+        self.numberOfMembers = int(configuration.ensembleOptions['numberOfMembers'])
+        if self.numberOfMembers < 1:
+            msg = "The option 'numberOfMembers' in the ensembleOptions must be at least 1."
+            logger.error(msg)
+            raise Exception(msg)
+        # - standard deviations of the (relative) perturbations of the precipitation (every time step) and the initial groundwater storage;
+        #   the first member (member 0) is not perturbed
+        self.precipitationPerturbation = None
+        if configuration.get_option('ensembleOptions', 'precipitationPerturbationStandardDeviation') is not None:
+            self.precipitationPerturbation = float(configuration.ensembleOptions['precipitationPerturbationStandardDeviation'])
+        self.groundwaterPerturbation = None
+        if configuration.get_option('ensembleOptions', 'groundwaterPerturbationStandardDeviation') is not None:
+            self.groundwaterPerturbation = float(configuration.ensembleOptions['groundwaterPerturbationStandardDeviation'])
+        
+        # the online coupling to MODFLOW runs one MODFLOW model per PCR-GLOBWB model 
+        if configuration.online_coupling_between_pcrglobwb_and_modflow:
+            msg = "The ensemble runner cannot be used with the online coupling between PCR-GLOBWB and MODFLOW."
+            logger.error(msg)
+            raise Exception(msg)
+        
+        # the first member, reading all input
+        firstMember = PCRGlobWB(configuration, modelTime, initialState)
+        
+        self.members    = []
+        self.reportings = []
+        for member in range(self.numberOfMembers):
+            
+            if member == 0:
+                model = firstMember
+            else:
+                model = ensembleMemberCopy(firstMember)
+            
+            # output directories of this member
+            model._configuration = self.memberConfiguration(configuration, member)
+            
+            # initial perturbation of the groundwater storage
+            if member > 0 and self.groundwaterPerturbation is not None:
+                model.groundwater.perturb("groundwater", standard_deviation = self.groundwaterPerturbation)
+            
+            self.members.append(model)
+            self.reportings.append(Reporting(model._configuration, model, modelTime))
+        
+        logger.info("Ensemble with %i members.", self.numberOfMembers)
+        
+    def memberConfiguration(self, configuration, member):
+        """ Returns a copy of the configuration with the output directories of the member. """
+
+        memberConfiguration = copy.copy(configuration)
+        memberDir = vos.getFullPath("member_%03i/" %(member), configuration.globalOptions['outputDir'])
+        for dirName in ['outNCDir', 'endStateDir', 'mapsDir']:
+            subDir = os.path.basename(os.path.normpath(vars(configuration)[dirName])) + "/"
+            vars(memberConfiguration)[dirName] = vos.getFullPath(subDir, memberDir)
+            if not os.path.exists(vars(memberConfiguration)[dirName]): os.makedirs(vars(memberConfiguration)[dirName])
+        return memberConfiguration
+
+    def initial(self): 
+        pass
+
+    def dynamic(self):
+
+        # re-calculate current model time using current pcraster timestep value
+        self.modelTime.update(self.currentTimeStep())
+
+        # read the forcing once (by the first member) 
+        # - the forcing variables are all meteo variables that are (re-)assigned by read_forcings 
+        meteoBefore = dict(vars(self.members[0].meteo))
+        self.members[0].read_forcings()
+        forcing = {}
+        for varName, value in list(vars(self.members[0].meteo).items()):
+            if varName not in meteoBefore or meteoBefore[varName] is not value: forcing[varName] = value
+        
+        for member, model in enumerate(self.members):
+            
+            # forcing of this member
+            vars(model.meteo).update(forcing)
+            if member > 0 and self.precipitationPerturbation is not None:
+                model.meteo.perturb("precipitation", standard_deviation = self.precipitationPerturbation)
+            
+            # update model (will pick up current model time from model time object)
+            model.update(report_water_balance=True)
+            
+            #do any needed reporting for this time step        
+            self.reportings[member].report()
+
+def main():
+
+    # print disclaimer
+    disclaimer.print_disclaimer()
+    
+    # get the full path of configuration/ini file given in the system argument
+    iniFileName   = os.path.abspath(sys.argv[1])
+    
+    # debug option
+    debug_mode = False
+    if len(sys.argv) > 2: 
+        if sys.argv[2] == "debug": debug_mode = True
+    
+    # object to handle configuration/ini file
+    configuration = Configuration(iniFileName = iniFileName, \
+                                  debug_mode = debug_mode, \
+                                  no_modification = True)      
+    
+    if 'ensembleOptions' not in configuration.allSections:
+        msg = "The section 'ensembleOptions' is not defined in the configuration file."
+        logger.error(msg)
+        raise Exception(msg)
+    
+    # timeStep info: year, month, day, doy, hour, etc
+    currTimeStep = ModelTime() 
+    currTimeStep.setCalendar(configuration.get_calendar())
+    
+    # object for spin_up
+    spin_up = SpinUp(configuration)            
+
+    # spinningUp (with a single, deterministic model; all members start from its states)
+    noSpinUps = int(configuration.globalOptions['maxSpinUpsInYears'])
+    initial_state = None
+    if noSpinUps > 0:
+        
+        logger.info('Spin-Up #Total Years: '+str(noSpinUps))
+
+        spinUpRun = 0 ; has_converged = False
+        while spinUpRun < noSpinUps and has_converged == False:
+            spinUpRun += 1
+            currTimeStep.getStartEndTimeStepsForSpinUp(
+                    configuration.globalOptions['startTime'],
+                    spinUpRun, noSpinUps)
+            logger.info('Spin-Up Run No. '+str(spinUpRun))
+            deterministic_runner = DeterministicRunner(configuration, currTimeStep, initial_state)
+            
+            all_state_begin = deterministic_runner.model.getAllState() 
+            
+            dynamic_framework = DynamicFramework(deterministic_runner,currTimeStep.nrOfTimeSteps)
+            dynamic_framework.setQuiet(True)
+            dynamic_framework.run()
+            
+            all_state_end = deterministic_runner.model.getAllState() 
+            
+            has_converged = spin_up.checkConvergence(all_state_begin, all_state_end, spinUpRun, deterministic_runner.model.routing.cellArea)
+            
+            initial_state = deterministic_runner.model.getState()
+
+            # option to extrapolate slow storage states (accelerated spin-up)
+            if has_converged == False:
+                initial_state = spin_up.accelerateStates(initial_state, deterministic_runner.model.landSurface, deterministic_runner.model.routing.cellArea)
+    
+    # Running the ensemble_runner
+    currTimeStep.getStartEndTimeSteps(configuration.globalOptions['startTime'],
+                                      configuration.globalOptions['endTime'])
+    logger.info('Transient ensemble simulation run started.')
+    ensemble_runner = EnsembleRunner(configuration, currTimeStep, initial_state)
+    dynamic_framework = DynamicFramework(ensemble_runner,currTimeStep.nrOfTimeSteps)
+    dynamic_framework.setQuiet(True)
+    dynamic_framework.run()
+
+if __name__ == '__main__':
+    # print disclaimer
+    disclaimer.print_disclaimer(with_logger = True)
+    sys.exit(main())
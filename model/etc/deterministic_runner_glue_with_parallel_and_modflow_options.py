@@ -334,10 +334,15 @@ def main():
     if len(sys.argv) > 2: 
         if sys.argv[2] == "debug" or sys.argv[2] == "debug_parallel" or sys.argv[2] == "debug-parallel": debug_mode = True
     
+    # parsed configuration (of the same ini file) given by the parallel runner, used instead of parsing the ini file again
+    parsed_configuration_file = None
+    if "-pc" in sys.argv: parsed_configuration_file = sys.argv[sys.argv.index("-pc") + 1]
+
     # object to handle configuration/ini file
     configuration = Configuration(iniFileName = iniFileName, \
                                   debug_mode = debug_mode, \
-                                  no_modification = False)      
+                                  no_modification = False, \
+                                  parsed_configuration_file = parsed_configuration_file)      
 
     # parallel option
     this_run_is_part_of_a_set_of_parallel_run = False    
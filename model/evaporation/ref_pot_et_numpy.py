@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# PCR-GLOBWB (PCRaster Global Water Balance) Global Hydrological Model
+#
+# Copyright (C) 2016, Edwin H. Sutanudjaja, Rens van Beek, Niko Wanders, Yoshihide Wada,
+# Joyce H. C. Bosmans, Niels Drost, Ruud J. van der Ent, Inge E. M. de Graaf, Jannis M. Hoch,
+# Kor de Jong, Derek Karssenberg, Patricia López López, Stefanie Peßenteiner, Oliver Schmitz,
+# Menno W. Straatsma, Ekkamol Vannametee, Dominik Wisser, and Marc F. P. Bierkens
+# Faculty of Geosciences, Utrecht University, Utrecht, The Netherlands
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# numpy versions of the reference potential evaporation methods (Hamon and Penman-Monteith)
+# - all input and output values are 1-D numpy arrays at the cells of a cell mask (see vos.getCellMask)
+# - the results are the same as the ones of the pcraster functions in hamonETPFunctions.py,
+#   ref_pot_et_penman_monteith.py and shortwave_radiation.py (all trigonometric functions here are in radians)
+# - the terms that only depend on the latitude and the day of year are calculated once per day of year
+#   for the unique latitudes of the cells (i.e. for the rows of the clone) and cached
+
+import math
+
+import numpy as np
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+def saturatedVapourPressure(temperature):
+    '''returns the saturated vapour pressure [Pa] as a function of temperature [degC] (see getSaturatedVapourPressure)'''
+    return 611.0 * np.exp(17.27 * temperature / (temperature + 237.3))
+
+def hamonSaturatedPressure(temperature):
+    '''returns the saturated vapour pressure [kPa] used in the Hamon method, Murray (1967) (see hamonETPFunctions.satPressure)'''
+    return np.where(temperature >= 0.0, 0.61078 * np.exp(17.26939 * temperature / (temperature + 237.3)), \
+                                        0.61078 * np.exp(21.87456 * temperature / (temperature + 265.5)))
+
+def hamonDayLength(doy, latitude):
+    '''returns the day length as a fraction of day for the latitude [degree] (see hamonETPFunctions.dayLength)'''
+
+    latitude = latitude * math.pi / 180.0
+    latitude = np.where(np.abs(latitude) > math.pi / 2.0, (math.pi / 2.0 - 0.01) * np.where(latitude > 0, 1.0, -1.0), latitude)
+
+    dec = math.sin(6.224111 + 0.017202 * doy)
+    dec = math.asin(0.39785 * math.sin(4.868961 + 0.017203 * doy + 0.033446 * math.sin(dec)))
+
+    arg = math.tan(dec) * np.tan(latitude) * -1.0
+    # - sun stays below horizon (arg > 1.0) or above horizon (arg < -1.0)
+    h = np.arccos(np.clip(arg, -1.0, 1.0))
+    return h / math.pi
+
+def extraterrestrialRadiation(doy, number_days, latitude, solar_constant = 118.1):
+    '''returns the extraterrestrial radiation in the unit of the solar_constant (default: MJ/m2/day) for the latitude [degree]
+       (see compute_solar_declination, compute_eccentricity, compute_day_length and compute_radsw_ext in shortwave_radiation.py)'''
+
+    latitude = latitude * math.pi / 180.0
+
+    # day angle (rad)
+    day_angle = float(doy - 1) / number_days * 2 * math.pi
+
+    # solar declination (rad)
+    solar_declination = 0.006918 - 0.399912 * math.cos(day_angle) + \
+                        0.070257 * math.sin(day_angle) - 0.006758 * math.cos(2 * day_angle) + \
+                        0.000907 * math.sin(2 * day_angle) - 0.002697 * math.cos(3 * day_angle) + \
+                        0.00148 * math.sin(3 * day_angle)
+
+    # eccentricity (-)
+    eccentricity = 1.00011 + 0.034221 * math.cos(day_angle) + \
+                   0.00128 * math.sin(day_angle) + 0.000719 * math.cos(2 * day_angle) + \
+                   0.000077 * math.sin(2 * day_angle)
+
+    # day length (hours)
+    tanterm = np.tan(latitude) * math.tan(solar_declination)
+    day_length = 2 * np.where(np.abs(tanterm) < 1.00, \
+                              np.arccos(np.clip(-tanterm, -1.0, 1.0)) / 0.2618, \
+                              0.0 if solar_declination < 0 else 12.0)
+
+    return 2.0 / 24.0 * solar_constant * eccentricity * \
+           (math.cos(solar_declination) * np.cos(latitude) * \
+            np.sin(0.5 * 0.2618 * day_length) / 0.2618 + \
+            0.5 * math.sin(solar_declination) * np.sin(latitude) * \
+            day_length)
+
+
+class ReferencePotETKernel(object):
+
+    def __init__(self, latitudes):
+        '''latitudes: 1-D numpy array of the latitudes [degree] of the cells'''
+
+        object.__init__(self)
+
+        # unique latitudes and the index of every cell to them
+        self.uniqueLatitudes, self.latitudeIndex = np.unique(latitudes, return_inverse = True)
+        self.latitudeIndex = self.latitudeIndex.reshape(-1)
+
+        # caches of the terms per day of year (values at the unique latitudes)
+        self.hamonDayLengthCache = {}
+        self.extraterrestrialRadiationCache = {}
+
+        msg = "Reference potential evaporation kernel: %i cells with %i unique latitudes." %(len(self.latitudeIndex), len(self.uniqueLatitudes))
+        logger.debug(msg)
+
+    def hamon(self, temperature, doy):
+        '''returns the reference potential evaporation [m.day-1] based on the Hamon method (see hamonETPFunctions.HamonPotET)'''
+
+        if doy not in self.hamonDayLengthCache:
+            self.hamonDayLengthCache[doy] = hamonDayLength(doy, self.uniqueLatitudes)
+        dayLen = self.hamonDayLengthCache[doy][self.latitudeIndex]
+
+        rhoSat = 2.167 * hamonSaturatedPressure(temperature) / (temperature + 273.15)
+
+        # 2 * dayLen = day length as fraction; pet in meters
+        return 165.1 * 2.0 * dayLen * rhoSat / 1000.
+
+    def extraterrestrialRadiation(self, doy, number_days, solar_constant = 118.1):
+        '''returns the extraterrestrial radiation in the unit of the solar_constant (default: MJ/m2/day)'''
+
+        key = (doy, number_days, solar_constant)
+        if key not in self.extraterrestrialRadiationCache:
+            self.extraterrestrialRadiationCache[key] = extraterrestrialRadiation(doy, number_days, self.uniqueLatitudes, solar_constant)
+        return self.extraterrestrialRadiationCache[key][self.latitudeIndex]
+
+    def penmanMonteith(self, penmanMonteithObject,\
+                             temperature, windSpeed, atmosphericPressure, shortwaveRadiation,\
+                             extraterrestrialRadiation = None, longwaveRadiation = None,\
+                             unsatVapPressure = None, relativeHumidity = None,\
+                             timeStepLength = 86400):
+        '''returns the reference potential evaporation [m] over the timeStepLength, the longwave radiation [W.m**-2] and the net radiation [W.m**-2]
+
+           - the constants are taken from the penmanMonteithObject (penman_monteith.penmanMonteithET)
+           - radiation values in W.m**-2; if longwaveRadiation is None, it is estimated (see penman_monteith.getLongWaveRadiation)
+           - either unsatVapPressure [Pa] or relativeHumidity [-] must be given; the former takes precedence
+        '''
+
+        pm = penmanMonteithObject
+
+        satVapPressure = saturatedVapourPressure(temperature)
+        if unsatVapPressure is None:
+            if relativeHumidity is None:
+                msg = "Either relative humidity or actual vapour pressure should be defined for the Penman-Monteith method."
+                logger.error(msg)
+                raise Exception(msg)
+            unsatVapPressure = relativeHumidity * satVapPressure
+
+        # longwave radiation (W.m**-2)
+        if longwaveRadiation is None:
+            # - fraction of shortWaveRadiation (dimensionless); zero if the extraterrestrial radiation is zero
+            with np.errstate(divide = 'ignore', invalid = 'ignore'):
+                fractionShortWaveRadiation = np.where(extraterrestrialRadiation > 0.0, \
+                                                      np.minimum(1.0, shortwaveRadiation / extraterrestrialRadiation), 0.0)
+            fractionShortWaveRadiation = np.where(np.isfinite(fractionShortWaveRadiation), fractionShortWaveRadiation, 0.0)
+            sigma    = 5.67E-8
+            ea0      = 0.34
+            eaFactor = 4.43e-3
+            radCon   = 0.25
+            radSlope = 0.50
+            radDif   = 0.35
+            radCor   = (1 + radDif) / (radCon + radSlope)
+            longwaveRadiation = sigma * (temperature + 273.15)**4 * np.maximum(0, ea0 - eaFactor * unsatVapPressure**0.5) * \
+                                np.maximum(0, np.minimum(1 + radDif, radCor * fractionShortWaveRadiation) - radDif)
+
+        # net radiation (W.m**-2)
+        netRadiation = np.maximum(0.0, shortwaveRadiation - longwaveRadiation)
+
+        # Penman-Monteith (see penman_monteith.penmanMonteithET.updatePotentialEvaporation)
+        latentHeatVaporization = 2.501E6 - 2370 * temperature
+        delta = 4098.0 * satVapPressure / (temperature + 237.3)**2
+        gamma = pm.cpAir * atmosphericPressure / (pm.epsilon * latentHeatVaporization)
+        Zd  = 2./3. * pm.vegetationHeight
+        Z0m = 0.123 * pm.vegetationHeight
+        Z0h = 0.1 * Z0m
+        raTerm = np.log((pm.windHeight - Zd) / Z0m) * np.log((pm.temperatureHeight - Zd) / Z0h) * (pm.karmanConst)**-2
+        atmosphericResistance = raTerm / np.maximum(1.e-3, windSpeed)
+        dGLv = (delta + gamma * (1 + pm.canopyResistance / atmosphericResistance)) * latentHeatVaporization
+        atmosphericContribution = pm.rhoAir * pm.cpAir * (satVapPressure - unsatVapPressure) / (atmosphericResistance * pm.rhoWater * dGLv)
+        radiationContribution = delta * netRadiation / (dGLv * pm.rhoWater)
+        referencePotET = np.maximum(0., atmosphericContribution + radiationContribution) * timeStepLength
+
+        return referencePotET, longwaveRadiation, netRadiation
@@ -26,6 +26,9 @@ import math
 import subprocess
 import os
 import types
+import time
+
+import numpy as np
 
 from pcraster.framework import *
 import pcraster as pcr
@@ -36,6 +39,79 @@ logger = logging.getLogger(__name__)
 import virtualOS as vos
 from ncConverter import *
 
+# states updated by groundwaterUpdateKernel (including the statistics of calculate_statistics)
+groundwaterKernelStates = ['storGroundwater', 'storGroundwaterFossil', 'avgStorGroundwater', 'avgAbstraction', \
+                           'avgNonFossilAllocation', 'avgNonFossilAllocationShort', 'avgAllocation', 'avgAllocationShort']
+
+def groundwaterUpdateKernel(states, inputs, parameters, limitFossilGroundwaterAbstraction):
+    """
+    Returns the new groundwater states and fluxes (as 1-D arrays at the landmask cells) for one time step, 
+    following Groundwater.update_without_MODFLOW and Groundwater.calculate_statistics.
+    """
+
+    recessionCoeff = parameters['recessionCoeff']
+    storGroundwater    = states['storGroundwater']
+    avgStorGroundwater = states['avgStorGroundwater']
+
+    # riverbed infiltration, net recharge and non fossil groundwater abstraction
+    storGroundwater = storGroundwater + inputs['surfaceWaterInf']
+    storGroundwater = np.maximum(0., storGroundwater + inputs['gwRecharge'])
+    storGroundwater = np.maximum(0., storGroundwater - inputs['nonFossilGroundwaterAbs'])
+    
+    # groundwater discharge (baseflow) - unit: m.day
+    # - baseflow = (1/J)*<S3>*(S3/<S3>)^gamma ; linear reservoir if avgStorGroundwater < 5 mm (and as the minimum value)
+    with np.errstate(divide = 'ignore', invalid = 'ignore', over = 'ignore'):
+        relativeStorage = np.where(avgStorGroundwater > vos.smallNumber, storGroundwater / np.maximum(vos.smallNumber, avgStorGroundwater), 0.0)
+        baseflow = recessionCoeff * avgStorGroundwater * relativeStorage ** parameters['baseflow_exponent']
+    min_baseflow = recessionCoeff * storGroundwater
+    baseflow = np.where(avgStorGroundwater < 0.005, min_baseflow, baseflow)
+    baseflow = np.maximum(min_baseflow, baseflow)
+    baseflow = np.maximum(0., np.minimum(storGroundwater, baseflow))
+    storGroundwater = np.maximum(0., storGroundwater - baseflow)
+    
+    # fossil groundwater abstraction 
+    storGroundwaterFossil = states['storGroundwaterFossil'] - inputs['fossilGroundwaterAbstr']
+    if limitFossilGroundwaterAbstraction: storGroundwaterFossil = np.maximum(0.0, storGroundwaterFossil)
+    
+    results = {}
+    results['surfaceWaterInf']         = inputs['surfaceWaterInf']
+    results['baseflow']                = baseflow
+    results['storGroundwater']         = storGroundwater
+    results['storGroundwaterFossil']   = storGroundwaterFossil
+    results['relativeGroundwaterHead'] = storGroundwater / parameters['specificYield']
+    
+    # statistics (running averages over the last 365 days, 7 days, and 5 x 365 days)
+    timesteps = np.maximum(1.0, inputs['timestepsToAvgDischarge'])
+    def runningAverage(average, value, maximumTimesteps):
+        return np.maximum(0.0, average + (value - average) / np.minimum(maximumTimesteps, timesteps))
+    totalGroundwaterAllocation = inputs['allocNonFossilGroundwater'] + inputs['fossilGroundwaterAlloc']
+    results['avgAbstraction']              = runningAverage(states['avgAbstraction'], inputs['fossilGroundwaterAbstr'] + inputs['nonFossilGroundwaterAbs'], 365.)
+    results['avgNonFossilAllocation']      = runningAverage(states['avgNonFossilAllocation'], inputs['allocNonFossilGroundwater'], 365.)
+    results['avgNonFossilAllocationShort'] = runningAverage(states['avgNonFossilAllocationShort'], inputs['allocNonFossilGroundwater'], 7.)
+    results['avgAllocation']               = runningAverage(states['avgAllocation'], totalGroundwaterAllocation, 365.)
+    results['avgAllocationShort']          = runningAverage(states['avgAllocationShort'], totalGroundwaterAllocation, 7.)
+    results['avgStorGroundwater']          = runningAverage(avgStorGroundwater, storGroundwater, 5. * 365.)
+    
+    return results
+
+def groundwaterKernelWaterBalanceCheck(results, states, inputs, currTimeStep):
+    """ Water balance checks of groundwaterUpdateKernel (as in Groundwater.update_without_MODFLOW). """
+    
+    errors = {'storGroundwater'      : (inputs['surfaceWaterInf'] + inputs['gwRecharge'] - results['baseflow'] - inputs['nonFossilGroundwaterAbs'] + \
+                                        states['storGroundwater'] - results['storGroundwater'], 1e-4),
+              'storGroundwaterFossil': (states['storGroundwaterFossil'] - inputs['fossilGroundwaterAbstr'] - results['storGroundwaterFossil'], 1e-3),
+              'demand allocation (desalination, surface water, groundwater & unmetDemand. Error here may be due to rounding error.': \
+                                       (inputs['desalinationAllocation'] + inputs['fossilGroundwaterAlloc'] + inputs['allocNonFossilGroundwater'] + \
+                                        inputs['allocSurfaceWaterAbstract'] - inputs['totalPotentialGrossDemand'], 1e-3)}
+    for processName in sorted(errors.keys()):
+        error, threshold = errors[processName]
+        if error.size == 0: continue
+        a, b, c = np.nanmin(error), np.nanmax(error), np.nanmean(error)
+        if abs(a) > threshold or abs(b) > threshold:
+            msg = "WARNING !!!!!!!! Water Balance Error %s Min %f Max %f Mean %f" %(processName, a, b, c)
+            logger.error(msg)
+            logger.error(str(currTimeStep.fulldate))
+
 class Groundwater(object):
 
     def getState(self):
@@ -79,9 +155,16 @@ class Groundwater(object):
         self.useMODFLOW = False
         if iniItems.groundwaterOptions['useMODFLOW'] == "True": self.useMODFLOW = True
 
+        # engine for the groundwater update (without MODFLOW):
+        # - "pcraster" (default)
+        # - "numpy"           : one pass over the landmask cells (see the function groundwaterUpdateKernel)
+        # - "numpy_with_check": as "numpy", but also using the "pcraster" method (its results are used) to log the differences and the calculation times
+        self.groundwaterEngine = iniItems.get_choice_option('groundwaterOptions', 'groundwaterEngine', ["pcraster", "numpy", "numpy_with_check"], "pcraster")
+        self.groundwaterKernelParameters = None
+
         
         # exponent in baseflow reservoir formula (default is one)
-        if "baseflow_exponent" in list(iniItems.groundwaterOptions.keys()):
+        if iniItems.get_option('groundwaterOptions', 'baseflow_exponent') is not None:
             msg = "The exponent for the groundwater reservoir formula is set according to the baseflow_exponent values in the groundwaterOptions of the configuration file."
             logger.info(msg)
             self.baseflow_exponent = vos.readPCRmapClone(iniItems.groundwaterOptions['baseflow_exponent'],\
@@ -176,8 +259,7 @@ class Groundwater(object):
         # TODO: Remove try and except !!!    
 
         # assign the reccession coefficient based on the given pcraster file
-        if 'recessionCoeff' in list(iniItems.groundwaterOptions.keys()):
-            if iniItems.groundwaterOptions['recessionCoeff'] != "None":\
+        if iniItems.get_option('groundwaterOptions', 'recessionCoeff') is not None:\
                self.recessionCoeff = vos.readPCRmapClone(iniItems.groundwaterOptions['recessionCoeff'],self.cloneMap,self.tmpDir,self.inputDir)
 
         # calculate the reccession coefficient based on the given parameters
@@ -207,14 +289,13 @@ class Groundwater(object):
                                   (4.*self.specificYield*(aquiferWidth**2.))
 
         # assign the reccession coefficient based on the given pcraster file
-        if 'recessionCoeff' in list(iniItems.groundwaterOptions.keys()):
-            if iniItems.groundwaterOptions['recessionCoeff'] != "None":\
+        if iniItems.get_option('groundwaterOptions', 'recessionCoeff') is not None:\
                self.recessionCoeff = vos.readPCRmapClone(iniItems.groundwaterOptions['recessionCoeff'],self.cloneMap,self.tmpDir,self.inputDir)
 
         # minimum and maximum values for groundwater recession coefficient (day-1)
         self.recessionCoeff = pcr.cover(self.recessionCoeff,0.00)
         self.recessionCoeff = pcr.min(0.9999,self.recessionCoeff)
-        if 'minRecessionCoeff' in list(iniItems.groundwaterOptions.keys()):
+        if iniItems.get_option('groundwaterOptions', 'minRecessionCoeff') is not None:
             minRecessionCoeff = float(iniItems.groundwaterOptions['minRecessionCoeff'])
         else:
             minRecessionCoeff = 1.0e-4                                               # This is the minimum value used in Van Beek et al. (2011).
@@ -227,8 +308,7 @@ class Groundwater(object):
         # - the default value is equal to kSatAquifer
         self.riverBedConductivity = self.kSatAquifer
         # - assign riverBedConductivity coefficient based on the given pcraster file
-        if 'riverBedConductivity' in list(iniItems.groundwaterOptions.keys()):
-            if iniItems.groundwaterOptions['riverBedConductivity'] != "None":\
+        if iniItems.get_option('groundwaterOptions', 'riverBedConductivity') is not None:\
                self.riverBedConductivity = vos.readPCRmapClone(iniItems.groundwaterOptions['riverBedConductivity'],self.cloneMap,self.tmpDir,self.inputDir)
         #####################################################################################################################################################
 
@@ -240,7 +320,7 @@ class Groundwater(object):
         #   - to determine productive aquifer areas (where capillary rise can occur and groundwater depletion can occur) (for runs with/without MODFLOW)
         # - Note that for runs with MODFLOW, ideally, we want to minimize enormous drawdown in non-productive aquifer areas
         totalGroundwaterThickness = None
-        if 'estimateOfTotalGroundwaterThickness' in list(iniItems.groundwaterOptions.keys()) and\
+        if iniItems.get_option('groundwaterOptions', 'estimateOfTotalGroundwaterThickness') is not None and\
            (self.limitFossilGroundwaterAbstraction or self.useMODFLOW):
 
             totalGroundwaterThickness = vos.readPCRmapClone(iniItems.groundwaterOptions['estimateOfTotalGroundwaterThickness'],
@@ -268,14 +348,13 @@ class Groundwater(object):
             totalGroundwaterThickness = pcr.cover(totalGroundwaterThickness, 0.0)
 
             # set minimum thickness
-            if 'minimumTotalGroundwaterThickness' in list(iniItems.groundwaterOptions.keys()):
+            if iniItems.get_option('groundwaterOptions', 'minimumTotalGroundwaterThickness') is not None:
                 minimumThickness = pcr.scalar(float(\
                                    iniItems.groundwaterOptions['minimumTotalGroundwaterThickness']))
                 totalGroundwaterThickness = pcr.max(minimumThickness, totalGroundwaterThickness)
 
             # set maximum thickness
-            if 'maximumTotalGroundwaterThickness' in list(iniItems.groundwaterOptions.keys()) and\
-                                                    (iniItems.groundwaterOptions['maximumTotalGroundwaterThickness'] != "None"):
+            if iniItems.get_option('groundwaterOptions', 'maximumTotalGroundwaterThickness') is not None:
                 maximumThickness = float(iniItems.groundwaterOptions['maximumTotalGroundwaterThickness'])
                 totalGroundwaterThickness = pcr.min(maximumThickness, totalGroundwaterThickness)
 
@@ -331,6 +410,7 @@ class Groundwater(object):
         #####################################################################################################################################################
         # zones at which groundwater allocations are determined
         self.usingAllocSegments = False
+        self.allocSegmentsZoneIndex = None
         # - by default, it is consistent with the one defined in the landSurfaceOptions
         if iniItems.landSurfaceOptions['allocationSegmentsForGroundSurfaceWater'] not in ["None", "False"]:
             self.usingAllocSegments = True
@@ -384,6 +464,10 @@ class Groundwater(object):
             # zonal/segment area (unit: m2)
             self.segmentArea = pcr.areatotal(pcr.cover(cellArea, 0.0), self.allocSegments)
             self.segmentArea = pcr.ifthen(self.landmask, self.segmentArea)
+
+            # zone index for the numpy allocation kernel (built once, see vos.getZoneIndex)
+            if iniItems.get_option('landSurfaceOptions', 'allocationMethod') == "numpy":
+                self.allocSegmentsZoneIndex = vos.getZoneIndex(self.allocSegments, self.landmask)
         #####################################################################################################################################################
 
 
@@ -554,7 +638,7 @@ class Groundwater(object):
 
             # initial condition for avgStorGroundwater (unit: m)
             # - only relevant if non-linear groundwater reservoir is used
-            if 'avgStorGroundwaterIni' in list(iniItems.groundwaterOptions.keys()):
+            if iniItems.get_option('groundwaterOptions', 'avgStorGroundwaterIni') is not None:
                 self.avgStorGroundwater      = vos.readPCRmapClone(\
                                                iniItems.groundwaterOptions['avgStorGroundwaterIni'],
                                                self.cloneMap, self.tmpDir, self.inputDir)
@@ -670,10 +754,13 @@ class Groundwater(object):
 
         if self.useMODFLOW:
             self.update_with_MODFLOW(landSurface,routing,currTimeStep)
+            self.calculate_statistics(routing)
+        elif self.groundwaterEngine in ["numpy", "numpy_with_check"]:
+            # - including the statistics
+            self.update_without_MODFLOW_with_numpy(landSurface,routing,currTimeStep)
         else:
             self.update_without_MODFLOW(landSurface,routing,currTimeStep)
-
-        self.calculate_statistics(routing)
+            self.calculate_statistics(routing)
 
         # old-style reporting
         self.old_style_groundwater_reporting(currTimeStep)              # TODO: remove this one
@@ -823,6 +910,71 @@ class Groundwater(object):
                                    True,\
                                    currTimeStep.fulldate,threshold=1e-3)
 
+    def update_without_MODFLOW_with_numpy(self,landSurface,routing,currTimeStep):
+
+        # the same calculation as in update_without_MODFLOW and calculate_statistics, but in one pass over the landmask cells 
+
+        logger.info("Updating groundwater (using numpy)")
+        
+        start = time.time()
+        
+        # parameters (fixed during the simulation)
+        if self.groundwaterKernelParameters is None:
+            self.groundwaterCellMask = vos.getCellMask(self.landmask)
+            self.groundwaterKernelParameters = {}
+            for var in ['recessionCoeff', 'baseflow_exponent', 'specificYield']:
+                self.groundwaterKernelParameters[var] = vos.pcr2numpyAtCells(vars(self)[var], self.groundwaterCellMask)
+        cellMask = self.groundwaterCellMask
+        
+        # states and input fluxes
+        states = {}
+        for var in groundwaterKernelStates: 
+            states[var] = vos.pcr2numpyAtCells(vars(self)[var], cellMask)
+        inputs = {}
+        inputs['surfaceWaterInf']           = vos.pcr2numpyAtCells(routing.riverbedExchange, cellMask) / vos.pcr2numpyAtCells(routing.cellArea, cellMask)
+        inputs['timestepsToAvgDischarge']   = vos.pcr2numpyAtCells(routing.timestepsToAvgDischarge, cellMask)
+        for var in ['gwRecharge', 'nonFossilGroundwaterAbs', 'fossilGroundwaterAbstr', 'allocNonFossilGroundwater', 'fossilGroundwaterAlloc']: 
+            inputs[var] = vos.pcr2numpyAtCells(vars(landSurface)[var], cellMask)
+        
+        results = groundwaterUpdateKernel(states, inputs, self.groundwaterKernelParameters, self.limitFossilGroundwaterAbstraction)
+        
+        numpyTime = time.time() - start
+        
+        if self.debugWaterBalance:
+            # - the demand allocation fluxes are only needed for the check
+            for var in ['desalinationAllocation', 'allocSurfaceWaterAbstract', 'totalPotentialGrossDemand']: 
+                inputs[var] = vos.pcr2numpyAtCells(pcr.spatial(pcr.scalar(vars(landSurface)[var])), cellMask)
+            groundwaterKernelWaterBalanceCheck(results, states, inputs, currTimeStep)
+
+        # fluxes taken from the landSurface module
+        self.nonFossilGroundwaterAbs   = landSurface.nonFossilGroundwaterAbs
+        self.fossilGroundwaterAbstr    = landSurface.fossilGroundwaterAbstr
+        self.allocNonFossilGroundwater = landSurface.allocNonFossilGroundwater
+        self.fossilGroundwaterAlloc    = landSurface.fossilGroundwaterAlloc
+        self.unmetDemand               = self.fossilGroundwaterAlloc
+        
+        if self.groundwaterEngine == "numpy_with_check":
+            
+            # the pcraster calculation is the reference; its results are used
+            start = time.time()
+            self.update_without_MODFLOW(landSurface,routing,currTimeStep)
+            self.calculate_statistics(routing)
+            pcrasterTime = time.time() - start
+            
+            maximumDifference = 0.0
+            for var in sorted(results.keys()):
+                if results[var].size == 0: continue
+                difference = np.nanmax(np.abs(results[var] - vos.pcr2numpyAtCells(vars(self)[var], cellMask)))
+                maximumDifference = max(maximumDifference, difference)
+                logger.debug('Groundwater (numpy vs pcraster): max abs difference %s = %e' %(var, difference))
+            msg = 'Groundwater (numpy vs pcraster): max abs difference = %e ; time numpy = %.4f s ; pcraster = %.4f s' %(maximumDifference, numpyTime, pcrasterTime)
+            logger.info(msg)
+            return
+        
+        # the new states and fluxes as maps
+        for var in results.keys():
+            vars(self)[var] = vos.numpyAtCells2pcr(results[var], cellMask)
+
     def calculate_statistics(self, routing):
 
         # calculate the average total groundwater abstraction (m/day) from the last 365 days:
@@ -874,10 +1026,7 @@ class Groundwater(object):
     def old_style_groundwater_reporting(self,currTimeStep):
 
         if self.report == True:
-            timeStamp = datetime.datetime(currTimeStep.year,\
-                                          currTimeStep.month,\
-                                          currTimeStep.day,\
-                                          0)
+            timeStamp = currTimeStep.currTimeFull
             # writing daily output to netcdf files
             timestepPCR = currTimeStep.timeStepPCR
             if self.outDailyTotNC[0] != "None":
@@ -1,12 +1,33 @@
 cimport cython
+from cython.parallel cimport prange
 from libc.math cimport isnan, NAN
 
+# block reduction methods (see block_reduce)
+cdef enum:
+    REDUCE_MEAN = 0
+    REDUCE_SUM = 1
+    REDUCE_WEIGHTED_MEAN = 2
+    REDUCE_MAX = 3
+MEAN = REDUCE_MEAN
+SUM = REDUCE_SUM
+WEIGHTED_MEAN = REDUCE_WEIGHTED_MEAN
+MAX = REDUCE_MAX
+
+def check_blocks(Py_ssize_t fine_rows, Py_ssize_t fine_cols, Py_ssize_t coarse_rows, Py_ssize_t coarse_cols, Py_ssize_t factor):
+    """ Checks that the factor x factor blocks of all coarse cells are within the fine array (the kernels do not check their indices). """
+    if factor < 1:
+        raise ValueError("The factor must be at least 1, got %i" % factor)
+    if coarse_rows * factor > fine_rows or coarse_cols * factor > fine_cols:
+        raise ValueError("The %i x %i coarse cells with factor %i do not fit in the %i x %i fine cells" % (coarse_rows, coarse_cols, factor, fine_rows, fine_cols))
+
 @cython.boundscheck(False)
-def downsample(double[:, :] input, double[:, :] output):
+def downsample(double[:, :] input, double[:, :] output, Py_ssize_t factor):
     cdef Py_ssize_t i, j, k, l
     cdef double total, x
     cdef unsigned non_nan
-    cdef unsigned ratio = input.shape[0] // output.shape[0]
+    cdef Py_ssize_t ratio = factor
+
+    check_blocks(input.shape[0], input.shape[1], output.shape[0], output.shape[1], factor)
 
     for i in range(output.shape[0]):
         for j in range(output.shape[1]):
@@ -22,3 +43,96 @@ def downsample(double[:, :] input, double[:, :] output):
                 output[i, j] = total / non_nan
             else:
                 output[i, j] = NAN
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def block_reduce(double[:, :] input, double[:, :] weights, double[:, :] output, Py_ssize_t factor, int method):
+    """ Reduces every block of factor x factor cells of input to one cell of output (rows in parallel), ignoring NaN values.
+
+        method: MEAN, SUM, WEIGHTED_MEAN (weighted by weights, e.g. the cell area) or MAX;
+        blocks without any value are NaN; weights must have the shape of input (it is only used for WEIGHTED_MEAN).
+    """
+    cdef Py_ssize_t i, j, k, l
+    cdef double total, total_weight, maximum, x, w
+    cdef Py_ssize_t non_nan
+    cdef Py_ssize_t ratio = factor
+
+    check_blocks(input.shape[0], input.shape[1], output.shape[0], output.shape[1], factor)
+    if weights.shape[0] != input.shape[0] or weights.shape[1] != input.shape[1]:
+        raise ValueError("The weights (%i x %i) must have the shape of the input (%i x %i)" % (weights.shape[0], weights.shape[1], input.shape[0], input.shape[1]))
+
+    with nogil:
+        for i in prange(output.shape[0], schedule='static'):
+            for j in range(output.shape[1]):
+                non_nan = 0
+                total = 0.
+                total_weight = 0.
+                maximum = 0.
+                for k in range(ratio):
+                    for l in range(ratio):
+                        x = input[i * ratio + k, j * ratio + l]
+                        if not isnan(x):
+                            if method == REDUCE_WEIGHTED_MEAN:
+                                w = weights[i * ratio + k, j * ratio + l]
+                                total = total + w * x
+                                total_weight = total_weight + w
+                            else:
+                                total = total + x
+                            if non_nan == 0 or x > maximum:
+                                maximum = x
+                            non_nan = non_nan + 1
+                if non_nan == 0:
+                    output[i, j] = NAN
+                elif method == REDUCE_SUM:
+                    output[i, j] = total
+                elif method == REDUCE_MAX:
+                    output[i, j] = maximum
+                elif method == REDUCE_WEIGHTED_MEAN:
+                    if total_weight > 0.:
+                        output[i, j] = total / total_weight
+                    else:
+                        output[i, j] = NAN
+                else:
+                    output[i, j] = total / non_nan
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def prolongate_add(double[:, :] increment, double[:, :] input, double[:, :] output, Py_ssize_t factor, bint divide_over_block):
+    """ Adds the value of every cell of increment to the factor x factor cells of its block in input, written to output (rows in parallel).
+
+        - NaN values of input and of increment are not changed (output = input)
+        - with divide_over_block, the increment is divided over the non-NaN cells of the block (the inverse of the SUM reduction);
+          otherwise every cell gets the full increment (the inverse of the MEAN, WEIGHTED_MEAN and MAX reductions)
+        - cells of input that are not in any block (the remainder rows and columns) are copied
+    """
+    cdef Py_ssize_t i, j, k, l
+    cdef double x, d
+    cdef Py_ssize_t non_nan
+    cdef Py_ssize_t ratio = factor
+
+    check_blocks(input.shape[0], input.shape[1], increment.shape[0], increment.shape[1], factor)
+    if output.shape[0] != input.shape[0] or output.shape[1] != input.shape[1]:
+        raise ValueError("The output (%i x %i) must have the shape of the input (%i x %i)" % (output.shape[0], output.shape[1], input.shape[0], input.shape[1]))
+
+    output[:, :] = input
+
+    with nogil:
+        for i in prange(increment.shape[0], schedule='static'):
+            for j in range(increment.shape[1]):
+                d = increment[i, j]
+                if isnan(d):
+                    continue
+                if divide_over_block:
+                    non_nan = 0
+                    for k in range(ratio):
+                        for l in range(ratio):
+                            if not isnan(input[i * ratio + k, j * ratio + l]):
+                                non_nan = non_nan + 1
+                    if non_nan == 0:
+                        continue
+                    d = d / non_nan
+                for k in range(ratio):
+                    for l in range(ratio):
+                        x = input[i * ratio + k, j * ratio + l]
+                        if not isnan(x):
+                            output[i * ratio + k, j * ratio + l] = x + d
@@ -59,8 +59,7 @@ class LandCover(object):
         if iniItems.landSurfaceOptions['limitAbstraction'] == "True": self.limitAbstraction = True
         
         # if using MODFLOW, limitAbstraction must be True (the abstraction cannot exceed storGroundwater)
-        if "useMODFLOW" in list(iniItems.groundwaterOptions.keys()):
-            if iniItems.groundwaterOptions["useMODFLOW"] == "True": self.limitAbstraction = True
+        if iniItems.get_boolean_option('groundwaterOptions', 'useMODFLOW'): self.limitAbstraction = True
         
         # includeIrrigation
         self.includeIrrigation = False
@@ -104,10 +103,8 @@ class LandCover(object):
         # Improved Arno Scheme's method:
         # - In the "Original" work of van Beek et al., 2011 there is no "directRunoff reduction"
         # - However, later (20 April 2011), Rens van Beek introduce this reduction, particularly to maintain soil saturation. This is currently the "Default" method. 
-        self.improvedArnoSchemeMethod = "Default"
-        if "improvedArnoSchemeMethod" in list(iniItems.landSurfaceOptions.keys()):
-            self.improvedArnoSchemeMethod = iniItems.landSurfaceOptions['improvedArnoSchemeMethod']
-            if self.improvedArnoSchemeMethod == "Original": logger.warning("Using the old/original approach of Improved Arno Scheme. No reduction for directRunoff.")
+        self.improvedArnoSchemeMethod = iniItems.get_option('landSurfaceOptions', 'improvedArnoSchemeMethod', "Default")
+        if self.improvedArnoSchemeMethod == "Original": logger.warning("Using the old/original approach of Improved Arno Scheme. No reduction for directRunoff.")
 
         # In the original oldcalc script of Rens (2 layer model), the percolation percUpp (P1) can be negative
         # - To avoid this, Edwin changed few lines (see the method updateSoilStates)
@@ -153,8 +150,7 @@ class LandCover(object):
 
         # an option to introduce changes of land cover parameters (not only fracVegCover)
         self.noAnnualChangesInLandCoverParameter = True
-        if 'annualChangesInLandCoverParameters' in list(iniItems.landSurfaceOptions.keys()):
-            if iniItems.landSurfaceOptions['annualChangesInLandCoverParameters'] == "True": self.noAnnualChangesInLandCoverParameter = False
+        if iniItems.get_boolean_option('landSurfaceOptions', 'annualChangesInLandCoverParameters'): self.noAnnualChangesInLandCoverParameter = False
         
         # get land cover parameters that are fixed for the entire simulation
         if self.noAnnualChangesInLandCoverParameter: 
@@ -193,6 +189,7 @@ class LandCover(object):
         
         # water allocation zones:
         self.usingAllocSegments = usingAllocSegments # water allocation option:
+        self.allocSegmentsZoneIndex = None           # zone index for the numpy allocation kernel (set by the landSurface module)
         if self.usingAllocSegments:
         
             # cellArea (unit: m2)                         # TODO: If possible, integrate this one with the one coming from the routing module
@@ -1026,10 +1023,7 @@ class LandCover(object):
         if self.report == True:
             # writing Output to netcdf files
             # - daily output:
-            timeStamp = datetime.datetime(currTimeStep.year,\
-                                          currTimeStep.month,\
-                                          currTimeStep.day,\
-                                          0)
+            timeStamp = currTimeStep.currTimeFull
             timestepPCR = currTimeStep.timeStepPCR
             if self.outDailyTotNC[0] != "None":
                 for var in self.outDailyTotNC:
@@ -1753,7 +1747,8 @@ class LandCover(object):
               extra_info_for_water_balance_reporting = str(currTimeStep.fulldate), 
               landmask = self.landmask,
               ignore_small_values = False,
-              prioritizing_local_source = self.prioritizeLocalSourceToMeetWaterDemand)
+              prioritizing_local_source = self.prioritizeLocalSourceToMeetWaterDemand,
+              zone_index = self.allocSegmentsZoneIndex)
         #     
             self.desalinationAbstraction = volDesalinationAbstraction / routing.cellArea
             self.desalinationAllocation  = volDesalinationAllocation  / routing.cellArea
@@ -1858,7 +1853,8 @@ class LandCover(object):
              extra_info_for_water_balance_reporting = str(currTimeStep.fulldate), 
              landmask = self.landmask,
              ignore_small_values = False,
-             prioritizing_local_source = self.prioritizeLocalSourceToMeetWaterDemand)
+             prioritizing_local_source = self.prioritizeLocalSourceToMeetWaterDemand,
+             zone_index = self.allocSegmentsZoneIndex)
 
             self.actSurfaceWaterAbstract   = volActSurfaceWaterAbstract / routing.cellArea
             self.allocSurfaceWaterAbstract = volAllocSurfaceWaterAbstract / routing.cellArea
@@ -2034,7 +2030,8 @@ class LandCover(object):
              extra_info_for_water_balance_reporting = str(currTimeStep.fulldate),  
              landmask = self.landmask,
              ignore_small_values = False,
-             prioritizing_local_source = self.prioritizeLocalSourceToMeetWaterDemand)
+             prioritizing_local_source = self.prioritizeLocalSourceToMeetWaterDemand,
+             zone_index = groundwater.allocSegmentsZoneIndex)
             
             # non fossil groundwater abstraction and allocation in meter
             self.nonFossilGroundwaterAbs   = volActGroundwaterAbstract  / routing.cellArea 
@@ -2261,7 +2258,8 @@ class LandCover(object):
                        extra_info_for_water_balance_reporting = str(currTimeStep.fulldate),  
                        landmask = self.landmask,
                        ignore_small_values = False,
-                       prioritizing_local_source = self.prioritizeLocalSourceToMeetWaterDemand)
+                       prioritizing_local_source = self.prioritizeLocalSourceToMeetWaterDemand,
+                       zone_index = groundwater.allocSegmentsZoneIndex)
                     
                     # fossil groundwater abstraction and allocation in meter
                     self.fossilGroundwaterAbstr = volActGroundwaterAbstract  /routing.cellArea 
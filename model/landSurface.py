@@ -221,7 +221,7 @@ class LandSurface(object):
             logger.info("Irrigation is NOT included/considered in this run.")
             
         # if user define their land cover types: 
-        if 'landCoverTypes' in list(iniItems.landSurfaceOptions.keys()): 
+        if iniItems.get_option('landSurfaceOptions', 'landCoverTypes') is not None: 
             self.coverTypes = iniItems.landSurfaceOptions['landCoverTypes'].split(",")
 
         # water demand options: irrigation efficiency, non irrigation water demand, and desalination supply 
@@ -328,8 +328,7 @@ class LandSurface(object):
         # rescale landCover Fractions
         # - by default, the land cover fraction will always be corrected (to ensure the total of all fractions = 1.0)
         self.noLandCoverFractionCorrection = False
-        if "noLandCoverFractionCorrection" in list(iniItems.landSurfaceOptions.keys()):
-            if iniItems.landSurfaceOptions["noLandCoverFractionCorrection"] == "True": self.noLandCoverFractionCorrection = True
+        if iniItems.get_boolean_option('landSurfaceOptions', 'noLandCoverFractionCorrection'): self.noLandCoverFractionCorrection = True
         # - rescaling land cover fractions
         if self.noLandCoverFractionCorrection == False:
             self.scaleNaturalLandCoverFractions()
@@ -337,8 +336,7 @@ class LandSurface(object):
         
         # an option to introduce changes of land cover parameters (not only fracVegCover)
         self.noAnnualChangesInLandCoverParameter = True
-        if 'annualChangesInLandCoverParameters' in list(iniItems.landSurfaceOptions.keys()):
-            if iniItems.landSurfaceOptions['annualChangesInLandCoverParameters'] == "True": self.noAnnualChangesInLandCoverParameter = False
+        if iniItems.get_boolean_option('landSurfaceOptions', 'annualChangesInLandCoverParameters'): self.noAnnualChangesInLandCoverParameter = False
 
         # Note that "dynamicIrrigationArea" CANNOT be combined with "noLandCoverFractionCorrection"
         if self.noLandCoverFractionCorrection: self.dynamicIrrigationArea = False
@@ -683,6 +681,10 @@ class LandSurface(object):
         # zones at which water allocation (surface and groundwater allocation) is determined
         self.usingAllocSegments = False
         self.allocSegments = None
+        
+        # method for the water allocation within zones: "pcraster" (default, using areatotal) or "numpy" (using a precomputed zone index)
+        self.allocationMethod = iniItems.get_choice_option('landSurfaceOptions', 'allocationMethod', ["pcraster", "numpy"], "pcraster")
+        self.allocSegmentsZoneIndex = None
         if iniItems.landSurfaceOptions['allocationSegmentsForGroundSurfaceWater']  != "None":
             self.usingAllocSegments = True 
             
@@ -719,6 +721,13 @@ class LandSurface(object):
             self.segmentArea = pcr.areatotal(pcr.cover(cellArea, 0.0), self.allocSegments)
             self.segmentArea = pcr.ifthen(self.landmask, self.segmentArea)
 
+            # zone index for the numpy allocation kernel (built once, see vos.getZoneIndex) 
+            if self.allocationMethod == "numpy":
+                logger.info("Water allocation is calculated with the numpy zone index kernel.")
+                self.allocSegmentsZoneIndex = vos.getZoneIndex(self.allocSegments, self.landmask)
+                for coverType in self.coverTypes:
+                    self.landCoverObj[coverType].allocSegmentsZoneIndex = self.allocSegmentsZoneIndex
+
         else:
 
             logger.info("If there is any, water demand is satisfied by local source only.")
@@ -1464,10 +1473,7 @@ class LandSurface(object):
     def old_style_land_surface_reporting(self,currTimeStep):
 
         if self.report == True:
-            timeStamp = datetime.datetime(currTimeStep.year,\
-                                          currTimeStep.month,\
-                                          currTimeStep.day,\
-                                          0)
+            timeStamp = currTimeStep.currTimeFull
             # writing daily output to netcdf files
             timestepPCR = currTimeStep.timeStepPCR
             if self.outDailyTotNC[0] != "None":
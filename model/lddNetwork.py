@@ -0,0 +1,475 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# PCR-GLOBWB (PCRaster Global Water Balance) Global Hydrological Model
+#
+# Copyright (C) 2016, Edwin H. Sutanudjaja, Rens van Beek, Niko Wanders, Yoshihide Wada,
+# Joyce H. C. Bosmans, Niels Drost, Ruud J. van der Ent, Inge E. M. de Graaf, Jannis M. Hoch,
+# Kor de Jong, Derek Karssenberg, Patricia López López, Stefanie Peßenteiner, Oliver Schmitz,
+# Menno W. Straatsma, Ekkamol Vannametee, Dominik Wisser, and Marc F. P. Bierkens
+# Faculty of Geosciences, Utrecht University, Utrecht, The Netherlands
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import math
+import time
+import heapq
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pcraster as pcr
+
+import virtualOS as vos
+
+import logging
+logger = logging.getLogger(__name__)
+
+# numba is optional; without numba, the kinematic wave is solved level by level (vectorized over all cells of a level)
+try:
+    from numba import njit
+except:
+    njit = None
+
+# row and column offsets to the downstream cell for every ldd direction (keypad notation, rows are counted southward)
+ldd_row_offsets = np.array([0,  1, 1, 1,  0, 0, 0, -1, -1, -1], dtype = np.int64)
+ldd_col_offsets = np.array([0, -1, 0, 1, -1, 0, 1, -1,  0,  1], dtype = np.int64)
+
+# convergence criteria of the Newton-Raphson iteration (as used in the pcraster kinematic operation)
+kinematic_epsilon = 1e-12
+kinematic_max_iterations = 3000
+
+def iterateToNewDischarge(Qin, Qold, q, alpha, beta, deltaT, deltaX):
+    """
+    Returns the new discharge (m3/s) of the kinematic wave equation (Chow et al., 1988) using the Newton-Raphson method,
+    vectorized over numpy arrays. Qin is the new discharge coming from the upstream cells.
+    """
+
+    with np.errstate(divide = 'ignore', invalid = 'ignore', over = 'ignore'):
+
+        # common terms
+        ab_pQ   = alpha * beta * ((Qold + Qin) / 2.0)**(beta - 1.0)
+        deltaTX = deltaT / deltaX
+        C       = deltaTX * Qin + alpha * Qold**beta + deltaT * q
+
+        # initial guess
+        Qkx = (deltaTX * Qin + Qold * ab_pQ + deltaT * q) / (deltaTX + ab_pQ)
+        Qkx = np.maximum(np.nan_to_num(Qkx, nan = 0.0, posinf = 0.0), 1e-30)
+
+        # iterate only for the cells that have not converged yet
+        active = np.ones(Qkx.shape, dtype = bool)
+        for i_iteration in range(kinematic_max_iterations):
+            fQkx  = deltaTX[active] * Qkx[active] + alpha[active] * Qkx[active]**beta - C[active]
+            dfQkx = deltaTX[active] + alpha[active] * beta * Qkx[active]**(beta - 1.0)
+            Qkx[active] = np.maximum(Qkx[active] - fQkx / dfQkx, 1e-30)
+            still_active = np.abs(fQkx) > kinematic_epsilon
+            if not np.any(still_active): break
+            active[np.nonzero(active)[0][~still_active]] = False
+
+    # if no input, the output is zero
+    return np.where((Qin + Qold + q) == 0.0, 0.0, Qkx)
+
+def kinematicInOrder(order, downstream, Qold, q, alpha, beta, deltaT, deltaX, epsilon, max_iterations, Qnew, Qin):
+    """
+    Kinematic wave over cells given in topological (upstream to downstream) order, one cell at a time.
+    The results are written to Qnew (and Qin, the new discharge coming from the upstream cells) for the given cells only.
+    This function is written with scalar operations only, such that it can be compiled by numba.
+    """
+
+    for i in range(order.shape[0]):
+        cell = order[i]
+        if Qin[cell] + Qold[cell] + q[cell] == 0.0:
+            Qkx = 0.0
+        else:
+            ab_pQ   = alpha[cell] * beta * math.pow((Qold[cell] + Qin[cell]) / 2.0, beta - 1.0)
+            deltaTX = deltaT / deltaX[cell]
+            C       = deltaTX * Qin[cell] + alpha[cell] * math.pow(Qold[cell], beta) + deltaT * q[cell]
+            Qkx     = (deltaTX * Qin[cell] + Qold[cell] * ab_pQ + deltaT * q[cell]) / (deltaTX + ab_pQ)
+            Qkx     = max(Qkx, 1e-30)
+            for i_iteration in range(max_iterations):
+                fQkx  = deltaTX * Qkx + alpha[cell] * math.pow(Qkx, beta) - C
+                dfQkx = deltaTX + alpha[cell] * beta * math.pow(Qkx, beta - 1.0)
+                Qkx   = max(Qkx - fQkx / dfQkx, 1e-30)
+                if abs(fQkx) <= epsilon: break
+        Qnew[cell] = Qkx
+        if downstream[cell] >= 0: Qin[downstream[cell]] += Qkx
+
+# the compiled version releases the GIL, such that work packages can run in parallel threads
+if njit is not None: kinematicInOrder = njit(cache = True, nogil = True)(kinematicInOrder)
+
+def kinematicPerLevel(levels, downstream, Qold, q, alpha, beta, deltaT, deltaX, Qnew, Qin):
+    """
+    Kinematic wave over cells grouped in topological levels, vectorized over all cells of a level.
+    The results are written to Qnew (and Qin) for the given cells only.
+    """
+
+    for level in levels:
+        Qnew[level] = iterateToNewDischarge(Qin[level], Qold[level], q[level], alpha[level], \
+                                            beta, deltaT, deltaX[level])
+        downstreamOfLevel = downstream[level]
+        hasDownstream = downstreamOfLevel >= 0
+        np.add.at(Qin, downstreamOfLevel[hasDownstream], Qnew[level][hasDownstream])
+
+
+def channelStepInOrder(order, downstream, factor, offset, storage, denominator, floodWettedPerimeter, \
+                       channelWidth, channelLength, channelDepth, gradient, manningsN, floodplainManningsN, floodPlain, \
+                       isWaterBody, isWaterBodyOutlet, waterBodyOutflow, beta, deltaT, epsilon, max_iterations, \
+                       inflowKinematic, inflowDischarge, inflowLimited, dischargeVolume):
+    """
+    Channel kinematic wave step with local time stepping over cells given in topological (upstream to downstream) order, one cell at a time.
+    Every cell makes factor[cell] sub steps of deltaT/factor[cell] seconds, as in Routing.kinematic_wave_channel_step:
+    alpha and the initial discharge from the storage, the kinematic wave (without lateral inflow), the limit for non negative storage and the storage update.
+    The outflows of every sub step are passed to the inflow slots of the downstream cell (at its own sub steps, see LddNetwork.setLocalTimeStepping),
+    averaged if the downstream cell makes fewer sub steps and repeated if it makes more, such that the exchanged volumes are exact.
+    The results are written to storage and dischargeVolume (the outflow volume over deltaT) for the given cells only.
+    This function is written with scalar operations only, such that it can be compiled by numba.
+    """
+
+    for i in range(order.shape[0]):
+        cell = order[i]
+        numberOfSubSteps = factor[cell]
+        deltaTCell = deltaT / numberOfSubSteps
+        deltaTX    = deltaTCell / channelLength[cell]
+        for j in range(numberOfSubSteps):
+            slot = offset[cell] + j
+            S = storage[cell]
+
+            # alpha and initial discharge (see Routing.calculate_alpha_and_initial_discharge_for_kinematic_wave)
+            wettedArea = max(S / denominator[cell] * channelWidth[cell], S / channelLength[cell])
+            channelWettedPerimeter = channelWidth[cell]
+            if channelLength[cell] * channelWidth[cell] > 0.0:
+                channelWettedPerimeter += min(channelDepth[cell], S / (channelLength[cell] * channelWidth[cell])) * 2.0
+            wettedPerimeter = max(0.1, channelWettedPerimeter + floodWettedPerimeter[cell])
+            usedManningsN = manningsN[cell]
+            if floodPlain:
+                usedManningsN = math.pow((channelWettedPerimeter / wettedPerimeter) * math.pow(manningsN[cell], 1.5) + \
+                                         (floodWettedPerimeter[cell] / wettedPerimeter) * math.pow(floodplainManningsN[cell], 1.5), 2.0 / 3.0)
+            alpha = math.pow(usedManningsN * math.pow(wettedPerimeter, 2.0 / 3.0) * math.pow(gradient[cell], -0.5), beta)
+            Qold = 0.0
+            if alpha > 0.0: Qold = math.pow(wettedArea / alpha, 1.0 / beta)
+            if isWaterBodyOutlet[cell]: Qold = waterBodyOutflow[cell]
+            if not S > 0.0: Qold = 0.0
+
+            # kinematic wave (as in kinematicInOrder)
+            Qin = inflowKinematic[slot]
+            if Qin + Qold == 0.0:
+                Qkx = 0.0
+            else:
+                ab_pQ = alpha * beta * math.pow((Qold + Qin) / 2.0, beta - 1.0)
+                C     = deltaTX * Qin + alpha * math.pow(Qold, beta)
+                Qkx   = (deltaTX * Qin + Qold * ab_pQ) / (deltaTX + ab_pQ)
+                Qkx   = max(Qkx, 1e-30)
+                for i_iteration in range(max_iterations):
+                    fQkx  = deltaTX * Qkx + alpha * math.pow(Qkx, beta) - C
+                    dfQkx = deltaTX + alpha * beta * math.pow(Qkx, beta - 1.0)
+                    Qkx   = max(Qkx - fQkx / dfQkx, 1e-30)
+                    if abs(fQkx) <= epsilon: break
+
+            # no discharge from water body cells and no negative storage
+            discharge = max(0.0, Qkx)
+            if isWaterBody[cell]: discharge = 0.0
+            limitedDischarge = min(discharge * deltaTCell, max(0.0, S + inflowDischarge[slot] * deltaTCell)) / deltaTCell
+            storage[cell] = S + (inflowLimited[slot] - limitedDischarge) * deltaTCell
+            dischargeVolume[cell] += limitedDischarge * deltaTCell
+
+            # outflows to the inflow slots of the downstream cell
+            down = downstream[cell]
+            if down >= 0:
+                downFactor = factor[down]
+                if numberOfSubSteps >= downFactor:
+                    downSlot = offset[down] + (j * downFactor) // numberOfSubSteps
+                    weight = downFactor / numberOfSubSteps
+                    inflowKinematic[downSlot] += Qkx * weight
+                    inflowDischarge[downSlot] += discharge * weight
+                    inflowLimited[downSlot]   += limitedDischarge * weight
+                else:
+                    ratio = downFactor // numberOfSubSteps
+                    for k in range(ratio):
+                        downSlot = offset[down] + j * ratio + k
+                        inflowKinematic[downSlot] += Qkx
+                        inflowDischarge[downSlot] += discharge
+                        inflowLimited[downSlot]   += limitedDischarge
+
+if njit is not None: channelStepInOrder = njit(cache = True, nogil = True)(channelStepInOrder)
+
+def channelStepPerLevel(levels, downstream, factor, offset, storage, denominator, floodWettedPerimeter, \
+                        channelWidth, channelLength, channelDepth, gradient, manningsN, floodplainManningsN, floodPlain, \
+                        isWaterBody, isWaterBodyOutlet, waterBodyOutflow, beta, deltaT, \
+                        inflowKinematic, inflowDischarge, inflowLimited, dischargeVolume):
+    """
+    As channelStepInOrder, but vectorized over the cells of a level with the same factor (levels: list of lists of (factor, cells)).
+    """
+
+    for level in levels:
+        for numberOfSubSteps, cells in level:
+            deltaTCell = deltaT / numberOfSubSteps
+            down = downstream[cells]
+            hasDown = down >= 0
+            down = down[hasDown]
+            downFactor = factor[down]
+            for j in range(numberOfSubSteps):
+                slots = offset[cells] + j
+                S = storage[cells]
+
+                # alpha and initial discharge (see Routing.calculate_alpha_and_initial_discharge_for_kinematic_wave)
+                with np.errstate(divide = 'ignore', invalid = 'ignore'):
+                    wettedArea = np.maximum(S / denominator[cells] * channelWidth[cells], S / channelLength[cells])
+                    channelWettedPerimeter = np.where(channelLength[cells] * channelWidth[cells] > 0.0, \
+                                             np.minimum(channelDepth[cells], S / (channelLength[cells] * channelWidth[cells])) * 2.0, 0.0) + channelWidth[cells]
+                    wettedPerimeter = np.maximum(0.1, channelWettedPerimeter + floodWettedPerimeter[cells])
+                    usedManningsN = manningsN[cells]
+                    if floodPlain:
+                        usedManningsN = ((channelWettedPerimeter / wettedPerimeter) * manningsN[cells]**(1.5) + \
+                                         (floodWettedPerimeter[cells] / wettedPerimeter) * floodplainManningsN[cells]**(1.5))**(2./3.)
+                    alpha = (usedManningsN * wettedPerimeter**(2./3.) * gradient[cells]**(-0.5))**beta
+                    Qold  = np.where(alpha > 0.0, (wettedArea / alpha)**(1.0 / beta), 0.0)
+                Qold = np.where(isWaterBodyOutlet[cells], waterBodyOutflow[cells], Qold)
+                Qold = np.where(S > 0.0, Qold, 0.0)
+
+                # kinematic wave (as in kinematicPerLevel)
+                Qkx = iterateToNewDischarge(inflowKinematic[slots], Qold, 0.0, alpha, beta, deltaTCell, channelLength[cells])
+
+                # no discharge from water body cells and no negative storage
+                discharge = np.where(isWaterBody[cells], 0.0, np.maximum(0.0, Qkx))
+                limitedDischarge = np.minimum(discharge * deltaTCell, np.maximum(0.0, S + inflowDischarge[slots] * deltaTCell)) / deltaTCell
+                storage[cells] = S + (inflowLimited[slots] - limitedDischarge) * deltaTCell
+                dischargeVolume[cells] += limitedDischarge * deltaTCell
+
+                # outflows to the inflow slots of the downstream cells
+                Qkx, discharge, limitedDischarge = Qkx[hasDown], discharge[hasDown], limitedDischarge[hasDown]
+                isCoarser = numberOfSubSteps >= downFactor
+                downSlots = offset[down[isCoarser]] + (j * downFactor[isCoarser]) // numberOfSubSteps
+                weight = downFactor[isCoarser] / numberOfSubSteps
+                np.add.at(inflowKinematic, downSlots, Qkx[isCoarser] * weight)
+                np.add.at(inflowDischarge, downSlots, discharge[isCoarser] * weight)
+                np.add.at(inflowLimited,   downSlots, limitedDischarge[isCoarser] * weight)
+                ratio = downFactor[~isCoarser] // numberOfSubSteps
+                for k in range(int(ratio.max()) if ratio.size > 0 else 0):
+                    hasSlot = k < ratio
+                    downSlots = offset[down[~isCoarser][hasSlot]] + j * ratio[hasSlot] + k
+                    np.add.at(inflowKinematic, downSlots, Qkx[~isCoarser][hasSlot])
+                    np.add.at(inflowDischarge, downSlots, discharge[~isCoarser][hasSlot])
+                    np.add.at(inflowLimited,   downSlots, limitedDischarge[~isCoarser][hasSlot])
+
+
+class LddNetwork(object):
+    """
+    Local drain direction network as flat arrays over the ldd cells:
+    - the downstream cell index of every cell (-1 for pits and for cells draining outside the ldd)
+    - the cells in topological (upstream to downstream) order, also grouped per level
+    These are built once and used for upstream sums and kinematic wave calculations without pcraster network operations.
+    The ldd may also be given as a 2-D numpy array of ldd directions (0 outside the network), e.g. for tests and benchmarks.
+    """
+
+    def __init__(self, lddMap):
+        object.__init__(self)
+
+        # cells of the network and their index
+        if isinstance(lddMap, np.ndarray):
+            self.cellMask = lddMap > 0
+            direction = lddMap.astype(np.int64)[self.cellMask]
+        else:
+            self.cellMask = vos.getCellMask(pcr.defined(lddMap))
+            direction = pcr.pcr2numpy(pcr.scalar(lddMap), 5).astype(np.int64)[self.cellMask]
+        self.numberOfCells = int(np.count_nonzero(self.cellMask))
+        cellIndex = np.full(self.cellMask.shape, -1, dtype = np.int64)
+        cellIndex[self.cellMask] = np.arange(self.numberOfCells)
+
+        # downstream cell index
+        rows, cols = np.nonzero(self.cellMask)
+        downstreamRows = rows + ldd_row_offsets[direction]
+        downstreamCols = cols + ldd_col_offsets[direction]
+        isInside = (direction != 5) & \
+                   (downstreamRows >= 0) & (downstreamRows < self.cellMask.shape[0]) & \
+                   (downstreamCols >= 0) & (downstreamCols < self.cellMask.shape[1])
+        self.downstream = np.full(self.numberOfCells, -1, dtype = np.int64)
+        self.downstream[isInside] = cellIndex[downstreamRows[isInside], downstreamCols[isInside]]
+        self.hasDownstream = self.downstream >= 0
+
+        # topological order (Kahn's algorithm, level by level)
+        numberOfUpstreamCells = np.bincount(self.downstream[self.hasDownstream], minlength = self.numberOfCells)
+        self.levels = []
+        current = np.nonzero(numberOfUpstreamCells == 0)[0]
+        while current.size > 0:
+            self.levels.append(current)
+            nextCells = self.downstream[current]
+            nextCells = nextCells[nextCells >= 0]
+            np.subtract.at(numberOfUpstreamCells, nextCells, 1)
+            nextCells = np.unique(nextCells)
+            current = nextCells[numberOfUpstreamCells[nextCells] == 0]
+        self.order = np.concatenate(self.levels) if len(self.levels) > 0 else np.zeros(0, dtype = np.int64)
+        if self.order.size != self.numberOfCells:
+            msg = 'The ldd network contains cycles; it cannot be sorted topologically.'
+            logger.error(msg)
+            raise Exception(msg)
+
+        logger.info('Ldd network with %i cells and %i levels is prepared.' %(self.numberOfCells, len(self.levels)))
+
+        # river basin (the index of the pit/outlet cell) of every cell
+        self.basin = np.arange(self.numberOfCells)
+        for level in reversed(self.levels):
+            hasDownstream = self.hasDownstream[level]
+            self.basin[level[hasDownstream]] = self.basin[self.downstream[level[hasDownstream]]]
+
+        # by default, the entire network is calculated as one work package
+        self.setWorkPackages(1)
+        
+        # local time stepping (see setLocalTimeStepping)
+        self.localTimeSteppingFactor = None
+
+    def setWorkPackages(self, numberOfPackages):
+        """
+        Groups the river basins into balanced work packages (based on the number of cells), 
+        to be calculated in parallel threads. River basins are hydraulically independent. 
+        """
+
+        self.numberOfPackages = max(1, int(numberOfPackages))
+        self.workPackages = []
+
+        # the thread pool is made once (per network and number of packages) and reused for every kinematic wave calculation
+        if getattr(self, 'executor', None) is not None: self.executor.shutdown()
+        self.executor = None
+        
+        if self.numberOfPackages == 1:
+            self.workPackages.append((self.order, self.levels))
+            if getattr(self, 'localTimeSteppingFactor', None) is not None: self.setLocalTimeStepping(self.localTimeSteppingFactor)
+            return
+
+        # greedy assignment: the largest basins first, every basin to the package with the least number of cells 
+        basinIds, basinSizes = np.unique(self.basin, return_counts = True)
+        packageOfBasin = np.zeros(self.numberOfCells, dtype = np.int64)
+        packageLoads = [(0, iPackage) for iPackage in range(self.numberOfPackages)]
+        heapq.heapify(packageLoads)
+        for iBasin in np.argsort(-basinSizes, kind = 'stable'):
+            load, iPackage = heapq.heappop(packageLoads)
+            packageOfBasin[basinIds[iBasin]] = iPackage
+            heapq.heappush(packageLoads, (load + int(basinSizes[iBasin]), iPackage))
+        packageOfCell = packageOfBasin[self.basin]
+
+        # for every package, the cells in topological order and per level
+        for iPackage in range(self.numberOfPackages):
+            order  = self.order[packageOfCell[self.order] == iPackage]
+            levels = [level[packageOfCell[level] == iPackage] for level in self.levels]
+            levels = [level for level in levels if level.size > 0]
+            if order.size > 0: self.workPackages.append((order, levels))
+        
+        msg = 'Ldd network: %i river basins are grouped into %i work packages (largest package: %i cells).' \
+              %(basinIds.size, len(self.workPackages), max([package[0].size for package in self.workPackages]))
+        logger.info(msg)
+        
+        if len(self.workPackages) > 1: self.executor = ThreadPoolExecutor(max_workers = len(self.workPackages))
+        
+        if getattr(self, 'localTimeSteppingFactor', None) is not None: self.setLocalTimeStepping(self.localTimeSteppingFactor)
+
+    def setLocalTimeStepping(self, factor):
+        """
+        Sets the number of sub steps (a power of 2) of every cell within a time step of channelStepWithLocalTimeStepping: 
+        - the inflow slots: for every cell, one slot per sub step (offsets of the slots of every cell)
+        - for every work package, the cells of every level grouped per factor (used without numba)
+        """
+
+        self.localTimeSteppingFactor = np.asarray(factor, dtype = np.int64)
+        self.localTimeSteppingOffset = np.concatenate(([0], np.cumsum(self.localTimeSteppingFactor)))
+        self.numberOfSlots = int(self.localTimeSteppingOffset[-1])
+        self.localTimeSteppingOffset = self.localTimeSteppingOffset[:-1]
+
+        self.localTimeSteppingLevels = []
+        for order, levels in self.workPackages:
+            factorLevels = []
+            for level in levels:
+                levelFactor = self.localTimeSteppingFactor[level]
+                factorLevels.append([(int(f), level[levelFactor == f]) for f in np.unique(levelFactor)])
+            self.localTimeSteppingLevels.append(factorLevels)
+
+    def toArray(self, pcrMap):
+        return vos.pcr2numpyAtCells(pcrMap, self.cellMask)
+
+    def toMap(self, values):
+        return vos.numpyAtCells2pcr(values, self.cellMask)
+
+    def upstream(self, values):
+        """ Returns the sum of the values of the (direct) upstream cells. """
+        return np.bincount(self.downstream[self.hasDownstream], weights = values[self.hasDownstream], minlength = self.numberOfCells)
+
+    def kinematic(self, Qold, q, alpha, beta, nrTimeSlices, deltaT, deltaX):
+        """
+        Returns the new discharge (m3/s) of the kinematic wave, as the pcraster kinematic operation:
+        Qold (m3/s), q (m2/s), alpha and deltaX (m) are arrays over the network cells; beta, nrTimeSlices and deltaT (s) are scalars.
+        """
+        q      = np.broadcast_to(np.asarray(q, dtype = np.float64), (self.numberOfCells,))
+        deltaX = np.broadcast_to(np.asarray(deltaX, dtype = np.float64), (self.numberOfCells,))
+        alpha  = np.broadcast_to(np.asarray(alpha, dtype = np.float64), (self.numberOfCells,))
+        deltaT = float(deltaT) / nrTimeSlices
+
+        Qnew = Qold
+        for i_slice in range(int(nrTimeSlices)):
+            Qold = Qnew
+            Qnew = np.zeros(self.numberOfCells)
+            Qin  = np.zeros(self.numberOfCells)
+            
+            # every work package writes only to its own cells (of complete river basins) 
+            def calculatePackage(package):
+                order, levels = package
+                if njit is not None:
+                    kinematicInOrder(order, self.downstream, Qold, q, alpha, float(beta), deltaT, deltaX, \
+                                     kinematic_epsilon, kinematic_max_iterations, Qnew, Qin)
+                else:
+                    kinematicPerLevel(levels, self.downstream, Qold, q, alpha, beta, deltaT, deltaX, Qnew, Qin)
+
+            start = time.time()
+            if self.executor is None:
+                for package in self.workPackages: calculatePackage(package)
+            else:
+                list(self.executor.map(calculatePackage, self.workPackages))
+            logger.debug('Kinematic wave over %i work package(s): %.4f s' %(len(self.workPackages), time.time() - start))
+
+        return Qnew
+
+    def channelStepWithLocalTimeStepping(self, storage, deltaT, denominator, floodWettedPerimeter, channelParameters, waterBodyOutflow):
+        """
+        Returns the outflow volume (m3) over deltaT (s) and the storage (m3) of every cell after a channel kinematic wave step with local time stepping:
+        every cell makes its own number of sub steps (see setLocalTimeStepping). Only the sub steps of a cell are calculated for it, and 
+        the volumes passed between cells with different numbers of sub steps are exact (see channelStepInOrder).
+        - storage (m3), denominator (m2, the one of the water height), floodWettedPerimeter (m) and waterBodyOutflow (m3/s) are arrays over the network cells
+        - channelParameters is a dictionary of the arrays channelWidth, channelLength, channelDepth, gradient, manningsN, floodplainManningsN, isWaterBody and 
+          isWaterBodyOutlet and the values floodPlain and beta
+        """
+        p = channelParameters
+        storage = np.array(storage, dtype = np.float64)
+        dischargeVolume = np.zeros(self.numberOfCells)
+        inflowKinematic = np.zeros(self.numberOfSlots)
+        inflowDischarge = np.zeros(self.numberOfSlots)
+        inflowLimited   = np.zeros(self.numberOfSlots)
+
+        # every work package writes only to its own cells and inflow slots (of complete river basins) 
+        def calculatePackage(iPackage):
+            order, levels = self.workPackages[iPackage]
+            if njit is not None:
+                channelStepInOrder(order, self.downstream, self.localTimeSteppingFactor, self.localTimeSteppingOffset, storage, denominator, floodWettedPerimeter, \
+                                   p['channelWidth'], p['channelLength'], p['channelDepth'], p['gradient'], p['manningsN'], p['floodplainManningsN'], p['floodPlain'], \
+                                   p['isWaterBody'], p['isWaterBodyOutlet'], waterBodyOutflow, float(p['beta']), float(deltaT), \
+                                   kinematic_epsilon, kinematic_max_iterations, inflowKinematic, inflowDischarge, inflowLimited, dischargeVolume)
+            else:
+                channelStepPerLevel(self.localTimeSteppingLevels[iPackage], self.downstream, self.localTimeSteppingFactor, self.localTimeSteppingOffset, storage, denominator, floodWettedPerimeter, \
+                                    p['channelWidth'], p['channelLength'], p['channelDepth'], p['gradient'], p['manningsN'], p['floodplainManningsN'], p['floodPlain'], \
+                                    p['isWaterBody'], p['isWaterBodyOutlet'], waterBodyOutflow, p['beta'], float(deltaT), \
+                                    inflowKinematic, inflowDischarge, inflowLimited, dischargeVolume)
+
+        start = time.time()
+        if self.executor is None:
+            for iPackage in range(len(self.workPackages)): calculatePackage(iPackage)
+        else:
+            list(self.executor.map(calculatePackage, range(len(self.workPackages))))
+        logger.debug('Channel step with local time stepping (%i cell sub steps for %i cells): %.4f s' %(self.numberOfSlots, self.numberOfCells, time.time() - start))
+
+        return dischargeVolume, storage
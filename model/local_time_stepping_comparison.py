@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# PCR-GLOBWB (PCRaster Global Water Balance) Global Hydrological Model
+#
+# Copyright (C) 2016, Edwin H. Sutanudjaja, Rens van Beek, Niko Wanders, Yoshihide Wada, 
+# Joyce H. C. Bosmans, Niels Drost, Ruud J. van der Ent, Inge E. M. de Graaf, Jannis M. Hoch, 
+# Kor de Jong, Derek Karssenberg, Patricia López López, Stefanie Peßenteiner, Oliver Schmitz, 
+# Menno W. Straatsma, Ekkamol Vannametee, Dominik Wisser, and Marc F. P. Bierkens
+# Faculty of Geosciences, Utrecht University, Utrecht, The Netherlands
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Comparison of the kinematic wave routing with and without local time stepping
+# - the model is run twice with the given ini file (routingMethod = kinematicWave): with the global sub time steps and with the local time stepping
+# - the (wall clock) run times and the differences of the daily discharge fields are reported
+#
+# usage: python local_time_stepping_comparison.py <ini_file> <output_directory>
+#
+# Without a model setup, the channel step with local time stepping (see lddNetwork.py) can be compared on a synthetic ldd network: 
+# - the same channel storage is routed with the maximum sub cycling factor for all cells (global sub time steps) and with the factor of every cell
+# - the run times, the mass balance errors and the differences of the outflow at the pits are reported
+#
+# usage: python local_time_stepping_comparison.py --synthetic [<number_of_rows> <number_of_cols> <number_of_days>]
+
+import os
+import sys
+import time
+import subprocess
+
+import numpy as np
+from six.moves.configparser import RawConfigParser as ConfigParser
+from netCDF4 import Dataset
+
+def run_model(iniFileName, output_directory, localTimeStepping):
+    # the ini file with the kinematic wave method, the local time stepping option and only the daily discharge output
+    config = ConfigParser()
+    config.optionxform = str
+    config.read(iniFileName)
+    config.set('globalOptions', 'outputDir', output_directory)
+    config.set('routingOptions', 'routingMethod', 'kinematicWave')
+    config.set('routingOptions', 'localTimeStepping', str(localTimeStepping))
+    config.set('reportingOptions', 'outDailyTotNC', 'discharge')
+    if not os.path.exists(output_directory): os.makedirs(output_directory)
+    run_ini_file = os.path.join(output_directory, "local_time_stepping_" + str(localTimeStepping) + ".ini")
+    with open(run_ini_file, 'w') as f: config.write(f)
+    
+    start = time.time()
+    subprocess.check_call([sys.executable, "deterministic_runner.py", run_ini_file], cwd = os.path.abspath(os.path.dirname(__file__)))
+    return time.time() - start, os.path.join(output_directory, "netcdf", "discharge_dailyTot_output.nc")
+
+def synthetic_comparison(number_of_rows, number_of_cols, number_of_days):
+
+    import lddNetwork
+
+    # synthetic ldd: every cell drains to one of its lower neighbours (south west, south or south east); the cells of the last row are pits
+    random = np.random.RandomState(1)
+    ldd = random.randint(1, 4, size = (number_of_rows, number_of_cols))
+    ldd[:, 0][ldd[:, 0] == 1] = 2
+    ldd[:, -1][ldd[:, -1] == 3] = 2
+    ldd[-1, :] = 5
+    network = lddNetwork.LddNetwork(ldd)
+    n = network.numberOfCells
+
+    # channel parameters, storage (with a large range of flow velocities) and the number of sub time steps of every cell (Courant condition)
+    parameters = {}
+    parameters['channelLength']       = np.full(n, 10000.)
+    parameters['channelWidth']        = random.uniform(5.0, 200.0, n)
+    parameters['channelDepth']        = random.uniform(1.0, 10.0, n)
+    parameters['gradient']            = 10**random.uniform(-5.0, -1.5, n)
+    parameters['manningsN']           = np.full(n, 0.04)
+    parameters['floodplainManningsN'] = np.zeros(n)
+    parameters['floodPlain']          = False
+    parameters['isWaterBody']         = np.zeros(n, dtype = bool)
+    parameters['isWaterBodyOutlet']   = np.zeros(n, dtype = bool)
+    parameters['beta']                = 0.6
+    denominator          = parameters['channelLength'] * parameters['channelWidth']
+    floodWettedPerimeter = np.zeros(n)
+    waterBodyOutflow     = np.zeros(n)
+    storage = random.uniform(0.1, 3.0, n) * denominator
+    
+    water_height = storage / denominator
+    velocity = water_height**(2./3.) * parameters['gradient']**(0.5) / parameters['manningsN']
+    number_of_sub_time_steps = 86400. / (parameters['channelLength'] / velocity)
+    number_of_loops = int(max(24, np.ceil(number_of_sub_time_steps.min())))
+    length_of_sub_time_step = 86400. / number_of_loops
+    factor = np.power(2, np.ceil(np.log2(np.maximum(1.0, number_of_sub_time_steps / number_of_loops)) - 1e-6)).astype(np.int64)
+    print("synthetic ldd network: %i cells, %i levels ; %i sub time steps per day ; sub cycling factors %s" \
+          %(n, len(network.levels), number_of_loops, str(np.unique(factor, return_counts = True))))
+
+    results = {}
+    for name, cell_factor in [("global sub time steps", np.full(n, factor.max())), ("local time stepping", factor)]:
+        network.setLocalTimeStepping(cell_factor)
+        cell_storage = storage.copy()
+        outflow = np.zeros(n)
+        start = time.time()
+        for i_day in range(number_of_days):
+            for i_loop in range(number_of_loops):
+                discharge_volume, cell_storage = network.channelStepWithLocalTimeStepping(cell_storage, length_of_sub_time_step, denominator, \
+                                                                                          floodWettedPerimeter, parameters, waterBodyOutflow)
+                outflow[~network.hasDownstream] += discharge_volume[~network.hasDownstream]
+        run_time = time.time() - start
+        mass_balance_error = storage.sum() - cell_storage.sum() - outflow.sum()
+        print("%-22s: %.2f s ; %i cell sub steps per sub time step ; mass balance error %.3g m3 (relative %.3g)" \
+              %(name, run_time, network.numberOfSlots, mass_balance_error, mass_balance_error / storage.sum()))
+        results[name] = (run_time, outflow)
+
+    global_time, global_outflow = results["global sub time steps"]
+    local_time,  local_outflow  = results["local time stepping"]
+    print("speed up %.2f ; relative difference of the total outflow at the pits %.3g ; maximum relative difference of the pit outflows %.3g" \
+          %(global_time / local_time, abs(global_outflow.sum() - local_outflow.sum()) / global_outflow.sum(), \
+            np.max(np.abs(global_outflow - local_outflow)) / np.max(global_outflow)))
+
+def main():
+
+    if sys.argv[1] == "--synthetic":
+        size = [int(value) for value in sys.argv[2:5]] + [200, 200, 1][len(sys.argv[2:5]):]
+        return synthetic_comparison(*size)
+
+    iniFileName      = os.path.abspath(sys.argv[1])
+    output_directory = os.path.abspath(sys.argv[2])
+
+    global_time, global_file = run_model(iniFileName, os.path.join(output_directory, "global_time_step"), False)
+    local_time,  local_file  = run_model(iniFileName, os.path.join(output_directory, "local_time_stepping"), True)
+    print("global sub time steps : %.1f s" %(global_time))
+    print("local time stepping   : %.1f s (speed up %.2f)" %(local_time, global_time / local_time))
+
+    # daily discharge differences (m3/s): maximum absolute difference and relative difference of the total discharge
+    global_discharge = Dataset(global_file).variables['discharge']
+    local_discharge  = Dataset(local_file).variables['discharge']
+    for i_time in range(global_discharge.shape[0]):
+        a = np.ma.filled(global_discharge[i_time].astype(np.float64), 0.0)
+        b = np.ma.filled(local_discharge[i_time].astype(np.float64), 0.0)
+        print("day %4i : maximum absolute difference %.4g m3/s ; relative difference of the total discharge %.4g" \
+              %(i_time + 1, np.max(np.abs(a - b)), np.abs(a.sum() - b.sum()) / max(a.sum(), 1e-20)))
+
+if __name__ == '__main__':
+    sys.exit(main())
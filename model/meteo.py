@@ -23,8 +23,10 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import os
-import calendar
 import math
+import time
+
+import numpy as np
 
 from pcraster.framework import *
 import pcraster as pcr
@@ -38,6 +40,7 @@ from ncConverter import *
 import evaporation.hamonETPFunctions as hamon_et0
 import evaporation.ref_pot_et_penman_monteith as penman_monteith
 import evaporation.shortwave_radiation as sw_rad
+import evaporation.ref_pot_et_numpy as ref_pot_et_numpy
 
 class Meteo(object):
 
@@ -68,21 +71,21 @@ class Meteo(object):
         # initial conditions (unit: m)
         if iniConditions == None: # when the model just start (reading the initial conditions from file)
 
-            if 'avgAnnualPrecipitationIni' in list(iniItems.meteoOptions.keys()):
+            if iniItems.get_option('meteoOptions', 'avgAnnualPrecipitationIni') is not None:
                 self.avgAnnualPrecipitation    = vos.readPCRmapClone(iniItems.meteoOptions['avgAnnualPrecipitationIni'],
                                                                      self.cloneMap, self.tmpDir, self.inputDir)
             else:                                                         
                 msg = "The initial condition avgAnnualPrecipitationIni is not defined and set to zero. This is needed only for the Bristow-Campbell method."
                 self.avgAnnualPrecipitation    = pcr.scalar(0.0)
 
-            if 'avgAnnualTemperatureIni' in list(iniItems.meteoOptions.keys()):
+            if iniItems.get_option('meteoOptions', 'avgAnnualTemperatureIni') is not None:
                 self.avgAnnualTemperature      = vos.readPCRmapClone(iniItems.meteoOptions['avgAnnualTemperatureIni'],
                                                                      self.cloneMap, self.tmpDir, self.inputDir)
             else:                                                         
                 msg = "The initial condition avgAnnualTemperatureIni is not defined and set to zero. This is needed only for the Bristow-Campbell method."
                 self.avgAnnualTemperature      = pcr.scalar(0.0)
 
-            if 'avgAnnualDiurnalDeltaTempIni' in list(iniItems.meteoOptions.keys()):
+            if iniItems.get_option('meteoOptions', 'avgAnnualDiurnalDeltaTempIni') is not None:
                 self.avgAnnualDiurnalDeltaTemp = vos.readPCRmapClone(iniItems.meteoOptions['avgAnnualDiurnalDeltaTempIni'],
                                                                  self.cloneMap, self.tmpDir, self.inputDir)
             else:                                                         
@@ -124,7 +127,7 @@ class Meteo(object):
 
         # option to ignore snow (temperature will be set to 25 deg C if this option is activated)
         self.ignore_snow = False
-        if 'ignoreSnow' in list(iniItems.meteoOptions.keys()) and iniItems.meteoOptions['ignoreSnow'] == "True":
+        if iniItems.get_boolean_option('meteoOptions', 'ignoreSnow'):
             self.ignore_snow = True
 
         self.preFileNC = iniItems.meteoOptions['precipitationNC']        # starting from 19 Feb 2014, we only support netcdf input files
@@ -143,6 +146,13 @@ class Meteo(object):
         
         if self.refETPotMethod == 'Input': self.etpFileNC = iniItems.meteoOptions['refETPotFileNC']              
 
+        # engine for the Hamon and Penman-Monteith calculations:
+        # - "pcraster" (default)
+        # - "numpy"           : one pass over the cells, with the latitude and day of year terms cached (see evaporation/ref_pot_et_numpy.py)
+        # - "numpy_with_check": as "numpy", but also using the "pcraster" method (its results are used) to log the differences and the calculation times
+        self.refETPotEngine = iniItems.get_choice_option('meteoOptions', 'referenceETPotEngine', ["pcraster", "numpy", "numpy_with_check"], "pcraster")
+        self.refETPotKernel = None
+
         # list of extra meteo variable names, needed for the Peman-Monteith calculation
         self.extra_meteo_var_names = ['wind_speed_10m',\
                                       'wind_speed_10m_u_comp',\
@@ -212,6 +222,28 @@ class Meteo(object):
         self.temperature_set_per_year    = iniItems.meteoOptions['temperature_set_per_year'] == "True"
         self.refETPotFileNC_set_per_year = iniItems.meteoOptions['refETPotFileNC_set_per_year'] == "True" 
         
+        # options for reading the forcing files, set once (instead of every time step in read_forcings)
+        # - methods for finding the time indexes in the netcdf files
+        self.precipitation_time_index_method = iniItems.get_option('meteoOptions', 'time_index_method_for_precipitation_netcdf', "daily")
+        self.temperature_time_index_method   = iniItems.get_option('meteoOptions', 'time_index_method_for_temperature_netcdf', "daily")
+        self.refETPot_time_index_method      = iniItems.get_option('meteoOptions', 'time_index_method_for_ref_pot_et_netcdf', "daily")
+        # - netcdf files that are defined per month (one file for each month)
+        self.precipitation_file_per_month  = iniItems.get_boolean_option('meteoOptions', 'precipitation_file_per_month')
+        self.temperature_file_per_month    = iniItems.get_boolean_option('meteoOptions', 'temperature_file_per_month')
+        self.refETPotFileNC_file_per_month = iniItems.get_boolean_option('meteoOptions', 'refETPotFileNC_file_per_month')
+        # - netcdf files of the extra meteo variables
+        self.extra_meteo_files = {}
+        for meteo_var_name in self.extra_meteo_var_names:
+            if iniItems.get_option('meteoOptions', meteo_var_name, "None").endswith(('.nc', '.nc4', '.nc3')):
+                self.extra_meteo_files[meteo_var_name] = vos.getFullPath(iniItems.meteoOptions[meteo_var_name], self.inputDir)
+        # - variables of the Penman-Monteith method that are calculated (if not given) and the units of the radiation input
+        self.wind_speed_from_components               = iniItems.get_option('meteoOptions', 'wind_speed_10m') is None
+        self.extraterestrial_radiation_calculated     = iniItems.get_option('meteoOptions', 'extraterestrial_radiation') is None
+        self.extraterestrial_radiation_in_w_per_m2    = iniItems.get_boolean_option('meteoOptions', 'extraterestrial_radiation_input_in_w_per_m2')
+        self.shortwave_radiation_in_w_per_m2          = iniItems.get_boolean_option('meteoOptions', 'shortwave_radiation_input_in_w_per_m2')
+        self.shortwave_radiation_from_net_radiation   = iniItems.meteoOptions.get('shortwave_radiation') == "None"
+        self.longwave_radiation_in_w_per_m2           = iniItems.get_boolean_option('meteoOptions', 'longwave_radiation_input_in_w_per_m2')
+        
         # make the iniItems available for the other modules:
         self.iniItems = iniItems
         
@@ -401,10 +433,19 @@ class Meteo(object):
         else:
             logger.info("No forcing downscaling is implemented.")
 
+        # engine for the forcing downscaling:
+        # - "pcraster" (default)
+        # - "numpy"           : one pass over the cells of meteoDownscaleIds for all forcing variables (with a zone index built once)
+        # - "numpy_with_check": as "numpy", but also using the "pcraster" method (its results are used) to log the differences and the calculation times
+        self.downscalingEngine = iniItems.get_choice_option('meteoDownscalingOptions', 'downscalingEngine', ["pcraster", "numpy", "numpy_with_check"], "pcraster")
+        self.downscalingZoneIndex = None
+        
+        # monthly lapse rates (slopes) for the downscaling, read once (per month) and kept in memory (see get_downscaling_lapse_rate)
+        self.downscalingLapseRates = {}
+
         # forcing smoothing options: - THIS is still experimental. PS: MUST BE TESTED.
         self.forcingSmoothing = False
-        if 'meteoDownscalingOptions' in iniItems.allSections and \
-           'smoothingWindowsLength' in list(iniItems.meteoDownscalingOptions.keys()):
+        if iniItems.get_option('meteoDownscalingOptions', 'smoothingWindowsLength') is not None:
 
             if float(iniItems.meteoDownscalingOptions['smoothingWindowsLength']) > 0.0:
                 self.forcingSmoothing = True
@@ -429,27 +470,8 @@ class Meteo(object):
             return -1
 
 
-    def update(self, routing, currTimeStep):
+    def update_referencePotET(self, currTimeStep):
 
-        # Downscaling precipitation
-        self.precipitation_before_downscaling = pcr.ifthen(self.landmask, self.precipitation)
-        if self.downscalePrecipitationOption: self.downscalePrecipitation(currTimeStep)
-
-        # downscaling temperature average       
-        self.temperature_before_downscaling = pcr.ifthen(self.landmask, self.temperature)
-        if self.downscaleTemperatureOption: self.downscaleTemperature(currTimeStep)
-
-        # downscaling temperature min       
-        if self.air_temperature_min is not None and self.downscaleTemperatureOption:
-            self.air_temperature_min = self.downscaleTemperatureFunction(currTimeStep, self.air_temperature_min)
-            self.air_temperature_min = pcr.min(self.temperature, self.air_temperature_min)
-            
-        # downscaling temperature max       
-        if self.air_temperature_max is not None and self.downscaleTemperatureOption:
-            self.air_temperature_max = self.downscaleTemperatureFunction(currTimeStep, self.air_temperature_max)
-            self.air_temperature_max = pcr.max(self.temperature, self.air_temperature_max)
-        
-        # calculate or obtain referencePotET
         if self.refETPotMethod == 'Hamon':
             
             msg = "Calculating reference potential evaporation based on the Hamon method"
@@ -488,8 +510,7 @@ class Meteo(object):
             
 
             # wind speed (m.s-1)
-            if ('wind_speed_10m' not in list(self.iniItems.meteoOptions.keys())) or \
-                                            (self.iniItems.meteoOptions['wind_speed_10m'] == "None"): 
+            if self.wind_speed_from_components: 
                 msg = "Calculating wind speed based on their u and v components"
                 logger.info(msg)
                 self.wind_speed_10m = (self.wind_speed_10m_u_comp**2. + self.wind_speed_10m_v_comp**2.)**(0.5)
@@ -502,8 +523,7 @@ class Meteo(object):
 
             # extraterestrial radiation
             
-            if ('extraterestrial_radiation' not in list(self.iniItems.meteoOptions.keys())) or \
-                                                       (self.iniItems.meteoOptions['extraterestrial_radiation'] == "None"):
+            if self.extraterestrial_radiation_calculated:
                 
                 msg = "Estimating extraterestrial radiation based on Dingman's Physical Geography (2015)"
                 logger.info(msg)
@@ -511,10 +531,9 @@ class Meteo(object):
                 # get the day angle (rad)
                 # - julian day
                 julian_day    = currTimeStep.doy
-                #~ julian_day = penman_monteith.shortwave_radiation.get_julian_day_number(currTimeStep._currTimeFull)
+                #~ julian_day = penman_monteith.shortwave_radiation.get_julian_day_number(currTimeStep.currTimeFull)
                 # - number of days in a year
-                number_days = 365
-                if calendar.isleap(currTimeStep.year): number_days = 366
+                number_days = currTimeStep.daysInYear
                 # - day angle (rad)
                 day_angle = float(julian_day - 1) / number_days * 2 * math.pi
 
@@ -549,8 +568,7 @@ class Meteo(object):
             # TODO: There is a case that we don't need extraterestrial shortwave radiation (e.g. if shortwave and longwave have been provided). 
 
             # set the extraterestrial radiation unit to W.m-2
-            if "extraterestrial_radiation_input_in_w_per_m2" in list(self.iniItems.meteoOptions.keys()) and \
-                                                              (self.iniItems.meteoOptions['extraterestrial_radiation_input_in_w_per_m2'] == "True"): 
+            if self.extraterestrial_radiation_in_w_per_m2: 
                 self.extraterestrial_radiation  = pcr.max(0.0, self.extraterestrial_radiation) 
             else:
                 self.extraterestrial_radiation  = pcr.max(0.0, self.extraterestrial_radiation / 1e6) / 0.0864
@@ -561,69 +579,8 @@ class Meteo(object):
             #~ os.system("killall aguila")
 
 
-            # shortwave radiation
-            
-            if self.iniItems.meteoOptions['shortwave_radiation'].endswith(('.nc', '.nc4', '.nc3')):
-
-                msg = "Shortwave (solar) radiation is obtained from the input file."
-                logger.info(msg)
-                
-
-            if self.iniItems.meteoOptions['shortwave_radiation'] == "None":
-        
-                msg = "Estimating shortwave (solar) radiation based on the input of net radiation and albedo."
-                logger.info(msg)
-                
-                self.shortwave_radiation = self.surface_net_solar_radiation / (pcr.spatial(pcr.scalar(1.0)) - self.albedo)
-                
-
-            if self.sw_rad_based_on_bristow_campbell == True:
-
-                msg = "Estimating shortwave (solar) radiation based on an adaptation of the Bristow-Campbell model by Winslow et al (2001)."
-                logger.info(msg)
-                
-                # TODO: Note initiating shortwave_radiation module still must be done at every time step as temp_annual and delta_temp_mean is defined on the 'init' part)
-
-                # initiate short wave radiation class with the the solar constant = 118.1 MJ/m2/day
-                self.sw_rad_model = sw_rad.ShortwaveRadiation(latitude        = self.latitudes, \
-                                                              elevation       = self.elevation_meteo, \
-                                                              temp_annual     = self.avgAnnualTemperature, \
-                                                              delta_temp_mean = self.avgAnnualDiurnalDeltaTemp, \
-                                                              solar_constant  = 118.1)
-			    
-                #~ # initiate short wave radiation class with the the solar constant = 1362 W.m-2
-                #~ self.sw_rad_model = sw_rad.ShortwaveRadiation(latitude        = self.latitudes, \
-                                                              #~ elevation       = elevation_meteo, \
-                                                              #~ temp_annual     = self.avgAnnualTemperature, \
-                                                              #~ delta_temp_mean = self.avgAnnualDiurnalDeltaTemp, \
-                                                              #~ solar_constant  = 1362.0)
-			    
-                # - TODO: set solar_constant in the configuration file                                              
-
-                # the 'sw_rad_model' needs the radiation input in MJ/m2/day (given the solar constant = 118.1 MJ/m2/day)
-                extraterrestrial_rad_in_watt_per_m2 = self.extraterestrial_radiation
-                extraterrestrial_rad = extraterrestrial_rad_in_watt_per_m2 * 0.0864
-
-                # calculate shortwave_radiation
-                self.sw_rad_model.update(date                 = currTimeStep._currTimeFull, \
-                                         prec_daily           = self.precipitation, \
-                                         temp_min_daily       = self.air_temperature_min, \
-                                         temp_max_daily       = self.air_temperature_max, \
-                                         temp_avg_daily       = self.temperature, \
-                                         dew_temperature      = self.dewpoint_temperature_avg, \
-                                         extraterrestrial_rad = extraterrestrial_rad,\
-                                         relative_humidity    = self.relative_humidity
-                                         )
-                
-                # using the values from the shortwave radiation model (unit: J.m-2.day-1)
-                self.shortwave_radiation       = self.sw_rad_model.radsw_act * 1e6
-            
-            # set the shortwave radiation unit to W.m-2
-            if "shortwave_radiation_input_in_w_per_m2" in list(self.iniItems.meteoOptions.keys()) and \
-                                                        (self.iniItems.meteoOptions['shortwave_radiation_input_in_w_per_m2'] == "True"): 
-                self.shortwave_radiation = pcr.max(0.0, self.shortwave_radiation) 
-            else:
-                self.shortwave_radiation = pcr.max(0.0, self.shortwave_radiation / 1e6) / 0.0864
+            # shortwave radiation (unit: W.m-2)
+            self.update_shortwave_radiation(currTimeStep)
 
             #~ # debug
             #~ pcr.aguila(self.shortwave_radiation)
@@ -632,8 +589,7 @@ class Meteo(object):
 
             # longwave radiation
             
-            if "longwave_radiation" in list(self.iniItems.meteoOptions.keys()) and\
-                                            self.iniItems.meteoOptions['longwave_radiation'].endswith(('.nc', '.nc4', '.nc3')):
+            if 'longwave_radiation' in self.extra_meteo_files:
 
                 msg = "Longwave radiation is obtained from the input file."
                 logger.info(msg)
@@ -641,8 +597,7 @@ class Meteo(object):
                 # make sure that longwave radiation unit is W.m-2
                 # - note that the default unit for the input file defined in the configuration file is J.m-2.day-1
                 # - therefore we have set the longwave radiation unit to W.m-2
-                if "longwave_radiation_input_in_w_per_m2" in list(self.iniItems.meteoOptions.keys()) and \
-                                                            (self.iniItems.meteoOptions['longwave_radiation_input_in_w_per_m2'] == "True"): 
+                if self.longwave_radiation_in_w_per_m2: 
                     self.longwave_radiation = pcr.max(0.0, self.longwave_radiation) 
                 else:
                     self.longwave_radiation = pcr.max(0.0, self.longwave_radiation / 1e6) / 0.0864
@@ -675,10 +630,206 @@ class Meteo(object):
                                                                                   relativeHumidity    = self.relative_humidity,\
                                                                                   timeStepLength      = 86400)
 
+    def update_shortwave_radiation(self, currTimeStep):
+
+        # shortwave radiation, needed for the Penman-Monteith method
+
+        if 'shortwave_radiation' in self.extra_meteo_files:
+
+            msg = "Shortwave (solar) radiation is obtained from the input file."
+            logger.info(msg)
+            
+
+        if self.shortwave_radiation_from_net_radiation:
+    
+            msg = "Estimating shortwave (solar) radiation based on the input of net radiation and albedo."
+            logger.info(msg)
+            
+            self.shortwave_radiation = self.surface_net_solar_radiation / (pcr.spatial(pcr.scalar(1.0)) - self.albedo)
+            
+
+        if self.sw_rad_based_on_bristow_campbell == True:
+
+            msg = "Estimating shortwave (solar) radiation based on an adaptation of the Bristow-Campbell model by Winslow et al (2001)."
+            logger.info(msg)
+            
+            # TODO: Note initiating shortwave_radiation module still must be done at every time step as temp_annual and delta_temp_mean is defined on the 'init' part)
+
+            # initiate short wave radiation class with the the solar constant = 118.1 MJ/m2/day
+            self.sw_rad_model = sw_rad.ShortwaveRadiation(latitude        = self.latitudes, \
+                                                          elevation       = self.elevation_meteo, \
+                                                          temp_annual     = self.avgAnnualTemperature, \
+                                                          delta_temp_mean = self.avgAnnualDiurnalDeltaTemp, \
+                                                          solar_constant  = 118.1)
+
+            #~ # initiate short wave radiation class with the the solar constant = 1362 W.m-2
+            #~ self.sw_rad_model = sw_rad.ShortwaveRadiation(latitude        = self.latitudes, \
+                                                          #~ elevation       = elevation_meteo, \
+                                                          #~ temp_annual     = self.avgAnnualTemperature, \
+                                                          #~ delta_temp_mean = self.avgAnnualDiurnalDeltaTemp, \
+                                                          #~ solar_constant  = 1362.0)
+
+            # - TODO: set solar_constant in the configuration file                                              
+
+            # the 'sw_rad_model' needs the radiation input in MJ/m2/day (given the solar constant = 118.1 MJ/m2/day)
+            extraterrestrial_rad_in_watt_per_m2 = self.extraterestrial_radiation
+            extraterrestrial_rad = extraterrestrial_rad_in_watt_per_m2 * 0.0864
+
+            # calculate shortwave_radiation
+            self.sw_rad_model.update(date                 = currTimeStep.currTimeFull, \
+                                     prec_daily           = self.precipitation, \
+                                     temp_min_daily       = self.air_temperature_min, \
+                                     temp_max_daily       = self.air_temperature_max, \
+                                     temp_avg_daily       = self.temperature, \
+                                     dew_temperature      = self.dewpoint_temperature_avg, \
+                                     extraterrestrial_rad = extraterrestrial_rad,\
+                                     relative_humidity    = self.relative_humidity
+                                     )
+            
+            # using the values from the shortwave radiation model (unit: J.m-2.day-1)
+            self.shortwave_radiation       = self.sw_rad_model.radsw_act * 1e6
+        
+        # set the shortwave radiation unit to W.m-2
+        if self.shortwave_radiation_in_w_per_m2: 
+            self.shortwave_radiation = pcr.max(0.0, self.shortwave_radiation) 
+        else:
+            self.shortwave_radiation = pcr.max(0.0, self.shortwave_radiation / 1e6) / 0.0864
+
+
+    def update_referencePotET_with_numpy(self, currTimeStep):
+
+        # the cells used: landmask cells, or all cells if the values outside the landmask are needed (downscaling and smoothing)
+        if self.refETPotKernel is None:
+            if self.downscaleReferenceETPotOption or self.forcingSmoothing:
+                self.refETPotCellMask = vos.getCellMask(pcr.defined(self.latitudes))
+            else:
+                self.refETPotCellMask = vos.getCellMask(self.landmask)
+            self.refETPotKernel = ref_pot_et_numpy.ReferencePotETKernel(vos.pcr2numpyAtCells(self.latitudes, self.refETPotCellMask))
+        cellMask = self.refETPotCellMask
+        kernel   = self.refETPotKernel
+
+        # the input fields that are converted (in their units) by the calculation; needed again for the "pcraster" method
+        if self.refETPotEngine == "numpy_with_check":
+            inputFields = {}
+            for var in ['wind_speed_10m', 'extraterestrial_radiation', 'shortwave_radiation', 'longwave_radiation']:
+                if var in vars(self): inputFields[var] = vars(self)[var]
+
+        start = time.time()
+
+        temperature = vos.pcr2numpyAtCells(self.temperature, cellMask)
+
+        if self.refETPotMethod == 'Hamon':
+
+            msg = "Calculating reference potential evaporation based on the Hamon method (numpy)"
+            logger.info(msg)
+
+            referencePotET = kernel.hamon(temperature, currTimeStep.doy)
+
+        if self.refETPotMethod == 'Penman-Monteith':
+
+            msg = "Calculating reference potential evaporation based on the Penman-Monteith (numpy)"
+            logger.info(msg)
+
+            # actual vapour pressure (Pa) based on relative humidity or on dew point temperature
+            relativeHumidity = None
+            vapourPressure   = None
+            if self.relative_humidity is not None:
+                relativeHumidity = vos.pcr2numpyAtCells(self.relative_humidity, cellMask)
+                vapourPressure   = relativeHumidity * ref_pot_et_numpy.saturatedVapourPressure(temperature)
+            if vapourPressure is None and self.dewpoint_temperature_avg is not None:
+                vapourPressure   = ref_pot_et_numpy.saturatedVapourPressure(vos.pcr2numpyAtCells(self.dewpoint_temperature_avg, cellMask))
+
+            # wind speed (m.s-1)
+            if self.wind_speed_from_components:
+                windSpeed = (vos.pcr2numpyAtCells(self.wind_speed_10m_u_comp, cellMask)**2. + \
+                             vos.pcr2numpyAtCells(self.wind_speed_10m_v_comp, cellMask)**2.)**(0.5)
+                self.wind_speed_10m = vos.numpyAtCells2pcr(windSpeed, cellMask)
+            else:
+                windSpeed = vos.pcr2numpyAtCells(self.wind_speed_10m, cellMask)
+
+            # extraterestrial radiation (J.m-2.day-1, unless given in W.m-2), calculated (and cached per day of year) or from the input file
+            if self.extraterestrial_radiation_calculated:
+                number_days = currTimeStep.daysInYear
+                extraterrestrialRadiation = kernel.extraterrestrialRadiation(currTimeStep.doy, number_days, solar_constant = 118.1) * 1e6
+            else:
+                extraterrestrialRadiation = vos.pcr2numpyAtCells(self.extraterestrial_radiation, cellMask)
+            # - set the extraterestrial radiation unit to W.m-2
+            if self.extraterestrial_radiation_in_w_per_m2:
+                extraterrestrialRadiation = np.maximum(0.0, extraterrestrialRadiation)
+            else:
+                extraterrestrialRadiation = np.maximum(0.0, extraterrestrialRadiation / 1e6) / 0.0864
+            self.extraterestrial_radiation = vos.numpyAtCells2pcr(extraterrestrialRadiation, cellMask)
+
+            # shortwave radiation (unit: W.m-2)
+            self.update_shortwave_radiation(currTimeStep)
+            shortwaveRadiation = vos.pcr2numpyAtCells(self.shortwave_radiation, cellMask)
+
+            # longwave radiation (unit: W.m-2) from the input file; if None, it is estimated in the kernel
+            longwaveRadiation = None
+            if 'longwave_radiation' in self.extra_meteo_files:
+                longwaveRadiation = vos.pcr2numpyAtCells(self.longwave_radiation, cellMask)
+                if self.longwave_radiation_in_w_per_m2:
+                    longwaveRadiation = np.maximum(0.0, longwaveRadiation)
+                else:
+                    longwaveRadiation = np.maximum(0.0, longwaveRadiation / 1e6) / 0.0864
+
+            # referencePotET in m.day-1, longwave and net radiation in W.m**-2
+            referencePotET, longwaveRadiation, netRadiation = \
+                kernel.penmanMonteith(self.penman_monteith,\
+                                      temperature               = temperature,\
+                                      windSpeed                 = windSpeed,\
+                                      atmosphericPressure       = vos.pcr2numpyAtCells(self.atmospheric_pressure, cellMask),\
+                                      shortwaveRadiation        = shortwaveRadiation,\
+                                      extraterrestrialRadiation = extraterrestrialRadiation,\
+                                      longwaveRadiation         = longwaveRadiation,\
+                                      unsatVapPressure          = vapourPressure,\
+                                      relativeHumidity          = relativeHumidity,\
+                                      timeStepLength            = 86400)
+            self.longwave_radiation = vos.numpyAtCells2pcr(longwaveRadiation, cellMask)
+            self.net_radiation      = vos.numpyAtCells2pcr(netRadiation, cellMask)
+
+        numpyTime = time.time() - start
+
+        if self.refETPotEngine == "numpy_with_check":
+
+            # the pcraster calculation is the reference; its results are used
+            for var in inputFields.keys(): vars(self)[var] = inputFields[var]
+            start = time.time()
+            self.update_referencePotET(currTimeStep)
+            pcrasterTime = time.time() - start
+
+            difference = np.nanmax(np.abs(referencePotET - vos.pcr2numpyAtCells(self.referencePotET, cellMask))) if referencePotET.size > 0 else 0.0
+            msg = 'Reference potential evaporation (numpy vs pcraster): max abs difference = %e ; time numpy = %.4f s ; pcraster = %.4f s' %(difference, numpyTime, pcrasterTime)
+            logger.info(msg)
+            return
+
+        self.referencePotET = vos.numpyAtCells2pcr(referencePotET, cellMask)
+
+    def update(self, routing, currTimeStep):
+
+        self.precipitation_before_downscaling = pcr.ifthen(self.landmask, self.precipitation)
+        self.temperature_before_downscaling = pcr.ifthen(self.landmask, self.temperature)
+
+        # Downscaling precipitation and temperature (average, min and max)
+        if self.downscalingEngine in ["numpy", "numpy_with_check"] and (self.downscalePrecipitationOption or self.downscaleTemperatureOption):
+            self.downscale_forcing_with_numpy(currTimeStep)
+        else:
+            self.downscale_forcing(currTimeStep)
+        
+        # calculate or obtain referencePotET
+        if self.refETPotEngine in ["numpy", "numpy_with_check"] and self.refETPotMethod in ['Hamon', 'Penman-Monteith']:
+            self.update_referencePotET_with_numpy(currTimeStep)
+        else:
+            self.update_referencePotET(currTimeStep)
+
 
         # Downscaling referenceETPot (based on temperature)
         self.referencePotET_before_downscaling = self.referencePotET
-        if self.downscaleReferenceETPotOption: self.downscaleReferenceETPot(currTimeStep)
+        if self.downscaleReferenceETPotOption:
+            if self.downscalingEngine in ["numpy", "numpy_with_check"]:
+                self.downscale_referencePotET_with_numpy(currTimeStep)
+            else:
+                self.downscaleReferenceETPot(currTimeStep)
  
         # smoothing:
         if self.forcingSmoothing == True:
@@ -734,10 +885,7 @@ class Meteo(object):
 
 
         if self.report == True:
-            timeStamp = datetime.datetime(currTimeStep.year,\
-                                          currTimeStep.month,\
-                                          currTimeStep.day,\
-                                          0)
+            timeStamp = currTimeStep.currTimeFull
             # writing daily output to netcdf files
             timestepPCR = currTimeStep.timeStepPCR
             if self.outDailyTotNC[0] != "None":
@@ -860,26 +1008,179 @@ class Meteo(object):
                                          timeStamp,currTimeStep.annuaIdx-1)
 
 
+    def get_downscaling_lapse_rate(self, variable, month, correlationCriteria):
+        
+        # returns the lapse rate (slope) of 'precipitation' or 'temperature' for the month, only where the correlation meets the correlationCriteria (otherwise zero)
+        # - the slopes are read only once and kept in memory (for the 12 months)
+        
+        key = (variable, month, correlationCriteria)
+        if key in self.downscalingLapseRates: return self.downscalingLapseRates[key]
+
+        if variable == 'precipitation':
+            preSlope = 0.001 * vos.netcdf2PCRobjClone(\
+                               self.precipLapseRateNC, 'precipitation',\
+                               month, useDoy = "Yes",\
+                               cloneMapFileName=self.cloneMap,\
+                               LatitudeLongitude = True)
+            preSlope = pcr.cover(preSlope, 0.0)
+            preSlope = pcr.max(0.,preSlope)
+            
+            preCriteria = vos.netcdf2PCRobjClone(\
+                         self.precipitCorrelNC, 'precipitation',\
+                         month, useDoy = "Yes",\
+                         cloneMapFileName=self.cloneMap,\
+                         LatitudeLongitude = True)
+            preSlope = pcr.ifthenelse(preCriteria > correlationCriteria,\
+                       preSlope, 0.0)             
+            slope = pcr.cover(preSlope, 0.0)
+
+        if variable == 'temperature':
+            tmpSlope = 1.000 * vos.netcdf2PCRobjClone(\
+                               self.temperLapseRateNC, 'temperature',\
+                               month, useDoy = "Yes",\
+                               cloneMapFileName=self.cloneMap,\
+                               LatitudeLongitude = True)
+            tmpSlope = pcr.min(0.,tmpSlope)  # must be negative
+            tmpCriteria = vos.netcdf2PCRobjClone(\
+                          self.temperatCorrelNC, 'temperature',\
+                          month, useDoy = "Yes",\
+                          cloneMapFileName=self.cloneMap,\
+                          LatitudeLongitude = True)
+            tmpSlope = pcr.ifthenelse(tmpCriteria < correlationCriteria,\
+                       tmpSlope, 0.0)             
+            slope = pcr.cover(tmpSlope, 0.0)
+        
+        logger.debug("The downscaling lapse rate of " + variable + " for the month " + str(month) + " is read.")
+        self.downscalingLapseRates[key] = slope
+        return slope
+
+    def get_downscaling_zone_index(self):
+
+        # zone index of the meteoDownscaleIds, built once, with the (constant) anomalyDEM and cellArea values at its cells
+        if self.downscalingZoneIndex is None:
+            self.downscalingZoneIndex = vos.getZoneIndex(self.meteoDownscaleIds, pcr.defined(self.latitudes))
+            cellMask = self.downscalingZoneIndex['cellMask']
+            self.downscalingZoneIndex['anomalyDEM'] = vos.pcr2numpyAtCells(self.anomalyDEM, cellMask)
+            self.downscalingZoneIndex['cellArea']   = vos.pcr2numpyAtCells(self.cellArea, cellMask)
+            self.downscalingZoneIndex['latitudes']  = vos.pcr2numpyAtCells(self.latitudes, cellMask)
+            self.downscalingZoneIndex['hamon']      = ref_pot_et_numpy.ReferencePotETKernel(self.downscalingZoneIndex['latitudes'])
+        return self.downscalingZoneIndex
+
+    def downscale_forcing_with_numpy(self, currTimeStep, minCorrelationCriteria = 0.85, drizzle_limit = 0.001, maxCorrelationCriteria = -0.75):
+
+        # downscaling precipitation, temperature and minimum and maximum temperature in one pass over the cells of meteoDownscaleIds
+        # - as downscalePrecipitation(useFactor = True, considerCellArea = True), downscaleTemperature(useFactor = False) and downscaleTemperatureFunction(useFactor = False)
+        # - outside meteoDownscaleIds, precipitation is not changed and temperature values are missing (as in the "pcraster" method)
+        
+        zone_index = self.get_downscaling_zone_index()
+        cellMask   = zone_index['cellMask']
+        anomalyDEM = zone_index['anomalyDEM']
+        
+        start = time.time()
+        
+        results = {}
+        
+        if self.downscalePrecipitationOption:
+            precipitation = vos.pcr2numpyAtCells(self.precipitation, cellMask)
+            preSlope = vos.pcr2numpyAtCells(self.get_downscaling_lapse_rate('precipitation', currTimeStep.month, minCorrelationCriteria), cellMask)
+            # - avoid zero factor
+            factor = np.maximum(drizzle_limit, np.maximum(0., precipitation + preSlope * anomalyDEM)) * zone_index['cellArea']
+            factor = factor / vos.getZoneAverage(factor, zone_index)[zone_index['zone']]
+            # - do not downscale drizzle
+            factor = np.where(precipitation > drizzle_limit, factor, 1.00)
+            factor = np.where(np.isfinite(factor), factor, 1.0)
+            results['precipitation'] = np.maximum(0.0, factor * precipitation)
+        
+        if self.downscaleTemperatureOption:
+            tmpSlope = vos.pcr2numpyAtCells(self.get_downscaling_lapse_rate('temperature', currTimeStep.month, maxCorrelationCriteria), cellMask)
+            results['temperature'] = vos.pcr2numpyAtCells(self.temperature, cellMask) + tmpSlope * anomalyDEM
+            if self.air_temperature_min is not None:
+                results['air_temperature_min'] = np.minimum(results['temperature'], vos.pcr2numpyAtCells(self.air_temperature_min, cellMask) + tmpSlope * anomalyDEM)
+            if self.air_temperature_max is not None:
+                results['air_temperature_max'] = np.maximum(results['temperature'], vos.pcr2numpyAtCells(self.air_temperature_max, cellMask) + tmpSlope * anomalyDEM)
+        
+        numpyTime = time.time() - start
+        
+        if self.downscalingEngine == "numpy_with_check":
+            
+            # the pcraster calculation is the reference; its results are used
+            start = time.time()
+            self.downscale_forcing(currTimeStep)
+            pcrasterTime = time.time() - start
+            
+            maximumDifference = 0.0
+            for var in sorted(results.keys()):
+                if results[var].size == 0: continue
+                difference = np.nanmax(np.abs(results[var] - vos.pcr2numpyAtCells(vars(self)[var], cellMask)))
+                maximumDifference = max(maximumDifference, difference)
+                logger.debug('Forcing downscaling (numpy vs pcraster): max abs difference %s = %e' %(var, difference))
+            msg = 'Forcing downscaling (numpy vs pcraster): max abs difference = %e ; time numpy = %.4f s ; pcraster = %.4f s' %(maximumDifference, numpyTime, pcrasterTime)
+            logger.info(msg)
+            return
+        
+        if 'precipitation' in results: self.precipitation = pcr.cover(vos.numpyAtCells2pcr(results['precipitation'], cellMask), self.precipitation)
+        for var in ['temperature', 'air_temperature_min', 'air_temperature_max']:
+            if var in results: vars(self)[var] = vos.numpyAtCells2pcr(results[var], cellMask)
+
+    def downscale_referencePotET_with_numpy(self, currTimeStep, min_limit = 0.001):
+
+        # as downscaleReferenceETPot(usingHamon = True, considerCellArea = True), at the cells of meteoDownscaleIds (outside them, referencePotET is not changed)
+
+        zone_index = self.get_downscaling_zone_index()
+        cellMask   = zone_index['cellMask']
+        
+        start = time.time()
+        
+        referencePotET = vos.pcr2numpyAtCells(self.referencePotET, cellMask)
+        
+        # factor is based on hamon reference potential evaporation using high resolution temperature; avoid zero factor
+        factor = zone_index['hamon'].hamon(vos.pcr2numpyAtCells(self.temperature, cellMask), currTimeStep.doy)
+        factor = np.maximum(min_limit, np.maximum(0.0, factor)) * zone_index['cellArea']
+        factor = factor / vos.getZoneAverage(factor, zone_index)[zone_index['zone']]
+        # - do not downscale small values
+        factor = np.where(referencePotET > min_limit, factor, 1.00)
+        factor = np.where(np.isfinite(factor), factor, 1.0)
+        referencePotET = np.maximum(0.0, factor * referencePotET)
+        
+        numpyTime = time.time() - start
+        
+        if self.downscalingEngine == "numpy_with_check":
+            
+            # the pcraster calculation is the reference; its results are used
+            start = time.time()
+            self.downscaleReferenceETPot(currTimeStep)
+            pcrasterTime = time.time() - start
+            
+            difference = np.nanmax(np.abs(referencePotET - vos.pcr2numpyAtCells(self.referencePotET, cellMask))) if referencePotET.size > 0 else 0.0
+            msg = 'Reference potential evaporation downscaling (numpy vs pcraster): max abs difference = %e ; time numpy = %.4f s ; pcraster = %.4f s' %(difference, numpyTime, pcrasterTime)
+            logger.info(msg)
+            return
+        
+        self.referencePotET = pcr.cover(vos.numpyAtCells2pcr(referencePotET, cellMask), self.referencePotET)
+
+    def downscale_forcing(self, currTimeStep):
+
+        # Downscaling precipitation
+        if self.downscalePrecipitationOption: self.downscalePrecipitation(currTimeStep)
+
+        # downscaling temperature average       
+        if self.downscaleTemperatureOption: self.downscaleTemperature(currTimeStep)
+
+        # downscaling temperature min       
+        if self.air_temperature_min is not None and self.downscaleTemperatureOption:
+            self.air_temperature_min = self.downscaleTemperatureFunction(currTimeStep, self.air_temperature_min)
+            self.air_temperature_min = pcr.min(self.temperature, self.air_temperature_min)
+            
+        # downscaling temperature max       
+        if self.air_temperature_max is not None and self.downscaleTemperatureOption:
+            self.air_temperature_max = self.downscaleTemperatureFunction(currTimeStep, self.air_temperature_max)
+            self.air_temperature_max = pcr.max(self.temperature, self.air_temperature_max)
+
     def downscalePrecipitation(self, currTimeStep, useFactor = True, minCorrelationCriteria = 0.85, drizzle_limit = 0.001, considerCellArea = True):
         
         # TODO: add CorrelationCriteria in the config file
         
-        preSlope = 0.001 * vos.netcdf2PCRobjClone(\
-                           self.precipLapseRateNC, 'precipitation',\
-                           currTimeStep.month, useDoy = "Yes",\
-                           cloneMapFileName=self.cloneMap,\
-                           LatitudeLongitude = True)
-        preSlope = pcr.cover(preSlope, 0.0)
-        preSlope = pcr.max(0.,preSlope)
-        
-        preCriteria = vos.netcdf2PCRobjClone(\
-                     self.precipitCorrelNC, 'precipitation',\
-                     currTimeStep.month, useDoy = "Yes",\
-                     cloneMapFileName=self.cloneMap,\
-                     LatitudeLongitude = True)
-        preSlope = pcr.ifthenelse(preCriteria > minCorrelationCriteria,\
-                   preSlope, 0.0)             
-        preSlope = pcr.cover(preSlope, 0.0)
+        preSlope = self.get_downscaling_lapse_rate('precipitation', currTimeStep.month, minCorrelationCriteria)
     
         if useFactor == True:
             factor = pcr.max(0., self.precipitation + preSlope * self.anomalyDEM)
@@ -911,20 +1212,7 @@ class Meteo(object):
         
         # TODO: add CorrelationCriteria in the config file
 
-        tmpSlope = 1.000 * vos.netcdf2PCRobjClone(\
-                           self.temperLapseRateNC, 'temperature',\
-                           currTimeStep.month, useDoy = "Yes",\
-                           cloneMapFileName=self.cloneMap,\
-                           LatitudeLongitude = True)
-        tmpSlope = pcr.min(0.,tmpSlope)  # must be negative
-        tmpCriteria = vos.netcdf2PCRobjClone(\
-                      self.temperatCorrelNC, 'temperature',\
-                      currTimeStep.month, useDoy = "Yes",\
-                      cloneMapFileName=self.cloneMap,\
-                      LatitudeLongitude = True)
-        tmpSlope = pcr.ifthenelse(tmpCriteria < maxCorrelationCriteria,\
-                   tmpSlope, 0.0)             
-        tmpSlope = pcr.cover(tmpSlope, 0.0)
+        tmpSlope = self.get_downscaling_lapse_rate('temperature', currTimeStep.month, maxCorrelationCriteria)
     
         if useFactor == True:
             temperatureInKelvin = self.temperature + zeroCelciusInKelvin
@@ -941,20 +1229,7 @@ class Meteo(object):
         
         # TODO: add CorrelationCriteria in the config file
 
-        tmpSlope = 1.000 * vos.netcdf2PCRobjClone(\
-                           self.temperLapseRateNC, 'temperature',\
-                           currTimeStep.month, useDoy = "Yes",\
-                           cloneMapFileName=self.cloneMap,\
-                           LatitudeLongitude = True)
-        tmpSlope = pcr.min(0.,tmpSlope)  # must be negative
-        tmpCriteria = vos.netcdf2PCRobjClone(\
-                      self.temperatCorrelNC, 'temperature',\
-                      currTimeStep.month, useDoy = "Yes",\
-                      cloneMapFileName=self.cloneMap,\
-                      LatitudeLongitude = True)
-        tmpSlope = pcr.ifthenelse(tmpCriteria < maxCorrelationCriteria,\
-                   tmpSlope, 0.0)             
-        tmpSlope = pcr.cover(tmpSlope, 0.0)
+        tmpSlope = self.get_downscaling_lapse_rate('temperature', currTimeStep.month, maxCorrelationCriteria)
     
         if useFactor == True:
             temperatureInKelvin = input_temperature + zeroCelciusInKelvin
@@ -1011,18 +1286,13 @@ class Meteo(object):
         
         # method for finding time indexes in the precipitation netdf file:
         # - the default one
-        method_for_time_index = None
-        method_for_time_index = "daily"
-        # - based on the ini/configuration file (if given)
-        if 'time_index_method_for_precipitation_netcdf' in list(self.iniItems.meteoOptions.keys()) and\
-                                                           self.iniItems.meteoOptions['time_index_method_for_precipitation_netcdf'] != "None":
-            method_for_time_index = self.iniItems.meteoOptions['time_index_method_for_precipitation_netcdf']
+        # - the default one ("daily") or based on the ini/configuration file (if given)
+        method_for_time_index = self.precipitation_time_index_method
         
         # reading precipitation:
         netcdf_file_name = self.preFileNC
 
-        if ("precipitation_file_per_month" in list(self.iniItems.meteoOptions.keys())) and\
-                                                  (self.iniItems.meteoOptions['precipitation_file_per_month'] == "True"):
+        if self.precipitation_file_per_month:
             try:
                 netcdf_file_name = self.preFileNC %(int(currTimeStep.year), int(currTimeStep.month), int(currTimeStep.month), int(currTimeStep.year))
             except:
@@ -1062,18 +1332,13 @@ class Meteo(object):
         
         # method for finding time index in the temperature netdf file:
         # - the default one
-        method_for_time_index = None
-        method_for_time_index = "daily"
-        # - based on the ini/configuration file (if given)
-        if 'time_index_method_for_temperature_netcdf' in list(self.iniItems.meteoOptions.keys()) and\
-                                                         self.iniItems.meteoOptions['time_index_method_for_temperature_netcdf'] != "None":
-            method_for_time_index = self.iniItems.meteoOptions['time_index_method_for_temperature_netcdf']
+        # - the default one ("daily") or based on the ini/configuration file (if given)
+        method_for_time_index = self.temperature_time_index_method
 
         # reading temperature
         netcdf_file_name = self.tmpFileNC
 
-        if ("temperature_file_per_month" in list(self.iniItems.meteoOptions.keys())) and\
-                                                 (self.iniItems.meteoOptions['temperature_file_per_month'] == "True"):
+        if self.temperature_file_per_month:
             try:
                 netcdf_file_name = self.tmpFileNC %(int(currTimeStep.year), int(currTimeStep.month), int(currTimeStep.month), int(currTimeStep.year))
             except:
@@ -1107,18 +1372,13 @@ class Meteo(object):
 
             # method for finding time indexes in the precipitation netdf file:
             # - the default one
-            method_for_time_index = None
-            method_for_time_index = "daily"
-            # - based on the ini/configuration file (if given)
-            if 'time_index_method_for_ref_pot_et_netcdf' in list(self.iniItems.meteoOptions.keys()) and\
-                                                            self.iniItems.meteoOptions['time_index_method_for_ref_pot_et_netcdf'] != "None":
-                method_for_time_index = self.iniItems.meteoOptions['time_index_method_for_ref_pot_et_netcdf']
+            # - the default one ("daily") or based on the ini/configuration file (if given)
+            method_for_time_index = self.refETPot_time_index_method
 
             # reading referencePotET
             netcdf_file_name = self.etpFileNC
 		    
-            if ("refETPotFileNC_file_per_month" in list(self.iniItems.meteoOptions.keys())) and\
-                                                       (self.iniItems.meteoOptions['refETPotFileNC_file_per_month'] == "True"):
+            if self.refETPotFileNC_file_per_month:
                 try:
                     netcdf_file_name = self.etpFileNC %(int(currTimeStep.year), int(currTimeStep.month), int(currTimeStep.month), int(currTimeStep.year))
                 except:
@@ -1152,12 +1412,12 @@ class Meteo(object):
         for meteo_var_name in self.extra_meteo_var_names:  
         #
             vars(self)[meteo_var_name] = None
-            if meteo_var_name in list(self.iniItems.meteoOptions.keys()) and self.iniItems.meteoOptions[meteo_var_name].endswith(('.nc', '.nc4', '.nc3')):
+            if meteo_var_name in self.extra_meteo_files:
                 
                 # read the file
                 method_for_time_index = None
                 method_for_time_index = "daily"
-                netcdf_file_name = vos.getFullPath(self.iniItems.meteoOptions[meteo_var_name], self.inputDir)
+                netcdf_file_name = self.extra_meteo_files[meteo_var_name]
                 vars(self)[meteo_var_name] = vos.netcdf2PCRobjClone(ncFile = netcdf_file_name,\
                                                                     varName = "automatic" ,
                                                                     dateInput = str(currTimeStep.fulldate),\
@@ -30,7 +30,10 @@ import datetime
 import time
 import re
 import glob
+import shutil
 import subprocess
+import tempfile
+import atexit
 import netCDF4 as nc
 import numpy as np
 import pcraster as pcr
@@ -38,37 +41,52 @@ import virtualOS as vos
 
 # TODO: defined the dictionary (e.g. filecache = dict()) to avoid open and closing files
 
+# template files (dimensions, coordinates and global attributes, without any variable) that are copied to create output files
+# - one template per file format, clone and set of attributes; shared by all PCR2netCDF objects of a run
+# - the template files are deleted at the end of the run
+templateFiles = {}
+
+def removeTemplateFiles():
+    for templateFileName in list(templateFiles.values()):
+        if os.path.exists(templateFileName): os.remove(templateFileName)
+    templateFiles.clear()
+
+atexit.register(removeTemplateFiles)
+
+def getCloneCoordinates():
+    '''returns the latitudes (from top to bottom) and longitudes of the cell centres of the clone map (calculated from its attributes)'''
+    clone = pcr.clone()
+    latitudes  = clone.north() - (np.arange(clone.nrRows()) + 0.5) * clone.cellSize()
+    longitudes = clone.west()  + (np.arange(clone.nrCols()) + 0.5) * clone.cellSize()
+    return latitudes, longitudes
+
 class PCR2netCDF():
     
     def __init__(self,iniItems,specificAttributeDictionary=None):
                 
         # cloneMap
         pcr.setclone(iniItems.cloneMap)
-        cloneMap = pcr.boolean(1.0)
         
-        # latitudes and longitudes
-        self.latitudes  = np.unique(pcr.pcr2numpy(pcr.ycoordinate(cloneMap), vos.MV))[::-1]
-        self.longitudes = np.unique(pcr.pcr2numpy(pcr.xcoordinate(cloneMap), vos.MV))
+        # latitudes and longitudes (cell centres, calculated from the clone attributes without any pass over the map)
+        self.latitudes, self.longitudes = getCloneCoordinates()
         
         # Let users decide what their preference regarding latitude order. 
         self.netcdf_y_orientation_follow_cf_convention = False
-        if 'netcdf_y_orientation_follow_cf_convention' in list(iniItems.reportingOptions.keys()) and\
-            iniItems.reportingOptions['netcdf_y_orientation_follow_cf_convention'] == "True":
+        if iniItems.get_boolean_option('reportingOptions', 'netcdf_y_orientation_follow_cf_convention'):
             msg = "Latitude (y) orientation for output netcdf files start from the bottom to top."
             self.netcdf_y_orientation_follow_cf_convention = True
-            self.latitudes  = np.unique(pcr.pcr2numpy(pcr.ycoordinate(cloneMap), vos.MV))
+            self.latitudes  = self.latitudes[::-1]
         
         # set the general netcdf attributes (based on the information given in the ini/configuration file) 
         self.set_general_netcdf_attributes(iniItems, specificAttributeDictionary)
         
         # netcdf format and zlib setup 
-        self.format = 'NETCDF3_CLASSIC'
+        self.format = iniItems.get_option('reportingOptions', 'formatNetCDF', 'NETCDF3_CLASSIC')
         self.zlib = False
-        if "formatNetCDF" in list(iniItems.reportingOptions.keys()):
-            self.format = str(iniItems.reportingOptions['formatNetCDF'])
-        if "zlib" in list(iniItems.reportingOptions.keys()):
-            if iniItems.reportingOptions['zlib'] == "True": self.zlib = True
+        if iniItems.get_boolean_option('reportingOptions', 'zlib'): self.zlib = True
         
+        # directory for the template files (the temporary directory of the run, if defined)
+        self.templateDir = getattr(iniItems, 'tmpDir', None)
 
         # if given in the ini file, use the netcdf as given in the section 'specific_attributes_for_netcdf_output_files'
         if 'specific_attributes_for_netcdf_output_files' in iniItems.allSections:
@@ -99,7 +117,7 @@ class PCR2netCDF():
                 print(ncAttributeKey, ncAttribute)
                 self.attributeDictionary[ncAttributeKey]= ncAttribute
 
-    def createNetCDF(self, ncFileName, varName, varUnits, longName = None, standardName= None):
+    def createTemplateFile(self, ncFileName):
 
         rootgrp = nc.Dataset(ncFileName,'w',format= self.format)
 
@@ -131,6 +149,35 @@ class PCR2netCDF():
         lat[:]= self.latitudes
         lon[:]= self.longitudes
 
+        attributeDictionary = self.attributeDictionary
+        for k, v in list(attributeDictionary.items()): setattr(rootgrp,k,v)
+
+        rootgrp.sync()
+        rootgrp.close()
+
+    def getTemplateFile(self):
+
+        # the template depends on the file format, the coordinates and the global attributes
+        key = (self.format, self.templateDir, \
+               len(self.latitudes),  float(self.latitudes[0]),  float(self.latitudes[-1]), \
+               len(self.longitudes), float(self.longitudes[0]), float(self.longitudes[-1]), \
+               tuple(sorted((str(k), str(v)) for k, v in list(self.attributeDictionary.items()))))
+
+        if key not in templateFiles or not os.path.exists(templateFiles[key]):
+            fileHandle, templateFileName = tempfile.mkstemp(prefix = "template_", suffix = ".nc", dir = self.templateDir)
+            os.close(fileHandle)
+            self.createTemplateFile(templateFileName)
+            templateFiles[key] = templateFileName
+
+        return templateFiles[key]
+
+    def createNetCDF(self, ncFileName, varName, varUnits, longName = None, standardName= None):
+
+        # the dimensions, coordinates and global attributes are copied from the template file
+        shutil.copyfile(self.getTemplateFile(), ncFileName)
+
+        rootgrp = nc.Dataset(ncFileName,'a')
+
         shortVarName = varName
         longVarName  = varName
         standardVarName = varName
@@ -142,12 +189,14 @@ class PCR2netCDF():
         var.long_name = longVarName
         var.units = varUnits
 
-        attributeDictionary = self.attributeDictionary
-        for k, v in list(attributeDictionary.items()): setattr(rootgrp,k,v)
-
         rootgrp.sync()
         rootgrp.close()
 
+    def createNetCDFs(self, netcdfFiles):
+
+        # netcdfFiles: list of (ncFileName, varName, varUnits, longName, standardName); all files are created from one template
+        for netcdfFile in netcdfFiles: self.createNetCDF(*netcdfFile)
+
     def changeAtrribute(self, ncFileName, attributeDictionary):
 
         rootgrp = nc.Dataset(ncFileName,'a')
@@ -71,6 +71,10 @@ if os.path.exists(logFileFolder) == False:
     os.makedirs(logFileFolder)
 generalConfiguration.initialize_logging(logFileFolder)
 
+# save the parsed configuration, so that the clone runs do not have to parse the ini file again (see the system argument -pc)
+parsedConfigurationFile = logFileFolder + os.path.basename(iniFileName) + ".parsed"
+generalConfiguration.save_parsed_configuration(parsedConfigurationFile)
+
 # copy ini file to the log folder:
 timestamp = datetime.datetime.now()
 logger.info('Copying ini file to the folder %s', logFileFolder)
@@ -120,7 +124,7 @@ if float(generalConfiguration.globalOptions['maxSpinUpsInYears']) > 0:
     logger.warning(msg)
     logger.warning(msg)
     logger.warning(msg)
-    if "with_merging" in list(generalConfiguration.globalOptions.keys()) and generalConfiguration.globalOptions["with_merging"] == "False":
+    if generalConfiguration.get_option('globalOptions', 'with_merging') == "False":
         with_merging_or_modflow = False
     else:
         msg = "You set this run (with spin-ups) either with modflow or merging processes. That is not possible."
@@ -162,12 +166,13 @@ if clone_codes[0] == "part_two":
 
 
 # command line(s) for PCR-GLOBWB 
+# - the clone runs do not make a backup of the python scripts (system argument -bs False), as it is made above in the global scripts folder
 logger.info('Running transient PCR-GLOBWB with/without MODFLOW ')
 i_clone = 0
 cmd = ''
 for clone_code in clone_codes:
 
-   cmd += "python deterministic_runner_glue_with_parallel_and_modflow_options.py " + iniFileName  + " " + debug_option + " " + clone_code + " "
+   cmd += "python deterministic_runner_glue_with_parallel_and_modflow_options.py " + iniFileName  + " " + debug_option + " " + clone_code + " -pc " + parsedConfigurationFile + " -bs False "
    cmd = cmd + " & "
    i_clone += 1
 
@@ -35,6 +35,7 @@ import meteo
 import landSurface
 import groundwater
 import routing
+import stateCheckpoint
 
 
 import logging
@@ -73,13 +74,41 @@ class PCRGlobWB(object):
         # number of upperSoilLayers:
         self.numberOfSoilLayers = int(configuration.landSurfaceOptions['numberOfUpperSoilLayers'])
 
+        # option to start from a (binary) state checkpoint file (see stateCheckpoint.py), instead of the initial condition maps given in the configuration file
+        checkpointState = None
+        if initialState is None and configuration.get_option('globalOptions', 'initialStateCheckpoint') is not None:
+            checkpointState, checkpointMetadata = stateCheckpoint.readStateCheckpoint(configuration.globalOptions["initialStateCheckpoint"], self.landmask)
+            initialState = checkpointState
+            if "date" in checkpointMetadata: logger.info("Starting from the states of %s.", checkpointMetadata["date"])
+
         # preparing sub-modules
         self.createSubmodels(initialState)
         
+        # - the fossil groundwater storage is not taken from the initial conditions of a spin-up; for a checkpoint restart, it is
+        if checkpointState is not None: self.setFossilGroundwaterState(checkpointState)
+
         # option to save monthly end states
-        self.save_monthly_end_states = False
-        if "save_monthly_end_states" in list(configuration.reportingOptions.keys()):
-            self.save_monthly_end_states = configuration.reportingOptions["save_monthly_end_states"] == "True"
+        self.save_monthly_end_states = configuration.get_boolean_option('reportingOptions', 'save_monthly_end_states')
+
+        # format of the saved/dumped states: 
+        # - "pcraster" (default): one pcraster map per state
+        # - "checkpoint"        : one (binary) state checkpoint file, states_<date>.npz (see stateCheckpoint.py), that can be used with the option initialStateCheckpoint 
+        # - "both"
+        self.endStateFormat = configuration.get_choice_option('reportingOptions', 'endStateFormat', ["pcraster", "checkpoint", "both"], "pcraster")
+
+        # option to evaluate all water balance checks (vos.waterBalanceCheck) of a time step together at the end of the time step: 
+        # - "immediate" (default): every check is evaluated when it is called 
+        # - "deferred"           : using a water balance ledger (see vos.WaterBalanceLedger), optionally only every waterBalanceCheckInterval time steps, 
+        #                          with the errors (and their locations) also written to the file waterBalanceErrorLog (in the log directory)
+        vos.waterBalanceLedger = None
+        if configuration.get_option('reportingOptions', 'waterBalanceCheckMethod') == "deferred":
+            checkInterval = 1
+            if configuration.get_option('reportingOptions', 'waterBalanceCheckInterval') is not None:
+                checkInterval = int(configuration.reportingOptions["waterBalanceCheckInterval"])
+            errorLogFileName = None
+            if configuration.get_option('reportingOptions', 'waterBalanceErrorLog') is not None:
+                errorLogFileName = os.path.join(configuration.logFileDir, configuration.reportingOptions["waterBalanceErrorLog"])
+            vos.waterBalanceLedger = vos.WaterBalanceLedger(checkInterval, errorLogFileName)
                     
         # option for debugging to PCR-GLOBWB version 1.0
         self.debug_to_version_one = False
@@ -121,6 +150,10 @@ class PCRGlobWB(object):
         
         state = self.getState()
         
+        if self.endStateFormat in ["checkpoint", "both"]:
+            stateCheckpoint.writeStateCheckpoint(os.path.join(outputDirectory, "states_" + specific_date_string + ".npz"), state, self.landmask, self._modelTime)
+            if self.endStateFormat == "checkpoint": return
+
         meteoState = state['meteo']
         for variable, map in list(meteoState.items()):
             vos.writePCRmapToDir(\
@@ -198,9 +231,27 @@ class PCRGlobWB(object):
         pass
 
 
-    #FIXME: implement
     def setState(self, state):
-        logger.error("cannot set state")
+        # set all states (a nested dictionary as given by getState, e.g. from a state checkpoint) as for the initial conditions of a spin-up
+        self.meteo.getICs(self._configuration, state)
+        self.landSurface.getInitialConditions(self._configuration, state)
+        self.groundwater.getICs(self._configuration, state)
+        self.routing.getICs(self._configuration, state)
+        self.setWaterBodyState(state)
+        self.setFossilGroundwaterState(state)
+
+    def setWaterBodyState(self, state):
+        # the lake and reservoir states are kept by the WaterBodies (the ones of the routing are overwritten by them every time step)
+        # - before the first time step, the WaterBodies are initialized from the routing states (see routing.update)
+        waterBodies = self.routing.WaterBodies
+        if 'waterBodyStorage' not in vars(waterBodies): return
+        waterBodies.getICs(state['routing'])
+        # - the water body table (numpy engine) keeps its own copy of these states
+        if waterBodies.waterBodyTable is not None: waterBodies.loadWaterBodyTableStates()
+
+    def setFossilGroundwaterState(self, state):
+        if 'storGroundwaterFossil' in state['groundwater'] and state['groundwater']['storGroundwaterFossil'] is not None:
+            self.groundwater.storGroundwaterFossil = state['groundwater']['storGroundwaterFossil']
 
         
     def report_summary(self, landWaterStoresAtBeginning, landWaterStoresAtEnd,\
@@ -464,6 +515,8 @@ class PCRGlobWB(object):
     def update(self, report_water_balance = False):
         logger.info("Updating model for time %s", self._modelTime)
         
+        if vos.waterBalanceLedger != None: vos.waterBalanceLedger.startTimeStep(self._modelTime.timeStepPCR)
+
         if (report_water_balance):
             landWaterStoresAtBeginning    = self.totalLandWaterStores()    # not including surface water bodies
             surfaceWaterStoresAtBeginning = self.totalSurfaceWaterStores()     
@@ -497,6 +550,9 @@ class PCRGlobWB(object):
             self.report_summary(landWaterStoresAtBeginning, landWaterStoresAtEnd,\
                                 surfaceWaterStoresAtBeginning, surfaceWaterStoresAtEnd)
 
+        # evaluate all water balance checks of this time step
+        if vos.waterBalanceLedger != None: vos.waterBalanceLedger.evaluate()
+
         if self._modelTime.isLastDayOfMonth():
             # make an empty file to indicate that the calculation for this month has done
             # - this is only needed for runs with merging and modflow processes
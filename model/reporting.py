@@ -36,6 +36,7 @@ Added reporting of variables within the eartH2Observe project
 
 import os
 import shutil
+import dis
 
 import logging
 logger = logging.getLogger(__name__)
@@ -46,6 +47,54 @@ from ncConverter import *
 
 import variable_list as varDicts
 
+# output types (suffixes of the netcdf file names) of the reporting plan (see Reporting.initiate_reporting)
+reportingOutputTypes = ['dailyTot', 'monthTot', 'monthAvg', 'monthEnd', 'monthMax', 'annuaTot', 'annuaAvg', 'annuaEnd', 'annuaMax', 'dailyTotUpsAvg']
+
+def getReferencedAttributes(function):
+    '''returns the names of the attributes of the Reporting object (self) that a derived variable function refers to'''
+    # - self.<name> in the function, in the functions it calls through its closure (e.g. soil in ulysses_derived_variables) and in the Reporting methods it calls
+    # - getattr(self, var) with var a default argument of the function (e.g. the volume variables)
+    names = set()
+    functions = [function]
+    visited = set()
+    while len(functions) > 0:
+        function = functions.pop()
+        function = getattr(function, '__func__', function)
+        if function in visited or not hasattr(function, '__code__'): continue
+        visited.add(function)
+        names.update([value for value in (function.__defaults__ or ()) if isinstance(value, str)])
+        functions += [cell.cell_contents for cell in (function.__closure__ or ()) if callable(cell.cell_contents)]
+        codes = [function.__code__]
+        while len(codes) > 0:
+            code = codes.pop()
+            codes += [const for const in code.co_consts if hasattr(const, 'co_code')]
+            previous = None
+            for instruction in dis.get_instructions(code):
+                if previous is not None and previous.argval == 'self' and previous.opname.startswith('LOAD_') and \
+                   instruction.opname in ['LOAD_ATTR', 'LOAD_METHOD']:
+                    names.add(instruction.argval)
+                    method = getattr(Reporting, instruction.argval, None)
+                    if callable(method): functions.append(method)
+                previous = instruction
+    return names
+
+def getVariablesToCalculate(variables, dependencies):
+    '''returns the given derived variables and all derived variables they depend on, ordered such that every variable comes after the ones it depends on'''
+    variables_to_calculate = []
+    visited = set()
+    for variable in variables:
+        stack = [(variable, False)]
+        while len(stack) > 0:
+            var, dependencies_done = stack.pop()
+            if dependencies_done:
+                variables_to_calculate.append(var)
+                continue
+            if var in visited: continue
+            visited.add(var)
+            stack.append((var, True))
+            stack += [(dependency, False) for dependency in dependencies[var] if dependency not in visited]
+    return variables_to_calculate
+
 class Reporting(object):
 
     def __init__(self, configuration, model, modelTime):
@@ -62,8 +111,7 @@ class Reporting(object):
 
         # landmask for reporting
         self.landmask_for_reporting = None
-        if "landmask_for_reporting" in list(configuration.reportingOptions.keys()) and\
-            self.configuration.reportingOptions["landmask_for_reporting"] != "None": 
+        if configuration.get_option('reportingOptions', 'landmask_for_reporting') is not None: 
             self.landmask_for_reporting = vos.readPCRmapClone(\
                                                               configuration.reportingOptions['landmask_for_reporting'], \
                                                               configuration.cloneMap, \
@@ -74,6 +122,79 @@ class Reporting(object):
         self.debug_to_version_one = False
         if self.configuration.debug_to_version_one: self.debug_to_version_one = True
 
+        # derived variables: functions (without arguments) that are evaluated (once per time step) only when the variables are requested (see __getattr__)
+        self.derived_variables   = {}
+        self.evaluated_variables = []
+        self.basic_derived_variables()
+        self.additional_derived_variables()
+        #-RvB 23/02/2017: post-processing for the eartH2Observe project
+        self.e2o_derived_variables()
+        # reporting, post-processing for the Ulysses project
+        self.ulysses_derived_variables()
+
+        # derived variables needed for reporting on every time step, depending on whether it is the end of a month and/or year
+        self.initiate_calculation_plan()
+
+        # option to log the derived variables evaluated on every time step
+        self.debug_derived_variables = self.configuration.get_boolean_option('reportingOptions', 'debug_derived_variables', False)
+
+    def initiate_calculation_plan(self):
+
+        # dependency graph: for every derived variable, the derived variables it refers to (see getReferencedAttributes)
+        self.derived_variable_dependencies = {}
+        for var in self.derived_variables:
+            self.derived_variable_dependencies[var] = sorted((getReferencedAttributes(self.derived_variables[var]) & set(self.derived_variables)) - set([var]))
+
+        # the variables that are accumulated or reported daily are needed on every time step; the ones only reported at the end of a month/year only then
+        # - the derived variables are evaluated when they are requested (see __getattr__); the plan is used to check this (see the option debug_derived_variables)
+        # - variables that are not derived variables are left out (they cannot be calculated)
+        daily_variables      = [var for outputType in reportingOutputTypes if outputType not in ['monthEnd', 'annuaEnd'] \
+                                    for var, ncFileName, short_name in self.reporting_plan[outputType] if var in self.derived_variables]
+        month_end_variables  = [var for var, ncFileName, short_name in self.reporting_plan['monthEnd'] if var in self.derived_variables]
+        annua_end_variables  = [var for var, ncFileName, short_name in self.reporting_plan['annuaEnd'] if var in self.derived_variables]
+        self.variables_to_calculate = {}
+        for endMonth in [False, True]:
+            for endYear in [False, True]:
+                requested_variables = list(daily_variables)
+                if endMonth: requested_variables += month_end_variables
+                if endYear:  requested_variables += annua_end_variables
+                self.variables_to_calculate[(endMonth, endYear)] = getVariablesToCalculate(requested_variables, self.derived_variable_dependencies)
+        logger.info("Variables needed on every time step: %s", ", ".join(self.variables_to_calculate[(False, False)]))
+
+    def __getattr__(self, name):
+
+        # only called if the attribute is not found, i.e. a derived variable that has not been evaluated yet in this time step
+        derived_variables = self.__dict__.get('derived_variables', {})
+        if name not in derived_variables:
+            raise AttributeError("'%s' object has no attribute '%s'" %(type(self).__name__, name))
+        value = derived_variables[name]()
+        self.__dict__[name] = value
+        self.evaluated_variables.append(name)
+        return value
+
+    def reset_derived_variables(self):
+
+        # the derived variables evaluated in the previous time step are removed (they will be evaluated again if requested)
+        for name in self.evaluated_variables: del self.__dict__[name]
+        self.evaluated_variables = []
+
+    def get_variable(self, var):
+
+        # the value of a reporting variable in the current time step for external readers (e.g. the BMI), whether or not it is in the reporting plan
+        # - a derived variable that is not needed for reporting in this time step is evaluated on request
+        # - None if it is not a reporting variable
+        if var in self.__dict__: return self.__dict__[var]
+        if var not in self.derived_variables: return None
+        return getattr(self, var)
+
+    def get_variable_for_reporting(self, var):
+
+        # the value of a reporting variable, masked out for reporting (if a landmask for reporting is given)
+        value = getattr(self, var)
+        if self.landmask_for_reporting is not None:
+            value = pcr.ifthen(self.landmask_for_reporting, value)
+        return value
+
     def initiate_reporting(self):
         
         # output directory storing netcdf files:
@@ -90,6 +211,13 @@ class Reporting(object):
         self.netcdfObj = PCR2netCDF(self.configuration, specificAttributeDictionary)
 
         # initiating netcdf files for reporting
+        # - all files are created in one batch (from the same template file) after the lists of variables are read
+        netcdfFiles = []
+        #
+        # reporting plan: for every output type, the list of (variable, netcdf file name, netcdf short name) to be reported
+        # - the plan only decides what is written; all reporting variables stay available to external readers (see get_variable)
+        self.reporting_plan = {}
+        for outputType in reportingOutputTypes: self.reporting_plan[outputType] = []
         #
         # - daily output in netCDF files:
         self.outDailyTotNC = ["None"]
@@ -111,11 +239,10 @@ class Reporting(object):
                 if var in list(varDicts.netcdf_standard_name.keys()):
                     standard_name= varDicts.netcdf_standard_name[var]
                 
-                # creating netCDF files:
-                self.netcdfObj.createNetCDF(self.outNCDir+"/"+ \
-                                            str(var)+\
-                                            "_dailyTot_output.nc",\
-                                            short_name,unit,long_name,standard_name)
+                # netCDF files to be created:
+                ncFileName = self.outNCDir + "/" + str(var) + "_dailyTot_output.nc"
+                netcdfFiles.append((ncFileName, short_name, unit, long_name, standard_name))
+                self.reporting_plan['dailyTot'].append((var, ncFileName, short_name))
         #
         # - MONTHly output in netCDF files:
         # -- cummulative
@@ -140,11 +267,10 @@ class Reporting(object):
                 if var in list(varDicts.netcdf_standard_name.keys()):
                     standard_name= varDicts.netcdf_standard_name[var]
                 
-                # creating netCDF files:
-                self.netcdfObj.createNetCDF(self.outNCDir+"/"+ \
-                                            str(var)+\
-                                            "_monthTot_output.nc",\
-                                            short_name,unit,long_name,standard_name)
+                # netCDF files to be created:
+                ncFileName = self.outNCDir + "/" + str(var) + "_monthTot_output.nc"
+                netcdfFiles.append((ncFileName, short_name, unit, long_name, standard_name))
+                self.reporting_plan['monthTot'].append((var, ncFileName, short_name))
         #
         # -- average
         self.outMonthAvgNC = ["None"]
@@ -172,11 +298,10 @@ class Reporting(object):
                 if var in list(varDicts.netcdf_standard_name.keys()):
                     standard_name= varDicts.netcdf_standard_name[var]
                 
-                # creating netCDF files:
-                self.netcdfObj.createNetCDF(self.outNCDir+"/"+ \
-                                            str(var)+\
-                                            "_monthAvg_output.nc",\
-                                            short_name,unit,long_name,standard_name)
+                # netCDF files to be created:
+                ncFileName = self.outNCDir + "/" + str(var) + "_monthAvg_output.nc"
+                netcdfFiles.append((ncFileName, short_name, unit, long_name, standard_name))
+                self.reporting_plan['monthAvg'].append((var, ncFileName, short_name))
 
         #
         # -- last day of the month
@@ -199,11 +324,10 @@ class Reporting(object):
                 if var in list(varDicts.netcdf_standard_name.keys()):
                     standard_name= varDicts.netcdf_standard_name[var]
                 
-                # creating netCDF files:
-                self.netcdfObj.createNetCDF(self.outNCDir+"/"+ \
-                                            str(var)+\
-                                            "_monthEnd_output.nc",\
-                                            short_name,unit,long_name,standard_name)
+                # netCDF files to be created:
+                ncFileName = self.outNCDir + "/" + str(var) + "_monthEnd_output.nc"
+                netcdfFiles.append((ncFileName, short_name, unit, long_name, standard_name))
+                self.reporting_plan['monthEnd'].append((var, ncFileName, short_name))
         #
         # -- maximum of the month
         self.outMonthMaxNC = ["None"]
@@ -225,11 +349,10 @@ class Reporting(object):
                 if var in list(varDicts.netcdf_standard_name.keys()):
                     standard_name= varDicts.netcdf_standard_name[var]
                 
-                # creating netCDF files:
-                self.netcdfObj.createNetCDF(self.outNCDir+"/"+ \
-                                            str(var)+\
-                                            "_monthMax_output.nc",\
-                                            short_name,unit,long_name,standard_name)
+                # netCDF files to be created:
+                ncFileName = self.outNCDir + "/" + str(var) + "_monthMax_output.nc"
+                netcdfFiles.append((ncFileName, short_name, unit, long_name, standard_name))
+                self.reporting_plan['monthMax'].append((var, ncFileName, short_name))
 
         #
         # - YEARly output in netCDF files:
@@ -256,11 +379,10 @@ class Reporting(object):
                 if var in list(varDicts.netcdf_standard_name.keys()):
                     standard_name= varDicts.netcdf_standard_name[var]
                 
-                # creating netCDF files:
-                self.netcdfObj.createNetCDF(self.outNCDir+"/"+ \
-                                            str(var)+\
-                                            "_annuaTot_output.nc",\
-                                            short_name,unit,long_name,standard_name)
+                # netCDF files to be created:
+                ncFileName = self.outNCDir + "/" + str(var) + "_annuaTot_output.nc"
+                netcdfFiles.append((ncFileName, short_name, unit, long_name, standard_name))
+                self.reporting_plan['annuaTot'].append((var, ncFileName, short_name))
         #
         # -- average
         self.outAnnuaAvgNC = ["None"]
@@ -288,11 +410,10 @@ class Reporting(object):
                 if var in list(varDicts.netcdf_standard_name.keys()):
                     standard_name= varDicts.netcdf_standard_name[var]
                 
-                # creating netCDF files:
-                self.netcdfObj.createNetCDF(self.outNCDir+"/"+ \
-                                            str(var)+\
-                                            "_annuaAvg_output.nc",\
-                                            short_name,unit,long_name,standard_name)
+                # netCDF files to be created:
+                ncFileName = self.outNCDir + "/" + str(var) + "_annuaAvg_output.nc"
+                netcdfFiles.append((ncFileName, short_name, unit, long_name, standard_name))
+                self.reporting_plan['annuaAvg'].append((var, ncFileName, short_name))
         #
         # -- last day of the year
         self.outAnnuaEndNC = ["None"]
@@ -314,11 +435,10 @@ class Reporting(object):
                 if var in list(varDicts.netcdf_standard_name.keys()):
                     standard_name= varDicts.netcdf_standard_name[var]
                 
-                # creating netCDF files:
-                self.netcdfObj.createNetCDF(self.outNCDir+"/"+ \
-                                            str(var)+\
-                                            "_annuaEnd_output.nc",\
-                                            short_name,unit,long_name,standard_name)
+                # netCDF files to be created:
+                ncFileName = self.outNCDir + "/" + str(var) + "_annuaEnd_output.nc"
+                netcdfFiles.append((ncFileName, short_name, unit, long_name, standard_name))
+                self.reporting_plan['annuaEnd'].append((var, ncFileName, short_name))
 
         # -- maximum of the year
         self.outAnnuaMaxNC = ["None"]
@@ -340,11 +460,10 @@ class Reporting(object):
                 if var in list(varDicts.netcdf_standard_name.keys()):
                     standard_name= varDicts.netcdf_standard_name[var]
                 
-                # creating netCDF files:
-                self.netcdfObj.createNetCDF(self.outNCDir+"/"+ \
-                                            str(var)+\
-                                            "_annuaMax_output.nc",\
-                                            short_name,unit,long_name,standard_name)
+                # netCDF files to be created:
+                ncFileName = self.outNCDir + "/" + str(var) + "_annuaMax_output.nc"
+                netcdfFiles.append((ncFileName, short_name, unit, long_name, standard_name))
+                self.reporting_plan['annuaMax'].append((var, ncFileName, short_name))
 
         # -- daily upsteam average (through LDD)
         self.outDailyTotUpsAvgNC = ["None"]
@@ -367,34 +486,24 @@ class Reporting(object):
                 if var in list(varDicts.netcdf_standard_name.keys()):
                     standard_name= varDicts.netcdf_standard_name[var]
                 
-                # creating netCDF files:
-                self.netcdfObj.createNetCDF(self.outNCDir+"/"+ \
-                                            str(var)+\
-                                            "_dailyTotUpsAvg_output.nc",\
-                                            short_name,unit,long_name,standard_name)
+                # netCDF files to be created:
+                ncFileName = self.outNCDir + "/" + str(var) + "_dailyTotUpsAvg_output.nc"
+                netcdfFiles.append((ncFileName, short_name, unit, long_name, standard_name))
+                self.reporting_plan['dailyTotUpsAvg'].append((var, ncFileName, short_name))
+
+        # creating netCDF files:
+        self.netcdfObj.createNetCDFs(netcdfFiles)
 
         # list of variables that will be reported:
-        self.variables_for_report = self.outDailyTotNC +\
-                                    self.outMonthTotNC +\
-                                    self.outMonthAvgNC +\
-                                    self.outMonthEndNC +\
-                                    self.outMonthMaxNC +\
-                                    self.outAnnuaTotNC +\
-                                    self.outAnnuaAvgNC +\
-                                    self.outAnnuaEndNC +\
-                                    self.outMonthMaxNC +\
-                                    self.outDailyTotUpsAvgNC
+        self.variables_for_report = []
+        for outputType in reportingOutputTypes:
+            self.variables_for_report += [var for var, ncFileName, short_name in self.reporting_plan[outputType]]
 
     def post_processing(self):
 
-        self.basic_post_processing() 
-        self.additional_post_processing()
-        #-RvB 23/02/2017: post-processing for the eartH2Observe project
-        self.e2o_post_processing()
-        
-        # reporting, post-processing for the Ulysses project
-        self.ulysses_post_processing()
-                
+        # derived variables are evaluated again when they are requested in this time step
+        self.reset_derived_variables()
+
         if self.debug_to_version_one:
             if self._modelTime.timeStepPCR == 1: self.report_static_maps_for_debugging()
             self.report_forcing_for_debugging()
@@ -620,285 +729,260 @@ class Reporting(object):
         pcr.report(self._model.groundwater.specificYield , self.configuration.mapsDir+"/specificyield.map")
 
 
-    def basic_post_processing(self):
+    def basic_derived_variables(self):
+
+        # NOTE: The derived variables are defined as functions (without arguments) in self.derived_variables.
+        #       They are evaluated when they are requested for the first time in a time step (see __getattr__).
+        derived = self.derived_variables
 
-        # forcing 
-        self.precipitation  = pcr.ifthen(self._model.routing.landmask, self._model.meteo.precipitation) 
-        self.temperature    = pcr.ifthen(self._model.routing.landmask, self._model.meteo.temperature)
-        self.referencePotET = pcr.ifthen(self._model.routing.landmask, self._model.meteo.referencePotET) 
+        # forcing
+        derived['precipitation']  = lambda: pcr.ifthen(self._model.routing.landmask, self._model.meteo.precipitation)
+        derived['temperature']    = lambda: pcr.ifthen(self._model.routing.landmask, self._model.meteo.temperature)
+        derived['referencePotET'] = lambda: pcr.ifthen(self._model.routing.landmask, self._model.meteo.referencePotET)
 
         # potential and actual evaporation from land surface part (m)
-        self.totalLandSurfacePotET = self._model.landSurface.totalPotET 
-        self.totLandSurfaceActuaET = self._model.landSurface.actualET
+        derived['totalLandSurfacePotET'] = lambda: self._model.landSurface.totalPotET
+        derived['totLandSurfaceActuaET'] = lambda: self._model.landSurface.actualET
         #
-        self.fractionLandSurfaceET = vos.getValDivZero(self.totLandSurfaceActuaET,\
-                                                       self.totalLandSurfacePotET,\
-                                                       vos.smallNumber)
-        
-        self.interceptStor = self._model.landSurface.interceptStor
+        derived['fractionLandSurfaceET'] = lambda: vos.getValDivZero(self.totLandSurfaceActuaET,\
+                                                                     self.totalLandSurfacePotET,\
+                                                                     vos.smallNumber)
 
-        self.snowCoverSWE  = self._model.landSurface.snowCoverSWE
-        self.snowFreeWater = self._model.landSurface.snowFreeWater
+        derived['interceptStor'] = lambda: self._model.landSurface.interceptStor
+
+        derived['snowCoverSWE']  = lambda: self._model.landSurface.snowCoverSWE
+        derived['snowFreeWater'] = lambda: self._model.landSurface.snowFreeWater
+
+        derived['topWaterLayer'] = lambda: self._model.landSurface.topWaterLayer
+        derived['storUppTotal']  = lambda: self._model.landSurface.storUppTotal
+        derived['storLowTotal']  = lambda: self._model.landSurface.storLowTotal
+
+        derived['interceptEvap']        = lambda: self._model.landSurface.interceptEvap
+        derived['actSnowFreeWaterEvap'] = lambda: self._model.landSurface.actSnowFreeWaterEvap
+        derived['topWaterLayerEvap']    = lambda: self._model.landSurface.openWaterEvap
+        derived['actBareSoilEvap']      = lambda: self._model.landSurface.actBareSoilEvap
+
+        derived['actTranspiTotal']      = lambda: self._model.landSurface.actTranspiTotal
+        derived['actTranspiUppTotal']   = lambda: self._model.landSurface.actTranspiUppTotal
+        derived['actTranspiLowTotal']   = lambda: self._model.landSurface.actTranspiLowTotal
+
+        derived['directRunoff']         = lambda: self._model.landSurface.directRunoff
+        derived['interflowTotal']       = lambda: self._model.landSurface.interflowTotal
+
+        derived['infiltration']         = lambda: self._model.landSurface.infiltration
+        derived['gwRecharge']           = lambda: self._model.landSurface.gwRecharge
+        derived['gwNetCapRise']         = lambda: pcr.ifthenelse(self._model.landSurface.gwRecharge < 0.0, self.gwRecharge*(-1.0), 0.0)
 
-        self.topWaterLayer = self._model.landSurface.topWaterLayer
-        self.storUppTotal  = self._model.landSurface.storUppTotal
-        self.storLowTotal  = self._model.landSurface.storLowTotal
-        
-        self.interceptEvap        = self._model.landSurface.interceptEvap
-        self.actSnowFreeWaterEvap = self._model.landSurface.actSnowFreeWaterEvap
-        self.topWaterLayerEvap    = self._model.landSurface.openWaterEvap
-        self.actBareSoilEvap      = self._model.landSurface.actBareSoilEvap
-        
-        self.actTranspiTotal      = self._model.landSurface.actTranspiTotal
-        self.actTranspiUppTotal   = self._model.landSurface.actTranspiUppTotal
-        self.actTranspiLowTotal   = self._model.landSurface.actTranspiLowTotal
-                                  
-        self.directRunoff         = self._model.landSurface.directRunoff
-        self.interflowTotal       = self._model.landSurface.interflowTotal
-        
-        self.infiltration         = self._model.landSurface.infiltration
-        self.gwRecharge           = self._model.landSurface.gwRecharge
-        self.gwNetCapRise         = pcr.ifthenelse(self._model.landSurface.gwRecharge < 0.0, self.gwRecharge*(-1.0), 0.0)
-        
         # water demand (m)
-        self.irrGrossDemand       = self._model.landSurface.irrGrossDemand    
-        self.nonIrrGrossDemand    = self._model.landSurface.nonIrrGrossDemand
-        self.totalGrossDemand     = self._model.landSurface.totalPotentialGrossDemand
-        
-        self.satDegUpp            = self._model.landSurface.satDegUppTotal
-        self.satDegLow            = self._model.landSurface.satDegLowTotal
+        derived['irrGrossDemand']       = lambda: self._model.landSurface.irrGrossDemand
+        derived['nonIrrGrossDemand']    = lambda: self._model.landSurface.nonIrrGrossDemand
+        derived['totalGrossDemand']     = lambda: self._model.landSurface.totalPotentialGrossDemand
 
-        self.satDegTotal          = self._model.landSurface.satDegTotal
-        
-        self.storGroundwater      = self._model.groundwater.storGroundwater
-        
-        self.baseflow             = self._model.groundwater.baseflow
+        derived['satDegUpp']            = lambda: self._model.landSurface.satDegUppTotal
+        derived['satDegLow']            = lambda: self._model.landSurface.satDegLowTotal
+
+        derived['satDegTotal']          = lambda: self._model.landSurface.satDegTotal
+
+        derived['storGroundwater']      = lambda: self._model.groundwater.storGroundwater
+
+        derived['baseflow']             = lambda: self._model.groundwater.baseflow
 
         # abstraction (m)
-        self.desalinationAbstraction         = self._model.landSurface.desalinationAbstraction
-        self.surfaceWaterAbstraction         = self._model.landSurface.actSurfaceWaterAbstract
-        self.nonFossilGroundwaterAbstraction = self._model.groundwater.nonFossilGroundwaterAbs
-        self.fossilGroundwaterAbstraction    = self._model.groundwater.fossilGroundwaterAbstr
-        self.totalAbstraction                = self.desalinationAbstraction +\
-                                               self.surfaceWaterAbstraction +\
-                                               self.nonFossilGroundwaterAbstraction +\
-                                               self.fossilGroundwaterAbstraction
-        
+        derived['desalinationAbstraction']         = lambda: self._model.landSurface.desalinationAbstraction
+        derived['surfaceWaterAbstraction']         = lambda: self._model.landSurface.actSurfaceWaterAbstract
+        derived['nonFossilGroundwaterAbstraction'] = lambda: self._model.groundwater.nonFossilGroundwaterAbs
+        derived['fossilGroundwaterAbstraction']    = lambda: self._model.groundwater.fossilGroundwaterAbstr
+        derived['totalAbstraction']                = lambda: self.desalinationAbstraction +\
+                                                             self.surfaceWaterAbstraction +\
+                                                             self.nonFossilGroundwaterAbstraction +\
+                                                             self.fossilGroundwaterAbstraction
+
         # total evaporation (m), from land and water fractions
-        self.totalEvaporation = self._model.landSurface.actualET + \
-                                self._model.routing.waterBodyEvaporation
+        derived['totalEvaporation'] = lambda: self._model.landSurface.actualET + \
+                                              self._model.routing.waterBodyEvaporation
         #
-        self.fractionTotalEvaporation = vos.getValDivZero(self.totalEvaporation,\
-                                        self._model.landSurface.totalPotET + self._model.routing.waterBodyPotEvap,\
-                                        vos.smallNumber)
+        derived['fractionTotalEvaporation'] = lambda: vos.getValDivZero(self.totalEvaporation,\
+                                                      self._model.landSurface.totalPotET + self._model.routing.waterBodyPotEvap,\
+                                                      vos.smallNumber)
 
         # total potential evaporation (m). from land and water fractions
-        self.totalPotentialEvaporation = self._model.landSurface.totalPotET + self._model.routing.waterBodyPotEvap
-        
+        derived['totalPotentialEvaporation'] = lambda: self._model.landSurface.totalPotET + self._model.routing.waterBodyPotEvap
+
         # runoff (m) from land surface - not including local changes in water bodies
-        self.runoff = self._model.routing.runoff
-        
+        derived['runoff'] = lambda: self._model.routing.runoff
+
         # discharge (unit: m3/s)
-        self.discharge = self._model.routing.disChanWaterBody
+        derived['discharge'] = lambda: self._model.routing.disChanWaterBody
 
-        # soil moisture state from (approximately) the first 5 cm soil  
+        # soil moisture state from (approximately) the first 5 cm soil
         if self._model.landSurface.numberOfSoilLayers == 3:
-            self.storUppSurface   = self._model.landSurface.storUpp000005    # unit: m
-            self.satDegUppSurface = self._model.landSurface.satDegUpp000005  # unit: percentage
-        
+            derived['storUppSurface']   = lambda: self._model.landSurface.storUpp000005    # unit: m
+            derived['satDegUppSurface'] = lambda: self._model.landSurface.satDegUpp000005  # unit: percentage
+
         # fraction of surface water bodies.
-        self.dynamicFracWat = self._model.routing.dynamicFracWat
-        
+        derived['dynamicFracWat'] = lambda: self._model.routing.dynamicFracWat
+
         if self._model.landSurface.numberOfSoilLayers == 3:
-            self.storUpp000005  = self._model.landSurface.storUpp000005
-            self.storUpp005030  = self._model.landSurface.storUpp005030
-            self.storLow030150  = self._model.landSurface.storLow030150
-        
-    def additional_post_processing(self):
-        # In this method/function, users can add their own post-processing.
-        
+            derived['storUpp000005']  = lambda: self._model.landSurface.storUpp000005
+            derived['storUpp005030']  = lambda: self._model.landSurface.storUpp005030
+            derived['storLow030150']  = lambda: self._model.landSurface.storLow030150
+
+    def additional_derived_variables(self):
+        # In this method/function, users can add their own post-processing (derived variables, see basic_derived_variables).
+        derived = self.derived_variables
+
         # reporting water balance from the land surface part (excluding surface water bodies)
-        if "land_surface_water_balance" in self.variables_for_report: self.land_surface_water_balance = self._model.waterBalance
+        derived['land_surface_water_balance'] = lambda: self._model.waterBalance
 
         # accumulated directRunoff (m3/s) along the drainage network
-        if "accuDirectRunoff" in self.variables_for_report:
-            self.accuDirectRunoff = pcr.catchmenttotal(self.directRunoff * self._model.routing.cellArea, self._model.routing.lddMap) / vos.secondsPerDay()
+        derived['accuDirectRunoff'] = lambda: pcr.catchmenttotal(self.directRunoff * self._model.routing.cellArea, self._model.routing.lddMap) / vos.secondsPerDay()
 
         # accumulated interflowTotal (m3/s) along the drainage network
-        if "accuInterflowTotal" in self.variables_for_report:
-            self.accuInterflowTotal = pcr.catchmenttotal(self.interflowTotal * self._model.routing.cellArea, self._model.routing.lddMap) / vos.secondsPerDay()
+        derived['accuInterflowTotal'] = lambda: pcr.catchmenttotal(self.interflowTotal * self._model.routing.cellArea, self._model.routing.lddMap) / vos.secondsPerDay()
 
         # accumulated baseflow (m3/s) along the drainage network
-        if "accuBaseflow" in self.variables_for_report:
-            self.accuBaseflow = pcr.catchmenttotal(self.baseflow * self._model.routing.cellArea, self._model.routing.lddMap) / vos.secondsPerDay()
+        derived['accuBaseflow'] = lambda: pcr.catchmenttotal(self.baseflow * self._model.routing.cellArea, self._model.routing.lddMap) / vos.secondsPerDay()
 
         # accumulated runoff (m3/s) along the drainage network
-        if "accuRunoff" in self.variables_for_report:
-            self.accuRunoff = pcr.catchmenttotal(self.runoff * self._model.routing.cellArea, self._model.routing.lddMap) / vos.secondsPerDay()
+        derived['accuRunoff'] = lambda: pcr.catchmenttotal(self.runoff * self._model.routing.cellArea, self._model.routing.lddMap) / vos.secondsPerDay()
 
         # accumulated surface water abstraction along the drainage network (m3/s)
-        if "accuSurfaceWaterAbstraction" in self.variables_for_report:
-            self.accuSurfaceWaterAbstraction = pcr.catchmenttotal(self.surfaceWaterAbstraction * self._model.routing.cellArea, self._model.routing.lddMap) / vos.secondsPerDay()
-        
+        derived['accuSurfaceWaterAbstraction'] = lambda: pcr.catchmenttotal(self.surfaceWaterAbstraction * self._model.routing.cellArea, self._model.routing.lddMap) / vos.secondsPerDay()
+
         # local changes in water bodies (i.e. abstraction, return flow, evaporation, bed exchange), excluding runoff
-        self.local_water_body_flux = self._model.routing.local_input_to_surface_water / self._model.routing.cellArea - self.runoff
-        
-        # total runoff (m) from local land surface runoff and local changes in water bodies 
-        self.totalRunoff = self.runoff + self.local_water_body_flux     # actually this is equal to self._model.routing.local_input_to_surface_water / self._model.routing.cellArea
+        derived['local_water_body_flux'] = lambda: self._model.routing.local_input_to_surface_water / self._model.routing.cellArea - self.runoff
+
+        # total runoff (m) from local land surface runoff and local changes in water bodies
+        derived['totalRunoff'] = lambda: self.runoff + self.local_water_body_flux     # actually this is equal to self._model.routing.local_input_to_surface_water / self._model.routing.cellArea
 
         # water body evaporation (m) - from surface water fractions only
-        self.waterBodyActEvaporation = self._model.routing.waterBodyEvaporation
-        self.waterBodyPotEvaporation = self._model.routing.waterBodyPotEvap
+        derived['waterBodyActEvaporation'] = lambda: self._model.routing.waterBodyEvaporation
+        derived['waterBodyPotEvaporation'] = lambda: self._model.routing.waterBodyPotEvap
         #
-        self.fractionWaterBodyEvaporation = vos.getValDivZero(self.waterBodyActEvaporation,\
-                                                              self.waterBodyPotEvaporation,\
-                                                              vos.smallNumber)
+        derived['fractionWaterBodyEvaporation'] = lambda: vos.getValDivZero(self.waterBodyActEvaporation,\
+                                                                            self.waterBodyPotEvaporation,\
+                                                                            vos.smallNumber)
 
         # accumulated water body actual evaporation along the drainage network (m3/s)
-        if "accuWaterBodyActEvaporation" in self.variables_for_report: 
-            self.accuWaterBodyActEvaporation = pcr.catchmenttotal(self.waterBodyActEvaporation * self._model.routing.cellArea, self._model.routing.lddMap) / vos.secondsPerDay()
+        derived['accuWaterBodyActEvaporation'] = lambda: pcr.catchmenttotal(self.waterBodyActEvaporation * self._model.routing.cellArea, self._model.routing.lddMap) / vos.secondsPerDay()
 
         # land surface evaporation (m)
-        self.actualET = self._model.landSurface.actualET
+        derived['actualET'] = lambda: self._model.landSurface.actualET
 
         # fossil groundwater storage
-        self.storGroundwaterFossil = self._model.groundwater.storGroundwaterFossil
-        
+        derived['storGroundwaterFossil'] = lambda: self._model.groundwater.storGroundwaterFossil
+
         # total groundwater storage: (non fossil and fossil)
-        self.storGroundwaterTotal  = self._model.groundwater.storGroundwater + \
-                                     self._model.groundwater.storGroundwaterFossil
-        
+        derived['storGroundwaterTotal']  = lambda: self._model.groundwater.storGroundwater + \
+                                                   self._model.groundwater.storGroundwaterFossil
+
         # accumulated total groundwater storage along the drainage network (m3):
-        if "accuStorGroundwaterTotalVolume" in self.variables_for_report: 
-            self.accuStorGroundwaterTotalVolume = pcr.catchmenttotal(self.storGroundwaterTotal * self._model.routing.cellArea, self._model.routing.lddMap)
+        derived['accuStorGroundwaterTotalVolume'] = lambda: pcr.catchmenttotal(self.storGroundwaterTotal * self._model.routing.cellArea, self._model.routing.lddMap)
 
         # total active storage thickness (m) for the entire water column - not including fossil groundwater
-        # - including: interception, snow, soil and non fossil groundwater 
-        self.totalActiveStorageThickness = pcr.ifthen(\
-                                           self._model.routing.landmask, \
-                                           self._model.routing.channelStorage / self._model.routing.cellArea + \
-                                           self._model.landSurface.totalSto + \
-                                           self._model.groundwater.storGroundwater)
-
-        # total water storage thickness (m) for the entire water column: 
+        # - including: interception, snow, soil and non fossil groundwater
+        derived['totalActiveStorageThickness'] = lambda: pcr.ifthen(\
+                                                         self._model.routing.landmask, \
+                                                         self._model.routing.channelStorage / self._model.routing.cellArea + \
+                                                         self._model.landSurface.totalSto + \
+                                                         self._model.groundwater.storGroundwater)
+
+        # total water storage thickness (m) for the entire water column:
         # - including: interception, snow, soil, non fossil groundwater and fossil groundwater
-        # - this is usually used for GRACE comparison  
-        self.totalWaterStorageThickness  = self.totalActiveStorageThickness + \
-                                           self._model.groundwater.storGroundwaterFossil
+        # - this is usually used for GRACE comparison
+        derived['totalWaterStorageThickness']  = lambda: self.totalActiveStorageThickness + \
+                                                         self._model.groundwater.storGroundwaterFossil
+
+        # total water storage volume (m3) for the entire water column:
+        derived['totalWaterStorageVolume'] = lambda: self.totalWaterStorageThickness * self._model.routing.cellArea
 
-        # total water storage volume (m3) for the entire water column: 
-        self.totalWaterStorageVolume = self.totalWaterStorageThickness * self._model.routing.cellArea
-        
         # surfaceWaterStorage (unit: m) - negative values may be reported
-        self.surfaceWaterStorage = self._model.routing.channelStorage / self._model.routing.cellArea
+        derived['surfaceWaterStorage'] = lambda: self._model.routing.channelStorage / self._model.routing.cellArea
 
         # estimate of river/surface water levels (above channel/surface water bottom elevation)
-        self.surfaceWaterLevel = pcr.ifthenelse(self.dynamicFracWat > 0., self._model.routing.channelStorage / \
-                                                                         (self.dynamicFracWat * self._model.routing.cellArea), 
-                                                                          0.0)
-        self.surfaceWaterLevel = pcr.max(0.0, pcr.ifthen(self._model.routing.landmask, self.surfaceWaterLevel)) 
+        derived['surfaceWaterLevel'] = self.get_surface_water_level
 
         # Menno's post proccessing: fractions of water sources (allocated for) satisfying water demand in each cell
-        self.fracSurfaceWaterAllocation = pcr.ifthen(self._model.routing.landmask, \
-                                          vos.getValDivZero(\
-                                          self._model.landSurface.allocSurfaceWaterAbstract, self.totalGrossDemand, vos.smallNumber))
-        self.fracSurfaceWaterAllocation = pcr.ifthenelse(self.totalGrossDemand < vos.smallNumber, 1.0, self.fracSurfaceWaterAllocation)
+        derived['fracSurfaceWaterAllocation'] = lambda: pcr.ifthenelse(self.totalGrossDemand < vos.smallNumber, 1.0, \
+                                                        pcr.ifthen(self._model.routing.landmask, \
+                                                        vos.getValDivZero(\
+                                                        self._model.landSurface.allocSurfaceWaterAbstract, self.totalGrossDemand, vos.smallNumber)))
         #
-        self.fracNonFossilGroundwaterAllocation = pcr.ifthen(self._model.routing.landmask, \
-                                                  vos.getValDivZero(\
-                                                  self._model.groundwater.allocNonFossilGroundwater, self.totalGrossDemand, vos.smallNumber))
+        derived['fracNonFossilGroundwaterAllocation'] = lambda: pcr.ifthen(self._model.routing.landmask, \
+                                                                vos.getValDivZero(\
+                                                                self._model.groundwater.allocNonFossilGroundwater, self.totalGrossDemand, vos.smallNumber))
         #
-        self.fracOtherWaterSourceAllocation = pcr.ifthen(self._model.routing.landmask, \
-                                              vos.getValDivZero(\
-                                              self._model.groundwater.unmetDemand, self.totalGrossDemand, vos.smallNumber))
+        derived['fracOtherWaterSourceAllocation'] = lambda: pcr.ifthen(self._model.routing.landmask, \
+                                                            vos.getValDivZero(\
+                                                            self._model.groundwater.unmetDemand, self.totalGrossDemand, vos.smallNumber))
         #
-        self.fracDesalinatedWaterAllocation = pcr.ifthen(self._model.routing.landmask, \
-                                              vos.getValDivZero(\
-                                              self._model.landSurface.desalinationAllocation, self.totalGrossDemand, vos.smallNumber))
+        derived['fracDesalinatedWaterAllocation'] = lambda: pcr.ifthen(self._model.routing.landmask, \
+                                                            vos.getValDivZero(\
+                                                            self._model.landSurface.desalinationAllocation, self.totalGrossDemand, vos.smallNumber))
         #
-        self.totalFracWaterSourceAllocation = self.fracSurfaceWaterAllocation + \
-                                              self.fracNonFossilGroundwaterAllocation + \
-                                              self.fracOtherWaterSourceAllocation + \
-                                              self.fracDesalinatedWaterAllocation
+        derived['totalFracWaterSourceAllocation'] = lambda: self.fracSurfaceWaterAllocation + \
+                                                            self.fracNonFossilGroundwaterAllocation + \
+                                                            self.fracOtherWaterSourceAllocation + \
+                                                            self.fracDesalinatedWaterAllocation
 
         # Stefanie's post processing:
         # -  reporting lake and reservoir storage (unit: m3)
-        self.waterBodyStorage = pcr.ifthen(self._model.routing.landmask, \
-                                pcr.cover(\
-                                pcr.ifthen(\
-                                pcr.scalar(self._model.routing.WaterBodies.waterBodyIds) > 0.,\
-                                           self._model.routing.WaterBodies.waterBodyStorage), 0.0))     # Note: This value is after lake/reservoir outflow.
+        derived['waterBodyStorage'] = lambda: pcr.ifthen(self._model.routing.landmask, \
+                                              pcr.cover(\
+                                              pcr.ifthen(\
+                                              pcr.scalar(self._model.routing.WaterBodies.waterBodyIds) > 0.,\
+                                                         self._model.routing.WaterBodies.waterBodyStorage), 0.0))     # Note: This value is after lake/reservoir outflow.
         # - snowMelt (m)
-        self.snowMelt = self._model.landSurface.snowMelt
+        derived['snowMelt'] = lambda: self._model.landSurface.snowMelt
 
         # channel storage (unit: m3)
-        self.channelStorage = pcr.ifthen(self._model.routing.landmask, \
-                              pcr.cover(self._model.routing.channelStorage, 0.0)) 
-        
-        
+        derived['channelStorage'] = lambda: pcr.ifthen(self._model.routing.landmask, \
+                                            pcr.cover(self._model.routing.channelStorage, 0.0))
+
+
         # Some examples to report variables from certain land cover types:
         # - unit: m/day - values are average over the entire cell area
-        self.precipitation_at_irrigation    = pcr.ifthen(self._model.routing.landmask, pcr.spatial(pcr.scalar(0.0)))
-        self.netLqWaterToSoil_at_irrigation = pcr.ifthen(self._model.routing.landmask, pcr.spatial(pcr.scalar(0.0)))
-        self.evaporation_from_irrigation    = pcr.ifthen(self._model.routing.landmask, pcr.spatial(pcr.scalar(0.0)))
-        self.transpiration_from_irrigation  = pcr.ifthen(self._model.routing.landmask, pcr.spatial(pcr.scalar(0.0)))
-        if self._model.landSurface.includeIrrigation:
-            self.precipitation_at_irrigation    = self._model.meteo.precipitation * \
-                                                  self._model.landSurface.landCoverObj['irrPaddy'].fracVegCover + \
-                                                  self._model.meteo.precipitation * \
-                                                  self._model.landSurface.landCoverObj['irrNonPaddy'].fracVegCover
-            self.netLqWaterToSoil_at_irrigation = self._model.landSurface.landCoverObj['irrPaddy'].netLqWaterToSoil * \
-                                                  self._model.landSurface.landCoverObj['irrPaddy'].fracVegCover + \
-                                                  self._model.landSurface.landCoverObj['irrNonPaddy'].netLqWaterToSoil * \
-                                                  self._model.landSurface.landCoverObj['irrNonPaddy'].fracVegCover
-            self.evaporation_from_irrigation    = self._model.landSurface.landCoverObj['irrPaddy'].actualET * \
-                                                  self._model.landSurface.landCoverObj['irrPaddy'].fracVegCover + \
-                                                  self._model.landSurface.landCoverObj['irrNonPaddy'].actualET * \
-                                                  self._model.landSurface.landCoverObj['irrNonPaddy'].fracVegCover
-            self.transpiration_from_irrigation  = self._model.landSurface.landCoverObj['irrPaddy'].actTranspiTotal * \
-                                                  self._model.landSurface.landCoverObj['irrPaddy'].fracVegCover + \
-                                                  self._model.landSurface.landCoverObj['irrNonPaddy'].actTranspiTotal * \
-                                                  self._model.landSurface.landCoverObj['irrNonPaddy'].fracVegCover        
+        derived['precipitation_at_irrigation']    = lambda: self.get_irrigation_variable('precipitation')
+        derived['netLqWaterToSoil_at_irrigation'] = lambda: self.get_irrigation_variable('netLqWaterToSoil')
+        derived['evaporation_from_irrigation']    = lambda: self.get_irrigation_variable('actualET')
+        derived['transpiration_from_irrigation']  = lambda: self.get_irrigation_variable('actTranspiTotal')
 
         # Total groundwater abstraction (m) (assuming otherWaterSourceAbstraction as fossil groundwater abstraction
-        self.totalGroundwaterAbstraction = self.nonFossilGroundwaterAbstraction +\
-                                           self.fossilGroundwaterAbstraction
+        derived['totalGroundwaterAbstraction'] = lambda: self.nonFossilGroundwaterAbstraction +\
+                                                         self.fossilGroundwaterAbstraction
+
+        # net liquid water passing to the soil
+        derived['net_liquid_water_to_soil'] = lambda: self._model.landSurface.netLqWaterToSoil
+
+        # consumptive water use and return flow from non irrigation water demand (unit: m/day)
+        derived['nonIrrWaterConsumption'] = lambda: self._model.routing.nonIrrWaterConsumption
+        derived['nonIrrReturnFlow']       = lambda: self._model.landSurface.nonIrrReturnFlow
 
-        # net liquid water passing to the soil 
-        self.net_liquid_water_to_soil = self._model.landSurface.netLqWaterToSoil
-        
-        # consumptive water use and return flow from non irrigation water demand (unit: m/day)  
-        self.nonIrrWaterConsumption = self._model.routing.nonIrrWaterConsumption
-        self.nonIrrReturnFlow       = self._model.landSurface.nonIrrReturnFlow
-        
         # accumulated non irrigation return flow along the drainage network (m3/s)
-        if "accuNonIrrReturnFlow" in self.variables_for_report:
-            self.accuNonIrrReturnFlow = pcr.catchmenttotal(self.nonIrrReturnFlow * self._model.routing.cellArea, self._model.routing.lddMap) / vos.secondsPerDay()
+        derived['accuNonIrrReturnFlow'] = lambda: pcr.catchmenttotal(self.nonIrrReturnFlow * self._model.routing.cellArea, self._model.routing.lddMap) / vos.secondsPerDay()
 
         # total potential water demand - not considering water availability
-        self.totalPotentialMaximumGrossDemand = self._model.landSurface.totalPotentialMaximumGrossDemand
-        
+        derived['totalPotentialMaximumGrossDemand'] = lambda: self._model.landSurface.totalPotentialMaximumGrossDemand
+
 
         # return flow due to groundwater abstraction (unit: m/day)
-        self.groundwaterAbsReturnFlow = self._model.routing.riverbedExchange / self._model.routing.cellArea
+        derived['groundwaterAbsReturnFlow'] = lambda: self._model.routing.riverbedExchange / self._model.routing.cellArea
         # NOTE: Before 24 May 2015, the stupid Edwin forgot to divide this variable with self._model.routing.cellArea
         # - For PCR-GLOBWB run without MODFLOW, this value will be zero if there are no groundwater abstraction.
         # - For PCR-GLOBWB run with MODFLOW, the name "groundwaterAbsReturnFlow" is NOT valid, as there will be also exchange from groundwater to surface water even if there is no groundwater abstraction
-        
+
         # surface water infiltration (to groundwater) (unit: m/day)
-        self.surfaceWaterInf = self._model.routing.riverbedExchange / self._model.routing.cellArea
-        # - "surfaceWaterInf" is a better name than groundwaterAbsReturnFlow 
+        derived['surfaceWaterInf'] = lambda: self._model.routing.riverbedExchange / self._model.routing.cellArea
+        # - "surfaceWaterInf" is a better name than groundwaterAbsReturnFlow
 
         # accumulated surface water infiltration along the drainage network (m3/s)
-        if "accuSurfaceWaterInf" in self.variables_for_report:
-            self.accuSurfaceWaterInf = pcr.catchmenttotal(self.surfaceWaterInf * self._model.routing.cellArea, self._model.routing.lddMap) / vos.secondsPerDay()
+        derived['accuSurfaceWaterInf'] = lambda: pcr.catchmenttotal(self.surfaceWaterInf * self._model.routing.cellArea, self._model.routing.lddMap) / vos.secondsPerDay()
 
         # net groundwater discharge (m/day)
-        self.netGroundwaterDischarge = self.baseflow - self.surfaceWaterInf
+        derived['netGroundwaterDischarge'] = lambda: self.baseflow - self.surfaceWaterInf
 
         # accumulated net groundwater discharge along the drainage network (m3/s)
-        if "accuNetGroundwaterDischarge" in self.variables_for_report:
-            self.accuNetGroundwaterDischarge = pcr.catchmenttotal(self.netGroundwaterDischarge * self._model.routing.cellArea, self._model.routing.lddMap) / vos.secondsPerDay()
+        derived['accuNetGroundwaterDischarge'] = lambda: pcr.catchmenttotal(self.netGroundwaterDischarge * self._model.routing.cellArea, self._model.routing.lddMap) / vos.secondsPerDay()
 
         #-----------------------------------------------------------------------
         # NOTE (RvB, 12/07): the following has been changed to get the actual flood volume and depth;
@@ -909,53 +993,44 @@ class Reporting(object):
            #~ self.floodDepth = pcr.ifthen(self._model.routing.landmask, \
                       #~ pcr.ifthenelse(pcr.cover(pcr.scalar(self._model.routing.WaterBodies.waterBodyIds), 0.0) > 0.0, 0.0,
                                      #~ self._model.routing.floodDepth))
-        #                        
+        #
         # flood volume (unit: m3): excess above the channel storage capacity
         #~ if self._model.routing.floodPlain:\
            #~ self.floodVolume = pcr.ifthen(self._model.routing.landmask, \
                       #~ pcr.ifthenelse(pcr.cover(pcr.scalar(self._model.routing.WaterBodies.waterBodyIds), 0.0) > 0.0, 0.0, \
                       #~ pcr.max(0.0, self._model.routing.channelStorage - self._model.routing.channelStorageCapacity)))
-        #              
+        #
         # flood innundation depth (unit: m) above the floodplain
-        self.floodDepth = pcr.ifthen(self._model.routing.landmask, pcr.spatial(pcr.scalar(0.0)))
-        if self._model.routing.floodPlain:
-           self.floodDepth = pcr.ifthen(self._model.routing.landmask, \
-                      pcr.ifthenelse(pcr.cover(self._model.routing.WaterBodies.waterBodyIds,0) == 0,\
-                                self._model.routing.floodDepth, 0.0))
-        #               
-        # flood volume (unit: m3): excess above the channel storage capacity
-        self.floodVolume = pcr.ifthen(self._model.routing.landmask, pcr.spatial(pcr.scalar(0.0)))
+        derived['floodDepth'] = lambda: pcr.ifthen(self._model.routing.landmask, pcr.spatial(pcr.scalar(0.0)))
         if self._model.routing.floodPlain:
-           self.floodVolume = pcr.ifthen(self._model.routing.landmask, \
-                      pcr.ifthenelse(pcr.cover(self._model.routing.WaterBodies.waterBodyIds,0) == 0,\
-                                  pcr.max(0.0,self._model.routing.channelStorage-self._model.routing.channelStorageCapacity), 0.0))
+           derived['floodDepth'] = lambda: pcr.ifthen(self._model.routing.landmask, \
+                                           pcr.ifthenelse(pcr.cover(self._model.routing.WaterBodies.waterBodyIds,0) == 0,\
+                                                          self._model.routing.floodDepth, 0.0))
+        #
+        # flood volume (unit: m3)
+        derived['floodVolume'] = lambda: pcr.ifthen(self._model.routing.landmask, pcr.spatial(pcr.scalar(0.0)))
         #-----------------------------------------------------------------------
-        
 
-        # channel storage (unit: m3)
-        self.channelStorage = pcr.ifthen(self._model.routing.landmask, \
-                              pcr.cover(self._model.routing.channelStorage, 0.0))
-        
         # riverine flood inundation volume (unit: m3)
         if self._model.routing.floodPlain:
-            self.floodVolume = pcr.ifthen(
+            derived['floodVolume'] = lambda: pcr.ifthen(
                 self._model.routing.landmask,
                 pcr.cover(self._model.routing.floodInundationVolume, 0.0),
             )
 
         # water withdrawal for irrigation sectors
-        self.irrPaddyWaterWithdrawal    = pcr.ifthen(self._model.routing.landmask, self._model.landSurface.irrGrossDemandPaddy)
-        self.irrNonPaddyWaterWithdrawal = pcr.ifthen(self._model.routing.landmask, self._model.landSurface.irrGrossDemandNonPaddy)
-        self.irrigationWaterWithdrawal  = self.irrPaddyWaterWithdrawal + self.irrNonPaddyWaterWithdrawal
-        
+        derived['irrPaddyWaterWithdrawal']    = lambda: pcr.ifthen(self._model.routing.landmask, self._model.landSurface.irrGrossDemandPaddy)
+        derived['irrNonPaddyWaterWithdrawal'] = lambda: pcr.ifthen(self._model.routing.landmask, self._model.landSurface.irrGrossDemandNonPaddy)
+        derived['irrigationWaterWithdrawal']  = lambda: self.irrPaddyWaterWithdrawal + self.irrNonPaddyWaterWithdrawal
+
         # water withdrawal for livestock, industry and domestic water demands
-        self.domesticWaterWithdrawal    = pcr.ifthen(self._model.routing.landmask, self._model.landSurface.domesticWaterWithdrawal)
-        self.industryWaterWithdrawal    = pcr.ifthen(self._model.routing.landmask, self._model.landSurface.industryWaterWithdrawal)
-        self.livestockWaterWithdrawal   = pcr.ifthen(self._model.routing.landmask, self._model.landSurface.livestockWaterWithdrawal)
+        derived['domesticWaterWithdrawal']    = lambda: pcr.ifthen(self._model.routing.landmask, self._model.landSurface.domesticWaterWithdrawal)
+        derived['industryWaterWithdrawal']    = lambda: pcr.ifthen(self._model.routing.landmask, self._model.landSurface.industryWaterWithdrawal)
+        derived['livestockWaterWithdrawal']   = lambda: pcr.ifthen(self._model.routing.landmask, self._model.landSurface.livestockWaterWithdrawal)
+
 
-        
         ######################################################################################################################################################################
-        # All water withdrawal variables in volume unit (m3): 
+        # All water withdrawal variables in volume unit (m3):
         waterWithdrawalVariables = [
                                     'totalGroundwaterAbstraction',\
                                     'surfaceWaterAbstraction',\
@@ -970,59 +1045,82 @@ class Reporting(object):
                                     ]
         for var in waterWithdrawalVariables:
                 volVariable = var + 'Volume'
-                vars(self)[volVariable] = None 
-                vars(self)[volVariable] = self._model.routing.cellArea * vars(self)[var]
+                derived[volVariable] = lambda var = var: self._model.routing.cellArea * getattr(self, var)
         ######################################################################################################################################################################
-                                                         
+
 
         ##########################################################################################################################################################################################
-        # Consumptive water use (unit: m3/day) for livestock, domestic and industry 
-        self.livestockWaterConsumptionVolume = self._model.landSurface.livestockReturnFlowFraction * self.livestockWaterWithdrawalVolume 
-        self.domesticWaterConsumptionVolume  = self._model.landSurface.domesticReturnFlowFraction  * self.domesticWaterWithdrawalVolume
-        self.industryWaterConsumptionVolume  = self._model.landSurface.industryReturnFlowFraction  * self.industryWaterWithdrawalVolume
+        # Consumptive water use (unit: m3/day) for livestock, domestic and industry
+        derived['livestockWaterConsumptionVolume'] = lambda: self._model.landSurface.livestockReturnFlowFraction * self.livestockWaterWithdrawalVolume
+        derived['domesticWaterConsumptionVolume']  = lambda: self._model.landSurface.domesticReturnFlowFraction  * self.domesticWaterWithdrawalVolume
+        derived['industryWaterConsumptionVolume']  = lambda: self._model.landSurface.industryReturnFlowFraction  * self.industryWaterWithdrawalVolume
         ##########################################################################################################################################################################################
 
 
         ######################################################################################################################################################################
         # For irrigation sector, the net consumptive water use will be calculated using annual values as follows:
         # irrigation_water_consumption_volume = self.evaporation_from_irrigation_volume * self.irrigationWaterWithdrawal / \
-        #                                                                         (self.precipitation_at_irrigation + self.irrigationWaterWithdrawal)  
-        self.precipitation_at_irrigation_volume = self.precipitation_at_irrigation * self._model.routing.cellArea
-        self.evaporation_from_irrigation_volume = self.evaporation_from_irrigation * self._model.routing.cellArea
-        # - additional values (may be needed) 
-        self.netLqWaterToSoil_at_irrigation_volume = self.netLqWaterToSoil_at_irrigation * self._model.routing.cellArea
-        self.transpiration_from_irrigation_volume  = self.transpiration_from_irrigation  * self._model.routing.cellArea
+        #                                                                         (self.precipitation_at_irrigation + self.irrigationWaterWithdrawal)
+        derived['precipitation_at_irrigation_volume'] = lambda: self.precipitation_at_irrigation * self._model.routing.cellArea
+        derived['evaporation_from_irrigation_volume'] = lambda: self.evaporation_from_irrigation * self._model.routing.cellArea
+        # - additional values (may be needed)
+        derived['netLqWaterToSoil_at_irrigation_volume'] = lambda: self.netLqWaterToSoil_at_irrigation * self._model.routing.cellArea
+        derived['transpiration_from_irrigation_volume']  = lambda: self.transpiration_from_irrigation  * self._model.routing.cellArea
         ######################################################################################################################################################################
 
 
         # fluxes from water bodies (lakes and reservoirs) - unit: m3/s
-        self.lake_and_reservoir_inflow = self._model.routing.WaterBodies.inflowInM3PerSec
+        derived['lake_and_reservoir_inflow'] = lambda: self._model.routing.WaterBodies.inflowInM3PerSec
 
 
-        # an estimate of total groundwater storage (m3) and thickness (m) 
+        # an estimate of total groundwater storage (m3) and thickness (m)
         # - these values can be negative
-        if "groundwaterVolumeEstimate" or "groundwaterThicknessEstimate" in self.variables_for_report:
-            if self._model.groundwater.useMODFLOW:
-                # - from the lowermost layer
-                self.groundwaterThicknessEstimate = \
-                                                    pcr.ifthen(self._model.routing.landmask, \
-                                                               self._model.groundwater.gw_modflow.storage_coefficient_1 * \
-                                                              (self._model.groundwater.groundwaterHeadLayer1 - self._model.groundwater.gw_modflow.bottom_layer_1))
-                # - from the uppermost layer
-                if self._model.groundwater.gw_modflow.number_of_layers == 2:\
-                   self.groundwaterThicknessEstimate += \
-                                                    pcr.ifthen(self._model.routing.landmask, \
-                                                               self._model.groundwater.gw_modflow.storage_coefficient_2 * \
-                                                              (self._model.groundwater.groundwaterHeadLayer2 - self._model.groundwater.gw_modflow.bottom_layer_2))
-            else:
-                self.groundwaterThicknessEstimate = self.storGroundwater + self.storGroundwaterFossil
-            
-            self.groundwaterVolumeEstimate = self.groundwaterThicknessEstimate *\
-                                             self._model.routing.cellArea 
-            
-            self.accuGroundwaterVolumeEstimate = pcr.catchmenttotal(self.groundwaterVolumeEstimate, self._model.routing.lddMap)
-            
+        derived['groundwaterThicknessEstimate']  = self.get_groundwater_thickness_estimate
+        derived['groundwaterVolumeEstimate']     = lambda: self.groundwaterThicknessEstimate *\
+                                                           self._model.routing.cellArea
+        derived['accuGroundwaterVolumeEstimate'] = lambda: pcr.catchmenttotal(self.groundwaterVolumeEstimate, self._model.routing.lddMap)
+
+    def get_surface_water_level(self):
 
+        # estimate of river/surface water levels (above channel/surface water bottom elevation)
+        surfaceWaterLevel = pcr.ifthenelse(self.dynamicFracWat > 0., self._model.routing.channelStorage / \
+                                                                    (self.dynamicFracWat * self._model.routing.cellArea),
+                                                                     0.0)
+        return pcr.max(0.0, pcr.ifthen(self._model.routing.landmask, surfaceWaterLevel))
+
+    def get_irrigation_variable(self, var):
+
+        # value (m/day) of a land cover variable of the irrigation land cover types (paddy and non paddy), averaged over the entire cell area
+        # - the precipitation is taken from the meteo object
+        if not self._model.landSurface.includeIrrigation:
+            return pcr.ifthen(self._model.routing.landmask, pcr.spatial(pcr.scalar(0.0)))
+        value = 0.0
+        for coverType in ['irrPaddy', 'irrNonPaddy']:
+            landCover = self._model.landSurface.landCoverObj[coverType]
+            if var == 'precipitation':
+                value += self._model.meteo.precipitation * landCover.fracVegCover
+            else:
+                value += getattr(landCover, var) * landCover.fracVegCover
+        return value
+
+    def get_groundwater_thickness_estimate(self):
+
+        # an estimate of total groundwater thickness (m) - this value can be negative
+        if self._model.groundwater.useMODFLOW:
+            # - from the lowermost layer
+            groundwaterThicknessEstimate = \
+                                           pcr.ifthen(self._model.routing.landmask, \
+                                                      self._model.groundwater.gw_modflow.storage_coefficient_1 * \
+                                                     (self._model.groundwater.groundwaterHeadLayer1 - self._model.groundwater.gw_modflow.bottom_layer_1))
+            # - from the uppermost layer
+            if self._model.groundwater.gw_modflow.number_of_layers == 2:\
+               groundwaterThicknessEstimate += \
+                                           pcr.ifthen(self._model.routing.landmask, \
+                                                      self._model.groundwater.gw_modflow.storage_coefficient_2 * \
+                                                     (self._model.groundwater.groundwaterHeadLayer2 - self._model.groundwater.gw_modflow.bottom_layer_2))
+        else:
+            groundwaterThicknessEstimate = self.storGroundwater + self.storGroundwaterFossil
+        return groundwaterThicknessEstimate
 
     def report(self):
 
@@ -1030,376 +1128,315 @@ class Reporting(object):
         self.post_processing()
 
         # time stamp for reporting
-        timeStamp = datetime.datetime(self._modelTime.year,\
-                                      self._modelTime.month,\
-                                      self._modelTime.day,\
-                                      0)
+        timeStamp = self._modelTime.currTimeFull
 
         logger.info("reporting for time %s", self._modelTime.currTime)
 
         # writing daily output to netcdf files
-        if self.outDailyTotNC[0] != "None":
-            for var in self.outDailyTotNC:
-                
-                # masking out for reporting
-                if self.landmask_for_reporting is not None:
-                    vars(self)[var] = pcr.ifthen(self.landmask_for_reporting, \
-                                                 vars(self)[var])
+        for var, ncFileName, short_name in self.reporting_plan['dailyTot']:
+            
+            # masked out for reporting
+            value = self.get_variable_for_reporting(var)
 
-                short_name = varDicts.netcdf_short_name[var]
-                
-                self.netcdfObj.data2NetCDF(self.outNCDir+"/"+ \
-                                            str(var)+\
-                                            "_dailyTot_output.nc",\
-                                            short_name,\
-                  pcr.pcr2numpy(self.__getattribute__(var),vos.MV),\
-                                            timeStamp)
+            self.netcdfObj.data2NetCDF(ncFileName,\
+                                        short_name,\
+              pcr.pcr2numpy(value,vos.MV),\
+                                        timeStamp)
 
         # writing monthly output to netcdf files
         # - cummulative
-        if self.outMonthTotNC[0] != "None":
-            for var in self.outMonthTotNC:
+        for var, ncFileName, short_name in self.reporting_plan['monthTot']:
 
-                # introduce variables at the beginning of simulation or
-                #     reset variables at the beginning of the month
-                if self._modelTime.timeStepPCR == 1 or \
-                   self._modelTime.day == 1:\
-                   vars(self)[var+'MonthTot'] = pcr.scalar(0.0)
+            # introduce variables at the beginning of simulation or
+            #     reset variables at the beginning of the month
+            if self._modelTime.timeStepPCR == 1 or \
+               self._modelTime.day == 1:\
+               vars(self)[var+'MonthTot'] = pcr.scalar(0.0)
 
-                # masking out for reporting
-                if self.landmask_for_reporting is not None:
-                    vars(self)[var] = pcr.ifthen(self.landmask_for_reporting, \
-                                                 vars(self)[var])
+            # masked out for reporting
+            value = self.get_variable_for_reporting(var)
 
-                # accumulating
-                vars(self)[var+'MonthTot'] += vars(self)[var]
+            # accumulating
+            vars(self)[var+'MonthTot'] += value
 
-                # reporting at the end of the month:
-                if self._modelTime.endMonth == True: 
+            # reporting at the end of the month:
+            if self._modelTime.endMonth == True: 
 
-                    short_name = varDicts.netcdf_short_name[var]
-
-                    self.netcdfObj.data2NetCDF(self.outNCDir+"/"+ \
-                                            str(var)+\
-                                               "_monthTot_output.nc",\
-                                               short_name,\
-                      pcr.pcr2numpy(self.__getattribute__(var+'MonthTot'),\
-                       vos.MV),timeStamp)
+                self.netcdfObj.data2NetCDF(ncFileName,\
+                                           short_name,\
+                  pcr.pcr2numpy(self.__getattribute__(var+'MonthTot'),\
+                   vos.MV),timeStamp)
         #
         # - average
-        if self.outMonthAvgNC[0] != "None":
-            for var in self.outMonthAvgNC:
+        for var, ncFileName, short_name in self.reporting_plan['monthAvg']:
 
-                # only if a accumulator variable has not been defined: 
-                if var not in self.outMonthTotNC: 
+            # only if a accumulator variable has not been defined: 
+            if var not in self.outMonthTotNC: 
 
-                    # introduce accumulator at the beginning of simulation or
-                    #     reset accumulator at the beginning of the month
-                    if self._modelTime.timeStepPCR == 1 or \
-                       self._modelTime.day == 1:\
-                       vars(self)[var+'MonthTot'] = pcr.scalar(0.0)
+                # introduce accumulator at the beginning of simulation or
+                #     reset accumulator at the beginning of the month
+                if self._modelTime.timeStepPCR == 1 or \
+                   self._modelTime.day == 1:\
+                   vars(self)[var+'MonthTot'] = pcr.scalar(0.0)
 
-                    # masking out for reporting
-                    if self.landmask_for_reporting is not None:
-                        vars(self)[var] = pcr.ifthen(self.landmask_for_reporting, \
-                                                     vars(self)[var])
+                # masked out for reporting
+                value = self.get_variable_for_reporting(var)
 
-                    # accumulating
-                    vars(self)[var+'MonthTot'] += vars(self)[var]
+                # accumulating
+                vars(self)[var+'MonthTot'] += value
 
-                # calculating average & reporting at the end of the month:
-                if self._modelTime.endMonth == True:
+            # calculating average & reporting at the end of the month:
+            if self._modelTime.endMonth == True:
 
-                    vars(self)[var+'MonthAvg'] = vars(self)[var+'MonthTot']/\
-                                                 self._modelTime.day  
+                vars(self)[var+'MonthAvg'] = vars(self)[var+'MonthTot']/\
+                                             self._modelTime.day  
 
-                    short_name = varDicts.netcdf_short_name[var]
-                    self.netcdfObj.data2NetCDF(self.outNCDir+"/"+ \
-                                               str(var)+\
-                                               "_monthAvg_output.nc",\
-                                               short_name,\
-                      pcr.pcr2numpy(self.__getattribute__(var+'MonthAvg'),\
-                       vos.MV),timeStamp)
+                self.netcdfObj.data2NetCDF(ncFileName,\
+                                           short_name,\
+                  pcr.pcr2numpy(self.__getattribute__(var+'MonthAvg'),\
+                   vos.MV),timeStamp)
         #
         # - last day of the month
-        if self.outMonthEndNC[0] != "None":
-            for var in self.outMonthEndNC:
+        for var, ncFileName, short_name in self.reporting_plan['monthEnd']:
 
-                # reporting at the end of the month:
-                if self._modelTime.endMonth == True: 
+            # reporting at the end of the month:
+            if self._modelTime.endMonth == True: 
 
-                    short_name = varDicts.netcdf_short_name[var]
-                    self.netcdfObj.data2NetCDF(self.outNCDir+"/"+ \
-                                               str(var)+\
-                                               "_monthEnd_output.nc",\
-                                               short_name,\
-                      pcr.pcr2numpy(self.__getattribute__(var),\
-                       vos.MV),timeStamp)
+                self.netcdfObj.data2NetCDF(ncFileName,\
+                                           short_name,\
+                  pcr.pcr2numpy(self.get_variable_for_reporting(var),\
+                   vos.MV),timeStamp)
         #
         # - maximum
-        if self.outMonthMaxNC[0] != "None":
-            for var in self.outMonthMaxNC:
+        for var, ncFileName, short_name in self.reporting_plan['monthMax']:
 
-                # introduce variables at the beginning of simulation or
-                #     reset variables at the beginning of the month
-                if self._modelTime.timeStepPCR == 1 or \
-                   self._modelTime.day == 1:
-                    vars(self)[var+'MonthMax'] = pcr.scalar(0.0)
-                    vars(self)[var+'MonthMax'] = vars(self)[var]
+            # masked out for reporting
+            value = self.get_variable_for_reporting(var)
 
-                # masking out for reporting
-                if self.landmask_for_reporting is not None:
-                    vars(self)[var] = pcr.ifthen(self.landmask_for_reporting, \
-                                                 vars(self)[var])
+            # introduce variables at the beginning of simulation or
+            #     reset variables at the beginning of the month
+            if self._modelTime.timeStepPCR == 1 or \
+               self._modelTime.day == 1:
+                vars(self)[var+'MonthMax'] = value
 
-                # find the maximum
-                vars(self)[var+'MonthMax'] = pcr.max(vars(self)[var], vars(self)[var+'MonthMax'])
+            # find the maximum
+            vars(self)[var+'MonthMax'] = pcr.max(value, vars(self)[var+'MonthMax'])
 
-                # reporting at the end of the month:
-                if self._modelTime.endMonth == True: 
+            # reporting at the end of the month:
+            if self._modelTime.endMonth == True: 
 
-                    short_name = varDicts.netcdf_short_name[var]
-                    self.netcdfObj.data2NetCDF(self.outNCDir+"/"+ \
-                                            str(var)+\
-                                               "_monthMax_output.nc",\
-                                               short_name,\
-                      pcr.pcr2numpy(self.__getattribute__(var+'MonthMax'),\
-                       vos.MV),timeStamp)
+                self.netcdfObj.data2NetCDF(ncFileName,\
+                                           short_name,\
+                  pcr.pcr2numpy(self.__getattribute__(var+'MonthMax'),\
+                   vos.MV),timeStamp)
 
         # writing yearly output to netcdf files
         # - cummulative
-        if self.outAnnuaTotNC[0] != "None":
-            for var in self.outAnnuaTotNC:
+        for var, ncFileName, short_name in self.reporting_plan['annuaTot']:
 
-                # introduce variables at the beginning of simulation or
-                #     reset variables at the beginning of the year
-                if self._modelTime.timeStepPCR == 1 or \
-                   self._modelTime.doy == 1:\
-                   vars(self)[var+'AnnuaTot'] = pcr.scalar(0.0)
+            # introduce variables at the beginning of simulation or
+            #     reset variables at the beginning of the year
+            if self._modelTime.timeStepPCR == 1 or \
+               self._modelTime.doy == 1:\
+               vars(self)[var+'AnnuaTot'] = pcr.scalar(0.0)
 
-                # masking out for reporting
-                if self.landmask_for_reporting is not None:
-                    vars(self)[var] = pcr.ifthen(self.landmask_for_reporting, \
-                                                 vars(self)[var])
+            # masked out for reporting
+            value = self.get_variable_for_reporting(var)
 
-                # accumulating
-                vars(self)[var+'AnnuaTot'] += vars(self)[var]
+            # accumulating
+            vars(self)[var+'AnnuaTot'] += value
 
-                # reporting at the end of the year:
-                if self._modelTime.endYear == True: 
+            # reporting at the end of the year:
+            if self._modelTime.endYear == True: 
 
-                    short_name = varDicts.netcdf_short_name[var]
-                    self.netcdfObj.data2NetCDF(self.outNCDir+"/"+ \
-                                               str(var)+\
-                                               "_annuaTot_output.nc",\
-                                               short_name,\
-                      pcr.pcr2numpy(self.__getattribute__(var+'AnnuaTot'),\
-                       vos.MV),timeStamp)
+                self.netcdfObj.data2NetCDF(ncFileName,\
+                                           short_name,\
+                  pcr.pcr2numpy(self.__getattribute__(var+'AnnuaTot'),\
+                   vos.MV),timeStamp)
 
         # - average
-        if self.outAnnuaAvgNC[0] != "None":
-            for var in self.outAnnuaAvgNC:
+        for var, ncFileName, short_name in self.reporting_plan['annuaAvg']:
 
-                # only if a accumulator variable has not been defined: 
-                if var not in self.outAnnuaTotNC: 
+            # only if a accumulator variable has not been defined: 
+            if var not in self.outAnnuaTotNC: 
 
-                    # introduce accumulator at the beginning of simulation or
-                    #     reset accumulator at the beginning of the year
-                    if self._modelTime.timeStepPCR == 1 or \
-                       self._modelTime.doy == 1:\
-                       vars(self)[var+'AnnuaTot'] = pcr.scalar(0.0)
+                # introduce accumulator at the beginning of simulation or
+                #     reset accumulator at the beginning of the year
+                if self._modelTime.timeStepPCR == 1 or \
+                   self._modelTime.doy == 1:\
+                   vars(self)[var+'AnnuaTot'] = pcr.scalar(0.0)
 
-                    # masking out for reporting
-                    if self.landmask_for_reporting is not None:
-                        vars(self)[var] = pcr.ifthen(self.landmask_for_reporting, \
-                                                     vars(self)[var])
+                # masked out for reporting
+                value = self.get_variable_for_reporting(var)
 
-                    # accumulating
-                    vars(self)[var+'AnnuaTot'] += vars(self)[var]
+                # accumulating
+                vars(self)[var+'AnnuaTot'] += value
 
-                # calculating average & reporting at the end of the year:
-                if self._modelTime.endYear == True:
+            # calculating average & reporting at the end of the year:
+            if self._modelTime.endYear == True:
 
-                    vars(self)[var+'AnnuaAvg'] = vars(self)[var+'AnnuaTot']/\
-                                                 self._modelTime.doy  
+                vars(self)[var+'AnnuaAvg'] = vars(self)[var+'AnnuaTot']/\
+                                             self._modelTime.doy  
 
-                    short_name = varDicts.netcdf_short_name[var]
-                    self.netcdfObj.data2NetCDF(self.outNCDir+"/"+ \
-                                               str(var)+\
-                                               "_annuaAvg_output.nc",\
-                                               short_name,\
-                      pcr.pcr2numpy(self.__getattribute__(var+'AnnuaAvg'),\
-                       vos.MV),timeStamp)
+                self.netcdfObj.data2NetCDF(ncFileName,\
+                                           short_name,\
+                  pcr.pcr2numpy(self.__getattribute__(var+'AnnuaAvg'),\
+                   vos.MV),timeStamp)
         #
         # -last day of the year
-        if self.outAnnuaEndNC[0] != "None":
-            for var in self.outAnnuaEndNC:
+        for var, ncFileName, short_name in self.reporting_plan['annuaEnd']:
 
-                # calculating average & reporting at the end of the year:
-                if self._modelTime.endYear == True:
+            # calculating average & reporting at the end of the year:
+            if self._modelTime.endYear == True:
 
-                    short_name = varDicts.netcdf_short_name[var]
-                    self.netcdfObj.data2NetCDF(self.outNCDir+"/"+ \
-                                               str(var)+\
-                                               "_annuaEnd_output.nc",\
-                                               short_name,\
-                      pcr.pcr2numpy(self.__getattribute__(var),\
-                       vos.MV),timeStamp)
+                self.netcdfObj.data2NetCDF(ncFileName,\
+                                           short_name,\
+                  pcr.pcr2numpy(self.get_variable_for_reporting(var),\
+                   vos.MV),timeStamp)
         #
         # - maximum
-        if self.outAnnuaMaxNC[0] != "None":
-            for var in self.outAnnuaMaxNC:
+        for var, ncFileName, short_name in self.reporting_plan['annuaMax']:
 
-                # introduce variables at the beginning of simulation or
-                #     reset variables at the beginning of the year
-                if self._modelTime.timeStepPCR == 1 or \
-                   self._modelTime.doy == 1:
-                    vars(self)[var+'AnnuaMax'] = pcr.scalar(0.0)
-                    vars(self)[var+'AnnuaMax'] = vars(self)[var]
-
-                # masking out for reporting
-                if self.landmask_for_reporting is not None:
-                    vars(self)[var] = pcr.ifthen(self.landmask_for_reporting, \
-                                                 vars(self)[var])
-
-                # find the maximum
-                vars(self)[var+'AnnuaMax'] = pcr.max(vars(self)[var], vars(self)[var+'AnnuaMax'])
-
-                # reporting at the end of the year:
-                if self._modelTime.endYear == True: 
-
-                    short_name = varDicts.netcdf_short_name[var]
-                    self.netcdfObj.data2NetCDF(self.outNCDir+"/"+ \
-                                            str(var)+\
-                                               "_annuaMax_output.nc",\
-                                               short_name,\
-                      pcr.pcr2numpy(self.__getattribute__(var+'AnnuaMax'),\
-                       vos.MV),timeStamp)
-       
-        # -- daily upsteam average (through LDD)
-        if self.outDailyTotUpsAvgNC[0] != "None":
+            # masked out for reporting
+            value = self.get_variable_for_reporting(var)
 
-            for var in self.outDailyTotUpsAvgNC:
+            # introduce variables at the beginning of simulation or
+            #     reset variables at the beginning of the year
+            if self._modelTime.timeStepPCR == 1 or \
+               self._modelTime.doy == 1:
+                vars(self)[var+'AnnuaMax'] = value
 
-                # calculate upstream area
-                if self._modelTime.timeStepPCR == 1: self.upstream_area = pcr.catchmenttotal(self._model.routing.cellArea, self._model.routing.lddMap)
+            # find the maximum
+            vars(self)[var+'AnnuaMax'] = pcr.max(value, vars(self)[var+'AnnuaMax'])
 
-                # masking out for reporting
-                if self.landmask_for_reporting is not None:
-                    vars(self)[var] = pcr.ifthen(self.landmask_for_reporting, \
-                                                 vars(self)[var])
+            # reporting at the end of the year:
+            if self._modelTime.endYear == True: 
 
-                # calculate upstream average
-                vars(self)[var+'DailyTotUpsAvg'] =  pcr.catchmenttotal(vars(self)[var] * self._model.routing.cellArea, self._model.routing.lddMap) /\
-                                                    self.upstream_area
+                self.netcdfObj.data2NetCDF(ncFileName,\
+                                           short_name,\
+                  pcr.pcr2numpy(self.__getattribute__(var+'AnnuaMax'),\
+                   vos.MV),timeStamp)
 
-                short_name = "upstream_average_" + varDicts.netcdf_short_name[var]
-                
-                self.netcdfObj.data2NetCDF(self.outNCDir+"/"+ \
-                                            str(var)+\
-                                            "_dailyTotUpsAvg_output.nc",\
-                                            short_name,\
-                  pcr.pcr2numpy(self.__getattribute__(var+'DailyTotUpsAvg'),vos.MV),\
-                                            timeStamp)
+        # -- daily upsteam average (through LDD)
+        for var, ncFileName, short_name in self.reporting_plan['dailyTotUpsAvg']:
 
+            # calculate upstream area
+            if self._modelTime.timeStepPCR == 1: self.upstream_area = pcr.catchmenttotal(self._model.routing.cellArea, self._model.routing.lddMap)
 
+            # masked out for reporting
+            value = self.get_variable_for_reporting(var)
 
-    def e2o_post_processing(self):
+            # calculate upstream average
+            vars(self)[var+'DailyTotUpsAvg'] =  pcr.catchmenttotal(value * self._model.routing.cellArea, self._model.routing.lddMap) /\
+                                                self.upstream_area
+
+            self.netcdfObj.data2NetCDF(ncFileName,\
+                                        short_name,\
+              pcr.pcr2numpy(self.__getattribute__(var+'DailyTotUpsAvg'),vos.MV),\
+                                        timeStamp)
+
+        # the derived variables evaluated in this time step (in the order of evaluation)
+        # - and the ones that are not in the reporting plan of this time step (e.g. requested by the BMI)
+        if self.debug_derived_variables:
+            logger.info("Derived variables evaluated for time %s: %s", self._modelTime.currTime, ", ".join(self.evaluated_variables))
+            variables_needed = self.variables_to_calculate[(bool(self._modelTime.endMonth), bool(self._modelTime.endYear))]
+            not_needed = [var for var in self.evaluated_variables if var not in variables_needed]
+            if len(not_needed) > 0: logger.info("Derived variables evaluated for time %s that are not in the reporting plan: %s", self._modelTime.currTime, ", ".join(not_needed))
+
+    def e2o_derived_variables(self):
+
+        # RvB 23/02/2017: post-processing of earth2observe variables (derived variables, see basic_derived_variables)
+        derived = self.derived_variables
 
-        # RvB 23/02/2017: post-processing of earth2observe variables
-        
         # fluxes (/86.4 to go from "m day-1" to "kg m-2 s-1")
-        self.Precip     =   self._model.meteo.precipitation / 86.4 # report in kg m-2 s-1
-        self.Evap       = - (self._model.landSurface.actualET + 
-                            self._model.routing.waterBodyEvaporation) / 86.4 # report in kg m-2 s-1
-        self.Runoff     = - self._model.routing.runoff / 86.4 # report in kg m-2 s-1
-        self.Qs         = - (self._model.landSurface.directRunoff + 
-                            self._model.landSurface.interflowTotal) / 86.4  # report in kg m-2 s-1
-        self.Qsb        = - self._model.groundwater.baseflow / 86.4 # report in kg m-2 s-1
-        self.Qsm        =   self._model.landSurface.snowMelt / 86.4 # report in kg m-2 s-1
-        self.PotEvap    = - self._model.meteo.referencePotET / 86.4 # report in kg m-2 s-1
-        self.ECanop     = - self._model.landSurface.interceptEvap / 86.4 # report in kg m-2 s-1
-        self.TVeg       = - self._model.landSurface.actTranspiTotal / 86.4 # report in kg m-2 s-1
-        self.ESoil      = - self._model.landSurface.actBareSoilEvap / 86.4 # report in kg m-2 s-1
-        self.EWater     = - self._model.routing.waterBodyEvaporation / 86.4 # report in kg m-2 s-1
-        self.RivOut     =   self._model.routing.disChanWaterBody # report in m3/s
-        
+        derived['Precip']     = lambda:   self._model.meteo.precipitation / 86.4 # report in kg m-2 s-1
+        derived['Evap']       = lambda: - (self._model.landSurface.actualET +
+                                           self._model.routing.waterBodyEvaporation) / 86.4 # report in kg m-2 s-1
+        derived['Runoff']     = lambda: - self._model.routing.runoff / 86.4 # report in kg m-2 s-1
+        derived['Qs']         = lambda: - (self._model.landSurface.directRunoff +
+                                           self._model.landSurface.interflowTotal) / 86.4  # report in kg m-2 s-1
+        derived['Qsb']        = lambda: - self._model.groundwater.baseflow / 86.4 # report in kg m-2 s-1
+        derived['Qsm']        = lambda:   self._model.landSurface.snowMelt / 86.4 # report in kg m-2 s-1
+        derived['PotEvap']    = lambda: - self._model.meteo.referencePotET / 86.4 # report in kg m-2 s-1
+        derived['ECanop']     = lambda: - self._model.landSurface.interceptEvap / 86.4 # report in kg m-2 s-1
+        derived['TVeg']       = lambda: - self._model.landSurface.actTranspiTotal / 86.4 # report in kg m-2 s-1
+        derived['ESoil']      = lambda: - self._model.landSurface.actBareSoilEvap / 86.4 # report in kg m-2 s-1
+        derived['EWater']     = lambda: - self._model.routing.waterBodyEvaporation / 86.4 # report in kg m-2 s-1
+        derived['RivOut']     = lambda:   self._model.routing.disChanWaterBody # report in m3/s
+
         # state variables (*1000 to go from "m" to "kg m-2")
-        self.SWE        =   self._model.landSurface.snowCoverSWE * 1000 # report in kg m-2
-        self.CanopInt   =   self._model.landSurface.interceptStor * 1000 # report in kg m-2
-        self.SurfStor   =   ( self._model.landSurface.topWaterLayer 
-                            + (self._model.routing.channelStorage/self._model.routing.cellArea) 
-                            + pcr.ifthen(self._model.routing.landmask, 
-                            pcr.ifthen(
-                            pcr.scalar(self._model.routing.WaterBodies.waterBodyIds) > 0.,
-                                       self._model.routing.WaterBodies.waterBodyStorage)) ) * 1000  # report in kg m-2
-        self.SurfMoist  =   self._model.landSurface.storUppTotal * 1000 # report in kg m-2 (water in SurfLayerThick)
-        self.RootMoist  =   ( self._model.landSurface.storUppTotal + 
-                            self._model.landSurface.storLowTotal ) * 1000 # report in kg m-2 (water in RootLayerThick)
-        self.TotMoist   =   self.RootMoist # equals RootMoist...
-        self.GroundMoist    = self._model.groundwater.storGroundwater * 1000  # self._model.groundwater. # report in kg m-2
-
-    def ulysses_post_processing(self):
+        derived['SWE']        = lambda:   self._model.landSurface.snowCoverSWE * 1000 # report in kg m-2
+        derived['CanopInt']   = lambda:   self._model.landSurface.interceptStor * 1000 # report in kg m-2
+        derived['SurfStor']   = lambda:   ( self._model.landSurface.topWaterLayer
+                                          + (self._model.routing.channelStorage/self._model.routing.cellArea)
+                                          + pcr.ifthen(self._model.routing.landmask,
+                                          pcr.ifthen(
+                                          pcr.scalar(self._model.routing.WaterBodies.waterBodyIds) > 0.,
+                                                     self._model.routing.WaterBodies.waterBodyStorage)) ) * 1000  # report in kg m-2
+        derived['SurfMoist']  = lambda:   self._model.landSurface.storUppTotal * 1000 # report in kg m-2 (water in SurfLayerThick)
+        derived['RootMoist']  = lambda:   ( self._model.landSurface.storUppTotal +
+                                            self._model.landSurface.storLowTotal ) * 1000 # report in kg m-2 (water in RootLayerThick)
+        derived['TotMoist']   = lambda:   self.RootMoist # equals RootMoist...
+        derived['GroundMoist'] = lambda:  self._model.groundwater.storGroundwater * 1000  # self._model.groundwater. # report in kg m-2
+
+    def ulysses_derived_variables(self):
 
         # PGB is assumed to write at least ET, SWE, Qsm, SM, Qr
-        
+        # - derived variables, see basic_derived_variables
+        derived = self.derived_variables
+
         # surface temperature
-        self.ulyssesTsurf = None
-        
+        derived['ulyssesTsurf'] = lambda: None
+
         # total precipitation (kg m-2 s-1)
-        self.ulyssesP     = self._model.meteo.precipitation / 86.4 
-        
+        derived['ulyssesP']     = lambda: self._model.meteo.precipitation / 86.4
+
         # total evaporation and transpiration (kg m-2 s-1)
         # - land only
-        self.ulyssesET       = - (self._model.landSurface.actualET   ) / 86.4
+        derived['ulyssesET']       = lambda: - (self._model.landSurface.actualET   ) / 86.4
         # - including water bodies
-        self.ulyssesETall    = - (self._model.landSurface.actualET + 
-                              self._model.routing.waterBodyEvaporation) / 86.4
-        
+        derived['ulyssesETall']    = lambda: - (self._model.landSurface.actualET +
+                                                self._model.routing.waterBodyEvaporation) / 86.4
+
         # potential evaporation
         # - reference potential evaporation
-        self.ulyssessRefPET     = - (self.referencePotET) / 86.4
+        derived['ulyssessRefPET']     = lambda: - (self.referencePotET) / 86.4
         # - with crop coefficient, but land only, excluding water
-        self.ulyssessCropPET    = - (self._model.landSurface.totalPotET) / 86.4
+        derived['ulyssessCropPET']    = lambda: - (self._model.landSurface.totalPotET) / 86.4
         # - with crop coefficient, land and water
-        self.ulyssessCropPETall = - (self._model.landSurface.totalPotET + self._model.routing.waterBodyPotEvap) / 86.4
+        derived['ulyssessCropPETall'] = lambda: - (self._model.landSurface.totalPotET + self._model.routing.waterBodyPotEvap) / 86.4
+
 
-        
         # SWE (kg m-2")
         # - including free water stored above the snow cover
-        self.ulyssesSWE      =   (self._model.landSurface.snowCoverSWE + self._model.landSurface.snowFreeWater)* 1000.
+        derived['ulyssesSWE']      = lambda: (self._model.landSurface.snowCoverSWE + self._model.landSurface.snowFreeWater)* 1000.
         # - excluding free water stored above the snow cover
-        self.ulyssesSWE_excluding_free_water = (self._model.landSurface.snowCoverSWE) * 1000.
-        
+        derived['ulyssesSWE_excluding_free_water'] = lambda: (self._model.landSurface.snowCoverSWE) * 1000.
+
         # Qsm = snowmelt (kg m-2 s-1)
-        self.ulyssesQsm      =    self._model.landSurface.snowMelt / 86.4
-        
-        # SM: theta = total volumetric of soil moisture (m3) 
-        # - theta = theta_res + degree_of_saturation * (theta_sat  theta_res)  
-        # - Note for this version, we assume soil properties are the same for all land cover types. Also, now they are valid only for two layers. TODO: Make the following calculations more flexible.  
+        derived['ulyssesQsm']      = lambda: self._model.landSurface.snowMelt / 86.4
+
+        # SM: theta = total volumetric of soil moisture (m3)
+        # - theta = theta_res + degree_of_saturation * (theta_sat  theta_res)
+        # - Note for this version, we assume soil properties are the same for all land cover types. Also, now they are valid only for two layers. TODO: Make the following calculations more flexible.
+        soil = lambda: self._model.landSurface.soil_topo_parameters['default']
         # -- upper soil moisture layer
-        theta_sat_upp = self._model.landSurface.soil_topo_parameters['default'].satVolMoistContUpp
-        theta_res_upp = self._model.landSurface.soil_topo_parameters['default'].resVolMoistContUpp
-        self.ulyssesSMUpp = theta_res_upp + self._model.landSurface.satDegUppTotal * (theta_sat_upp - theta_res_upp) 
+        derived['ulyssesSMUpp'] = lambda: soil().resVolMoistContUpp + self._model.landSurface.satDegUppTotal * (soil().satVolMoistContUpp - soil().resVolMoistContUpp)
         # -- low soil moisture layer
-        theta_sat_low = self._model.landSurface.soil_topo_parameters['default'].satVolMoistContLow
-        theta_res_low = self._model.landSurface.soil_topo_parameters['default'].resVolMoistContLow
-        self.ulyssesSMLow = theta_res_low + self._model.landSurface.satDegLowTotal * (theta_sat_low - theta_res_low)
+        derived['ulyssesSMLow'] = lambda: soil().resVolMoistContLow + self._model.landSurface.satDegLowTotal * (soil().satVolMoistContLow - soil().resVolMoistContLow)
         # -- entire moisture layer
-        thickness_upp = self._model.landSurface.soil_topo_parameters['default'].thickUpp
-        thickness_low = self._model.landSurface.soil_topo_parameters['default'].thickLow
-        self.ulyssesSM = (self.ulyssesSMUpp * thickness_upp + self.ulyssesSMLow * thickness_low) / (thickness_upp + thickness_low)
+        derived['ulyssesSM']    = lambda: (self.ulyssesSMUpp * soil().thickUpp + self.ulyssesSMLow * soil().thickLow) / (soil().thickUpp + soil().thickLow)
 
 
         # Qr: total runoff (report in kg m-2 s-1)
         # - land only, not including local changes in water body
-        self.ulyssesQrRunoff = - self._model.routing.runoff / 86.4 
-        
+        derived['ulyssesQrRunoff'] = lambda: - self._model.routing.runoff / 86.4
+
         # gridder river discharge
-        self.ulyssesDischarge  = self.discharge
+        derived['ulyssesDischarge']  = lambda: self.discharge
 
         # TWS (kg m-2)
-        self.ulyssesTWS = self.totalWaterStorageThickness * 1000. 
+        derived['ulyssesTWS'] = lambda: self.totalWaterStorageThickness * 1000.
 
         # extra variable for ILAMB evaluation
-        self.ulyssesSnowFraction = pcr.ifthenelse(self.ulyssesSWE > 0.0, pcr.scalar(1.0), pcr.scalar(0.0))
+        derived['ulyssesSnowFraction'] = lambda: pcr.ifthenelse(self.ulyssesSWE > 0.0, pcr.scalar(1.0), pcr.scalar(0.0))
@@ -23,6 +23,7 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import os
+import time
 import types
 import math
 import types
@@ -40,6 +41,7 @@ import virtualOS as vos
 from ncConverter import *
 
 import waterBodies
+import lddNetwork
 
 class Routing(object):
     
@@ -119,6 +121,17 @@ class Routing(object):
         # ldd mask 
         self.lddMap = pcr.lddmask(self.lddMap, self.landmask)
 
+        # engine for the network operations (pcr.kinematic and pcr.upstream) in the kinematic wave methods; options: 
+        # - "pcraster" (default)
+        # - "numpy"           : the ldd is converted once to a topologically ordered array of downstream cell indices (see lddNetwork.py)
+        # - "numpy_with_check": as "numpy", but the kinematic wave is also calculated using pcraster to log the differences and calculation times
+        self.kinematicWaveEngine = iniItems.get_choice_option('routingOptions', 'kinematicWaveEngine', ["pcraster", "numpy", "numpy_with_check"], "pcraster")
+        if self.kinematicWaveEngine != "pcraster": 
+            self.lddNetwork = lddNetwork.LddNetwork(self.lddMap)
+            # - option to calculate the kinematic wave for groups of (independent) river basins in parallel threads
+            if iniItems.get_option('routingOptions', 'numberOfRoutingThreads') is not None:
+                self.lddNetwork.setWorkPackages(int(iniItems.routingOptions['numberOfRoutingThreads']))
+
         # cell area (unit: m2)
         self.cellArea = vos.readPCRmapClone(\
                   iniItems.routingOptions['cellAreaMap'],
@@ -148,24 +161,21 @@ class Routing(object):
 
         # option to use minimum channel width (m)
         self.minChannelWidth = pcr.scalar(0.0)
-        if "minimumChannelWidth" in list(iniItems.routingOptions.keys()):
-            if iniItems.routingOptions['minimumChannelWidth'] != "None":\
+        if iniItems.get_option('routingOptions', 'minimumChannelWidth') is not None:\
                self.minChannelWidth = pcr.cover(vos.readPCRmapClone(\
                                       iniItems.routingOptions['minimumChannelWidth'],
                                       self.cloneMap,self.tmpDir,self.inputDir), 0.0)
         
         # option to use constant/pre-defined channel width (m)
         self.predefinedChannelWidth = None
-        if "constantChannelWidth" in list(iniItems.routingOptions.keys()):
-            if iniItems.routingOptions['constantChannelWidth'] != "None":\
+        if iniItems.get_option('routingOptions', 'constantChannelWidth') is not None:\
                self.predefinedChannelWidth = pcr.cover(vos.readPCRmapClone(\
                                              iniItems.routingOptions['constantChannelWidth'],
                                              self.cloneMap,self.tmpDir,self.inputDir), 0.0)
 
         # option to use constant/pre-defined channel depth (m)
         self.predefinedChannelDepth = None
-        if "constantChannelDepth" in list(iniItems.routingOptions.keys()):
-            if iniItems.routingOptions['constantChannelDepth'] != "None":\
+        if iniItems.get_option('routingOptions', 'constantChannelDepth') is not None:\
                self.predefinedChannelDepth = pcr.cover(vos.readPCRmapClone(\
                                              iniItems.routingOptions['constantChannelDepth'],
                                              self.cloneMap,self.tmpDir,self.inputDir), 0.0)
@@ -184,8 +194,7 @@ class Routing(object):
         self.channelLength = self.cellLengthFD
         # 
         # channel length (unit: m) 
-        if "channelLength" in list(iniItems.routingOptions.keys()):
-            if iniItems.routingOptions['channelLength'] != "None":\
+        if iniItems.get_option('routingOptions', 'channelLength') is not None:\
                self.channelLength = pcr.cover(
                                     vos.readPCRmapClone(\
                                     iniItems.routingOptions['channelLength'],
@@ -237,7 +246,7 @@ class Routing(object):
         self.limit_num_of_sub_time_steps = max(24.0, self.limit_num_of_sub_time_steps) 
                 
         # minimum number of a sub time step based on the configuration/ini file:  
-        if 'maxiumLengthOfSubTimeStep' in list(iniItems.routingOptions.keys()):
+        if iniItems.get_option('routingOptions', 'maxiumLengthOfSubTimeStep') is not None:
             maxiumLengthOfSubTimeStep = float(iniItems.routingOptions['maxiumLengthOfSubTimeStep'])
             minimum_number_of_sub_time_step  = np.ceil(
                                                vos.secondsPerDay() / maxiumLengthOfSubTimeStep )
@@ -250,12 +259,19 @@ class Routing(object):
         # critical water height (m) used to select stable length of sub time step in kinematic wave methods/approaches
         self.critical_water_height = 0.25;  # used in Van Beek et al. (2011)
 
+        # option to use local time stepping in the kinematic wave method: every cell is sub-cycled based on its own number of sub time steps 
+        self.localTimeStepping = iniItems.get_boolean_option('routingOptions', 'localTimeStepping')
+        if self.localTimeStepping:
+            logger.info("Local time stepping is used for the kinematic wave method.")
+            # - the channel step with local time stepping is calculated on the ldd network arrays (see lddNetwork.py), also for the kinematicWaveEngine pcraster
+            if self.kinematicWaveEngine == "pcraster": self.lddNetwork = lddNetwork.LddNetwork(self.lddMap)
+
         # assumption for the minimum fracwat value used for calculating water height
         self.min_fracwat_for_water_height = 0.001 # dimensionless
         
         # assumption for minimum crop coefficient for surface water bodies 
         self.minCropWaterKC = 0.00
-        if 'minCropWaterKC' in list(iniItems.routingOptions.keys()):
+        if iniItems.get_option('routingOptions', 'minCropWaterKC') is not None:
             self.minCropWaterKC = float(iniItems.routingOptions['minCropWaterKC'])
         
         # get the initialConditions
@@ -275,16 +291,25 @@ class Routing(object):
 
             # reduction parameter of smoothing interval and error threshold
             self.reductionKK = 0.5
-            if 'reductionKK' in list(iniItems.routingOptions.keys()):
+            if iniItems.get_option('routingOptions', 'reductionKK') is not None:
                self.reductionKK= float(iniItems.routingOptions['reductionKK'])
             self.criterionKK = 40.0
-            if 'criterionKK' in list(iniItems.routingOptions.keys()):
+            if iniItems.get_option('routingOptions', 'criterionKK') is not None:
                self.criterionKK= float(iniItems.routingOptions['criterionKK'])
 
             # get relative elevation (above floodplain) profile per grid cell (including smoothing parameters)
             self.nrZLevels, self.areaFractions, self.relZ, self.floodVolume, self.kSlope, self.mInterval = \
                             self.getElevationProfile(iniItems)
 
+            # method for calculating inundated fraction and flood depth; options: 
+            # - "pcraster" (default): loop over the levels of the elevation profile with pcraster operations
+            # - "numpy"             : one pass over the landmask cells using numpy arrays of the profile (prepared once) 
+            # - "numpy_with_check"  : as "numpy", but also using the "pcraster" method to log the differences and the calculation times
+            self.inundationMethod = iniItems.get_choice_option('routingOptions', 'inundationMethod', ["pcraster", "numpy", "numpy_with_check"], "pcraster")
+            if self.inundationMethod != "pcraster" and self.nrZLevels < 2:
+                logger.warning('The numpy inundationMethod needs at least two relativeElevationLevels. The pcraster method is used.')
+                self.inundationMethod = "pcraster"
+
             # get bankfull capacity (unit: m3)
             self.predefinedBankfullCapacity = None
             self.usingFixedBankfullCapacity = False
@@ -318,8 +343,11 @@ class Routing(object):
         
         # option to limit flood depth (to get rid of unrealistic flood depth)
         self.maxFloodDepth = None
-        if 'maxFloodDepth' in list(iniItems.routingOptions.keys()):
+        if iniItems.get_option('routingOptions', 'maxFloodDepth') is not None:
             self.maxFloodDepth = vos.readPCRmapClone(iniItems.routingOptions['maxFloodDepth'], self.cloneMap, self.tmpDir, self.inputDir)
+
+        # numpy arrays of the elevation profile (for the numpy inundationMethod)
+        if self.floodPlain and self.inundationMethod != "pcraster": self.prepareInundationProfileArrays()
         
         # initiate old style reporting                                  # This is still very useful during the 'debugging' process. 
         self.initiate_old_style_routing_reporting(iniItems)
@@ -686,7 +714,44 @@ class Routing(object):
         self.subDischarge = pcr.ifthen(self.landmask, self.subDischarge)
          
 
-    def estimate_length_of_sub_time_step(self): 
+    def upstream(self, lddMap, values): 
+
+        # sum of the values of the (direct) upstream cells
+        # - for the numpy engine, the network of self.lddMap is used; this is also valid for an ldd masked to complete river basins 
+        #   (as used for local time stepping), as there are no flows between river basins
+        if self.kinematicWaveEngine == "pcraster": return pcr.upstream(lddMap, values)
+        return self.lddNetwork.toMap(self.lddNetwork.upstream(self.lddNetwork.toArray(values)))
+
+    def kinematic(self, lddMap, dischargeInitial, alpha, length_of_sub_time_step): 
+
+        # discharge (m3/s) based on the kinematic wave approximation, without lateral inflow
+        if self.kinematicWaveEngine == "pcraster":
+            return pcr.kinematic(lddMap, dischargeInitial, 0.0, 
+                                 alpha, self.beta, \
+                                 1, length_of_sub_time_step, self.channelLength)
+        
+        start = time.time()
+        discharge = self.lddNetwork.kinematic(self.lddNetwork.toArray(dischargeInitial), 0.0, \
+                                              self.lddNetwork.toArray(alpha), self.beta, \
+                                              1, length_of_sub_time_step, self.lddNetwork.toArray(self.channelLength))
+        discharge = self.lddNetwork.toMap(discharge)
+        numpyTime = time.time() - start
+        
+        if self.kinematicWaveEngine == "numpy_with_check":
+            start = time.time()
+            checkDischarge = pcr.kinematic(lddMap, dischargeInitial, 0.0, 
+                                           alpha, self.beta, \
+                                           1, length_of_sub_time_step, self.channelLength)
+            pcrasterTime = time.time() - start
+            difference = pcr.ifthen(pcr.defined(checkDischarge), pcr.abs(discharge - checkDischarge))
+            relativeDifference = vos.getValDivZero(difference, pcr.abs(checkDischarge), 1e-6, 0.0)
+            msg = 'Kinematic wave (numpy vs pcraster): max abs difference = %e m3/s ; max relative difference = %e ; time numpy = %.4f s ; pcraster = %.4f s' \
+                  %(vos.getMinMaxMean(difference)[1], vos.getMinMaxMean(relativeDifference)[1], numpyTime, pcrasterTime)
+            logger.info(msg)
+        
+        return discharge
+
+    def estimate_number_of_sub_time_steps(self, zones): 
 
         # estimate the length of sub-time step (unit: s):
         # - the shorter is the better
@@ -697,20 +762,27 @@ class Routing(object):
                                   self.subDischarge, vos.secondsPerDay())
         # TODO: Check this logic with Rens!                           
 
-        # determine the number of sub time steps (based on Rens van Beek's method)
+        # determine the number of sub time steps (based on Rens van Beek's method) for every zone
         #
         critical_condition = (length_of_sub_time_step < vos.secondsPerDay())  & \
                              (self.water_height > self.critical_water_height) & \
                              (self.lddMap != pcr.ldd(5))
         #
+        # - without zones (zones = None), for every cell
+        critical_length_of_sub_time_step = pcr.ifthen(critical_condition, length_of_sub_time_step)
+        if zones is not None: critical_length_of_sub_time_step = pcr.areaminimum(critical_length_of_sub_time_step, zones)
         number_of_sub_time_steps = vos.secondsPerDay() /\
-                                   pcr.cover(
-                                   pcr.areaminimum(\
-                                   pcr.ifthen(critical_condition, \
-                                              length_of_sub_time_step),self.landmask),\
+                                   pcr.cover(critical_length_of_sub_time_step,\
                                              vos.secondsPerDay()/self.limit_num_of_sub_time_steps)   
         number_of_sub_time_steps = 1.25 * number_of_sub_time_steps + 1
         number_of_sub_time_steps = pcr.roundup(number_of_sub_time_steps)
+
+        return number_of_sub_time_steps
+
+    def estimate_length_of_sub_time_step(self): 
+
+        # the number of sub time steps for the entire landmask
+        number_of_sub_time_steps = self.estimate_number_of_sub_time_steps(self.landmask)
         #
         number_of_loops = max(1.0, pcr.cellvalue(pcr.mapmaximum(number_of_sub_time_steps),1)[1])     # minimum number of sub_time_steps = 1 
         number_of_loops = int(max(self.limit_num_of_sub_time_steps, number_of_loops))
@@ -720,6 +792,128 @@ class Routing(object):
 
         return (length_of_sub_time_step, number_of_loops)                               
 
+    def estimate_sub_cycling_factor(self): 
+
+        # for the local time stepping option (Courant classes of cells): 
+        # - the length of the (global) sub time step is based on the minimum number of sub time steps of the cells (but at least limit_num_of_sub_time_steps) 
+        # - every cell is sub-cycled within a (global) sub time step by a factor 2**k, based on its own number of sub time steps 
+        # - the factors and the channel parameters (constant within a day) are passed to the ldd network once per day
+        number_of_sub_time_steps = self.estimate_number_of_sub_time_steps(None)
+        number_of_loops = max(1.0, pcr.cellvalue(pcr.mapminimum(number_of_sub_time_steps), 1)[0])
+        number_of_loops = int(max(self.limit_num_of_sub_time_steps, number_of_loops))
+        length_of_sub_time_step = vos.secondsPerDay() / number_of_loops
+
+        sub_cycling_factor = np.maximum(1.0, np.nan_to_num(self.lddNetwork.toArray(number_of_sub_time_steps), nan = 1.0) / number_of_loops)
+        sub_cycling_factor = np.power(2, np.ceil(np.log2(sub_cycling_factor) - 1e-6)).astype(np.int64)
+        self.lddNetwork.setLocalTimeStepping(sub_cycling_factor)
+
+        def cell_values(value):
+            return np.nan_to_num(self.lddNetwork.toArray(pcr.ifthen(self.landmask, pcr.scalar(value))))
+        
+        self.channel_parameters_for_local_time_stepping = {}
+        self.channel_parameters_for_local_time_stepping['channelWidth']        = cell_values(self.channelWidth)
+        self.channel_parameters_for_local_time_stepping['channelLength']       = cell_values(self.channelLength)
+        self.channel_parameters_for_local_time_stepping['channelDepth']        = cell_values(self.channelDepth)
+        self.channel_parameters_for_local_time_stepping['gradient']            = cell_values(self.gradient)
+        self.channel_parameters_for_local_time_stepping['manningsN']           = cell_values(self.manningsN)
+        self.channel_parameters_for_local_time_stepping['floodplainManningsN'] = cell_values(self.floodplainManN if self.floodPlain else 0.0)
+        self.channel_parameters_for_local_time_stepping['floodPlain']          = bool(self.floodPlain)
+        self.channel_parameters_for_local_time_stepping['isWaterBody']         = cell_values(pcr.cover(pcr.scalar(self.WaterBodies.waterBodyIds), 0.0)) > 0.0
+        self.channel_parameters_for_local_time_stepping['isWaterBodyOutlet']   = cell_values(pcr.cover(pcr.scalar(self.WaterBodies.waterBodyOut), 0.0)) > 0.0
+        self.channel_parameters_for_local_time_stepping['beta']                = self.beta
+
+        # the number of cell sub steps per (global) sub time step, compared to global time stepping (every cell with the maximum factor)
+        max_factor = int(sub_cycling_factor.max()) if sub_cycling_factor.size > 0 else 1
+        msg = "Local time stepping: %i cell sub steps per sub time step (%.1f percent of the ones with the maximum sub cycling factor %i for all cells)" \
+              %(self.lddNetwork.numberOfSlots, 100. * self.lddNetwork.numberOfSlots / max(1, max_factor * self.lddNetwork.numberOfCells), max_factor)
+        logger.info(msg)
+
+        return (length_of_sub_time_step, number_of_loops, max_factor)
+
+    def kinematic_wave_channel_step(self, channelStorageForRouting, lddMap, length_of_sub_time_step, waterBodyOutflowInM3PerSec): 
+
+        # estimate of water height (m)
+        # - here it is needed to estimate the channel wetted area (for the calculation of alpha and dischargeInitial)
+        # - this water height is only for the one in channels (it does not include the one for lake and reservoirs)
+        self.water_height = channelStorageForRouting /\
+                           (pcr.max(self.min_fracwat_for_water_height, self.dynamicFracWat) * self.cellArea)
+        # PS: Disactivate this line gives negative channelStorage (most likely due too high water heights in lakes and reservoirs).                  
+                           
+
+        # alpha parameter and initial/estimate discharge variable - needed for kinematic wave calculation 
+        alpha, dischargeInitial = \
+               self.calculate_alpha_and_initial_discharge_for_kinematic_wave(channelStorageForRouting, \
+                                                                             self.water_height, \
+                                                                             self.innundatedFraction, self.floodDepth) 
+
+        # for lakes and reservoir outlet cells, set discharge estimate (dischargeInitial) to waterBodyOutflowInM3PerSec
+        dischargeInitial = pcr.cover(\
+                           pcr.ifthen(\
+                           self.WaterBodies.waterBodyOut, waterBodyOutflowInM3PerSec), dischargeInitial)
+
+        # also for the ones with zero channelStorageForRouting
+        dischargeInitial = pcr.ifthenelse(channelStorageForRouting > 0.0, dischargeInitial, 0.0)
+        
+        # discharge estimate (dischargeInitial) in m3/s
+        dischargeInitial = pcr.cover(dischargeInitial, 0.0)
+        dischargeInitial = pcr.ifthen(self.landmask, dischargeInitial)
+
+
+        # discharge (m3/s) based on the KINEMATIC WAVE approximation
+        #~ logger.debug('start pcr.kinematic')
+        subDischarge = self.kinematic(lddMap, dischargeInitial, alpha, length_of_sub_time_step)
+        subDischarge = pcr.max(0.0, pcr.cover(subDischarge, 0.0))
+        #~ logger.debug('done')
+
+
+        # for lakes and reservoir cells, set discharge to zero
+        subDischarge = pcr.cover(\
+                       pcr.ifthen(pcr.scalar(self.WaterBodies.waterBodyIds) > 0., pcr.scalar(0.0)), subDischarge)
+        
+        
+        # make sure that we do not get negative channel storage
+        subDischarge = pcr.min(subDischarge * length_of_sub_time_step, \
+                       pcr.max(0.0, channelStorageForRouting + self.upstream(lddMap, subDischarge * length_of_sub_time_step)))/length_of_sub_time_step
+
+
+        # update channelStorage (m3) after lateral flows in channels
+        storage_change_in_volume  = self.upstream(lddMap, subDischarge * length_of_sub_time_step) - subDischarge * length_of_sub_time_step 
+        channelStorageForRouting += storage_change_in_volume 
+        
+        return subDischarge, channelStorageForRouting
+
+    def kinematic_wave_channel_step_with_sub_cycling(self, channelStorageForRouting, length_of_sub_time_step, waterBodyOutflowInM3PerSec): 
+
+        # the channel kinematic wave step with local time stepping on the ldd network arrays: every cell makes its own number of sub steps (see estimate_sub_cycling_factor) 
+        # - the volumes passed between cells with different numbers of sub steps are exact (see lddNetwork.channelStepInOrder)
+        # - the flood fraction and flood depth (and dynamicFracWat) are the ones of the latest (global) sub time step, as in kinematic_wave_channel_step
+        storage = np.nan_to_num(self.lddNetwork.toArray(channelStorageForRouting))
+        denominator = self.lddNetwork.toArray(pcr.max(self.min_fracwat_for_water_height, self.dynamicFracWat) * self.cellArea)
+        flood_only_wetted_perimeter = self.floodDepth * (2.0) + \
+                                      pcr.max(0.0, self.innundatedFraction*self.cellArea/self.channelLength - self.channelWidth)
+        flood_only_wetted_perimeter = np.nan_to_num(self.lddNetwork.toArray(pcr.ifthen(self.landmask, flood_only_wetted_perimeter)))
+        waterBodyOutflow = np.nan_to_num(self.lddNetwork.toArray(waterBodyOutflowInM3PerSec))
+        
+        discharge_volume, new_storage = self.lddNetwork.channelStepWithLocalTimeStepping(storage, length_of_sub_time_step, denominator, flood_only_wetted_perimeter, \
+                                                                                         self.channel_parameters_for_local_time_stepping, waterBodyOutflow)
+        
+        if self.debugWaterBalance:
+            # - the storage change must be equal to the volume leaving the network at its pits/outlets
+            outflow = discharge_volume[~self.lddNetwork.hasDownstream].sum()
+            error = storage.sum() - new_storage.sum() - outflow
+            msg = "Channel step with local time stepping: storage change %e m3 ; outflow at the outlets %e m3 ; error %e m3" %(storage.sum() - new_storage.sum(), outflow, error)
+            logger.debug(msg)
+            if abs(error) > 1e-9 * max(1.0, storage.sum()): logger.warning(msg)
+
+        subDischarge             = pcr.cover(self.lddNetwork.toMap(discharge_volume / length_of_sub_time_step), 0.0)
+        channelStorageForRouting = pcr.cover(self.lddNetwork.toMap(new_storage), channelStorageForRouting)
+
+        # water height for the entire landmask
+        self.water_height = channelStorageForRouting /\
+                           (pcr.max(self.min_fracwat_for_water_height, self.dynamicFracWat) * self.cellArea)
+
+        return subDischarge, channelStorageForRouting
+
     def simplifiedKinematicWave(self): 
         """
         The 'simplifiedKinematicWave':
@@ -771,19 +965,17 @@ class Routing(object):
 
             # discharge (m3/s) based on kinematic wave approximation
             #~ logger.debug('start pcr.kinematic')
-            self.subDischarge = pcr.kinematic(self.lddMap, dischargeInitial, 0.0, 
-                                              alpha, self.beta, \
-                                              1, length_of_sub_time_step, self.channelLength)
+            self.subDischarge = self.kinematic(self.lddMap, dischargeInitial, alpha, length_of_sub_time_step)
             self.subDischarge = pcr.cover(self.subDischarge, 0.0)
             self.subDischarge = pcr.max(0.0, pcr.cover(self.subDischarge, 0.0))
             #~ logger.debug('done')
             
             # make sure that we do not get negative channel storage
             self.subDischarge = pcr.min(self.subDischarge * length_of_sub_time_step, \
-                                pcr.max(0.0, channelStorageForRouting + pcr.upstream(self.lddMap, self.subDischarge * length_of_sub_time_step)))/length_of_sub_time_step
+                                pcr.max(0.0, channelStorageForRouting + self.upstream(self.lddMap, self.subDischarge * length_of_sub_time_step)))/length_of_sub_time_step
             
             # update channelStorage (m3)
-            storage_change_in_volume  = pcr.upstream(self.lddMap, self.subDischarge * length_of_sub_time_step) - \
+            storage_change_in_volume  = self.upstream(self.lddMap, self.subDischarge * length_of_sub_time_step) - \
                                                                   self.subDischarge * length_of_sub_time_step 
             channelStorageForRouting += storage_change_in_volume 
             #
@@ -844,6 +1036,7 @@ class Routing(object):
         #
         if self.includeWaterBodies == False:
             self.WaterBodies.waterBodyIds = pcr.ifthen(self.landmask, pcr.nominal(-1))            # ignoring all lakes and reservoirs 
+            if self.WaterBodies.waterBodyTable is not None: self.WaterBodies.buildWaterBodyTable()  # - also in the water body table (numpy engine)
         
         # downstreamDemand (m3/s) for reservoirs 
         # - this one must be called before updating timestepsToAvgDischarge
@@ -1301,8 +1494,101 @@ class Routing(object):
 
         return logInt,x+logInt
         
+    def prepareInundationProfileArrays(self):
+
+        # numpy arrays (levels x landmask cells) of the elevation profile, used in returnInundationFractionAndFloodDepthWithNumpy
+        self.inundationCellMask = vos.getCellMask(self.landmask)
+        
+        self.floodVolumeArray   = np.vstack([vos.pcr2numpyAtCells(self.floodVolume[iCnt], self.inundationCellMask) for iCnt in range(self.nrZLevels)])
+        self.kSlopeArray        = np.vstack([vos.pcr2numpyAtCells(self.kSlope[iCnt]     , self.inundationCellMask) for iCnt in range(self.nrZLevels)])
+        self.mIntervalArray     = np.vstack([vos.pcr2numpyAtCells(self.mInterval[iCnt]  , self.inundationCellMask) for iCnt in range(self.nrZLevels)])
+        self.areaFractionsArray = np.array(self.areaFractions, dtype = np.float64)
+        
+        self.cellAreaArray = vos.pcr2numpyAtCells(self.cellArea, self.inundationCellMask)
+        
+        self.maxFloodDepthArray = None
+        if self.maxFloodDepth is not None: self.maxFloodDepthArray = vos.pcr2numpyAtCells(self.maxFloodDepth, self.inundationCellMask)
+
     def returnInundationFractionAndFloodDepth(self, channelStorage):
         
+        if self.floodPlain and self.inundationMethod == "numpy":
+            return self.returnInundationFractionAndFloodDepthWithNumpy(channelStorage)
+
+        if self.floodPlain and self.inundationMethod == "numpy_with_check":
+            
+            start = time.time()
+            inundatedFraction, floodDepth = self.returnInundationFractionAndFloodDepthWithNumpy(channelStorage)
+            numpyTime = time.time() - start
+            
+            start = time.time()
+            checkFraction, checkDepth = self.returnInundationFractionAndFloodDepthWithPCRaster(channelStorage)
+            pcrasterTime = time.time() - start
+            
+            errorFraction = vos.getMinMaxMean(pcr.ifthen(self.landmask, pcr.abs(inundatedFraction - checkFraction)))[1]
+            errorDepth    = vos.getMinMaxMean(pcr.ifthen(self.landmask, pcr.abs(floodDepth - checkDepth)))[1]
+            msg = 'Inundation (numpy vs pcraster): max abs difference fraction = %e ; depth = %e m ; time numpy = %.4f s ; pcraster = %.4f s' \
+                  %(errorFraction, errorDepth, numpyTime, pcrasterTime)
+            logger.info(msg)
+            
+            return inundatedFraction, floodDepth
+
+        return self.returnInundationFractionAndFloodDepthWithPCRaster(channelStorage)
+
+    def returnInundationFractionAndFloodDepthWithNumpy(self, channelStorage):
+
+        # the same calculation as in returnInundationFractionAndFloodDepthWithPCRaster, but in one pass over the landmask cells
+        
+        msg = 'Calculate channel inundated fraction and flood inundation depth above the floodplain (using numpy).'
+        logger.debug(msg)
+
+        cellMask = self.inundationCellMask
+        
+        # flood/innundation/excess volume (excess above the bankfull capacity, unit: m3)
+        excessVolume = np.maximum(0.0, vos.pcr2numpyAtCells(channelStorage, cellMask) - \
+                                       vos.pcr2numpyAtCells(self.channelStorageCapacity, cellMask))
+        channelFraction = vos.pcr2numpyAtCells(self.channelFraction, cellMask)
+        
+        # find the match on the basis of the shortest distance to the available intersections (levels 1 to nrZLevels-1)
+        # - for equal distances, the highest level is selected (as in the loop of the pcraster method)
+        # - a match must be closer than the distance to the top of the profile (floodVolume[nrZLevels-1])
+        lastLevel = self.nrZLevels - 1
+        cells     = np.arange(excessVolume.size)
+        deltaXAll = excessVolume[np.newaxis,:] - self.floodVolumeArray[1:,:]
+        iMatch    = lastLevel - np.argmin(np.abs(deltaXAll[::-1,:]), axis = 0)
+        deltaX    = deltaXAll[iMatch - 1, cells]
+        isMatched = np.abs(deltaX) < np.abs(self.floodVolumeArray[lastLevel,:])
+        
+        deltaX = np.where(isMatched, deltaX, self.floodVolumeArray[lastLevel,:])
+        y_i    = np.where(isMatched, self.areaFractionsArray[iMatch], 1.0)
+        kZero  = np.where(isMatched, self.kSlopeArray[iMatch - 1, cells], 0.0)
+        kOne   = np.where(isMatched, self.kSlopeArray[iMatch, cells], 0.0)
+        mInt   = np.where(isMatched, self.mIntervalArray[iMatch, cells], 0.0)
+
+        # scaled deltaX and smoothed function on the basis of the integrated logistic functions PHI(x) and 1-PHI(x)
+        deltaXScaled = np.where(deltaX < 0., -1., 1.) * np.minimum(self.criterionKK, np.abs(deltaX / np.maximum(1., mInt)))
+        logIntZero   = np.log(np.exp(-deltaXScaled) + 1.)
+        logIntOne    = deltaXScaled + logIntZero
+        
+        # compute fractional inundated/flooded area
+        inundatedFraction = np.where(excessVolume > 0.0, \
+                                     np.where(np.abs(deltaXScaled) < self.criterionKK, \
+                                              y_i - kZero * mInt * logIntZero + kOne * mInt * logIntOne, \
+                                              y_i + np.where(deltaX < 0., kZero, kOne) * deltaX), 0.0)
+        # - minimum value is channelFraction and maximum value is 1.0
+        inundatedFraction = np.maximum(channelFraction, inundatedFraction)
+        inundatedFraction = np.maximum(0., np.minimum(1.0, inundatedFraction))               # dimensionless
+
+        # calculate flooded/inundated depth (unit: m) above the floodplain 
+        floodDepth = np.where(inundatedFraction > 0., \
+                              excessVolume / (np.maximum(self.min_fracwat_for_water_height, inundatedFraction) * self.cellAreaArray), 0.)
+        # - maximum flood depth
+        if self.maxFloodDepthArray is not None:
+            floodDepth = np.maximum(0.0, np.minimum(self.maxFloodDepthArray, floodDepth))
+        
+        return vos.numpyAtCells2pcr(inundatedFraction, cellMask), vos.numpyAtCells2pcr(floodDepth, cellMask)
+
+    def returnInundationFractionAndFloodDepthWithPCRaster(self, channelStorage):
+        
         # flood/innundation depth above the flood plain (unit: m)
         floodDepth = 0.0
         
@@ -1963,7 +2249,12 @@ class Routing(object):
                            (pcr.max(self.min_fracwat_for_water_height, self.dynamicFracWat) * self.cellArea)
 
         # estimate the length of sub-time step (unit: s):
-        length_of_sub_time_step, number_of_loops = self.estimate_length_of_sub_time_step()
+        if self.localTimeStepping:
+            length_of_sub_time_step, number_of_loops, max_sub_cycling_factor = self.estimate_sub_cycling_factor()
+            msg = "Local time stepping: "+str(number_of_loops)+" sub time steps and maximum sub cycling factor "+str(max_sub_cycling_factor)
+            logger.info(msg)
+        else:
+            length_of_sub_time_step, number_of_loops = self.estimate_length_of_sub_time_step()
 
 
         #######################################################################################################################
@@ -2052,58 +2343,14 @@ class Routing(object):
             # - update channelStorage (m3)  - after waterBodyOutflow (m3)
             #~ storage_change_in_volume = waterBodyOutflow                                                 # NOT CORRECT
             #~ storage_change_in_volume = pcr.upstream(self.lddMap, waterBodyOutflow) - waterBodyOutflow   # NOT CORRECT
-            storage_change_in_volume    = pcr.upstream(self.lddMap, waterBodyOutflow)                      # PS: I think this is the correct one. 
+            storage_change_in_volume    = self.upstream(self.lddMap, waterBodyOutflow)                     # PS: I think this is the correct one. 
             channelStorageForRouting   += storage_change_in_volume 
 
-            # estimate of water height (m)
-            # - here it is needed to estimate the channel wetted area (for the calculation of alpha and dischargeInitial)
-            # - this water height is only for the one in channels (it does not include the one for lake and reservoirs)
-            self.water_height = channelStorageForRouting /\
-                               (pcr.max(self.min_fracwat_for_water_height, self.dynamicFracWat) * self.cellArea)
-            # PS: Disactivate this line gives negative channelStorage (most likely due too high water heights in lakes and reservoirs).                  
-                               
-
-            # alpha parameter and initial/estimate discharge variable - needed for kinematic wave calculation 
-            alpha, dischargeInitial = \
-                   self.calculate_alpha_and_initial_discharge_for_kinematic_wave(channelStorageForRouting, \
-                                                                                 self.water_height, \
-                                                                                 self.innundatedFraction, self.floodDepth) 
-
-            # for lakes and reservoir outlet cells, set discharge estimate (dischargeInitial) to waterBodyOutflowInM3PerSec
-            dischargeInitial = pcr.cover(\
-                               pcr.ifthen(\
-                               self.WaterBodies.waterBodyOut, waterBodyOutflowInM3PerSec), dischargeInitial)
-
-            # also for the ones with zero channelStorageForRouting
-            dischargeInitial = pcr.ifthenelse(channelStorageForRouting > 0.0, dischargeInitial, 0.0)
-            
-            # discharge estimate (dischargeInitial) in m3/s
-            dischargeInitial = pcr.cover(dischargeInitial, 0.0)
-            dischargeInitial = pcr.ifthen(self.landmask, dischargeInitial)
-
-
-            # discharge (m3/s) based on the KINEMATIC WAVE approximation
-            #~ logger.debug('start pcr.kinematic')
-            self.subDischarge = pcr.kinematic(self.lddMap, dischargeInitial, 0.0, 
-                                              alpha, self.beta, \
-                                              1, length_of_sub_time_step, self.channelLength)
-            self.subDischarge = pcr.max(0.0, pcr.cover(self.subDischarge, 0.0))
-            #~ logger.debug('done')
-
-
-            # for lakes and reservoir cells, set discharge to zero
-            self.subDischarge = pcr.cover(\
-                                pcr.ifthen(pcr.scalar(self.WaterBodies.waterBodyIds) > 0., pcr.scalar(0.0)), self.subDischarge)
-            
-            
-            # make sure that we do not get negative channel storage
-            self.subDischarge = pcr.min(self.subDischarge * length_of_sub_time_step, \
-                                pcr.max(0.0, channelStorageForRouting + pcr.upstream(self.lddMap, self.subDischarge * length_of_sub_time_step)))/length_of_sub_time_step
-
-
-            # update channelStorage (m3) after lateral flows in channels
-            storage_change_in_volume  = pcr.upstream(self.lddMap, self.subDischarge * length_of_sub_time_step) - self.subDischarge * length_of_sub_time_step 
-            channelStorageForRouting += storage_change_in_volume 
+            # discharge (m3/s) based on the KINEMATIC WAVE approximation and channelStorage (m3) after lateral flows in channels
+            if self.localTimeStepping:
+                self.subDischarge, channelStorageForRouting = self.kinematic_wave_channel_step_with_sub_cycling(channelStorageForRouting, length_of_sub_time_step, waterBodyOutflowInM3PerSec)
+            else:
+                self.subDischarge, channelStorageForRouting = self.kinematic_wave_channel_step(channelStorageForRouting, self.lddMap, length_of_sub_time_step, waterBodyOutflowInM3PerSec)
 
 
             # return waterBodyStorage to channelStorage  
@@ -2355,10 +2602,7 @@ class Routing(object):
     def old_style_routing_reporting(self,currTimeStep):
 
         if self.report == True:
-            timeStamp = datetime.datetime(currTimeStep.year,\
-                                          currTimeStep.month,\
-                                          currTimeStep.day,\
-                                          0)
+            timeStamp = currTimeStep.currTimeFull
             # writing daily output to netcdf files
             timestepPCR = currTimeStep.timeStepPCR
             if self.outDailyTotNC[0] != "None":
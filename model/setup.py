@@ -1,6 +1,12 @@
 from distutils.core import setup
+from distutils.extension import Extension
 from Cython.Build import cythonize
 
+# the block reductions of imagemean run in parallel (OpenMP)
+extensions = [Extension("imagemean", ["imagemean.pyx"],
+                        extra_compile_args = ['-fopenmp'],
+                        extra_link_args = ['-fopenmp'])]
+
 setup(
-  ext_modules = cythonize("imagemean.pyx"),
+  ext_modules = cythonize(extensions),
 )
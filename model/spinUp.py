@@ -56,6 +56,9 @@ class SpinUp(object):
         # setting up the convergence parameters
         self.setupConvergence(iniItems)
 
+        # option to accelerate the spin-up by extrapolating slow storage states
+        self.setupAcceleration(iniItems)
+
     def setupConvergence(self,iniItems):
 
         self.noSpinUps         =   int(iniItems.globalOptions['maxSpinUpsInYears'])
@@ -71,6 +74,111 @@ class SpinUp(object):
         # directory for storing end states (format: pcraster maps)
         self.endStateDir = iniItems.endStateDir
 
+    def setupAcceleration(self, iniItems):
+
+        # method for accelerating the spin-up; options: "None" (default) or "Aitken"
+        # - "Aitken": the end states of slow storages (groundwater and the deepest soil layer) of three consecutive spin-up cycles 
+        #             are extrapolated (Aitken delta-squared) towards their fixed point
+        self.accelerationMethod = iniItems.get_choice_option('globalOptions', 'spinUpAccelerationMethod', ["None", "False", "Aitken"], "None")
+
+        # safeguards:
+        # - extrapolation is only done for cells with a monotonic geometric convergence, i.e. 0 < ratio < maximum ratio, 
+        #   where ratio is the change during the last cycle divided by the change during the cycle before  
+        self.maxConvergenceRatio = 0.95
+        if iniItems.get_option('globalOptions', 'spinUpAccelerationMaxRatio') is not None:
+            self.maxConvergenceRatio = float(iniItems.globalOptions['spinUpAccelerationMaxRatio'])
+        # - the extrapolated change may not exceed this factor times the change during the last cycle
+        self.maxExtrapolationFactor = 10.0
+        if iniItems.get_option('globalOptions', 'spinUpAccelerationMaxFactor') is not None:
+            self.maxExtrapolationFactor = float(iniItems.globalOptions['spinUpAccelerationMaxFactor'])
+
+        # the end states (of the extrapolated variables) of the previous spin-up cycles
+        self.stateHistory = []
+
+    def acceleratedStateVariables(self, state):
+
+        # list of (module, land cover type, variable name) of the slow storages to be extrapolated  
+        variables = [('groundwater', None, 'storGroundwater')]
+        deepestSoilLayer = 'storLow'
+        if self.numberOfLayers == 3: deepestSoilLayer = 'storLow030150'
+        for coverType in list(state['landSurface'].keys()):
+            variables.append(('landSurface', coverType, deepestSoilLayer))
+        return variables
+
+    def accelerateStates(self, state, landSurface, cellAreaMap):
+        """
+        Extrapolate the slow storage states of the given (end) state towards their fixed point (Aitken delta-squared).
+        The state is modified and returned. 
+        """
+
+        if self.accelerationMethod not in ["Aitken"]: return state
+
+        variables = self.acceleratedStateVariables(state)
+
+        # save the current end states
+        endStates = {}
+        for module, coverType, var in variables:
+            if coverType is None: endStates[(module, coverType, var)] = state[module][var]
+            else: endStates[(module, coverType, var)] = state[module][coverType][var]
+        self.stateHistory.append(endStates)
+
+        # logging the per cell changes during the last cycle
+        if len(self.stateHistory) > 1:
+            for key in variables:
+                change = pcr.abs(self.stateHistory[-1][key] - self.stateHistory[-2][key])
+                mn, mx, mean = vos.getMinMaxMean(change)
+                logger.info('Spin-up change of %s (%s) during the last cycle (m): max = %.5f ; mean = %.5f' %(key[2], str(key[1]), mx, mean))
+
+        # at least three consecutive end states are needed
+        if len(self.stateHistory) < 3: return state
+
+        logger.info('Extrapolating slow storage states using the Aitken delta-squared method.')
+
+        x0, x1, x2 = self.stateHistory[-3:]
+        for key in variables:
+
+            module, coverType, var = key
+
+            deltaOne = x1[key] - x0[key]
+            deltaTwo = x2[key] - x1[key]
+
+            # convergence ratio, only for cells with a monotonic geometric convergence
+            ratio = vos.getValDivZero(deltaTwo, deltaOne, vos.smallNumber, 0.0)
+            ratio = pcr.ifthenelse(pcr.abs(deltaOne) > vos.smallNumber, ratio, 0.0)
+            isExtrapolated = pcr.cover((ratio > 0.0) & (ratio < self.maxConvergenceRatio), pcr.boolean(0.0))
+
+            # extrapolated change towards the fixed point: deltaTwo * ratio / (1 - ratio), limited by the safeguard factor
+            extrapolatedChange = deltaTwo * ratio / pcr.max(1.0 - ratio, 1.0 - self.maxConvergenceRatio)
+            maxChange = self.maxExtrapolationFactor * pcr.abs(deltaTwo)
+            extrapolatedChange = pcr.max(-maxChange, pcr.min(maxChange, extrapolatedChange))
+            extrapolatedChange = pcr.ifthenelse(isExtrapolated, extrapolatedChange, 0.0)
+
+            # the extrapolated storage must be positive and (for soil) within the storage capacity
+            extrapolatedState = pcr.max(0.0, x2[key] + extrapolatedChange)
+            if module == 'landSurface':
+                storCap = vars(landSurface.landCoverObj[coverType].parameters)['storCap' + var[4:]]
+                extrapolatedState = pcr.min(storCap, extrapolatedState)
+            extrapolatedState = pcr.ifthen(pcr.defined(x2[key]), extrapolatedState)
+
+            if coverType is None: 
+                state[module][var] = extrapolatedState
+            else:
+                state[module][coverType][var] = extrapolatedState
+
+            # logging the convergence metrics
+            numberOfCells  = vos.getMapTotal(pcr.scalar(pcr.defined(x2[key])))
+            extrapolatedCells = vos.getMapTotal(pcr.scalar(isExtrapolated))
+            meanRatio = vos.getMapTotal(pcr.ifthen(isExtrapolated, ratio)) / max(1.0, extrapolatedCells)
+            volumeChange = vos.getMapVolume(extrapolatedState - x2[key], cellAreaMap)
+            if coverType is not None: volumeChange = vos.getMapVolume((extrapolatedState - x2[key]) * landSurface.landCoverObj[coverType].fracVegCover, cellAreaMap)
+            logger.info('Aitken extrapolation of %s (%s): %i of %i cells ; mean convergence ratio = %.3f ; volume change = %e m3' \
+                        %(var, str(coverType), extrapolatedCells, numberOfCells, meanRatio, volumeChange))
+
+        # the trajectory is broken by the extrapolation, three new cycles are needed for the next extrapolation 
+        self.stateHistory = []
+
+        return state
+
     def getIniStates(self,model):
 
         if self.numberOfLayers == 2:
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# PCR-GLOBWB (PCRaster Global Water Balance) Global Hydrological Model
+#
+# Copyright (C) 2016, Edwin H. Sutanudjaja, Rens van Beek, Niko Wanders, Yoshihide Wada, 
+# Joyce H. C. Bosmans, Niels Drost, Ruud J. van der Ent, Inge E. M. de Graaf, Jannis M. Hoch, 
+# Kor de Jong, Derek Karssenberg, Patricia López López, Stefanie Peßenteiner, Oliver Schmitz, 
+# Menno W. Straatsma, Ekkamol Vannametee, Dominik Wisser, and Marc F. P. Bierkens
+# Faculty of Geosciences, Utrecht University, Utrecht, The Netherlands
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+# Startup benchmark of the model entry points
+# - every entry point module is imported in a new python process (as done for every clone and merging process of a parallel run), 
+#   and the (wall clock) time of the whole process is measured; the median of several repetitions is reported 
+# - the slowest imports of every module are taken from "python -X importtime"
+# - the backup of the python scripts (made by every run with backupScripts = True, and skipped by the clones of the parallel runners) is also timed
+#
+# usage: python startup_benchmark.py [number_of_repetitions] [module_name ...]
+
+import os
+import sys
+import glob
+import time
+import shutil
+import tempfile
+import subprocess
+
+# entry points of the model (the clone and merging processes of the parallel runs)
+default_modules = ["deterministic_runner", \
+                   "deterministic_runner_parallel_for_ulysses", \
+                   "deterministic_runner_merging_ulysses", \
+                   "ensemble_runner"]
+
+def process_time(module_name):
+    # time of a python process that only imports the module
+    start = time.time()
+    subprocess.check_call([sys.executable, "-c", "import " + module_name], cwd = os.path.abspath(os.path.dirname(__file__)))
+    return time.time() - start
+
+def backup_time():
+    # time of the backup of the python scripts to a new folder (as in Configuration.create_output_directories)
+    backup_directory = tempfile.mkdtemp()
+    start = time.time()
+    for filename in glob.glob(os.path.join(os.path.abspath(os.path.dirname(__file__)), '*.py')):
+        shutil.copy(filename, backup_directory)
+    elapsed = time.time() - start
+    shutil.rmtree(backup_directory)
+    return elapsed
+
+def slowest_imports(module_name, number_of_imports = 10):
+    # cumulative import times (microseconds) of the slowest imports, from the output of "python -X importtime"
+    output = subprocess.run([sys.executable, "-X", "importtime", "-c", "import " + module_name], \
+                            cwd = os.path.abspath(os.path.dirname(__file__)), stderr = subprocess.PIPE, universal_newlines = True).stderr
+    imports = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line: continue
+        self_time, cumulative_time, name = line[len("import time:"):].split("|")
+        imports.append((int(cumulative_time), name.rstrip()))
+    return sorted(imports, reverse = True)[:number_of_imports]
+
+def main():
+
+    number_of_repetitions = 5
+    if len(sys.argv) > 1: number_of_repetitions = int(sys.argv[1])
+    module_names = default_modules
+    if len(sys.argv) > 2: module_names = sys.argv[2:]
+
+    # the first process of every module also writes its bytecode (pyc) files, which is not part of the startup of a normal run
+    for module_name in module_names: process_time(module_name)
+
+    times = sorted(backup_time() for i in range(number_of_repetitions))
+    print("%-45s : %.3f s (median of %i backups ; min %.3f s ; max %.3f s)" %("backup of the python scripts", times[len(times) // 2], number_of_repetitions, times[0], times[-1]))
+
+    for module_name in module_names:
+        times = sorted(process_time(module_name) for i in range(number_of_repetitions))
+        print("%-45s : %.3f s (median of %i processes ; min %.3f s ; max %.3f s)" %(module_name, times[len(times) // 2], number_of_repetitions, times[0], times[-1]))
+        for cumulative_time, name in slowest_imports(module_name):
+            print("    %10.3f s  %s" %(cumulative_time * 1e-6, name))
+
+if __name__ == '__main__':
+    sys.exit(main())
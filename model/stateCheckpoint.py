@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+#
+# PCR-GLOBWB (PCRaster Global Water Balance) Global Hydrological Model
+#
+# Copyright (C) 2016, Edwin H. Sutanudjaja, Rens van Beek, Niko Wanders, Yoshihide Wada, 
+# Joyce H. C. Bosmans, Niels Drost, Ruud J. van der Ent, Inge E. M. de Graaf, Jannis M. Hoch, 
+# Kor de Jong, Derek Karssenberg, Patricia López López, Stefanie Peßenteiner, Oliver Schmitz, 
+# Menno W. Straatsma, Ekkamol Vannametee, Dominik Wisser, and Marc F. P. Bierkens
+# Faculty of Geosciences, Utrecht University, Utrecht, The Netherlands
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+
+'''
+Binary state checkpoints: all model states (as given by PCRGlobWB.getState) in one compressed (numpy npz) file, with
+- a manifest (the component, land cover type and name of every state),
+- the state values at the landmask cells only (float32, the precision of pcraster maps),
+- the landmask and the clone attributes (to check that a checkpoint is used for the same model domain), and 
+- the model time (date and time step) of the states.
+
+A checkpoint file is written to a temporary file first and then renamed, so that an existing checkpoint is never left half-written. 
+It is read in one go, and the states are returned in the same (nested dictionary) structure as PCRGlobWB.getState, 
+which can be used as the initial conditions of the model (see the 'iniConditions' of the getICs methods).
+'''
+
+import io
+import os
+import json
+
+import numpy as np
+import pcraster as pcr
+
+import logging
+logger = logging.getLogger(__name__)
+
+import virtualOS as vos
+
+checkpointFormatVersion = 1
+
+def getCloneAttributes():
+    ''' returns the attributes of the current clone '''
+    clone = pcr.clone()
+    return {'nrRows': clone.nrRows(), 'nrCols': clone.nrCols(), 'cellSize': clone.cellSize(), 'west': clone.west(), 'north': clone.north()}
+
+def writeStateCheckpoint(fileName, state, landmask, modelTime = None):
+    ''' writes the states (a nested dictionary as given by PCRGlobWB.getState) to a checkpoint file '''
+
+    cellMask = vos.getCellMask(landmask)
+
+    arrays   = {}
+    manifest = []
+    for component in sorted(state.keys()):
+        for var in sorted(state[component].keys()):
+            if isinstance(state[component][var], dict):
+                # - land cover types
+                for coverTypeVar in sorted(state[component][var].keys()):
+                    manifest.append([component, var, coverTypeVar, state[component][var][coverTypeVar] is not None])
+            else:
+                manifest.append([component, None, var, state[component][var] is not None])
+    for i, (component, coverType, var, defined) in enumerate(manifest):
+        if not defined: continue
+        value = state[component][var] if coverType is None else state[component][coverType][var]
+        arrays['state_%04i' %(i)] = vos.pcr2numpyAtCells(value, cellMask).astype(np.float32)
+
+    metadata = {}
+    metadata['version']       = checkpointFormatVersion
+    metadata['manifest']      = manifest
+    metadata['clone']         = getCloneAttributes()
+    metadata['numberOfCells'] = int(np.count_nonzero(cellMask))
+    if modelTime is not None:
+        metadata['date']        = str(modelTime.fulldate)
+        metadata['timeStepPCR'] = int(modelTime.timeStepPCR)
+    arrays['metadata'] = np.array(json.dumps(metadata))
+    arrays['landmask'] = np.packbits(cellMask)
+
+    # writing to a temporary file, then renaming it
+    directory = os.path.dirname(os.path.abspath(fileName))
+    if not os.path.exists(directory): os.makedirs(directory)
+    tmpFileName = fileName + ".tmp"
+    with open(tmpFileName, "wb") as checkpointFile:
+        np.savez_compressed(checkpointFile, **arrays)
+        checkpointFile.flush()
+        os.fsync(checkpointFile.fileno())
+    os.replace(tmpFileName, fileName)
+
+    logger.info("The states (%i variables at %i cells) are saved to the checkpoint file %s", len(manifest), metadata['numberOfCells'], fileName)
+
+def readStateCheckpoint(fileName, landmask):
+    ''' returns the states (a nested dictionary, as given by PCRGlobWB.getState) and the metadata of a checkpoint file '''
+
+    logger.info("Reading the states from the checkpoint file %s", fileName)
+
+    # the file is read in one go
+    with open(fileName, "rb") as checkpointFile:
+        content = io.BytesIO(checkpointFile.read())
+    arrays = np.load(content)
+
+    metadata = json.loads(str(arrays['metadata']))
+    if metadata['version'] != checkpointFormatVersion:
+        msg = "The checkpoint file " + fileName + " has an unknown format version: " + str(metadata['version'])
+        logger.error(msg)
+        raise Exception(msg)
+
+    # checking the model domain
+    cellMask = vos.getCellMask(landmask)
+    checkpointCellMask = np.unpackbits(arrays['landmask'], count = cellMask.size).reshape(cellMask.shape).astype(bool) \
+                         if metadata['clone'] == getCloneAttributes() else None
+    if checkpointCellMask is None or not np.array_equal(checkpointCellMask, cellMask):
+        msg = "The checkpoint file " + fileName + " does not have the same clone and landmask as this model."
+        logger.error(msg)
+        raise Exception(msg)
+
+    state = {}
+    for i, (component, coverType, var, defined) in enumerate(metadata['manifest']):
+        value = vos.numpyAtCells2pcr(arrays['state_%04i' %(i)], cellMask) if defined else None
+        if component not in state: state[component] = {}
+        if coverType is None:
+            state[component][var] = value
+        else:
+            if coverType not in state[component]: state[component][coverType] = {}
+            state[component][coverType][var] = value
+
+    return state, metadata
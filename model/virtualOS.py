@@ -1915,6 +1915,24 @@ def getMapTotalHighPrecisionButOnlyForPositiveValues_NEEDMORETEST(mapFile):
 
     return total
 
+def getCellMask(landmask):
+    ''' returns a 2-D numpy boolean array of the (landmask) cells used in numpy kernels '''
+    
+    return pcr.pcr2numpy(pcr.cover(pcr.boolean(landmask), pcr.boolean(0)), 0).astype(bool)
+
+def pcr2numpyAtCells(pcrMap, cellMask, missingValue = np.nan):
+    ''' returns a 1-D numpy array (float64) of the values of a scalar map (or a constant) at the cells of the given cellMask '''
+    
+    if isinstance(pcrMap, (int, float)): return np.full(int(np.count_nonzero(cellMask)), float(pcrMap))
+    return pcr.pcr2numpy(pcr.scalar(pcrMap), missingValue)[cellMask].astype(np.float64)
+
+def numpyAtCells2pcr(values, cellMask, missingValue = MV):
+    ''' returns a scalar map from a 1-D numpy array of values at the cells of the given cellMask; other cells are missing values '''
+    
+    array = np.full(cellMask.shape, missingValue, dtype = np.float64)
+    array[cellMask] = np.where(np.isfinite(values), values, missingValue)
+    return pcr.numpy2pcr(pcr.Scalar, array, missingValue)
+
 def get_rowColAboveThreshold(map, threshold):
     npMap = pcr.pcr2numpy(map, -9999)
     (nr, nc) = np.shape(npMap)
@@ -2061,10 +2079,90 @@ def regridToCoarse(fine,fac,mode,missValue):
     return coarse    
         
     
+# the water balance ledger (see WaterBalanceLedger) ; if None, every waterBalanceCheck is evaluated immediately 
+waterBalanceLedger = None
+
+class WaterBalanceLedger(object):
+    """ 
+    Records the water balance checks (see waterBalanceCheck) during a time step and evaluates them together at the end of the time step. 
+    The checks are only recorded every checkInterval time steps. Errors are also written (with the location of the largest error) to errorLogFileName. 
+    """
+
+    def __init__(self, checkInterval = 1, errorLogFileName = None):
+        
+        self.checkInterval    = max(1, int(checkInterval))
+        self.errorLogFileName = errorLogFileName
+        self.records = []
+        self.active  = True
+
+    def startTimeStep(self, timeStep):
+
+        self.records = []
+        self.active  = (timeStep - 1) % self.checkInterval == 0
+
+    def record(self, fluxesIn, fluxesOut, preStorages, endStorages, processName, PrintOnlyErrors, dateStr, threshold):
+        
+        # the maps are only referenced (pcraster maps are not modified in place)
+        if self.active: self.records.append((list(fluxesIn), list(fluxesOut), list(preStorages), list(endStorages), processName, PrintOnlyErrors, dateStr, threshold))
+
+    def evaluate(self):
+
+        if len(self.records) == 0: return
+        
+        # numpy arrays of the maps (a map used in several checks is converted only once)
+        arrays = {}
+        def getArray(pcrMap):
+            if isinstance(pcrMap, (int, float)): return float(pcrMap)
+            key = id(pcrMap)
+            if key not in arrays:
+                if pcrMap.isSpatial() == False: pcrMap = pcr.spatial(pcr.scalar(pcrMap))
+                arrays[key] = pcr.pcr2numpy(pcr.scalar(pcrMap), np.nan).astype(np.float64)
+            return arrays[key]
+
+        errors = []
+        for fluxesIn, fluxesOut, preStorages, endStorages, processName, PrintOnlyErrors, dateStr, threshold in self.records:
+            
+            # water balance error: inflow + storage change - outflow (missing values as in waterBalanceCheck)
+            error = np.zeros((pcr.clone().nrRows(), pcr.clone().nrCols()))
+            for fluxIn in fluxesIn:         error = error + getArray(fluxIn)
+            for fluxOut in fluxesOut:       error = error - getArray(fluxOut)
+            for preStorage in preStorages:  error = error + getArray(preStorage)
+            for endStorage in endStorages:  error = error - getArray(endStorage)
+            
+            defined = np.isfinite(error)
+            if np.count_nonzero(defined) == 0: continue
+            a, b, c = np.min(error[defined]), np.max(error[defined]), np.mean(error[defined])
+            if (abs(a) > threshold or abs(b) > threshold) and PrintOnlyErrors:
+                
+                # the location of the largest error
+                absError = np.where(defined, np.abs(error), 0.0)
+                row, col = np.unravel_index(np.argmax(absError), absError.shape)
+                x = pcr.clone().west()  + (col + 0.5) * pcr.clone().cellSize()
+                y = pcr.clone().north() - (row + 0.5) * pcr.clone().cellSize()
+                numberOfCells = np.count_nonzero(absError > threshold)
+                
+                msg = "WARNING !!!!!!!! Water Balance Error %s Min %f Max %f Mean %f (%i cells above the threshold %s; the largest error at row %i col %i, x %f y %f)" %(processName, a, b, c, numberOfCells, str(threshold), row, col, x, y)
+                logger.error(msg)
+                errors.append([str(dateStr), processName, "%e" %(a), "%e" %(b), "%e" %(c), str(threshold), str(numberOfCells), str(row), str(col), "%f" %(x), "%f" %(y)])
+        
+        self.records = []
+        
+        # structured log (comma separated values)
+        if self.errorLogFileName != None and len(errors) > 0:
+            writeHeader = os.path.exists(self.errorLogFileName) == False
+            with open(self.errorLogFileName, "a") as f:
+                if writeHeader: f.write("date,process,min,max,mean,threshold,number_of_cells,row,col,x,y\n")
+                for error in errors: f.write(",".join(error) + "\n")
+
 def waterBalanceCheck(fluxesIn,fluxesOut,preStorages,endStorages,processName,PrintOnlyErrors,dateStr,threshold=1e-5,landmask=None):
     """ Returns the water balance for a list of input, output, and storage map files  """
     # modified by Edwin (22 Apr 2013)
 
+    # using the ledger, the check is evaluated at the end of the time step 
+    if waterBalanceLedger != None:
+        waterBalanceLedger.record(fluxesIn, fluxesOut, preStorages, endStorages, processName, PrintOnlyErrors, dateStr, threshold)
+        return
+
     inMap   = pcr.spatial(pcr.scalar(0.0))
     outMap  = pcr.spatial(pcr.scalar(0.0))
     dsMap   = pcr.spatial(pcr.scalar(0.0))
@@ -2425,10 +2523,29 @@ def waterAbstractionAndAllocation(water_demand_volume,
                                   extra_info_for_water_balance_reporting = "",
                                   landmask = None,
                                   ignore_small_values = False,
-                                  prioritizing_local_source = True):
+                                  prioritizing_local_source = True,
+                                  zone_index = None):
 
     logger.debug("Allocation of abstraction.")
     
+    # using the numpy kernel with a precomputed zone index (see getZoneIndex)
+    # - the zone index must be built from the allocation_zones and the landmask; these are used through the zone index
+    # - ignore_small_values does not change the results (also not below: the rounded available_water_volume is not used anymore)
+    if zone_index is not None:
+        zone_area_per_zone = None
+        if debug_water_balance and zone_area is not None:
+            zone_area_per_zone = getZoneAverage(pcr2numpyAtCells(zone_area, zone_index['cellMask']), zone_index)
+        cellAbstraction, cellAllocation = waterAbstractionAndAllocationWithZoneIndex(\
+                                          pcr2numpyAtCells(water_demand_volume, zone_index['cellMask']),
+                                          pcr2numpyAtCells(available_water_volume, zone_index['cellMask']),
+                                          zone_index,
+                                          zone_area_per_zone,
+                                          high_volume_treshold,
+                                          debug_water_balance,
+                                          extra_info_for_water_balance_reporting,
+                                          prioritizing_local_source)
+        return numpyAtCells2pcr(cellAbstraction, zone_index['cellMask']), numpyAtCells2pcr(cellAllocation, zone_index['cellMask'])
+    
     if landmask is not None:
         water_demand_volume = pcr.ifthen(landmask, pcr.cover(water_demand_volume, 0.0))
         available_water_volume = pcr.ifthen(landmask, pcr.cover(available_water_volume, 0.0))
@@ -2522,6 +2639,116 @@ def waterAbstractionAndAllocation(water_demand_volume,
     
     return cellAbstraction, cellAllocation
 
+def getZoneIndex(allocation_zones, landmask):
+    """
+    Returns a zone index (a dictionary) for the numpy allocation kernel, built once from a nominal zone map:
+    - cellMask      : 2-D boolean array of the landmask cells
+    - zone          : the zone number (0 to numberOfZones - 1) of every landmask cell 
+    - numberOfZones : number of zones
+    """
+
+    zone_index = {}
+    zone_index['cellMask'] = getCellMask(pcr.ifthen(pcr.defined(allocation_zones), landmask))
+    zone_ids = pcr.pcr2numpy(pcr.scalar(allocation_zones), MV)[zone_index['cellMask']]
+    unique_zone_ids, zone_index['zone'] = np.unique(zone_ids, return_inverse = True)
+    zone_index['zone'] = zone_index['zone'].ravel()
+    zone_index['numberOfZones'] = unique_zone_ids.size
+    
+    logger.debug("Zone index with %i zones and %i cells." %(zone_index['numberOfZones'], zone_index['zone'].size))
+    
+    return zone_index
+
+def getZoneTotal(values, zone_index):
+    """ Returns the zonal totals of values at the cells of the zone index. """
+    
+    return np.bincount(zone_index['zone'], weights = values, minlength = zone_index['numberOfZones'])
+
+def getZoneAverage(values, zone_index):
+    """ Returns the zonal averages of the (finite) values at the cells of the zone index, as pcr.areaaverage ignoring missing values (NaN if a zone has no values). """
+    
+    valid = np.isfinite(values)
+    total = np.bincount(zone_index['zone'][valid], weights = values[valid], minlength = zone_index['numberOfZones'])
+    count = np.bincount(zone_index['zone'][valid], minlength = zone_index['numberOfZones'])
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        return total / count
+
+def waterAbstractionAndAllocationWithZoneIndex(water_demand_volume,
+                                               available_water_volume,
+                                               zone_index,
+                                               zone_area = None,
+                                               high_volume_treshold = None,
+                                               debug_water_balance = True,
+                                               extra_info_for_water_balance_reporting = "",
+                                               prioritizing_local_source = True):
+    """
+    The numpy version of waterAbstractionAndAllocation using a zone index (see getZoneIndex). 
+    The demand and available water volumes (m3) are arrays at the cells of the zone index. 
+    The zone area (m2) is an array with the area of every zone; if given, the abstraction and allocation per zone are checked (debug_water_balance).
+    """
+
+    # demand and available water (unit: m3)
+    cellVolDemand = np.maximum(0.0, np.nan_to_num(water_demand_volume))
+    cellAvlWater  = np.maximum(0.0, np.nan_to_num(available_water_volume))
+    
+    # satistify demand with local sources:
+    localAllocation  = 0.0
+    localAbstraction = 0.0
+    if prioritizing_local_source:
+        localAllocation  = np.minimum(cellVolDemand, cellAvlWater)
+        localAbstraction = localAllocation
+    
+    # the remaining demand and available water
+    cellVolDemand = np.maximum(0.0, cellVolDemand - localAllocation )
+    cellAvlWater  = np.maximum(0.0, cellAvlWater  - localAbstraction)
+    
+    # zonal values are gathered to the cells using the zone number 
+    zone = zone_index['zone']
+    
+    # total demand volume in each zone/segment (unit: m3)
+    zoneVolDemand = getZoneTotal(cellVolDemand, zone_index)[zone]
+    
+    # avoid very high values of available water
+    cellAvlWater  = np.minimum(cellAvlWater, zoneVolDemand)
+
+    # total available water volume in each zone/segment (unit: m3)
+    zoneAvlWater  = getZoneTotal(cellAvlWater, zone_index)[zone]
+    
+    # total actual water abstraction volume in each zone/segment (unit: m3)
+    zoneAbstraction = np.minimum(zoneAvlWater, zoneVolDemand)
+    
+    # actual water abstraction volume in each cell (unit: m3)
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        cellAbstraction = np.where(zoneAvlWater > smallNumber, cellAvlWater / zoneAvlWater, 0.0) * zoneAbstraction
+    cellAbstraction = np.minimum(cellAbstraction, cellAvlWater)
+    
+    # to minimize numerical errors
+    if high_volume_treshold is not None:
+        # mask: False for small volumes ; True for large volumes (e.g. lakes and reservoirs)
+        mask = cellAbstraction > high_volume_treshold
+        zoneAbstraction  = getZoneTotal(np.where(mask, 0.0, cellAbstraction), zone_index)[zone]
+        zoneAbstraction += getZoneTotal(np.where(mask, cellAbstraction, 0.0), zone_index)[zone]
+    
+    # allocation water to meet water demand (unit: m3)
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        cellAllocation  = np.where(zoneVolDemand > smallNumber, cellVolDemand / zoneVolDemand, 0.0) * zoneAbstraction
+    cellAllocation  = np.minimum(cellAllocation, cellVolDemand)
+    
+    # adding local abstraction and local allocation
+    cellAbstraction = cellAbstraction + localAbstraction
+    cellAllocation  = cellAllocation  + localAllocation
+    
+    if debug_water_balance and zone_area is not None:
+        
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            error = np.where(zone_area > 0.0, (getZoneTotal(cellAbstraction, zone_index) - getZoneTotal(cellAllocation, zone_index)) / zone_area, 0.0)
+        if error.size > 0 and np.max(np.abs(error)) > 1e-4:
+            msg  = "WARNING !!!!!!!! Water Balance Error %s Min %f Max %f Mean %f" %('abstraction - allocation per zone/segment (PS: Error here may be caused by rounding error.)', \
+                                                                                     np.min(error), np.max(error), np.mean(error))
+            msg += " " + str(extra_info_for_water_balance_reporting)
+            logger.error(msg)
+    
+    return cellAbstraction, cellAllocation
+
 def waterAbstractionAndAllocationBeforeRefactoringFinalizing(water_demand_volume,available_water_volume,allocation_zones,\
                                   zone_area = None,
                                   high_volume_treshold = 1000000.,
@@ -2737,6 +2964,16 @@ def findLastYearInNCTime(ncTimeVariable):
     
     return last_datetime.year
 
+def getCalendarOfNetcdfFile(ncFile):
+
+    # calendar of the time variable (the CF default is "standard")
+    f = nc.Dataset(ncFile)
+    calendar = "standard"
+    if 'time' in f.variables and 'calendar' in f.variables['time'].ncattrs(): calendar = str(f.variables['time'].calendar)
+    f.close()
+    
+    return calendar
+
 def findFirstYearInNCTime(ncTimeVariable):
 
     # first datetime
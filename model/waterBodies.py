@@ -24,6 +24,9 @@
 
 import os
 import types
+import hashlib
+
+import numpy as np
 
 from pcraster.framework import *
 import pcraster as pcr
@@ -33,6 +36,7 @@ logger = logging.getLogger(__name__)
 
 
 import virtualOS as vos
+import lddNetwork
 
 class WaterBodies(object):
 
@@ -57,19 +61,17 @@ class WaterBodies(object):
             self.lddMap = lddMap
 
         # the following is needed for a modflowOfflineCoupling run
-        if 'modflowOfflineCoupling' in list(iniItems.globalOptions.keys()) and iniItems.globalOptions['modflowOfflineCoupling'] == "True" and 'routingOptions' not in iniItems.allSections: 
+        if iniItems.get_boolean_option('globalOptions', 'modflowOfflineCoupling') and 'routingOptions' not in iniItems.allSections: 
             logger.info("The 'routingOptions' are not defined in the configuration ini file. We will adopt them from the 'modflowParameterOptions'.")
             iniItems.routingOptions = iniItems.modflowParameterOptions
 
 
         # option to activate water balance check
-        self.debugWaterBalance = True
-        if 'debugWaterBalance' in list(iniItems.routingOptions.keys()) and iniItems.routingOptions['debugWaterBalance'] == "False":
-            self.debugWaterBalance = False
+        self.debugWaterBalance = iniItems.get_boolean_option('routingOptions', 'debugWaterBalance', True)
         
         # option to perform a run with only natural lakes (without reservoirs)
         self.onlyNaturalWaterBodies = onlyNaturalWaterBodies
-        if "onlyNaturalWaterBodies" in list(iniItems.routingOptions.keys()) and iniItems.routingOptions['onlyNaturalWaterBodies'] == "True":
+        if iniItems.get_boolean_option('routingOptions', 'onlyNaturalWaterBodies'):
             logger.info("Using only natural water bodies identified in the year 1900. All reservoirs in 1900 are assumed as lakes.")
             self.onlyNaturalWaterBodies  = True
             self.dateForNaturalCondition = "1900-01-01"                  # The run for a natural condition should access only this date.   
@@ -98,15 +100,30 @@ class WaterBodies(object):
         self.minResvrFrac = 0.10
         self.maxResvrFrac = 0.75
         # - from the ini file
-        if "minResvrFrac" in list(iniItems.routingOptions.keys()):
+        if iniItems.get_option('routingOptions', 'minResvrFrac') is not None:
             minResvrFrac = iniItems.routingOptions['minResvrFrac']
             self.minResvrFrac = vos.readPCRmapClone(minResvrFrac,
                                                     self.cloneMap, self.tmpDir, self.inputDir)
-        if "maxResvrFrac" in list(iniItems.routingOptions.keys()):
+        if iniItems.get_option('routingOptions', 'maxResvrFrac') is not None:
             maxResvrFrac = iniItems.routingOptions['maxResvrFrac']
             self.maxResvrFrac = vos.readPCRmapClone(maxResvrFrac,
                                                     self.cloneMap, self.tmpDir, self.inputDir)
 
+        # engine for the lake and reservoir operations: 
+        # - "pcraster" (default): using pcraster maps and zonal operations over waterBodyIds 
+        # - "numpy"             : using a water body table (one value per water body, see the method buildWaterBodyTable)
+        # - "numpy_with_check"  : as "numpy", but the results are compared to (and replaced by) the ones of "pcraster"
+        self.waterBodyEngine = iniItems.get_choice_option('routingOptions', 'waterBodyEngine', ["pcraster", "numpy", "numpy_with_check"], "pcraster")
+        if self.waterBodyEngine != "pcraster":
+            logger.info("Lake and reservoir operations are calculated with the waterBodyEngine: "+str(self.waterBodyEngine))
+        self.waterBodyTable = None
+
+        # option to detect changes in the (yearly) water body input fields; if unchanged, the water body parameters of the previous year are used
+        self.waterBodyParameterChangeDetection = iniItems.get_boolean_option('routingOptions', 'waterBodyParameterChangeDetection', True)
+        self.inputFieldsHash = None
+        self.derivedParameterNames = ['fracWat', 'waterBodyIds', 'waterBodyOut', 'waterBodyArea', 'waterBodyTyp', 'resMaxCap', 'waterBodyCap']
+        self.wbCatchment = None
+
 
     def getParameterFiles(self,currTimeStep,cellArea,ldd,\
                                initial_condition_dictionary = None,\
@@ -134,44 +151,254 @@ class WaterBodies(object):
             date_used = self.dateForNaturalCondition
             year_used = self.dateForNaturalCondition[0:4] 
         
+        # reading the (yearly) water body input fields
+        inputFields = self.readWaterBodyInputFields(date_used, year_used)
+        
+        # the water body parameters derived from the input fields (ids, outlets, areas, types and capacities) 
+        # are only (re)calculated if the input fields differ from the ones used previously
+        inputFieldsHash = None
+        if self.waterBodyParameterChangeDetection: inputFieldsHash = self.getHashOfInputFields(inputFields)
+        parametersChanged = inputFieldsHash is None or inputFieldsHash != self.inputFieldsHash
+        if parametersChanged:
+            self.calculateWaterBodyParameters(inputFields, ldd, date_used)
+            self.derivedParameters = {}
+            for var in self.derivedParameterNames: self.derivedParameters[var] = vars(self)[var]
+        else:
+            logger.info("The water body input fields are unchanged. The water body parameters of the previous year are used.")
+            for var in self.derivedParameterNames: vars(self)[var] = self.derivedParameters[var]
+        self.inputFieldsHash = inputFieldsHash
+
+        # at the beginning of simulation period (timeStepPCR = 1)
+        # - we have to define/get the initial conditions 
+        #
+        if initial_condition_dictionary != None and currTimeStep.timeStepPCR == 1:
+            self.getICs(initial_condition_dictionary)
+        
+        # For each new reservoir (introduced at the beginning of the year)
+        # initiating storage, average inflow and outflow
+        # PS: THIS IS NOT NEEDED FOR OFFLINE MODFLOW RUN! 
+        #
+        try:
+            self.waterBodyStorage = pcr.cover(self.waterBodyStorage,0.0)
+            self.avgInflow        = pcr.cover(self.avgInflow ,0.0)
+            self.avgOutflow       = pcr.cover(self.avgOutflow,0.0)
+            self.waterBodyStorage = pcr.ifthen(self.landmask, self.waterBodyStorage)
+            self.avgInflow        = pcr.ifthen(self.landmask, self.avgInflow       )
+            self.avgOutflow       = pcr.ifthen(self.landmask, self.avgOutflow      )
+        except:
+            # PS: FOR OFFLINE MODFLOW RUN!
+            pass
+        # TODO: Remove try and except    
+
+        # cropping only in the landmask region:
+        self.fracWat           = pcr.ifthen(self.landmask, self.fracWat         )
+        self.waterBodyIds      = pcr.ifthen(self.landmask, self.waterBodyIds    ) 
+        self.waterBodyOut      = pcr.ifthen(self.landmask, self.waterBodyOut    )
+        self.waterBodyArea     = pcr.ifthen(self.landmask, self.waterBodyArea   )
+        self.waterBodyTyp      = pcr.ifthen(self.landmask, self.waterBodyTyp    )  
+        self.waterBodyCap      = pcr.ifthen(self.landmask, self.waterBodyCap    )
+
+        # water body table for the numpy engine (rebuilt whenever the water body parameters have changed)
+        if self.waterBodyEngine in ["numpy", "numpy_with_check"]:
+            if parametersChanged or self.waterBodyTable is None:
+                self.buildWaterBodyTable()
+
+    def buildWaterBodyTable(self):
+        """
+        Builds the water body table used by the numpy engine: 1-D arrays with one value per water body (lake or reservoir), 
+        as well as the gather/scatter indices between the water bodies and the (landmask) cells.
+        """
+
+        # landmask cells and water body cells (i.e. cells with waterBodyIds > 0)
+        self.cellMask = vos.getCellMask(self.landmask)
+        waterBodyIds  = np.nan_to_num(vos.pcr2numpyAtCells(self.waterBodyIds, self.cellMask))
+        isWaterBody   = waterBodyIds > 0
+        
+        table = {}
+        # - position (within the landmask cells) of every water body cell and the water body (0 to number of water bodies - 1) it belongs to 
+        table['cells'] = np.nonzero(isWaterBody)[0]
+        table['ids'], table['waterBodyOfCell'] = np.unique(waterBodyIds[isWaterBody], return_inverse = True)
+        table['waterBodyOfCell'] = table['waterBodyOfCell'].ravel()
+        numberOfWaterBodies = table['ids'].size
+        
+        # - outlet cell of every water body
+        isOutlet = np.nan_to_num(vos.pcr2numpyAtCells(self.waterBodyOut, self.cellMask)) > 0
+        #   every water body must have exactly one outlet cell
+        table['outlets'] = np.full(numberOfWaterBodies, -1, dtype = np.int64)
+        outletCells = table['cells'][isOutlet[table['cells']]]
+        waterBodyOfOutlet = table['waterBodyOfCell'][isOutlet[table['cells']]]
+        numberOfOutlets = np.bincount(waterBodyOfOutlet, minlength = numberOfWaterBodies)
+        if np.any(numberOfOutlets != 1):
+            msg = "Every lake/reservoir must have exactly one outlet cell (waterBodyIds: number of outlet cells): " + \
+                  ", ".join(["%i: %i" %(table['ids'][i], numberOfOutlets[i]) for i in np.nonzero(numberOfOutlets != 1)[0]])
+            logger.error(msg)
+            raise Exception(msg)
+        table['outlets'][waterBodyOfOutlet] = outletCells
+        
+        # - downstream cell (within the landmask cells; -1 if it is outside) of every water body cell (for the 'downstream' operation)
+        numberOfCells = int(np.count_nonzero(self.cellMask))
+        cellIndex = np.full(self.cellMask.shape, -1, dtype = np.int64)
+        cellIndex[self.cellMask] = np.arange(numberOfCells)
+        direction = pcr.pcr2numpy(pcr.scalar(self.lddMap), 5).astype(np.int64)[self.cellMask][table['cells']]
+        rows, cols = np.nonzero(self.cellMask)
+        downstreamRows = rows[table['cells']] + lddNetwork.ldd_row_offsets[direction]
+        downstreamCols = cols[table['cells']] + lddNetwork.ldd_col_offsets[direction]
+        isInside = (downstreamRows >= 0) & (downstreamRows < self.cellMask.shape[0]) & \
+                   (downstreamCols >= 0) & (downstreamCols < self.cellMask.shape[1])
+        table['downstreamCells'] = np.full(table['cells'].size, -1, dtype = np.int64)
+        table['downstreamCells'][isInside] = cellIndex[downstreamRows[isInside], downstreamCols[isInside]]
+        # - the water body of every downstream cell (-1 if it is not a water body cell)
+        waterBodyOfLandmaskCell = np.full(numberOfCells, -1, dtype = np.int64)
+        waterBodyOfLandmaskCell[table['cells']] = table['waterBodyOfCell']
+        table['downstreamWaterBody'] = np.where(table['downstreamCells'] >= 0, waterBodyOfLandmaskCell[table['downstreamCells']], -1)
+        
+        self.waterBodyTable = table
+        self.numberOfCells  = numberOfCells 
+
+        # parameters of every water body (values at the outlet)
+        table['type']     = self.valuesAtOutlets(self.waterBodyTyp)
+        table['area']     = self.valuesAtOutlets(self.waterBodyArea)
+        table['capacity'] = np.nan_to_num(self.valuesAtOutlets(self.waterBodyCap))
+        table['minResvrFrac'] = self.valuesAtOutlets(self.minResvrFrac)
+        table['maxResvrFrac'] = self.valuesAtOutlets(self.maxResvrFrac)
+
+        # states of every water body (values at the outlet) - not available for an offline MODFLOW run 
+        if hasattr(self, 'waterBodyStorage'): self.loadWaterBodyTableStates()
+        
+        logger.debug("Water body table with "+str(numberOfWaterBodies)+" lakes and/or reservoirs.")
+
+    def loadWaterBodyTableStates(self):
+        
+        self.waterBodyTable['storage']    = np.nan_to_num(self.valuesAtOutlets(self.waterBodyStorage))
+        self.waterBodyTable['avgInflow']  = np.nan_to_num(self.valuesAtOutlets(self.avgInflow ))
+        self.waterBodyTable['avgOutflow'] = np.nan_to_num(self.valuesAtOutlets(self.avgOutflow))
+
+    def valuesAtOutlets(self, pcrMap):
+        """ Returns the values of a map (or a constant) at the outlets of the water bodies. """
+        
+        return vos.pcr2numpyAtCells(pcrMap, self.cellMask)[self.waterBodyTable['outlets']] if not isinstance(pcrMap, (int, float)) else \
+               np.full(self.waterBodyTable['ids'].size, float(pcrMap))
+
+    def waterBodyTableToMap(self, values):
+        """ Returns a map of water body values (given for the entire water body cells); other landmask cells are zero. """
+        
+        valuesAtCells = np.zeros(self.numberOfCells)
+        valuesAtCells[self.waterBodyTable['cells']] = values[self.waterBodyTable['waterBodyOfCell']]
+        return vos.numpyAtCells2pcr(valuesAtCells, self.cellMask)
+
+    def maximumPerWaterBody(self, valuesAtWaterBodyCells):
+        """ Returns the maximum value of every water body (as areamaximum; missing values are ignored). """
+        
+        maximum = np.full(self.waterBodyTable['ids'].size, -np.inf)
+        np.maximum.at(maximum, self.waterBodyTable['waterBodyOfCell'], np.where(np.isnan(valuesAtWaterBodyCells), -np.inf, valuesAtWaterBodyCells))
+        return np.where(np.isfinite(maximum), maximum, np.nan)
+
+    def readWaterBodyInputFields(self, date_used, year_used):
+        """ Returns the (yearly) water body input fields: fracWat, waterBodyIds, resSfArea (m2), waterBodyTyp and resMaxCap (m3). """
+        
+        inputFields = {}
+
         # fracWat = fraction of surface water bodies (dimensionless)
-        self.fracWat = pcr.spatial(pcr.scalar(0.0))
+        fracWat = pcr.spatial(pcr.scalar(0.0))
         
         if self.useNetCDF:
-            self.fracWat = vos.netcdf2PCRobjClone(self.ncFileInp,'fracWaterInp', \
+            fracWat = vos.netcdf2PCRobjClone(self.ncFileInp,'fracWaterInp', \
                            date_used, useDoy = 'yearly',\
                            cloneMapFileName = self.cloneMap)
         else:
             if self.fracWaterInp != "None":
-                self.fracWat = vos.readPCRmapClone(\
+                fracWat = vos.readPCRmapClone(\
                                self.fracWaterInp+str(year_used)+".map",
                                self.cloneMap,self.tmpDir,self.inputDir)
         
-        self.fracWat = pcr.cover(self.fracWat, pcr.spatial(pcr.scalar(0.0)))
-        self.fracWat = pcr.max(0.0, self.fracWat)
-        self.fracWat = pcr.min(1.0, self.fracWat)
+        fracWat = pcr.cover(fracWat, pcr.spatial(pcr.scalar(0.0)))
+        fracWat = pcr.max(0.0, fracWat)
+        fracWat = pcr.min(1.0, fracWat)
+        
+        inputFields['fracWat'] = fracWat
         
-        self.waterBodyIds  = pcr.spatial(pcr.nominal(0))    # waterBody ids
-        self.waterBodyOut  = pcr.spatial(pcr.boolean(0))    # waterBody outlets
-        self.waterBodyArea = pcr.spatial(pcr.scalar(0.))    # waterBody surface areas
-
         # water body ids
+        waterBodyIds = pcr.spatial(pcr.nominal(0))
         if self.useNetCDF:
-            self.waterBodyIds = vos.netcdf2PCRobjClone(self.ncFileInp,'waterBodyIds', \
-                                date_used, useDoy = 'yearly',\
-                                cloneMapFileName = self.cloneMap)
+            waterBodyIds = vos.netcdf2PCRobjClone(self.ncFileInp,'waterBodyIds', \
+                           date_used, useDoy = 'yearly',\
+                           cloneMapFileName = self.cloneMap)
         else:
             if self.waterBodyIdsInp != "None":
-                self.waterBodyIds = vos.readPCRmapClone(\
+                waterBodyIds = vos.readPCRmapClone(\
                     self.waterBodyIdsInp+str(year_used)+".map",\
                     self.cloneMap,self.tmpDir,self.inputDir,False,None,True)
+        inputFields['waterBodyIds'] = waterBodyIds
+        
+        # reservoir surface area (m2)
+        if self.useNetCDF:
+            resSfArea = 1000. * 1000. * \
+                        vos.netcdf2PCRobjClone(self.ncFileInp,'resSfAreaInp', \
+                        date_used, useDoy = 'yearly',\
+                        cloneMapFileName = self.cloneMap)
+        else:
+            if self.resSfAreaInp != "None":
+                resSfArea = 1000. * 1000. * vos.readPCRmapClone(
+                       self.resSfAreaInp+str(year_used)+".map",\
+                       self.cloneMap,self.tmpDir,self.inputDir)
+            else:
+                resSfArea = pcr.spatial(pcr.scalar(0.0))
+        inputFields['resSfArea'] = resSfArea
+        
+        # water body types
+        waterBodyTyp = pcr.nominal(0)
+        if self.useNetCDF:
+            waterBodyTyp = vos.netcdf2PCRobjClone(self.ncFileInp,'waterBodyTyp', \
+                           date_used, useDoy = 'yearly',\
+                           cloneMapFileName = self.cloneMap)
+        else:
+            if self.waterBodyTypInp != "None":
+                waterBodyTyp = vos.readPCRmapClone(
+                    self.waterBodyTypInp+str(year_used)+".map",\
+                    self.cloneMap,self.tmpDir,self.inputDir,False,None,True)
+        inputFields['waterBodyTyp'] = waterBodyTyp
+        
+        # reservoir maximum capacity (m3)
+        resMaxCap = pcr.scalar(0.0)
+        if self.useNetCDF:
+            resMaxCap = 1000. * 1000. * \
+                        vos.netcdf2PCRobjClone(self.ncFileInp,'resMaxCapInp', \
+                        date_used, useDoy = 'yearly',\
+                        cloneMapFileName = self.cloneMap)
+        else:
+            if self.resMaxCapInp != "None":
+                resMaxCap = 1000. * 1000. * vos.readPCRmapClone(\
+                    self.resMaxCapInp+str(year_used)+".map", \
+                    self.cloneMap,self.tmpDir,self.inputDir)
+        inputFields['resMaxCap'] = resMaxCap
+        
+        return inputFields
+
+    def getHashOfInputFields(self, inputFields):
+        """ Returns a hash (sha1) of the values of the water body input fields, used to detect changes between years. """
+        
+        inputFieldsHash = hashlib.sha1()
+        for var in sorted(inputFields.keys()):
+            inputFieldsHash.update(var.encode())
+            inputFieldsHash.update(np.ascontiguousarray(pcr.pcr2numpy(pcr.spatial(pcr.scalar(inputFields[var])), vos.MV)).tobytes())
+        return inputFieldsHash.hexdigest()
+
+    def calculateWaterBodyParameters(self, inputFields, ldd, date_used):
+
+        # fracWat = fraction of surface water bodies (dimensionless)
+        self.fracWat = inputFields['fracWat']
+        
+        # water body ids
+        self.waterBodyIds = inputFields['waterBodyIds']
         #
         self.waterBodyIds = pcr.ifthen(\
                             pcr.scalar(self.waterBodyIds) > 0.,\
                             pcr.nominal(self.waterBodyIds))    
 
         # water body outlets (correcting outlet positions)
-        wbCatchment = pcr.catchmenttotal(pcr.scalar(1),ldd)
+        # - the upstream areas (number of cells) depend only on the ldd, so they are calculated only once
+        if self.wbCatchment is None: self.wbCatchment = pcr.catchmenttotal(pcr.scalar(1),ldd)
+        wbCatchment = self.wbCatchment
         self.waterBodyOut = pcr.ifthen(wbCatchment ==\
                             pcr.areamaximum(wbCatchment, \
                             self.waterBodyIds),\
@@ -197,18 +424,7 @@ class WaterBodies(object):
                             pcr.spatial(pcr.boolean(1)))
 
         # reservoir surface area (m2):
-        if self.useNetCDF:
-            resSfArea = 1000. * 1000. * \
-                        vos.netcdf2PCRobjClone(self.ncFileInp,'resSfAreaInp', \
-                        date_used, useDoy = 'yearly',\
-                        cloneMapFileName = self.cloneMap)
-        else:
-            if self.resSfAreaInp != "None":
-                resSfArea = 1000. * 1000. * vos.readPCRmapClone(
-                       self.resSfAreaInp+str(year_used)+".map",\
-                       self.cloneMap,self.tmpDir,self.inputDir)
-            else:
-                resSfArea = pcr.spatial(pcr.scalar(0.0))
+        resSfArea = inputFields['resSfArea']
         resSfArea = pcr.areaaverage(resSfArea,self.waterBodyIds)                        
         resSfArea = pcr.cover(resSfArea,0.)                        
 
@@ -231,17 +447,7 @@ class WaterBodies(object):
         # - 2 = reservoirs (regulated discharge)
         # - 1 = lakes (weirFormula)
         # - 0 = non lakes or reservoirs (e.g. wetland)
-        self.waterBodyTyp = pcr.nominal(0)
-        
-        if self.useNetCDF:
-            self.waterBodyTyp = vos.netcdf2PCRobjClone(self.ncFileInp,'waterBodyTyp', \
-                                date_used, useDoy = 'yearly',\
-                                cloneMapFileName = self.cloneMap)
-        else:
-            if self.waterBodyTypInp != "None":
-                self.waterBodyTyp = vos.readPCRmapClone(
-                    self.waterBodyTypInp+str(year_used)+".map",\
-                    self.cloneMap,self.tmpDir,self.inputDir,False,None,True)
+        self.waterBodyTyp = inputFields['waterBodyTyp']
 
         # excluding wetlands (waterBodyTyp = 0) in all functions related to lakes/reservoirs 
         #
@@ -266,20 +472,9 @@ class WaterBodies(object):
                                                   self.waterBodyOut)
 
         # reservoir maximum capacity (m3):
-        self.resMaxCap = pcr.scalar(0.0)
+        self.resMaxCap = inputFields['resMaxCap']
         self.waterBodyCap = pcr.scalar(0.0)
 
-        if self.useNetCDF:
-            self.resMaxCap = 1000. * 1000. * \
-                             vos.netcdf2PCRobjClone(self.ncFileInp,'resMaxCapInp', \
-                             date_used, useDoy = 'yearly',\
-                             cloneMapFileName = self.cloneMap)
-        else:
-            if self.resMaxCapInp != "None":
-                self.resMaxCap = 1000. * 1000. * vos.readPCRmapClone(\
-                    self.resMaxCapInp+str(year_used)+".map", \
-                    self.cloneMap,self.tmpDir,self.inputDir)
-
         self.resMaxCap = pcr.ifthen(self.resMaxCap > 0.,\
                                     self.resMaxCap)
         self.resMaxCap = pcr.areaaverage(self.resMaxCap,\
@@ -328,36 +523,6 @@ class WaterBodies(object):
         if abs(a) > threshold or abs(b) > threshold:
             logger.warning("Missing information in some lakes and/or reservoirs.")
 
-        # at the beginning of simulation period (timeStepPCR = 1)
-        # - we have to define/get the initial conditions 
-        #
-        if initial_condition_dictionary != None and currTimeStep.timeStepPCR == 1:
-            self.getICs(initial_condition_dictionary)
-        
-        # For each new reservoir (introduced at the beginning of the year)
-        # initiating storage, average inflow and outflow
-        # PS: THIS IS NOT NEEDED FOR OFFLINE MODFLOW RUN! 
-        #
-        try:
-            self.waterBodyStorage = pcr.cover(self.waterBodyStorage,0.0)
-            self.avgInflow        = pcr.cover(self.avgInflow ,0.0)
-            self.avgOutflow       = pcr.cover(self.avgOutflow,0.0)
-            self.waterBodyStorage = pcr.ifthen(self.landmask, self.waterBodyStorage)
-            self.avgInflow        = pcr.ifthen(self.landmask, self.avgInflow       )
-            self.avgOutflow       = pcr.ifthen(self.landmask, self.avgOutflow      )
-        except:
-            # PS: FOR OFFLINE MODFLOW RUN!
-            pass
-        # TODO: Remove try and except    
-
-        # cropping only in the landmask region:
-        self.fracWat           = pcr.ifthen(self.landmask, self.fracWat         )
-        self.waterBodyIds      = pcr.ifthen(self.landmask, self.waterBodyIds    ) 
-        self.waterBodyOut      = pcr.ifthen(self.landmask, self.waterBodyOut    )
-        self.waterBodyArea     = pcr.ifthen(self.landmask, self.waterBodyArea   )
-        self.waterBodyTyp      = pcr.ifthen(self.landmask, self.waterBodyTyp    )  
-        self.waterBodyCap      = pcr.ifthen(self.landmask, self.waterBodyCap    )
-
     def getICs(self,initial_condition):
 
         avgInflow  = initial_condition['avgLakeReservoirInflowShort']  
@@ -397,10 +562,24 @@ class WaterBodies(object):
                            length_of_time_step = vos.secondsPerDay(),\
                            downstreamDemand = None):
 
+        self.timestepsToAvgDischarge = timestepsToAvgDischarge          # TODO: include this one in "currTimeStep"     
+
+        # using the water body table (numpy engine)
+        if self.waterBodyEngine in ["numpy", "numpy_with_check"]:
+            results = self.getWaterBodyTableUpdate(newStorageAtLakeAndReservoirs,\
+                                                   timestepsToAvgDischarge,\
+                                                   maxTimestepsToAvgDischargeShort,\
+                                                   maxTimestepsToAvgDischargeLong,\
+                                                   avgChannelDischarge,\
+                                                   length_of_time_step,\
+                                                   downstreamDemand)
+            if self.waterBodyEngine == "numpy":
+                self.setWaterBodyTableUpdate(results, currTimeStep)
+                return
+
         if self.debugWaterBalance:\
            preStorage = self.waterBodyStorage    # unit: m
      
-        self.timestepsToAvgDischarge = timestepsToAvgDischarge          # TODO: include this one in "currTimeStep"     
         
         # obtain inflow (and update storage)
         self.moveFromChannelToWaterBody(\
@@ -427,6 +606,175 @@ class WaterBodies(object):
         
         self.waterBodyBalance = (pcr.cover(self.inflow/self.waterBodyArea, 0.0) - pcr.cover(self.waterBodyOutflow/self.waterBodyArea,0.0)) -\
                                 (pcr.cover(self.waterBodyStorage/self.waterBodyArea,0.0) - pcr.cover(preStorage/self.waterBodyArea,0.0))
+
+        # comparing the results of the numpy engine to the ones above (the latter are used)
+        if self.waterBodyEngine == "numpy_with_check":
+            self.compareWithWaterBodyTableUpdate(results)
+            self.loadWaterBodyTableStates()
+
+    def getWaterBodyTableUpdate(self,newStorageAtLakeAndReservoirs,\
+                                     timestepsToAvgDischarge,\
+                                     maxTimestepsToAvgDischargeShort,\
+                                     maxTimestepsToAvgDischargeLong,\
+                                     avgChannelDischarge,\
+                                     length_of_time_step = vos.secondsPerDay(),\
+                                     downstreamDemand = None):
+        """
+        Returns the inflow, outflow and new states of all water bodies calculated with the water body table (one value per water body).
+        The calculation follows the methods moveFromChannelToWaterBody, getWaterBodyOutflow, getLakeOutflow and getReservoirOutflow.
+        """
+
+        table = self.waterBodyTable
+        numberOfWaterBodies = table['ids'].size
+        
+        dayFraction = length_of_time_step / vos.secondsPerDay()
+        timestepsToAvgDischarge = self.valuesAtOutlets(timestepsToAvgDischarge)
+        
+        # inflow and new storage (see the method moveFromChannelToWaterBody)
+        newStorageAtCells = np.nan_to_num(vos.pcr2numpyAtCells(newStorageAtLakeAndReservoirs, self.cellMask)[table['cells']])
+        storage  = np.bincount(table['waterBodyOfCell'], weights = newStorageAtCells, minlength = numberOfWaterBodies)
+        inflow   = storage - table['storage']
+        inflowInM3PerSec = inflow / length_of_time_step
+        temp = np.maximum(1.0, np.minimum(maxTimestepsToAvgDischargeShort, timestepsToAvgDischarge - 1.0 + dayFraction))
+        avgInflow = np.maximum(0.0, table['avgInflow'] + (inflowInM3PerSec - table['avgInflow']) * dayFraction / temp)
+        avgOutflow = table['avgOutflow']
+
+        # outflow of lakes and reservoirs (m3)
+        avgChannelDischarge = vos.pcr2numpyAtCells(avgChannelDischarge, self.cellMask)
+        if downstreamDemand is None:
+            downstreamDemand = np.zeros(numberOfWaterBodies)
+        else:
+            downstreamDemand = self.valuesAtOutlets(downstreamDemand)
+        lakeOutflow      = self.getLakeOutflowFromTable(storage, avgInflow, avgOutflow, avgChannelDischarge, length_of_time_step)
+        reservoirOutflow = self.getReservoirOutflowFromTable(storage, avgInflow, avgOutflow, avgChannelDischarge, length_of_time_step, downstreamDemand)
+        outflow = np.where(table['type'] == 2, reservoirOutflow, np.where(table['type'] == 1, lakeOutflow, 0.0))
+        outflow = np.maximum(0.0, np.nan_to_num(outflow))
+        
+        # limit outflow to available storage (factor 0.25 to avoid flip flop) and use round values
+        outflow = np.floor(np.minimum(storage * 0.25, outflow))
+        
+        # updating (long term) average outflow (m3/s)
+        temp = np.maximum(1.0, np.minimum(maxTimestepsToAvgDischargeLong, timestepsToAvgDischarge - 1.0 + dayFraction))
+        avgOutflow = np.maximum(0.0, avgOutflow + (outflow / length_of_time_step - avgOutflow) * dayFraction / temp)
+
+        # update storage (after outflow)
+        preStorage = table['storage']
+        storage = np.maximum(0.0, storage - outflow)
+        
+        return {'inflow'          : inflow,
+                'inflowInM3PerSec': inflowInM3PerSec,
+                'avgInflow'       : avgInflow,
+                'avgOutflow'      : avgOutflow,
+                'waterBodyOutflow': outflow,
+                'preStorage'      : preStorage,
+                'waterBodyStorage': storage}
+
+    def getLakeOutflowFromTable(self, storage, avgInflow, avgOutflow, avgChannelDischarge, length_of_time_step):
+
+        table = self.waterBodyTable
+        waterBodyOfCell = table['waterBodyOfCell']
+
+        # waterHeight (m)
+        minWaterHeight = 0.001
+        waterHeight = np.maximum(minWaterHeight, (storage - table['capacity']) / table['area'])
+
+        # weirWidth (m), estimated from avgOutflow (m3/s) using the bankfull discharge formula
+        avgOutflowAtCells = np.where(avgOutflow[waterBodyOfCell] > 0.0, avgOutflow[waterBodyOfCell], \
+                                     np.maximum(np.maximum(avgChannelDischarge[table['cells']], avgInflow[waterBodyOfCell]), 0.001))
+        bankfullWidth = np.nan_to_num(4.8 * self.maximumPerWaterBody(avgOutflowAtCells) ** (0.5))
+        weirWidthUsed = np.maximum(bankfullWidth, self.minWeirWidth)
+
+        # avgInflow <= lakeOutflow (weirFormula) <= waterBodyStorage
+        lakeOutflowInM3PerSec = np.maximum(1.7 * 1.0 * np.maximum(0.0, waterHeight) ** 1.5 * weirWidthUsed, avgInflow)
+        return np.minimum(storage, lakeOutflowInM3PerSec * length_of_time_step)
+
+    def getReservoirOutflowFromTable(self, storage, avgInflow, avgOutflow, avgChannelDischarge, length_of_time_step, downstreamDemand):
+
+        table = self.waterBodyTable
+        waterBodyOfCell = table['waterBodyOfCell']
+        capacity     = table['capacity']
+        minResvrFrac = table['minResvrFrac']
+        maxResvrFrac = table['maxResvrFrac']
+        
+        # division that returns zero for a zero denominator (as a pcraster division followed by cover)
+        def divide(x, y): return np.where(y != 0.0, x / np.where(y != 0.0, y, 1.0), 0.0)
+
+        # avgOutflow (m3/s); for new reservoirs, taken from the cell (or its downstream cell) values
+        avgOutflowAtCells = np.where(avgOutflow[waterBodyOfCell] > 0.0, avgOutflow[waterBodyOfCell], \
+                                     np.maximum(avgChannelDischarge[table['cells']], avgInflow[waterBodyOfCell]))
+        downstreamCells      = table['downstreamCells']
+        downstreamWaterBody  = table['downstreamWaterBody']
+        downstreamAvgOutflow = np.where(downstreamWaterBody >= 0, avgOutflow[downstreamWaterBody], 0.0)
+        downstreamAvgInflow  = np.where(downstreamWaterBody >= 0, avgInflow[downstreamWaterBody] , 0.0)
+        downstreamAvgOutflow = np.where(downstreamCells >= 0, \
+                                        np.where(downstreamAvgOutflow > 0.0, downstreamAvgOutflow, \
+                                                 np.maximum(avgChannelDischarge[downstreamCells], downstreamAvgInflow)), np.nan)
+        avgOutflowAtCells = np.where(avgOutflowAtCells > 0.0, avgOutflowAtCells, downstreamAvgOutflow)
+        avgOutflow = self.maximumPerWaterBody(avgOutflowAtCells)
+
+        # reservoir release based on the relative capacity
+        reductionFactor = np.minimum(1., divide(np.maximum(0., storage - minResvrFrac * capacity), maxResvrFrac - minResvrFrac) * capacity)
+        resvOutflow = reductionFactor * avgOutflow * length_of_time_step
+        
+        # maximum release <= average inflow
+        resvOutflow = np.maximum(0.0, np.minimum(resvOutflow, avgInflow * length_of_time_step))
+        
+        # downstream demand (reduced if storage < lower limit); resvOutflow > downstreamDemand
+        reductionFactor  = np.where(minResvrFrac * capacity > vos.smallNumber, downstreamDemand / np.maximum(vos.smallNumber, minResvrFrac * capacity), 0.0)
+        downstreamDemand = np.minimum(downstreamDemand, downstreamDemand * reductionFactor)
+        resvOutflow = np.maximum(resvOutflow, downstreamDemand * length_of_time_step)
+        
+        # floodOutflow: additional release if storage > upper limit
+        ratioQBankfull = 2.3
+        estmStorage  = np.maximum(0.0, storage - resvOutflow)
+        floodOutflow = np.maximum(0.0, estmStorage - capacity) + \
+                       divide(np.maximum(0.0, estmStorage - maxResvrFrac * capacity), (1. - maxResvrFrac) * capacity) * \
+                       np.maximum(0.0, ratioQBankfull * avgOutflow * vos.secondsPerDay() - resvOutflow)
+        floodOutflow = np.maximum(0.0, np.minimum(floodOutflow, estmStorage - maxResvrFrac * capacity * 0.75))
+        resvOutflow  = np.nan_to_num(resvOutflow) + np.nan_to_num(floodOutflow)
+        
+        # if storage > upper limit: bring the reservoir storages only to 3/4 of upper limit capacities, but resvOutflow > avgInflow
+        aboveUpperLimit = storage > maxResvrFrac * capacity
+        resvOutflow = np.where(aboveUpperLimit, np.minimum(resvOutflow, np.maximum(0.0, storage - maxResvrFrac * capacity * 0.75)), resvOutflow)
+        resvOutflow = np.where(aboveUpperLimit, np.maximum(np.maximum(0.0, resvOutflow), avgInflow), resvOutflow)
+        
+        # resvOutflow < waterBodyStorage
+        return np.minimum(storage, resvOutflow)
+
+    def setWaterBodyTableUpdate(self, results, currTimeStep):
+        
+        table = self.waterBodyTable
+        table['storage']    = results['waterBodyStorage']
+        table['avgInflow']  = results['avgInflow']
+        table['avgOutflow'] = results['avgOutflow']
+        
+        # water balance (unit: m) 
+        waterBodyBalance = (results['inflow'] - results['waterBodyOutflow'] - (results['waterBodyStorage'] - results['preStorage'])) / table['area']
+        waterBodyBalance = np.nan_to_num(waterBodyBalance)
+        if self.debugWaterBalance and waterBodyBalance.size > 0:
+            a, b, c = np.min(waterBodyBalance), np.max(waterBodyBalance), np.mean(waterBodyBalance)
+            threshold = 5e-3
+            if abs(a) > threshold or abs(b) > threshold:
+                msg = "WARNING !!!!!!!! Water Balance Error %s Min %f Max %f Mean %f" %('WaterBodyStorage (unit: m)', a, b, c)
+                logger.error(msg)
+                logger.error(str(currTimeStep.fulldate))
+        
+        # maps (values given for the entire water body cells)
+        for var in ['inflow', 'inflowInM3PerSec', 'avgInflow', 'avgOutflow', 'waterBodyOutflow', 'waterBodyStorage']:
+            vars(self)[var] = self.waterBodyTableToMap(results[var])
+        self.waterBodyBalance = self.waterBodyTableToMap(waterBodyBalance)
+
+    def compareWithWaterBodyTableUpdate(self, results):
+        
+        for var in ['avgInflow', 'avgOutflow', 'waterBodyOutflow', 'waterBodyStorage']:
+            if results[var].size == 0: continue
+            pcrValues  = np.nan_to_num(self.valuesAtOutlets(vars(self)[var]))
+            difference = np.max(np.abs(results[var] - pcrValues) / np.maximum(1.0, np.abs(pcrValues)))
+            msg = "Maximum (relative) difference between the numpy and pcraster water body engines for "+str(var)+": "+str(difference)
+            if difference > 1e-6:
+                logger.warning(msg)
+            else:
+                logger.debug(msg)
                                   
 
     def moveFromChannelToWaterBody(self,\
@@ -31,6 +31,8 @@ import time
 import datetime
 import shutil
 import glob
+import hashlib
+import pickle
 
 import logging
 logger = logging.getLogger(__name__)
@@ -39,7 +41,7 @@ import disclaimer
 
 class Configuration(object):
 
-    def __init__(self, iniFileName, debug_mode = False, no_modification = True, system_arguments = None):
+    def __init__(self, iniFileName, debug_mode = False, no_modification = True, system_arguments = None, parsed_configuration_file = None):
         object.__init__(self)
 
         # timestamp of this run, used in logging file names, etc
@@ -51,8 +53,10 @@ class Configuration(object):
         # debug option
         self.debug_mode = debug_mode
         
-        # read configuration from given file
-        self.parse_configuration_file(self.iniFileName)
+        # read configuration from given file (or from the parsed configuration of the same ini file, see save_parsed_configuration)
+        self.parsed_configuration_file = None
+        if parsed_configuration_file is None or self.load_parsed_configuration(parsed_configuration_file) == False:
+            self.parse_configuration_file(self.iniFileName)
         
         # option to define an online coupling between PCR-GLOBWB and MODFLOW
         self.set_options_for_coupling_betweeen_pcrglobwb_and_modflow()
@@ -71,6 +75,14 @@ class Configuration(object):
             self.online_coupling_between_pcrglobwb_and_modflow = True
             self.groundwaterOptions['useMODFLOW'] = "True"
 
+        # directory (preferably in a shared-memory file system, e.g. /dev/shm) for exchanging the monthly coupling fields as numpy arrays (see modflow_exchange.py)
+        # - if None, the coupling fields are exchanged as pcraster map files
+        self.online_coupling_exchange_dir = None
+        if self.online_coupling_between_pcrglobwb_and_modflow and \
+           'online_coupling_exchange_dir' in self.globalMergingAndModflowOptions.keys() and \
+           self.globalMergingAndModflowOptions['online_coupling_exchange_dir'] != "None":
+            self.online_coupling_exchange_dir = self.globalMergingAndModflowOptions['online_coupling_exchange_dir']
+
     def set_configuration(self, system_arguments = None):
 
         # set all paths, clean output when requested
@@ -158,6 +170,9 @@ class Configuration(object):
         
         if system_arguments != None:
             logger.info('The system arguments given to execute this run: %s', system_arguments)
+        
+        if self.parsed_configuration_file is not None:
+            logger.info('The configuration is loaded from the parsed configuration %s (the ini file is not parsed again).', self.parsed_configuration_file)
        
     def backup_configuration(self):
         
@@ -166,6 +181,45 @@ class Configuration(object):
         shutil.copy(self.iniFileName, self.logFileDir + \
                                      os.path.basename(self.iniFileName) + '_' +  str(self._timestamp.isoformat()).replace(":",".") + '.ini')
 
+    def ini_file_hash(self):
+        # hash of the content of the ini file, used to check whether a parsed configuration belongs to it
+        with open(self.iniFileName, 'rb') as ini_file:
+            return hashlib.sha1(ini_file.read()).hexdigest()
+
+    def save_parsed_configuration(self, fileName):
+        """
+        Save the parsed sections, so that other runs with the same ini file (e.g. the clones of a parallel run) do not have to parse it again
+        """
+        parsed_configuration = {'iniFileHash': self.ini_file_hash(), \
+                                'allSections': list(self.allSections), \
+                                'sections'   : dict((sec, dict(vars(self)[sec])) for sec in self.allSections)}
+        
+        # - written to a temporary file first, so that other runs never read an incomplete file
+        tmp_file_name = fileName + ".tmp"
+        with open(tmp_file_name, 'wb') as parsed_file:
+            pickle.dump(parsed_configuration, parsed_file, protocol = 2)
+        if os.path.exists(fileName): os.remove(fileName)
+        os.rename(tmp_file_name, fileName)
+        logger.debug('The parsed configuration is saved to %s', fileName)
+
+    def load_parsed_configuration(self, fileName):
+        """
+        Load the sections saved by save_parsed_configuration; returns False (nothing loaded) if the file is not available 
+        or if it does not belong to the current content of the ini file
+        """
+        if not os.path.isfile(fileName): return False
+        with open(fileName, 'rb') as parsed_file:
+            parsed_configuration = pickle.load(parsed_file)
+        if parsed_configuration['iniFileHash'] != self.ini_file_hash(): 
+            logger.warning("The parsed configuration %s does not belong to the ini file %s. The ini file is parsed.", fileName, self.iniFileName)
+            return False
+        
+        self.allSections = list(parsed_configuration['allSections'])
+        for sec in self.allSections:
+            vars(self)[sec] = dict(parsed_configuration['sections'][sec])
+        self.parsed_configuration_file = fileName
+        return True
+
     def parse_configuration_file(self, modelFileName):
 
         config = ConfigParser.ConfigParser()
@@ -82,6 +82,7 @@ class Configuration(object):
 
         # the default option is offline coupling procedure
         self.online_coupling_between_pcrglobwb_and_modflow = False
+        self.online_coupling_exchange_dir = None
 
         if 'globalMergingAndModflowOptions' in self.allSections:
 
@@ -89,6 +90,12 @@ class Configuration(object):
                self.globalMergingAndModflowOptions['online_coupling_between_pcrglobwb_and_modflow'] == "True":\
                self.online_coupling_between_pcrglobwb_and_modflow = True
 
+            # directory (preferably in a shared-memory file system, e.g. /dev/shm) for exchanging the monthly coupling fields as numpy arrays (see modflow_exchange.py)
+            # - if None, the coupling fields are exchanged as pcraster map files
+            if 'online_coupling_exchange_dir' in self.globalMergingAndModflowOptions.keys() and \
+               self.globalMergingAndModflowOptions['online_coupling_exchange_dir'] != "None":\
+               self.online_coupling_exchange_dir = self.globalMergingAndModflowOptions['online_coupling_exchange_dir']
+
             # using the cloneMap and landmask as defined in the self.globalMergingAndModflowOptions:
             self.globalOptions['cloneMap'] = self.globalMergingAndModflowOptions['cloneMap']
             self.globalOptions['landmask'] = self.globalMergingAndModflowOptions['landmask']
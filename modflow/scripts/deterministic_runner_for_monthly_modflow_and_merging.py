@@ -36,6 +36,7 @@ from currTimeStep import ModelTime
 from reporting_for_modflow import Reporting
 
 from modflow import ModflowCoupling
+import modflow_exchange
 
 import virtualOS as vos
 
@@ -113,7 +114,28 @@ class DeterministicRunner(DynamicModel):
             self.merging_netcdf_files("outDailyTotNC", start_date, end_date)
             
             # for runs with modflow
-            if self.configuration.online_coupling_between_pcrglobwb_and_modflow:
+            if self.configuration.online_coupling_between_pcrglobwb_and_modflow and \
+               self.configuration.online_coupling_exchange_dir != None:
+                
+                # mosaicking the exchange arrays that are needed for MODFLOW calculation (no pcraster map files needed), see modflow_exchange.py
+                msg = "Mosaicking the exchange arrays that are needed for the MODFLOW calculation."
+                logger.info(msg)
+                monthly_input = modflow_exchange.mosaic_arrays(self.configuration.online_coupling_exchange_dir, self.get_clone_areas(),\
+                                                               "pcrglobwb_for_modflow", str(self.modelTime.fulldate))
+                if monthly_input == None:
+                    msg = "The exchange arrays for the MODFLOW calculation are not complete."
+                    logger.error(msg)
+                    raise Exception(msg)
+                for clone_area in self.get_clone_areas():
+                    modflow_exchange.remove_arrays(modflow_exchange.exchange_path(self.configuration.online_coupling_exchange_dir, clone_area,\
+                                                                                  "pcrglobwb_for_modflow", str(self.modelTime.fulldate)))
+
+                # update MODFLOW model (It will pick up current model time from the modelTime object)
+                self.model.update(monthly_input)
+                # reporting is only done at the end of the month
+                self.reporting.report()
+
+            elif self.configuration.online_coupling_between_pcrglobwb_and_modflow:
                 
                 # merging pcraster maps that are needed for MODFLOW calculation
                 msg = "Merging pcraster map files that are needed for the MODFLOW calculation."
@@ -211,14 +233,18 @@ class DeterministicRunner(DynamicModel):
             
             vos.cmd_line(cmd, using_subprocess = False)
 
-    def check_pcrglobwb_status(self):
+    def get_clone_areas(self):
 
         if self.configuration.globalOptions['cloneAreas'] == "Global" or \
            self.configuration.globalOptions['cloneAreas'] == "part_one":
             clone_areas = ['M%02d'%i for i in range(1,53+1,1)]
         else:
             clone_areas = list(set(self.configuration.globalOptions['cloneAreas'].split(",")))
-        for clone_area in clone_areas:
+        return clone_areas
+
+    def check_pcrglobwb_status(self):
+
+        for clone_area in self.get_clone_areas():
             status_file = str(self.configuration.main_output_directory) + "/" +str(clone_area) + "/maps/pcrglobwb_files_for_" + str(self.modelTime.fulldate) + "_are_ready.txt"
             msg = 'Waiting for the file: '+status_file
             if self.count_check == 1: logger.info(msg)
@@ -33,6 +33,7 @@ import logging
 logger = logging.getLogger(__name__)
 
 import virtualOS as vos
+import modflow_exchange
 from ncConverter import *
 
 class Groundwater(object):
@@ -585,18 +586,29 @@ class Groundwater(object):
             # for online coupling, we will read files from pcraster maps, using the previous day values
             directory = self.iniItems.main_output_directory + "/modflow/transient/maps/"
             yesterday = str(currTimeStep.yesterday())
+            
+            # - if available, use the exchange arrays instead (no resampling of global pcraster maps needed), see modflow_exchange.py
+            exchanged_maps = None
+            if self.iniItems.online_coupling_exchange_dir != None:
+                exchanged_maps = modflow_exchange.read_arrays_at_clone(self.iniItems.online_coupling_exchange_dir, "global", "modflow_for_pcrglobwb", yesterday, \
+                                                                       ['relativeGroundwaterHead', 'storGroundwater', 'baseflow'])
+                if exchanged_maps == None: logger.warning("The MODFLOW exchange arrays for " + yesterday + " are not available. The pcraster maps are used.")
+            if exchanged_maps != None:
+                for var in ['relativeGroundwaterHead', 'storGroundwater', 'baseflow']:
+                    vars(self)[var] = pcr.ifthen(self.landmask, pcr.cover(exchanged_maps[var], 0.0))
+            else:
 
-            # - relative groundwater head from MODFLOW
-            filename = directory + "relativeGroundwaterHead_" + str(yesterday) + ".map"
-            self.relativeGroundwaterHead = pcr.ifthen(self.landmask, pcr.cover(vos.readPCRmapClone(filename, self.cloneMap, self.tmpDir), 0.0))
+                # - relative groundwater head from MODFLOW
+                filename = directory + "relativeGroundwaterHead_" + str(yesterday) + ".map"
+                self.relativeGroundwaterHead = pcr.ifthen(self.landmask, pcr.cover(vos.readPCRmapClone(filename, self.cloneMap, self.tmpDir), 0.0))
 
-            # - storGroundwater from MODFLOW
-            filename = directory + "storGroundwater_" + str(yesterday) + ".map"
-            self.storGroundwater = pcr.ifthen(self.landmask, pcr.cover(vos.readPCRmapClone(filename, self.cloneMap, self.tmpDir), 0.0))
+                # - storGroundwater from MODFLOW
+                filename = directory + "storGroundwater_" + str(yesterday) + ".map"
+                self.storGroundwater = pcr.ifthen(self.landmask, pcr.cover(vos.readPCRmapClone(filename, self.cloneMap, self.tmpDir), 0.0))
 
-            # - baseflow from MODFLOW
-            filename = directory + "baseflow_" + str(yesterday) + ".map"
-            self.baseflow = pcr.ifthen(self.landmask, pcr.cover(vos.readPCRmapClone(filename, self.cloneMap, self.tmpDir), 0.0))
+                # - baseflow from MODFLOW
+                filename = directory + "baseflow_" + str(yesterday) + ".map"
+                self.baseflow = pcr.ifthen(self.landmask, pcr.cover(vos.readPCRmapClone(filename, self.cloneMap, self.tmpDir), 0.0))
 
         # river bed exchange has been accomodated in baseflow (via MODFLOW, river and drain packages)
         self.surfaceWaterInf = pcr.scalar(0.0)
@@ -23,6 +23,7 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import datetime
+import time
 import subprocess
 import os
 import types
@@ -388,6 +389,25 @@ class GroundwaterModflow(object):
         # initiate pcraster modflow object to None
         self.pcr_modflow = None
 
+        # option to keep the pcraster modflow object (with its grid/layer, boundary and BCF packages) during the entire simulation
+        # - if False, the modflow object will be rebuilt for every stress period (as in the past)
+        self.reuseModflowObject = True
+        if 'reuseModflowObject' in self.iniItems.modflowParameterOptions.keys() and \
+            self.iniItems.modflowParameterOptions['reuseModflowObject'] == "False": self.reuseModflowObject = False
+
+        # option to start the iteration of convergence criteria (HCLOSE and RCLOSE) from the criteria that converged in the previous stress period (for transient simulations only) 
+        # - we start from one step stricter than the last converged criteria, so that stricter criteria can be used again if the model allows 
+        # - if False, we always start from the strictest criteria (as in the past)
+        self.convergenceCriteriaFromHistory = False
+        if 'convergenceCriteriaFromHistory' in self.iniItems.modflowParameterOptions.keys() and \
+            self.iniItems.modflowParameterOptions['convergenceCriteriaFromHistory'] == "True": self.convergenceCriteriaFromHistory = True
+        self.last_converged_iteration_HCLOSE = None
+        self.last_converged_iteration_RCLOSE = None
+        
+        # the bottom of bank storage (used for the drain package) is constant for the entire simulation; the drain conductance changes only with the WaterBodies class
+        self.bottom_of_bank_storage = None
+        self.drain_conductance      = None
+
         # the following condition is needed if we have to 
         self.valuesRechargeAndAbstractionInMonthlyTotal = False
         if 'valuesRechargeAndAbstractionInMonthlyTotal' in self.iniItems.modflowTransientInputOptions.keys():
@@ -842,7 +862,7 @@ class GroundwaterModflow(object):
                                                     var,"undefined")
 
 
-    def update(self,currTimeStep):
+    def update(self,currTimeStep,monthly_input = None):
 
         # at the end of the month, calculate/simulate a steady state condition and obtain its calculated head values
         if currTimeStep.isLastDayOfMonth():
@@ -864,7 +884,8 @@ class GroundwaterModflow(object):
             self.modflow_simulation("transient", groundwaterHead, 
                                                  currTimeStep, 
                                                  PERLEN, 
-                                                 NSTP)
+                                                 NSTP, 
+                                                 monthly_input = monthly_input)
 
             # old-style reporting (this is usually used for debugging process)                            
             self.old_style_reporting(currTimeStep)
@@ -881,7 +902,13 @@ class GroundwaterModflow(object):
                            RELAX = 0.98,\
                            NBPOL = 2,\
                            DAMP = 1,\
-                           ITMUNI = 4, LENUNI = 2, TSMULT = 1.0):
+                           ITMUNI = 4, LENUNI = 2, TSMULT = 1.0, \
+                           monthly_input = None):
+        
+        # for measuring the wall time of this modflow simulation
+        start_time = time.time()
+        run_time   = 0.0
+        number_of_runs = 0
         
         # initiate pcraster modflow object including its grid/layer/elevation:
         # - constant for the entire simulation
@@ -931,7 +958,15 @@ class GroundwaterModflow(object):
         # read input files 
         if simulation_type == "transient":
             
-            if self.online_coupling:
+            if self.online_coupling and monthly_input != None:
+                
+                # for online coupling with the exchange arrays (see modflow_exchange.py), the mosaicked monthly values are given directly
+                discharge      = pcr.cover(monthly_input['monthly_discharge_cubic_meter_per_second'], 0.0)
+                gwRecharge     = pcr.cover(monthly_input['groundwater_recharge_meter_per_day'], 0.0)
+                gwAbstraction  = pcr.cover(monthly_input['groundwater_abstraction_meter_per_day'], 0.0)
+                channelStorage = pcr.cover(monthly_input['channel_storage_cubic_meter'], 0.0)
+
+            elif self.online_coupling:
 
                 # for online coupling, we will read files from pcraster maps
                 directory = self.iniItems.main_output_directory + "/global/maps/"
@@ -1017,6 +1052,12 @@ class GroundwaterModflow(object):
         self.iteration_HCLOSE = 0
         self.iteration_RCLOSE = 0
         self.modflow_converged = False
+        
+        # - using the convergence history: start from one step stricter than the criteria that converged in the previous stress period
+        if self.convergenceCriteriaFromHistory and simulation_type == "transient" and self.last_converged_iteration_HCLOSE != None:
+            iteration = max(0, self.last_converged_iteration_HCLOSE * len(self.criteria_RCLOSE) + self.last_converged_iteration_RCLOSE - 1)
+            self.iteration_HCLOSE = iteration / len(self.criteria_RCLOSE)
+            self.iteration_RCLOSE = iteration % len(self.criteria_RCLOSE)
 
         # execute MODFLOW 
         while self.modflow_converged == False:
@@ -1042,12 +1083,15 @@ class GroundwaterModflow(object):
             msg = "Executing MODFLOW with HCLOSE = "+str(HCLOSE)+" and RCLOSE = "+str(RCLOSE)+" and MXITER = "+str(MXITER)+" and ITERI = "+str(ITERI)+" and PERLEN = "+str(PERLEN)+" and NSTP = "+str(NSTP)
             logger.info(msg)
             
+            run_start_time = time.time()
             try:
                 self.pcr_modflow.run()
                 self.modflow_converged = self.pcr_modflow.converged()           # TODO: Ask Oliver to fix the non-convergence issue that can appear before reaching the end of stress period.  
                 #~ self.modflow_converged = self.old_check_modflow_convergence()
             except:
                 self.modflow_converged = False
+            run_time += time.time() - run_start_time
+            number_of_runs += 1
 
             print self.modflow_converged
 
@@ -1124,12 +1168,21 @@ class GroundwaterModflow(object):
                 msg += "HURRAY!!! MODFLOW CONVERGED with HCLOSE = "+str(HCLOSE)+" and RCLOSE = "+str(RCLOSE)
                 msg += "\n\n"
                 logger.info(msg)
+                
+                # remember the converged criteria (to be used for the next stress period)
+                if simulation_type == "transient":
+                    self.last_converged_iteration_HCLOSE = self.iteration_HCLOSE
+                    self.last_converged_iteration_RCLOSE = self.iteration_RCLOSE
             
         # obtaining the results from modflow simulation
         if self.modflow_converged: self.get_all_modflow_results(simulation_type)
         
-        # clear modflow object
-        self.pcr_modflow = None
+        # clear modflow object (if it is not reused for the next stress period)
+        if self.reuseModflowObject == False: self.pcr_modflow = None
+        
+        msg = "MODFLOW wall time for this stress period: %.2f s (of which %.2f s for %i run(s) of pcr_modflow.run)" %(time.time() - start_time, run_time, number_of_runs)
+        if currTimeStep != None: msg += " - " + str(currTimeStep.fulldate)
+        logger.info(msg)
         
         # calculate some variables that will be accessed from PCR-GLOBWB (for online coupling purpose)
         self.calculate_values_for_pcrglobwb()
@@ -1267,6 +1320,7 @@ class GroundwaterModflow(object):
             self.WaterBodies.getParameterFiles(date_given = self.iniItems.globalOptions['startTime'],\
                                                cellArea = self.cellAreaMap, \
                                                ldd = self.lddMap)
+            self.drain_conductance = None
         if simulation_type == "transient":
             if self.WaterBodies == None:
                 self.WaterBodies = waterBodies.WaterBodies(self.iniItems,\
@@ -1281,7 +1335,10 @@ class GroundwaterModflow(object):
                                                    ldd = self.lddMap)        
 
         # reset bed conductance at the first month (due to possibility of new inclusion of lakes/reservoirs)
-        if currTimeStep == None or currTimeStep.month == 1: self.bed_conductance = None
+        # - also the drain conductance (that depends on the extent of lakes/reservoirs)
+        if currTimeStep == None or currTimeStep.month == 1: 
+            self.bed_conductance   = None
+            self.drain_conductance = None
         
         if isinstance(self.bed_conductance, types.NoneType):
 
@@ -1540,22 +1597,29 @@ class GroundwaterModflow(object):
 
         # specify the drain package the drain package is used to simulate the drainage of bank storage 
 
-        # - estimate bottom of bank storage for flood plain areas
-        drain_elevation = self.estimate_bottom_of_bank_storage()                               # unit: m
+        # - estimate bottom of bank storage for flood plain areas (constant for the entire simulation)
+        if isinstance(self.bottom_of_bank_storage, types.NoneType): 
+            self.bottom_of_bank_storage = self.estimate_bottom_of_bank_storage()
+        drain_elevation = self.bottom_of_bank_storage                                          # unit: m
         
-        # - for lakes and/or reservoirs, ignore the drainage
-        drain_conductance = pcr.ifthen(pcr.scalar(self.WaterBodies.waterBodyIds) > 0.0, pcr.scalar(0.0))
-        # - drainage conductance is a linear reservoir coefficient
-        drain_conductance = pcr.cover(drain_conductance, \
-                            self.recessionCoeff * self.specificYield * self.cellAreaMap)       # unit: m2/day
+        # - drain conductance (only re-calculated if the WaterBodies class may have changed, see set_drain_and_river_package)
+        if isinstance(self.drain_conductance, types.NoneType): 
+        
+            # - for lakes and/or reservoirs, ignore the drainage
+            drain_conductance = pcr.ifthen(pcr.scalar(self.WaterBodies.waterBodyIds) > 0.0, pcr.scalar(0.0))
+            # - drainage conductance is a linear reservoir coefficient
+            drain_conductance = pcr.cover(drain_conductance, \
+                                self.recessionCoeff * self.specificYield * self.cellAreaMap)       # unit: m2/day
 
-        #~ drain_conductance = pcr.ifthenelse(drain_conductance < 1e-20, 0.0, \
-                                           #~ drain_conductance) 
-        #~ drain_conductance = pcr.rounddown(drain_conductance*10000.)/10000.                  # It is not a good idea to round the values down (water can be trapped).  
+            #~ drain_conductance = pcr.ifthenelse(drain_conductance < 1e-20, 0.0, \
+                                               #~ drain_conductance) 
+            #~ drain_conductance = pcr.rounddown(drain_conductance*10000.)/10000.                  # It is not a good idea to round the values down (water can be trapped).  
 
-        # reducing the size of table by ignoring cells outside landmask region
-        drain_conductance = pcr.ifthen(self.landmask, drain_conductance)
-        drain_conductance = pcr.cover(drain_conductance, 0.0)
+            # reducing the size of table by ignoring cells outside landmask region
+            drain_conductance = pcr.ifthen(self.landmask, drain_conductance)
+            self.drain_conductance = pcr.cover(drain_conductance, 0.0)
+        
+        drain_conductance = self.drain_conductance
         
         #~ # set the DRN package only to the uppermost layer
         #~ self.pcr_modflow.setDrain(drain_elevation, drain_conductance, self.number_of_layers)
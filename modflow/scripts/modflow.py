@@ -31,6 +31,7 @@ import pcraster as pcr
 
 import virtualOS as vos
 import groundwater_MODFLOW
+import modflow_exchange
 
 import logging
 logger = logging.getLogger(__name__)
@@ -64,6 +65,9 @@ class ModflowCoupling(object):
         
         # preparing the sub-model(s)         - Currently, there is only one sub-model. 
         self.createSubmodels()
+        
+        # the last exchange arrays written for PCR-GLOBWB (see dumpVariableValuesForPCRGLOBWB)
+        self.previous_exchange_path = None
          
     @property
     def configuration(self):
@@ -135,6 +139,14 @@ class ModflowCoupling(object):
              timeStamp+".map",\
              outputDirectory)
 
+        # also as exchange arrays (read by PCR-GLOBWB runs without resampling the above pcraster maps), see modflow_exchange.py
+        if self._configuration.online_coupling_exchange_dir != None:
+            path = modflow_exchange.exchange_path(self._configuration.online_coupling_exchange_dir, "global", "modflow_for_pcrglobwb", timeStamp)
+            modflow_exchange.write_arrays(path, variables)
+            # - the previous exchange is not needed anymore (PCR-GLOBWB runs have used it to reach this time step)
+            if self.previous_exchange_path != None: modflow_exchange.remove_arrays(self.previous_exchange_path)
+            self.previous_exchange_path = path
+
         # for a transient run with the coupled PCR-GLOBWB-MODFLOW, make an empty file to indicate that modflow files are ready
         if self._configuration.online_coupling_between_pcrglobwb_and_modflow and \
            self._configuration.steady_state_only == False:
@@ -154,10 +166,11 @@ class ModflowCoupling(object):
         
         return result
 
-    def update(self):
+    def update(self, monthly_input = None):
         logger.info("Updating model for time %s", self._modelTime)
         
-        self.modflow.update(self._modelTime)
+        # monthly_input: the monthly PCR-GLOBWB values (a dictionary of pcraster maps) given directly by the runner (if None, they are read from pcraster maps)
+        self.modflow.update(self._modelTime, monthly_input)
 
         # save/dump states at the end of the month or at the end of model simulation
         if self._modelTime.isLastDayOfMonth() or self._modelTime.isLastTimeStep():
@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# PCR-GLOBWB (PCRaster Global Water Balance) Global Hydrological Model
+#
+# Copyright (C) 2016, Ludovicus P. H. (Rens) van Beek, Edwin H. Sutanudjaja, Yoshihide Wada,
+# Joyce H. C. Bosmans, Niels Drost, Inge E. M. de Graaf, Kor de Jong, Patricia Lopez Lopez,
+# Stefanie Pessenteiner, Oliver Schmitz, Menno W. Straatsma, Niko Wanders, Dominik Wisser,
+# and Marc F. P. Bierkens,
+# Faculty of Geosciences, Utrecht University, Utrecht, The Netherlands
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+import shutil
+
+import numpy as np
+
+import pcraster as pcr
+
+import logging
+logger = logging.getLogger(__name__)
+
+'''
+Exchange of the monthly coupling fields between the PCR-GLOBWB (clone) runs and the MODFLOW run
+as numpy arrays, preferably in a shared-memory file system (e.g. /dev/shm), instead of pcraster map files
+that have to be merged (merge_pcraster_maps.py) and resampled (vos.readPCRmapClone).
+
+Each exchange is a directory containing one ".npy" file per variable and the file "clone_attributes.npy" 
+(west, north, cell size, number of rows and columns). A directory is written under a temporary name 
+and renamed when it is complete, so that a reader never sees an incomplete exchange.  
+'''
+
+# missing value used for converting arrays to pcraster maps
+MV = 1e20
+
+def get_clone_attributes():
+    clone = pcr.clone()
+    return np.array([clone.west(), clone.north(), clone.cellSize(), clone.nrRows(), clone.nrCols()], dtype = np.float64)
+
+def exchange_path(exchange_directory, area, name, date_string):
+    return os.path.join(exchange_directory, area, name + "_" + str(date_string))
+
+def write_arrays(path, variables):
+    # variables: a dictionary of pcraster maps (on the current clone)
+    
+    tmp_path = path + ".tmp"
+    if os.path.exists(tmp_path): shutil.rmtree(tmp_path)
+    os.makedirs(tmp_path)
+    
+    for variable, pcr_map in variables.items():
+        np.save(os.path.join(tmp_path, variable + ".npy"), pcr.pcr2numpy(pcr.scalar(pcr_map), np.nan))
+    np.save(os.path.join(tmp_path, "clone_attributes.npy"), get_clone_attributes())
+    
+    # make the exchange available
+    if os.path.exists(path): shutil.rmtree(path)
+    os.rename(tmp_path, path)
+    logger.debug('Writing the exchange arrays to : ' + str(path))
+
+def remove_arrays(path):
+    if os.path.exists(path): shutil.rmtree(path)
+
+def paste_arrays(target_arrays, target_attributes, path, variable_names = None):
+    # pasting the arrays stored in path to the target arrays (only for the cells that are still missing in the target)
+    # - the stored arrays are opened as memory maps, so that only the overlapping window is read
+    
+    source_attributes = np.load(os.path.join(path, "clone_attributes.npy"))
+    west, north, cell_size, rows, cols = target_attributes
+    source_west, source_north, source_cell_size, source_rows, source_cols = source_attributes
+    if abs(source_cell_size - cell_size) > 1e-6 * cell_size:
+        msg = "The cell size of the exchange arrays in " + str(path) + " (" + str(source_cell_size) + ") differs from the clone map (" + str(cell_size) + ")."
+        logger.error(msg)
+        raise Exception(msg)
+
+    # position of the source arrays in the target arrays
+    row_offset = int(round((north - source_north) / cell_size))
+    col_offset = int(round((source_west - west) / cell_size))
+    row_start, row_end = max(0, row_offset), min(int(rows), row_offset + int(source_rows))
+    col_start, col_end = max(0, col_offset), min(int(cols), col_offset + int(source_cols))
+    if row_start >= row_end or col_start >= col_end: return
+    
+    if variable_names == None:
+        variable_names = [f[:-4] for f in os.listdir(path) if f.endswith(".npy") and f != "clone_attributes.npy"]
+    for variable in variable_names:
+        source = np.load(os.path.join(path, variable + ".npy"), mmap_mode = 'r')
+        source = source[row_start - row_offset:row_end - row_offset, col_start - col_offset:col_end - col_offset]
+        if variable not in target_arrays.keys():
+            target_arrays[variable] = np.empty((int(rows), int(cols)), dtype = source.dtype)
+            target_arrays[variable][:] = np.nan
+        target = target_arrays[variable][row_start:row_end, col_start:col_end]
+        mask = np.isnan(target) & ~np.isnan(source)
+        target[mask] = source[mask]
+
+def arrays_to_pcraster(arrays):
+    maps = {}
+    for variable, array in arrays.items():
+        maps[variable] = pcr.numpy2pcr(pcr.Scalar, np.where(np.isnan(array), MV, array), MV)
+    return maps
+
+def mosaic_arrays(exchange_directory, areas, name, date_string, variable_names = None):
+    # mosaicking the exchange arrays of several areas (clones) to pcraster maps on the current clone
+    # - returns None if the exchange of an area is not available
+    
+    target_attributes = get_clone_attributes()
+    arrays = {}
+    for area in areas:
+        path = exchange_path(exchange_directory, area, name, date_string)
+        if not os.path.exists(path):
+            logger.warning('The exchange arrays ' + str(path) + ' are not available.')
+            return None
+        paste_arrays(arrays, target_attributes, path, variable_names)
+    return arrays_to_pcraster(arrays)
+
+def read_arrays_at_clone(exchange_directory, area, name, date_string, variable_names = None):
+    # reading the exchange arrays of an area (e.g. global) at the current clone
+    # - returns None if the exchange is not available
+    
+    path = exchange_path(exchange_directory, area, name, date_string)
+    if not os.path.exists(path): return None
+    arrays = {}
+    paste_arrays(arrays, get_clone_attributes(), path, variable_names)
+    return arrays_to_pcraster(arrays)
@@ -69,6 +69,10 @@ if os.path.exists(logFileFolder) == False:
     os.makedirs(logFileFolder)
 generalConfiguration.initialize_logging(logFileFolder)
 
+# save the parsed configuration, so that the clone runs do not have to parse the ini file again (see the system argument -pc)
+parsedConfigurationFile = logFileFolder + os.path.basename(iniFileName) + ".parsed"
+generalConfiguration.save_parsed_configuration(parsedConfigurationFile)
+
 # copy ini file to the log folder:
 timestamp = datetime.datetime.now()
 logger.info('Copying ini file to the folder %s', logFileFolder)
@@ -147,7 +151,7 @@ i_clone = 0
 cmd = ''
 for clone_code in clone_codes:
 
-   cmd += "python deterministic_runner_glue_with_parallel_and_modflow_options.py " + iniFileName  + " " + debug_option + " " + clone_code + " "
+   cmd += "python deterministic_runner_glue_with_parallel_and_modflow_options.py " + iniFileName  + " " + debug_option + " " + clone_code + " -pc " + parsedConfigurationFile + " "
    cmd = cmd + " & "
    i_clone += 1
 
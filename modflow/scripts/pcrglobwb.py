@@ -31,6 +31,7 @@ import gc
 import pcraster as pcr
 
 import virtualOS as vos
+import modflow_exchange
 import meteo
 import landSurface
 import groundwater
@@ -168,6 +169,17 @@ class PCRGlobWB(object):
             # time stamp used as part of the file name:
             if timeStamp == "Default": timeStamp = str(self._modelTime.fulldate) 
             
+            # for the exchange as numpy arrays (no pcraster map files needed), see modflow_exchange.py
+            if self._configuration.online_coupling_exchange_dir != None:
+                
+                # - the name of this area (clone) is the name of its output directory (e.g. M01) 
+                area = os.path.basename(os.path.normpath(self._configuration.globalOptions['outputDir']))
+                path = modflow_exchange.exchange_path(self._configuration.online_coupling_exchange_dir, area, "pcrglobwb_for_modflow", timeStamp)
+                logger.info('Writing some monthly variables for the MODFLOW input to the exchange directory %s', path)
+                
+                modflow_exchange.write_arrays(path, self.variables)
+                return
+
             logger.info('Dumping some monthly variables for the MODFLOW input.')
 
             for variable, map in self.variables.iteritems():